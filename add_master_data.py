@@ -1,14 +1,18 @@
 
-from app import app, db
+from app import create_app, db
 from models import (
     Supplier, GodownType, Godown, PrecleaningBin, Product, Customer, 
     CleaningMachine, CleaningBin, StorageArea, User
 )
 from datetime import datetime
+from migrations import migrate
+
+app = create_app(run_scheduler=False)
 
 def add_master_data():
     """Add basic master data to all tables"""
     with app.app_context():
+        migrate()
         try:
             print("Adding master data...")
             
@@ -1,11 +1,17 @@
 
 import os
 import logging
+import secrets
+import time
+from datetime import timedelta
+import click
 from flask import Flask
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_apscheduler import APScheduler
+from db_routing import RoutingSession, REPLICA_BIND, engine_options, init_read_routing
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,32 +19,114 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "your-secret-key-change-this-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+scheduler = APScheduler()
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///wheat_processing.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+def _secret_key(instance_path):
+    """SESSION_SECRET, or a random key generated on first start and kept in the instance folder for every worker"""
+    key = os.environ.get("SESSION_SECRET")
+    if key:
+        return key
+    path = os.path.join(instance_path, 'secret_key')
+    os.makedirs(instance_path, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another worker created it; wait for it to be written
+        for _ in range(50):
+            with open(path) as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.1)
+        raise RuntimeError(f"{path} is empty; delete it or set SESSION_SECRET")
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
 
-# Configure upload folder
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+def create_app(run_scheduler=None):
+    """Build the Flask app; tables and sample data are created by `flask init-db`, not here.
 
-# Initialize extensions
-db.init_app(app)
-scheduler = APScheduler()
-scheduler.init_app(app)
-scheduler.start()
+    run_scheduler=False keeps scripts out of leader election; None decides by
+    how the process was started (see scheduling.scheduler_enabled).
+    """
+    app = Flask(__name__)
+    app.secret_key = _secret_key(app.instance_path)
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=int(os.environ.get("SESSION_HOURS", "12")))
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///wheat_processing.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options("DB", app.config["SQLALCHEMY_DATABASE_URI"])
+
+    # Optional read replica for reports, tracking pages and GET /api/* (writes always go to the primary)
+    replica_url = os.environ.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {
+            REPLICA_BIND: {"url": replica_url, **engine_options("DB_REPLICA", replica_url)}
+        }
+
+    # Configure upload folder
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Initialize extensions
+    db.init_app(app)
+    init_read_routing(app)
+    scheduler.init_app(app)
+    from scheduling import scheduler_enabled
+    # CLI commands (migrate, task-worker, ...) build the app too but never campaign for leadership
+    if run_scheduler is None:
+        run_scheduler = scheduler_enabled()
+    if run_scheduler and not scheduler.running:
+        scheduler.start()
+
+    # Only the elected worker runs leader jobs; the others take over if it dies
+    import tasks  # noqa: F401 - registers the task queue drain job
+    import archive  # noqa: F401 - registers the log archival job and archive tables
+    import oee  # noqa: F401 - registers the machine bucket fold and its change tracking
+    import telemetry  # noqa: F401 - registers the raw sensor data purge
+    import forecast  # noqa: F401 - registers the capacity forecast refresh and its change tracking
+    import search  # noqa: F401 - keeps the search index in step with writes
+    import timeline  # noqa: F401 - records production events and folds them into the order timelines
+    import audit  # noqa: F401 - records row changes in the audit log at commit
+    if run_scheduler:
+        from scheduling import init_leader_election
+        init_leader_election(app)
+
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    import master_cache  # noqa: F401 - bumps master table versions on writes
+    from assets import init_assets
+    init_assets(app)
+    from compression import init_compression
+    init_compression(app)
+    from auth import init_auth
+    init_auth(app)
+    from idempotency import init_idempotency
+    init_idempotency(app)
+    from views import register_blueprints
+    register_blueprints(app)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(task_worker_command)
+    app.cli.add_command(archive_logs_command)
+    app.cli.add_command(refresh_oee_command)
+    app.cli.add_command(weighbridge_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(reindex_search_command)
+    app.cli.add_command(replay_timeline_command)
+    app.cli.add_command(rebuild_lineage_command)
+    app.cli.add_command(create_user_command)
+    app.cli.add_command(create_token_command)
+    app.cli.add_command(revoke_token_command)
+
+    return app
 
 def init_sample_data():
     """Initialize sample data for testing"""
@@ -180,15 +268,156 @@ def init_sample_data():
         # Continue with basic setup even if sample data fails
         pass
 
-# Initialize the app context and create tables
-with app.app_context():
-    # Import models and routes
-    import models
-    import routes
-    
-    # Create all tables
-    db.create_all()
-    init_sample_data()
+@click.command('init-db')
+@click.option('--no-sample-data', is_flag=True, help='Only create missing tables and apply migrations')
+@with_appcontext
+def init_db_command(no_sample_data):
+    """Create missing tables, apply migrations and load the sample master data"""
+    from migrations import migrate
+
+    migrate(log=click.echo)
+    if not no_sample_data:
+        init_sample_data()
+
+    from master_cache import seed_versions
+    seed_versions()
+    click.echo('Database initialised.')
+
+@click.command('migrate')
+@click.option('--status', is_flag=True, help='List migrations and whether each is applied, without changing anything')
+@with_appcontext
+def migrate_command(status):
+    """Create missing tables and apply pending schema migrations"""
+    from migrations import migrate, migration_status
+    if status:
+        for version, description, applied in migration_status():
+            click.echo(f"{version}  {'applied' if applied else 'pending'}  {description}")
+        return
+    applied = migrate(log=click.echo)
+    click.echo(f"{len(applied)} migration(s) applied." if applied else 'Database is up to date.')
+
+@click.command('task-worker')
+@click.option('--poll', default=1.0, help='Seconds to wait when the queue is empty')
+@click.option('--once', is_flag=True, help='Exit when no task is due instead of polling')
+@with_appcontext
+def task_worker_command(poll, once):
+    """Run queued background tasks until stopped"""
+    from tasks import run_worker
+    run_worker(poll_seconds=poll, once=once)
+
+@click.command('archive-logs')
+@click.option('--retention-days', type=int, help='Archive closed rows older than this many days (default ARCHIVE_RETENTION_DAYS)')
+@with_appcontext
+def archive_logs_command(retention_days):
+    """Move closed cleaning logs, reminders and schedules into the archive tables"""
+    from archive import archive_logs
+    moved = archive_logs(retention_days, log=click.echo)
+    click.echo(f"{sum(moved.values())} row(s) archived.")
+
+@click.command('refresh-oee')
+@click.option('--days', type=int, help='Rebuild the machine buckets of the last N days instead of the pending window')
+@with_appcontext
+def refresh_oee_command(days):
+    """Fold machine activity into the 15-minute and hourly OEE buckets"""
+    from datetime import datetime, timedelta
+    from oee import refresh_buckets
+    since = datetime.now() - timedelta(days=days) if days else None
+    window_start, rows = refresh_buckets(since)
+    click.echo(f"{rows} bucket(s) written from {window_start:%Y-%m-%d %H:%M}.")
+
+@click.command('weighbridge')
+@click.option('--bridge', help='Name of the weighbridge the readings belong to (default WEIGHBRIDGE_NAME or "main")')
+@click.option('--serial', 'serial_port', help='Serial port of the indicator, e.g. /dev/ttyUSB0 (needs pyserial)')
+@click.option('--baud', default=9600, help='Serial baud rate')
+@click.option('--tcp', help='host:port of the indicator or its serial-to-Ethernet converter')
+@click.option('--simulate', is_flag=True, help='Generate trucks crossing the bridge instead of reading a device')
+@with_appcontext
+def weighbridge_command(bridge, serial_port, baud, tcp, simulate):
+    """Read the weighbridge indicator and record settled weights against the waiting vehicle"""
+    import weighbridge
+    if simulate:
+        frames = weighbridge.simulated_frames()
+    elif serial_port:
+        frames = weighbridge.serial_frames(serial_port, baud)
+    elif tcp:
+        host, _, port = tcp.rpartition(':')
+        if not host or not port.isdigit():
+            raise click.BadParameter('expected host:port', param_hint='--tcp')
+        frames = weighbridge.tcp_frames(host, int(port))
+    else:
+        raise click.UsageError('Give one of --serial, --tcp or --simulate')
+    name = bridge or weighbridge.DEFAULT_BRIDGE
+    click.echo(f"Weighbridge {name}: reading {'simulator' if simulate else serial_port or tcp}")
+    weighbridge.run(name, frames)
+
+@click.command('reindex-search')
+@with_appcontext
+def reindex_search_command():
+    """Rebuild the global search index from vehicles, orders, jobs, batches, dispatches and parties"""
+    from search import rebuild_index
+    written = rebuild_index(log=click.echo)
+    click.echo(f"{sum(written.values())} document(s) indexed.")
+
+@click.command('replay-timeline')
+@with_appcontext
+def replay_timeline_command():
+    """Rebuild every order timeline from the production event log, importing orders that predate it first"""
+    from timeline import import_and_replay
+    imported, timelines, events = import_and_replay(log=click.echo)
+    click.echo(f"{imported} event(s) imported, {timelines} timeline(s) rebuilt from {events} event(s).")
+
+@click.command('rebuild-lineage')
+@with_appcontext
+def rebuild_lineage_command():
+    """Import movements that predate the lineage tables, then rebuild the lineage closure index"""
+    from genealogy import rebuild_lineage
+    edges, rows = rebuild_lineage(log=click.echo)
+    click.echo(f"{edges} movement(s) imported, {rows} closure row(s) written.")
+
+@click.command('create-user')
+@click.argument('username')
+@click.option('--role', type=click.Choice(['gate', 'lab', 'production', 'packing', 'dispatch', 'admin']), required=True)
+@click.password_option()
+@with_appcontext
+def create_user_command(username, role, password):
+    """Create a user, or set the role and password of an existing one"""
+    from auth import hash_password
+    from models import User
+    user = User.query.filter_by(username=username).first() or User(username=username)
+    user.role = role
+    user.password_hash = hash_password(password)
+    user.is_blocked = False
+    db.session.add(user)
+    db.session.commit()
+    click.echo(f"User {username} ({role}) saved.")
+
+@click.command('create-token')
+@click.argument('name')
+@click.option('--role', type=click.Choice(['gate', 'lab', 'production', 'packing', 'dispatch', 'admin']), required=True)
+@with_appcontext
+def create_token_command(name, role):
+    """Issue an API token for a device integration; it is shown once"""
+    from auth import create_token
+    click.echo(create_token(name, role))
+
+@click.command('revoke-token')
+@click.argument('name')
+@with_appcontext
+def revoke_token_command(name):
+    """Revoke a device's API token"""
+    from auth import revoke_token
+    click.echo(f"Token {name} revoked." if revoke_token(name) else f"No active token named {name}.")
+
+@click.command('build-assets')
+@click.option('--vendor', is_flag=True, help='Download Bootstrap, Font Awesome, Chart.js and Inter into static/vendor first')
+@with_appcontext
+def build_assets_command(vendor):
+    """Bundle, minify and fingerprint static assets into static/dist"""
+    from flask import current_app
+    from assets import vendor_assets, build_assets
+    if vendor:
+        vendor_assets(current_app.static_folder, log=click.echo)
+    build_assets(current_app.static_folder, current_app.static_url_path, log=click.echo)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,164 @@
+"""Archival of closed rows from the high-volume cleaning and reminder tables.
+
+Rows older than ARCHIVE_RETENTION_DAYS that are no longer open move in small
+batches into <table>_archive, which on PostgreSQL is range-partitioned by
+month. The live tables keep only recent and open rows; load_history() reads
+the archive as well only when the requested date range reaches into it.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Index, Table, delete, func, insert, select
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.interfaces import MANYTOONE
+from app import db
+from models import CleaningLog, MachineCleaningLog, B1ScaleCleaningLog, ProcessReminder, CleaningSchedule
+from scheduling import leader_job
+
+RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", "30"))
+BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+BATCH_PAUSE_SECONDS = float(os.environ.get("ARCHIVE_BATCH_PAUSE", "0.1"))
+
+class ArchivedTable:
+    def __init__(self, model, timestamp, closed=None):
+        self.model = model
+        self.live = model.__table__
+        self.timestamp = timestamp  # column the retention window and the monthly partitions are based on
+        self.closed = closed  # condition on the live table for rows that will not change again
+        self.archive = Table(
+            f"{self.live.name}_archive", db.metadata,
+            *[
+                Column(column.name, column.type, primary_key=column.primary_key or column.name == timestamp,
+                       nullable=column.nullable and column.name != timestamp)
+                for column in self.live.columns
+            ],
+            Column('archived_at', DateTime, nullable=False),
+            Index(f"ix_{self.live.name}_archive_{timestamp}", timestamp),
+            postgresql_partition_by=f"RANGE ({timestamp})"
+        )
+
+ARCHIVED_TABLES = {spec.live.name: spec for spec in (
+    ArchivedTable(CleaningLog, 'cleaning_time'),
+    ArchivedTable(MachineCleaningLog, 'cleaning_start_time', MachineCleaningLog.status == 'completed'),
+    ArchivedTable(B1ScaleCleaningLog, 'cleaning_start_time', B1ScaleCleaningLog.status == 'completed'),
+    ArchivedTable(ProcessReminder, 'reminder_time', ProcessReminder.status.in_(['sent', 'dismissed'])),
+    ArchivedTable(CleaningSchedule, 'scheduled_time', CleaningSchedule.status.in_(['completed', 'cancelled'])),
+)}
+
+_ARCHIVES_BY_MODEL = {spec.model: spec for spec in ARCHIVED_TABLES.values()}
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+def _next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _ensure_partitions(connection, spec, timestamps, known):
+    """Create the monthly partitions the rows about to be archived fall into (PostgreSQL only)"""
+    preparer = connection.dialect.identifier_preparer
+    for month in sorted({_month_start(ts) for ts in timestamps} - known):
+        name = f"{spec.archive.name}_{month:%Y%m}"
+        connection.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {preparer.quote(name)} PARTITION OF {preparer.quote(spec.archive.name)} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+        )
+        known.add(month)
+
+def archive_table(name, before, batch_size=None, pause=None):
+    """Move closed rows of one table older than before into its archive; returns the number moved.
+
+    Each batch is copied and deleted in one short transaction, so a row is
+    always in exactly one of the two tables, and the pause between batches
+    leaves room for the floor's own writes.
+    """
+    spec = ARCHIVED_TABLES[name]
+    batch_size = batch_size or BATCH_SIZE
+    pause = BATCH_PAUSE_SECONDS if pause is None else pause
+    timestamp = spec.live.c[spec.timestamp]
+    conditions = [timestamp < before] + ([spec.closed] if spec.closed is not None else [])
+    partitioned = db.engine.dialect.name == 'postgresql'
+    partitions = set()
+    moved = 0
+
+    while True:
+        with db.engine.begin() as connection:
+            rows = connection.execute(
+                select(spec.live).where(*conditions).order_by(spec.live.c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            if partitioned:
+                _ensure_partitions(connection, spec, [row[spec.timestamp] for row in rows], partitions)
+            now = datetime.utcnow()
+            connection.execute(insert(spec.archive), [{**row, 'archived_at': now} for row in rows])
+            connection.execute(delete(spec.live).where(spec.live.c.id.in_([row['id'] for row in rows])))
+        moved += len(rows)
+        time.sleep(pause)
+    return moved
+
+def archive_logs(retention_days=None, log=None):
+    """Archive every table in ARCHIVED_TABLES; returns {table: rows moved}"""
+    before = datetime.utcnow() - timedelta(days=RETENTION_DAYS if retention_days is None else retention_days)
+    moved = {}
+    for name in ARCHIVED_TABLES:
+        moved[name] = archive_table(name, before)
+        if log and moved[name]:
+            log(f"{name}: {moved[name]} row(s) archived")
+    return moved
+
+@leader_job('archive_logs', hours=6)
+def archive_logs_job():
+    """Move closed cleaning logs, reminders and schedules past the retention window into the archive"""
+    return archive_logs()
+
+def archived_until(model):
+    """Latest timestamp held in a model's archive, or None when nothing has been archived"""
+    spec = _ARCHIVES_BY_MODEL[model]
+    return db.session.execute(select(func.max(spec.archive.c[spec.timestamp]))).scalar()
+
+def _load_many_to_one(objects):
+    """Fill many-to-one relationships of detached archive rows with one query per relationship"""
+    if not objects:
+        return
+    for relationship in objects[0].__mapper__.relationships:
+        if relationship.direction is not MANYTOONE or len(relationship.local_columns) != 1:
+            continue
+        local = next(iter(relationship.local_columns)).key
+        target = relationship.mapper.class_
+        ids = {getattr(obj, local) for obj in objects} - {None}
+        related = {item.id: item for item in target.query.filter(target.id.in_(ids))} if ids else {}
+        for obj in objects:
+            set_committed_value(obj, relationship.key, related.get(getattr(obj, local)))
+
+def load_history(model, start=None, end=None, **filters):
+    """Rows of an archived model matching filters (column=value) within [start, end), oldest first.
+
+    The archive is only queried when start is missing or falls at or before
+    the newest archived row. Archived rows come back as read-only instances
+    that are not attached to the session.
+    """
+    spec = _ARCHIVES_BY_MODEL[model]
+    column = getattr(model, spec.timestamp)
+    query = model.query.filter_by(**filters).order_by(column, model.id)
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+    rows = query.all()
+
+    watermark = archived_until(model)
+    if watermark is None or (start is not None and start > watermark):
+        return rows
+
+    archived_column = spec.archive.c[spec.timestamp]
+    statement = select(*[spec.archive.c[c.name] for c in spec.live.columns]).where(
+        *[spec.archive.c[name] == value for name, value in filters.items()]
+    )
+    if start is not None:
+        statement = statement.where(archived_column >= start)
+    if end is not None:
+        statement = statement.where(archived_column < end)
+    archived = [model(**row) for row in db.session.execute(statement).mappings()]
+    _load_many_to_one(archived)
+
+    return sorted(archived + rows, key=lambda obj: (getattr(obj, spec.timestamp) or datetime.min, obj.id))
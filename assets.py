@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import urllib.request
+from flask import current_app, request, send_from_directory, url_for
+
+# Third-party assets served from static/vendor so pages work without internet access
+VENDOR = {
+    'vendor/bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    'vendor/chartjs/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js',
+    'vendor/inter/inter.css': 'https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap',
+}
+
+FONTAWESOME_WEBFONTS = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/'
+FONTAWESOME_FILES = ['fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility']
+
+# Bundle name -> source files under static/, in page order
+BUNDLES = {
+    'app.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/fontawesome/css/all.min.css',
+        'vendor/inter/inter.css',
+        'css/custom.css',
+    ],
+    'app.js': [
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+        'vendor/chartjs/chart.umd.min.js',
+        'js/camera.js',
+        'js/main.js',
+        'js/outbox.js',
+        'js/search.js',
+    ],
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+def _fetch(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120 Safari/537.36'})
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return response.read()
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def vendor_assets(static_folder, log=print):
+    """Download the CDN assets (and the fonts they reference) into static/vendor"""
+    for relpath, url in VENDOR.items():
+        data = _fetch(url)
+        if relpath == 'vendor/inter/inter.css':
+            # Google Fonts CSS points at font files on fonts.gstatic.com; keep local copies
+            css = data.decode()
+            for index, font_url in enumerate(sorted(set(re.findall(r'url\((https://[^)]+)\)', css)))):
+                name = f"inter-{index}{os.path.splitext(font_url)[1] or '.woff2'}"
+                _write(os.path.join(static_folder, 'vendor/inter', name), _fetch(font_url))
+                css = css.replace(font_url, name)
+            data = css.encode()
+        _write(os.path.join(static_folder, relpath), data)
+        log(f'vendored {relpath}')
+
+    for name in FONTAWESOME_FILES:
+        for ext in ('woff2', 'ttf'):
+            _write(os.path.join(static_folder, 'vendor/fontawesome/webfonts', f'{name}.{ext}'),
+                   _fetch(f'{FONTAWESOME_WEBFONTS}{name}.{ext}'))
+    log('vendored vendor/fontawesome/webfonts')
+
+def minify_css(css):
+    try:
+        import rcssmin
+        return rcssmin.cssmin(css)
+    except ImportError:
+        pass
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+def minify_js(js):
+    # Only minify with a real tokenizer; vendor files are already minified
+    try:
+        import rjsmin
+        return rjsmin.jsmin(js)
+    except ImportError:
+        return js
+
+def _rebase_css_urls(css, source, static_url_path):
+    """Make relative url() references absolute so they still resolve from the bundle"""
+    base = os.path.dirname(source)
+
+    def rebase(match):
+        target = match.group(2).strip()
+        if re.match(r'^(data:|https?:|/|#)', target):
+            return match.group(0)
+        path, _, suffix = target.partition('?')
+        resolved = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+        return f"url({match.group(1)}{static_url_path}/{resolved}{'?' + suffix if suffix else ''}{match.group(1)})"
+
+    return re.sub(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)', rebase, css)
+
+def compress_variants(path, data):
+    """Write .gz (and .br when the brotli package is installed) next to a built asset"""
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return ['gzip']
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+    return ['gzip', 'br']
+
+def build_assets(static_folder, static_url_path='/static', log=print):
+    """Bundle, minify and fingerprint every bundle into static/dist and write the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    for name in os.listdir(dist):
+        os.remove(os.path.join(dist, name))
+
+    manifest = {}
+    for bundle, sources in BUNDLES.items():
+        missing = [source for source in sources if not os.path.exists(os.path.join(static_folder, source))]
+        if missing:
+            raise RuntimeError(f'Missing {", ".join(missing)}; run build-assets --vendor once with internet access')
+
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                text = f.read()
+            if bundle.endswith('.css'):
+                text = _rebase_css_urls(text, source, static_url_path)
+            # Vendor files ship minified already
+            if not source.endswith(('.min.css', '.min.js')):
+                text = minify_css(text) if bundle.endswith('.css') else minify_js(text)
+            parts.append(text)
+        data = ('\n' if bundle.endswith('.css') else ';\n').join(parts).encode('utf-8')
+
+        stem, ext = os.path.splitext(bundle)
+        file_name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = os.path.join(dist, file_name)
+        _write(path, data)
+        encodings = compress_variants(path, data)
+        manifest[bundle] = file_name
+        log(f'{bundle} -> {DIST_DIR}/{file_name} ({len(data)} bytes, {", ".join(encodings)})')
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def _manifest(app):
+    manifest = app.extensions.get('asset_manifest')
+    if manifest is None:
+        path = os.path.join(app.static_folder, DIST_DIR, MANIFEST)
+        manifest = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+        # Re-read in debug so a rebuild shows up without a restart
+        if not app.debug:
+            app.extensions['asset_manifest'] = manifest
+    return manifest
+
+def asset_urls(bundle):
+    """URLs to include for a bundle: the fingerprinted build, else the individual sources"""
+    app = current_app
+    built = _manifest(app).get(bundle)
+    if built:
+        return [url_for('asset', filename=built)]
+
+    urls = []
+    for source in BUNDLES[bundle]:
+        if os.path.exists(os.path.join(app.static_folder, source)):
+            urls.append(url_for('static', filename=source))
+        elif source in VENDOR:
+            urls.append(VENDOR[source])
+    return urls
+
+def serve_asset(filename):
+    """Serve a fingerprinted bundle, preferring a pre-compressed variant the client accepts"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    accepted = request.accept_encodings
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.exists(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype)
+
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def init_assets(app):
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.jinja_env.globals['asset_urls'] = asset_urls
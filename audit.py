@@ -0,0 +1,264 @@
+"""Append-only audit log of row changes.
+
+Every flush records, for each row it inserted, updated or deleted, the
+columns that changed with their old and new values, the signed-in user or
+device and the endpoint. The records are held on the session and written
+as one multi-row insert when the transaction commits. They are dropped with
+the transaction, or with the savepoint that flushed them, if it rolls back.
+Triggers reject UPDATE and DELETE on audit_event, so history cannot be
+rewritten from the application.
+
+Audited columns load their committed value before being overwritten, so a
+row expired by an earlier commit still shows what it changed from. INSERT
+and UPDATE statements bypass the flush; code that issues them on audited
+tables reports the rows with record_insert() and record_update().
+"""
+import json
+from datetime import date, datetime
+import click
+from flask import g, has_request_context, request
+from sqlalchemy import DDL, event, insert, inspect, select
+from app import db
+from db_routing import RoutingSession
+from models import AuditEvent
+from serializers import iso
+
+# Derived, cache and bookkeeping tables, and logs that are append-only themselves
+EXCLUDED_TABLES = {
+    'audit_event', 'lineage_closure', 'scheduled_job', 'background_task', 'table_version', 'sync_event',
+    'idempotency_key', 'sequence_counter', 'schema_migration', 'machine_bucket', 'aggregation_cursor',
+    'weighbridge_reading', 'sensor', 'sensor_chunk', 'sensor_rollup', 'capacity_forecast', 'search_document',
+    'production_event', 'order_timeline', 'lineage_edge',
+}
+# Columns that change constantly without anyone acting (live readings, sign-in times)
+IGNORED_COLUMNS = {
+    'weighbridge': {'live_weight', 'live_stable', 'live_at', 'last_reading_id'},
+    'user': {'last_login_at'},
+}
+# Columns recorded as changed without their values
+REDACTED_COLUMNS = {
+    'user': {'password_hash'},
+    'api_token': {'token_hash'},
+}
+REDACTED = '***'
+MAX_HISTORY = 1000
+
+_PENDING = 'audit_pending'
+
+for dialect, statements in (
+    ('sqlite', [
+        f"CREATE TRIGGER IF NOT EXISTS audit_event_no_{verb.lower()} BEFORE {verb} ON audit_event "
+        f"BEGIN SELECT RAISE(ABORT, 'audit_event is append-only'); END"
+        for verb in ('UPDATE', 'DELETE')
+    ]),
+    ('postgresql', [
+        "CREATE OR REPLACE FUNCTION audit_event_append_only() RETURNS trigger AS $$ "
+        "BEGIN RAISE EXCEPTION 'audit_event is append-only'; END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER audit_event_append_only BEFORE UPDATE OR DELETE ON audit_event "
+        "FOR EACH ROW EXECUTE FUNCTION audit_event_append_only()",
+    ]),
+):
+    for statement in statements:
+        event.listen(AuditEvent.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return iso(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+def origin():
+    """(actor, source) of the current change"""
+    if has_request_context():
+        identity = g.get('identity')
+        return (identity['name'] if identity else None), request.endpoint
+    context = click.get_current_context(silent=True)
+    return None, (f"flask {context.info_name}" if context else None)
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+def load_old_values(mapper, keys=None, skip=()):
+    """Make setting an expired column load its committed value first, so the flush history has it.
+
+    The listeners are added when the mapper is configured (on first use), so
+    importing does not configure every mapper up front.
+    """
+    def listen(mapper):
+        for attr in mapper.column_attrs:
+            if (keys is None or attr.key in keys) and attr.key not in skip and not attr.columns[0].primary_key:
+                event.listen(attr.class_attribute, 'set', _keep_old_value, active_history=True)
+
+    if mapper.configured:
+        listen(mapper)
+    else:
+        event.listen(mapper, 'mapper_configured', lambda mapper, class_: listen(mapper), once=True)
+
+for _mapper in db.Model.registry.mappers:
+    _table = _mapper.local_table.name
+    if _table not in EXCLUDED_TABLES:
+        load_old_values(_mapper, skip=IGNORED_COLUMNS.get(_table, set()))
+
+def _diff(obj, action):
+    """{column: [old, new]} of one flushed object, or None when nothing worth recording changed"""
+    state = inspect(obj)
+    table = state.mapper.local_table.name
+    ignored = IGNORED_COLUMNS.get(table, ())
+    redacted = REDACTED_COLUMNS.get(table, ())
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if key in ignored or attr.columns[0].primary_key:
+            continue
+        if action == 'update':
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if old == new:
+                continue
+        else:
+            value = state.dict.get(key)
+            if value is None:
+                continue
+            old, new = (None, value) if action == 'insert' else (value, None)
+        changes[key] = [REDACTED, REDACTED] if key in redacted else [_value(old), _value(new)]
+    return changes or None
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect(session, flush_context):
+    """Hold the diffs of this flush on the session until commit"""
+    records = []
+    for action, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            table = getattr(obj, '__table__', None)
+            if table is None or table.name in EXCLUDED_TABLES:
+                continue
+            changes = _diff(obj, action)
+            if changes is None:
+                continue
+            records.append({
+                'entity_type': table.name,
+                # New rows get their identity key only after the flush completes, but their id is already set
+                'entity_id': inspect(obj).mapper.primary_key_from_instance(obj)[0],
+                'action': action,
+                'changes': json.dumps(changes, default=str),
+            })
+    if records:
+        # Tagged with the innermost savepoint, so rolling that back drops exactly these
+        session.info.setdefault(_PENDING, []).append((session.get_nested_transaction(), records))
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _write(session):
+    """Write everything the transaction flushed as one insert, inside the transaction itself"""
+    if session.get_nested_transaction() is not None:
+        return
+    # Commit flushes after this hook runs, so flush first to collect the last changes too
+    session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    actor, source = origin()
+    now = datetime.utcnow()
+    rows = [
+        {**record, 'actor': actor, 'source': source, 'occurred_at': now}
+        for _, records in pending for record in records
+    ]
+    stmt = insert(AuditEvent)
+    session.connection(bind_arguments={'clause': stmt}).execute(stmt, rows)
+
+def _hold(records):
+    session = db.session()
+    session.info.setdefault(_PENDING, []).append((session.get_nested_transaction(), records))
+
+def record_update(entity_type, entity_id, changes):
+    """Record a change made by an UPDATE statement, which the flush never sees.
+
+    changes is {column: (old, new)}; the record is written with the rest of
+    the transaction's audit rows.
+    """
+    _hold([{
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'action': 'update',
+        'changes': json.dumps({key: [_value(old), _value(new)] for key, (old, new) in changes.items()}, default=str),
+    }])
+
+def record_insert(entity_type, rows):
+    """Record rows added by an INSERT statement or bulk insert, which the flush never sees.
+
+    rows is [(id, {column: value})], e.g. the ids from RETURNING zipped with
+    the inserted values.
+    """
+    ignored = IGNORED_COLUMNS.get(entity_type, ())
+    redacted = REDACTED_COLUMNS.get(entity_type, ())
+    _hold([{
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'action': 'insert',
+        'changes': json.dumps({
+            key: [REDACTED, REDACTED] if key in redacted else [None, _value(value)]
+            for key, value in values.items() if value is not None and key not in ignored and key != 'id'
+        }, default=str),
+    } for entity_id, values in rows])
+
+def discard_rolled_back(session, key, previous_transaction):
+    """Drop the records held under session.info[key] that were flushed inside a transaction being rolled back"""
+    pending = session.info.get(key)
+    if not pending:
+        return
+    if not previous_transaction.nested:
+        session.info.pop(key, None)
+        return
+
+    def inside(transaction):
+        while transaction is not None:
+            if transaction is previous_transaction:
+                return True
+            transaction = transaction.parent
+        return False
+    session.info[key] = [(savepoint, records) for savepoint, records in pending if not inside(savepoint)]
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    discard_rolled_back(session, _PENDING, previous_transaction)
+
+def history(entity_type, entity_id, limit=MAX_HISTORY):
+    """Every recorded change of one row, oldest first"""
+    rows = db.session.execute(
+        select(AuditEvent)
+        .where(AuditEvent.entity_type == entity_type, AuditEvent.entity_id == entity_id)
+        .order_by(AuditEvent.occurred_at, AuditEvent.id)
+        .limit(limit)
+    ).scalars().all()
+    return [event_dict(row) for row in rows]
+
+def recent(since=None, until=None, entity_type=None, actor=None, limit=100):
+    """Changes across all rows, newest first, filtered by time window, table and actor"""
+    stmt = select(AuditEvent)
+    if since:
+        stmt = stmt.where(AuditEvent.occurred_at >= since)
+    if until:
+        stmt = stmt.where(AuditEvent.occurred_at < until)
+    if entity_type:
+        stmt = stmt.where(AuditEvent.entity_type == entity_type)
+    if actor:
+        stmt = stmt.where(AuditEvent.actor == actor)
+    rows = db.session.execute(
+        stmt.order_by(AuditEvent.occurred_at.desc(), AuditEvent.id.desc()).limit(min(limit, MAX_HISTORY))
+    ).scalars().all()
+    return [event_dict(row) for row in rows]
+
+def event_dict(row):
+    return {
+        'id': row.id,
+        'entity_type': row.entity_type,
+        'entity_id': row.entity_id,
+        'action': row.action,
+        'changes': json.loads(row.changes) if row.changes else {},
+        'actor': row.actor,
+        'source': row.source,
+        'occurred_at': iso(row.occurred_at)
+    }
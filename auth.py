@@ -0,0 +1,220 @@
+"""Sign-in, roles and permission checks for every route.
+
+Each user has one plant role, and each role grants a fixed set of
+permissions. Every request is checked in before_request against the
+permission its endpoint needs:
+- @requires(...) on the view, or @public for the sign-in page and the
+  service worker;
+- otherwise 'view' for GET and HEAD;
+- otherwise the permission of the blueprint the endpoint belongs to.
+API endpoints without a declared permission are admin-only.
+
+The signed session cookie caches the user's id and role, so a check is one
+frozenset lookup. The role is re-read from the database at most every
+AUTH_RECHECK_SECONDS, which is how soon a blocked user or a changed role
+takes effect.
+
+Device integrations send "Authorization: Bearer <token>" instead of a
+cookie. Tokens are cached per process by their hash for the same interval,
+up to AUTH_TOKEN_CACHE_SIZE entries.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from flask import abort, current_app, g, jsonify, redirect, request, session, url_for
+from sqlalchemy import select, update
+from werkzeug.security import check_password_hash, generate_password_hash
+from app import db
+from models import ApiToken, User
+
+ROLES = ('gate', 'lab', 'production', 'packing', 'dispatch', 'admin')
+
+# Permission -> what it allows: view (any page or read API), intake (gate entry and weighing), quality (lab
+# tests and vehicle approval), production (orders, plans, jobs), cleaning, packing, dispatch, inventory
+# (godown, bin and storage transfers), telemetry (sensor ingest) and admin (master data, maintenance)
+ROLE_PERMISSIONS = {
+    'gate': frozenset({'view', 'intake'}),
+    'lab': frozenset({'view', 'quality', 'telemetry'}),
+    'production': frozenset({'view', 'production', 'cleaning', 'inventory', 'telemetry'}),
+    'packing': frozenset({'view', 'packing', 'inventory'}),
+    'dispatch': frozenset({'view', 'dispatch', 'inventory'}),
+    'admin': frozenset({'view', 'intake', 'quality', 'production', 'cleaning', 'packing', 'dispatch', 'inventory',
+                        'telemetry', 'admin'}),
+}
+
+# Permission a state-changing request to a blueprint needs when its view declares none
+BLUEPRINT_PERMISSIONS = {
+    'core': 'admin',
+    'intake': 'intake',
+    'quality': 'quality',
+    'inventory': 'inventory',
+    'production': 'production',
+    'cleaning': 'cleaning',
+    'packing': 'packing',
+    'dispatch': 'dispatch',
+    'api': 'admin',
+}
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Files every page links, the sign-in page included (asset is the built bundle route from assets.py)
+UNCHECKED_ENDPOINTS = {'static', 'asset'}
+
+RECHECK_SECONDS = int(os.environ.get("AUTH_RECHECK_SECONDS", "60"))
+
+# Unknown tokens are cached too, so the cache is capped: expired entries go first, then the oldest
+MAX_CACHED_TOKENS = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "1024"))
+
+_tokens = {}  # token hash -> (token id, name, role, monotonic time cached until), oldest first
+_tokens_lock = threading.Lock()
+
+def requires(*permissions):
+    """Allow the view to users holding any of the given permissions"""
+    def decorate(view):
+        view.permissions = frozenset(permissions)
+        return view
+    return decorate
+
+def public(view):
+    """Serve the view without signing in"""
+    view.permissions = None
+    return view
+
+def hash_password(password):
+    return generate_password_hash(password)
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _required(endpoint, safe):
+    """Permissions any one of which the endpoint needs, or None for a public one"""
+    view = current_app.view_functions.get(endpoint)
+    declared = getattr(view, 'permissions', False)
+    if declared is not False:
+        return declared
+    if safe:
+        return frozenset({'view'})
+    return frozenset({BLUEPRINT_PERMISSIONS.get(endpoint.rpartition('.')[0], 'admin')})
+
+def _required_cached(endpoint, safe):
+    cache = current_app.extensions.setdefault('auth_required', {})
+    key = (endpoint, safe)
+    if key not in cache:
+        cache[key] = _required(endpoint, safe)
+    return cache[key]
+
+def login(user):
+    """Start a session for user (password already checked)"""
+    session.clear()
+    session.permanent = True
+    session['auth'] = {'id': user.id, 'name': user.username, 'role': user.role, 'checked': time.time()}
+    user.last_login_at = datetime.utcnow()
+    db.session.commit()
+
+def logout():
+    session.clear()
+
+def authenticate(username, password):
+    """The active user with these credentials, or None"""
+    user = User.query.filter_by(username=username).first()
+    if user is None or user.is_blocked or not user.password_hash:
+        return None
+    return user if check_password_hash(user.password_hash, password) else None
+
+def _session_identity():
+    auth = session.get('auth')
+    if not auth:
+        return None
+    if time.time() - auth.get('checked', 0) > RECHECK_SECONDS:
+        row = db.session.execute(select(User.username, User.role, User.is_blocked).where(User.id == auth['id'])).first()
+        if row is None or row.is_blocked:
+            session.pop('auth', None)
+            return None
+        auth = {**auth, 'name': row.username, 'role': row.role, 'checked': time.time()}
+        session['auth'] = auth
+    return auth
+
+def _token_identity(token):
+    digest = hash_token(token)
+    now = time.monotonic()
+    cached = _tokens.get(digest)
+    if cached is None or cached[3] < now:
+        with db.engine.begin() as connection:
+            row = connection.execute(select(ApiToken.id, ApiToken.name, ApiToken.role).where(
+                ApiToken.token_hash == digest, ApiToken.revoked_at.is_(None)
+            )).first()
+            if row is not None:
+                # Refreshed once per cache period, so last use is accurate to that
+                connection.execute(update(ApiToken).where(ApiToken.id == row.id).values(last_used_at=datetime.utcnow()))
+        cached = (row.id, row.name, row.role, now + RECHECK_SECONDS) if row else (None, None, None, now + RECHECK_SECONDS)
+        with _tokens_lock:
+            _tokens.pop(digest, None)
+            if len(_tokens) >= MAX_CACHED_TOKENS:
+                for key in [key for key, entry in _tokens.items() if entry[3] < now]:
+                    del _tokens[key]
+                while len(_tokens) >= MAX_CACHED_TOKENS:
+                    del _tokens[next(iter(_tokens))]
+            _tokens[digest] = cached
+    token_id, name, role, _ = cached
+    return {'token': token_id, 'name': name, 'role': role} if token_id else None
+
+def _request_token():
+    header = request.headers.get('Authorization', '')
+    if header[:7].lower() == 'bearer ':
+        return header[7:].strip()
+    return request.headers.get('X-Api-Token')
+
+def _wants_json():
+    return request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json'
+
+def has_permission(permission):
+    """Whether the signed-in user or device of this request holds permission"""
+    return permission in g.get('permissions', ())
+
+def _check_request():
+    if request.endpoint is None or request.endpoint in UNCHECKED_ENDPOINTS:
+        return None
+    required = _required_cached(request.endpoint, request.method in SAFE_METHODS)
+    token = _request_token()
+    identity = _token_identity(token) if token else _session_identity()
+    g.identity = identity
+    g.permissions = ROLE_PERMISSIONS.get(identity['role'], frozenset()) if identity else frozenset()
+    if required is None or not required.isdisjoint(g.permissions):
+        return None
+
+    if identity is None:
+        if _wants_json() or token:
+            return jsonify({'success': False, 'error': 'Sign-in required'}), 401
+        return redirect(url_for('auth.login_page', next=request.full_path if request.query_string else request.path))
+    if _wants_json():
+        return jsonify({'success': False, 'error': 'Not permitted for your role'}), 403
+    abort(403)
+
+def create_token(name, role):
+    """Issue a device token; the plain token is returned once and only its hash is kept"""
+    if role not in ROLES:
+        raise ValueError(f"Unknown role: {role}")
+    token = secrets.token_urlsafe(32)
+    db.session.add(ApiToken(name=name, role=role, token_hash=hash_token(token)))
+    db.session.commit()
+    return token
+
+def revoke_token(name):
+    """Revoke a device token by name; processes stop accepting it within AUTH_RECHECK_SECONDS"""
+    token = ApiToken.query.filter_by(name=name, revoked_at=None).first()
+    if token is None:
+        return False
+    token.revoked_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+def init_auth(app):
+    # Registered before idempotency, so a refused request never claims a key
+    app.before_request(_check_request)
+
+    @app.context_processor
+    def _current_user():
+        return {'current_user': g.get('identity'), 'has_permission': has_permission}
@@ -0,0 +1,79 @@
+"""Time the dispatch planner on synthetic orders and vehicles as both grow.
+
+Usage: python bench_dispatch_planner.py [orders] [vehicles] [rounds]
+Vehicles default to one per order. Runs at 1/4, 1/2 and the full size so the
+growth per doubling is visible.
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from dispatch_planner import allocate_bags, pack_vehicles, build_loading_sheets
+
+STATES = ['Punjab', 'Haryana', 'Rajasthan', 'Uttar Pradesh', 'Gujarat']
+CITIES = ['North', 'South', 'East', 'West', 'Central', 'Market', 'Depot', 'Port']
+PRODUCTS = [1, 2, 3, 4]
+BAG_WEIGHTS = [50.0, 25.0, 10.0]
+CAPACITIES_TONS = [5, 9, 12, 16, 25]
+
+def make_data(orders, vehicles, seed=7):
+    rng = random.Random(seed)
+    today = datetime.now()
+    demands = []
+    for i in range(orders):
+        state = rng.choice(STATES)
+        for item in range(rng.randint(1, 3)):
+            product_id = rng.choice(PRODUCTS)
+            demands.append({
+                'sales_order_id': i + 1,
+                'order_number': f'SO-{i:05d}',
+                'item_id': i * 3 + item,
+                'customer_id': i % 200,
+                'customer': f'Customer {i % 200}',
+                'state': state,
+                'city': f'{state} {rng.choice(CITIES)}',
+                'delivery_date': today + timedelta(days=rng.randint(0, 10)),
+                'product_id': product_id,
+                'product': f'Product {product_id}',
+                'quantity_kg': rng.randint(1, 40) * 250.0
+            })
+    # Enough bags that stock is not the limit
+    stock = {p: {w: orders * 200 for w in BAG_WEIGHTS} for p in PRODUCTS}
+    fleet = [{
+        'id': v + 1,
+        'vehicle_number': f'TRK-{v:04d}',
+        'driver_name': f'Driver {v}',
+        'state': rng.choice(STATES),
+        'city': '',
+        'capacity_kg': rng.choice(CAPACITIES_TONS) * 1000.0
+    } for v in range(vehicles)]
+    return demands, stock, fleet
+
+def plan(demands, stock, fleet):
+    lines, _ = allocate_bags(demands, {p: dict(bags) for p, bags in stock.items()})
+    loads, unassigned = pack_vehicles(lines, fleet)
+    return build_loading_sheets(loads), unassigned
+
+def timed(func, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        result = func()
+    return (time.process_time() - started) / rounds * 1000, result
+
+def main():
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    vehicles = int(sys.argv[2]) if len(sys.argv) > 2 else orders
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    print(f'{rounds} rounds per size')
+    previous = None
+    for scale in (4, 2, 1):
+        demands, stock, fleet = make_data(orders // scale, vehicles // scale)
+        elapsed, (sheets, unassigned) = timed(lambda: plan(demands, stock, fleet), rounds)
+        growth = f'  x{elapsed / previous:4.1f}' if previous else ''
+        print(f'{orders // scale:6d} orders {vehicles // scale:5d} vehicles: {elapsed:8.2f} ms CPU'
+              f'  {len(sheets):5d} trucks  {len(unassigned):5d} lines unassigned{growth}')
+        previous = elapsed
+
+if __name__ == '__main__':
+    main()
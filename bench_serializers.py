@@ -0,0 +1,83 @@
+"""Compare the hand-built jsonify payload of /api/production_jobs_by_stage with the schema serializer.
+
+Usage: python bench_serializers.py [jobs] [rounds]
+"""
+import gzip
+import sys
+import time
+from datetime import datetime, timedelta
+from app import create_app
+from models import ProductionJobNew, ProductionOrder
+from serializers import JOB_SUMMARY, dumps, orjson
+
+STAGES = ['cleaning_24h', 'cleaning_12h', 'grinding', 'packing']
+
+def make_jobs(count):
+    now = datetime.now()
+    jobs = []
+    for i in range(count):
+        order = ProductionOrder(order_number=f'PO-{20250000 + i // 4}', quantity=10, product='Maida')
+        started = now - timedelta(minutes=i) if i % 3 else None
+        jobs.append(ProductionJobNew(
+            id=i + 1,
+            job_number=f'JOB-{i:05d}',
+            order=order,
+            stage=STAGES[i % 4],
+            status='in_progress' if started else 'pending',
+            created_at=now - timedelta(hours=1, minutes=i),
+            started_at=started,
+            started_by='Operator' if started else None
+        ))
+    return jobs
+
+def legacy_payload(jobs):
+    jobs_by_stage = {stage: [] for stage in STAGES}
+    for job in jobs:
+        jobs_by_stage[job.stage].append({
+            'id': job.id,
+            'job_number': job.job_number,
+            'order_number': job.order.order_number if job.order else 'N/A',
+            'status': job.status,
+            'stage': job.stage,
+            'progress': 0,
+            'can_proceed': job.status == 'pending',
+            'is_previous_step': False,
+            'is_running': job.status == 'in_progress',
+            'created_at': job.created_at.strftime('%Y-%m-%d %H:%M') if job.created_at else '',
+            'started_at': job.started_at.strftime('%Y-%m-%d %H:%M') if job.started_at else '',
+            'started_by': job.started_by or '',
+            'completed_at': job.completed_at.strftime('%Y-%m-%d %H:%M') if job.completed_at else '',
+            'completed_by': job.completed_by or ''
+        })
+    return {'success': True, 'data': jobs_by_stage, 'total_jobs': len(jobs)}
+
+def schema_payload(jobs):
+    jobs_by_stage = {stage: [] for stage in STAGES}
+    for job in jobs:
+        jobs_by_stage[job.stage].append(JOB_SUMMARY.dump(
+            job, progress=0, can_proceed=job.status == 'pending', is_previous_step=False,
+            is_running=job.status == 'in_progress'
+        ))
+    return {'success': True, 'data': jobs_by_stage, 'total_jobs': len(jobs)}
+
+def timed(func, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        body = func()
+    return (time.process_time() - started) / rounds * 1000, body
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    app = create_app(run_scheduler=False)
+    with app.app_context():
+        jobs = make_jobs(count)
+        before_ms, before = timed(lambda: app.json.response(legacy_payload(jobs)).get_data(), rounds)
+        after_ms, after = timed(lambda: dumps(schema_payload(jobs)), rounds)
+
+    print(f'{count} jobs, {rounds} rounds, encoder: {"orjson" if orjson else "json"}')
+    print(f'before: {before_ms:7.2f} ms CPU  {len(before):8d} bytes  {len(gzip.compress(before, 6)):7d} bytes gzip')
+    print(f'after:  {after_ms:7.2f} ms CPU  {len(after):8d} bytes  {len(gzip.compress(after, 6)):7d} bytes gzip')
+
+if __name__ == '__main__':
+    main()
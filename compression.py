@@ -0,0 +1,54 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'text/javascript',
+}
+
+def _vary_accept_encoding(response):
+    vary = {value.strip().lower() for value in response.headers.get('Vary', '').split(',') if value.strip()}
+    if 'accept-encoding' not in vary:
+        response.headers.add('Vary', 'Accept-Encoding')
+
+def compress_response(response, min_size, gzip_level=6, brotli_quality=5):
+    """Gzip/brotli-encode a buffered text response when the client accepts it and it is big enough"""
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    # Responses of a compressible type vary by encoding even when this one stays small
+    _vary_accept_encoding(response)
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=brotli_quality))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=gzip_level))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    # The encoded body differs byte-for-byte, so a strong validator no longer holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    min_size = int(app.config.get('COMPRESS_MIN_SIZE', 1024))
+    gzip_level = int(app.config.get('COMPRESS_GZIP_LEVEL', 6))
+    brotli_quality = int(app.config.get('COMPRESS_BROTLI_QUALITY', 5))
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, min_size, gzip_level, brotli_quality)
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = 'replica'
+
+# GET views that only read and can be served from the replica; GET /api/* is always read-only
+READ_ONLY_ENDPOINTS = {
+    'core.reports',
+    'production.production_tracking',
+    'production.order_tracking_detail',
+    'production.live_production_dashboard',
+    'production.live_production_monitor',
+    'inventory.storage_management',
+    'dispatch.dispatch_planning',
+}
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkout_stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'peak_checked_out': 0
+        }
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkout_stats = self.checkout_stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.checkout_stats['timeouts'] += 1
+            raise
+        waited = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self.checkout_stats
+            stats['checkouts'] += 1
+            stats['wait_ms_total'] += waited
+            stats['wait_ms_max'] = max(stats['wait_ms_max'], waited)
+            stats['peak_checked_out'] = max(stats['peak_checked_out'], self.checkedout())
+        return connection
+
+def engine_options(prefix, url):
+    """Engine options for one pool, tunable through <prefix>_POOL_SIZE, _MAX_OVERFLOW and _POOL_TIMEOUT"""
+    options = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    # In-memory SQLite uses a singleton pool that cannot be sized
+    if url.startswith('sqlite') and (':memory:' in url or url.rstrip('/') == 'sqlite:'):
+        return options
+
+    options["poolclass"] = TimedQueuePool
+    for suffix, option, cast in (('POOL_SIZE', 'pool_size', int),
+                                 ('MAX_OVERFLOW', 'max_overflow', int),
+                                 ('POOL_TIMEOUT', 'pool_timeout', float)):
+        value = os.environ.get(f"{prefix}_{suffix}")
+        if value:
+            options[option] = cast(value)
+    return options
+
+def _wants_replica():
+    return has_request_context() and g.get('db_read_only', False)
+
+class RoutingSession(Session):
+    """Send reads from read-only requests to the replica bind; everything else goes to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engines = self._db.engines
+        if (
+            bind is None
+            and REPLICA_BIND in engines
+            and engine is engines.get(None)
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+            and _wants_replica()
+        ):
+            return engines[REPLICA_BIND]
+        return engine
+
+def is_read_only_request():
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    return request.path.startswith('/api/') or request.endpoint in READ_ONLY_ENDPOINTS
+
+def init_read_routing(app):
+    @app.before_request
+    def _route_reads_to_replica():
+        g.db_read_only = is_read_only_request()
+
+def pool_metrics(engines):
+    """Checkout wait time and saturation for every configured pool"""
+    metrics = {}
+    for key, engine in engines.items():
+        pool = engine.pool
+        name = key or 'primary'
+        entry = {'pool_class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            entry.update({
+                'size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'timeout': pool.timeout(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'saturation': pool.checkedout() / capacity if capacity else 0
+            })
+        stats = getattr(pool, 'checkout_stats', None)
+        if stats:
+            entry.update({
+                'checkouts': stats['checkouts'],
+                'timeouts': stats['timeouts'],
+                'wait_ms_avg': stats['wait_ms_total'] / stats['checkouts'] if stats['checkouts'] else 0,
+                'wait_ms_max': stats['wait_ms_max'],
+                'peak_checked_out': stats['peak_checked_out']
+            })
+        metrics[name] = entry
+    return metrics
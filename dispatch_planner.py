@@ -0,0 +1,235 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func
+from app import db
+from models import SalesOrder, SalesOrderItem, Customer, Product, DispatchVehicle, FinishedGoodsStock
+
+KG_PER_TON = 1000.0
+# Remainders up to this are float rounding of ton quantities, not missing goods
+ROUNDING_KG = 1e-6
+
+def load_planning_data():
+    """Open demand, bagged stock and available vehicles in three queries"""
+    items = db.session.query(SalesOrderItem, SalesOrder, Customer, Product.name).join(
+        SalesOrder, SalesOrderItem.sales_order_id == SalesOrder.id
+    ).join(
+        Customer, SalesOrder.customer_id == Customer.id
+    ).join(
+        Product, SalesOrderItem.product_id == Product.id
+    ).filter(
+        SalesOrder.status.in_(['pending', 'partial'])
+    ).all()
+
+    demands = []
+    for item, order, customer, product_name in items:
+        pending = item.pending_quantity if item.pending_quantity is not None else item.quantity - (item.delivered_quantity or 0)
+        if pending and pending > 0:
+            demands.append({
+                'sales_order_id': order.id,
+                'order_number': order.order_number,
+                'item_id': item.id,
+                'customer_id': customer.id,
+                'customer': customer.company_name,
+                'state': customer.state or '',
+                'city': customer.city or '',
+                'delivery_date': order.delivery_date,
+                'product_id': item.product_id,
+                'product': product_name,
+                'quantity_kg': pending * KG_PER_TON
+            })
+
+    stock_rows = db.session.query(
+        FinishedGoodsStock.product_id,
+        FinishedGoodsStock.bag_weight_kg,
+        func.sum(FinishedGoodsStock.bag_count)
+    ).filter(FinishedGoodsStock.bag_count > 0).group_by(
+        FinishedGoodsStock.product_id, FinishedGoodsStock.bag_weight_kg
+    ).all()
+    stock = defaultdict(dict)
+    for product_id, bag_weight, bags in stock_rows:
+        stock[product_id][bag_weight] = int(bags)
+
+    vehicles = [{
+        'id': v.id,
+        'vehicle_number': v.vehicle_number,
+        'driver_name': v.driver_name,
+        'state': v.state or '',
+        'city': v.city or '',
+        'capacity_kg': (v.capacity or 0) * KG_PER_TON
+    } for v in DispatchVehicle.query.filter_by(status='available').all() if v.capacity]
+
+    return demands, stock, vehicles
+
+def allocate_bags(demands, stock):
+    """Turn kg demand into whole-bag shipment lines, earliest delivery date first.
+
+    Larger bags are used first; anything that cannot be covered in whole bags
+    from stock, including a remainder smaller than any bag, is returned as a
+    shortfall. stock is consumed in place.
+    """
+    lines = []
+    shortfalls = []
+    ordered = sorted(demands, key=lambda d: (d['delivery_date'] or datetime.max, d['order_number']))
+
+    for demand in ordered:
+        remaining = demand['quantity_kg']
+        product_stock = stock.get(demand['product_id'], {})
+        for bag_weight in sorted(product_stock, reverse=True):
+            available = product_stock[bag_weight]
+            bags = min(available, int((remaining + 1e-6) // bag_weight))
+            if bags <= 0:
+                continue
+            product_stock[bag_weight] -= bags
+            remaining -= bags * bag_weight
+            lines.append(dict(demand, bag_weight_kg=bag_weight, bags=bags, quantity_kg=bags * bag_weight))
+        # Anything left, even less than a bag, is shipped short; only float noise is ignored
+        if remaining > ROUNDING_KG:
+            shortfalls.append(dict(demand, quantity_kg=remaining))
+
+    return lines, shortfalls
+
+def _split_line(line, capacity_kg):
+    """Largest part of a line (whole bags) that fits into capacity_kg, and the rest"""
+    bags = int((capacity_kg + 1e-6) // line['bag_weight_kg'])
+    if bags <= 0:
+        return None, line
+    if bags >= line['bags']:
+        return line, None
+    head = dict(line, bags=bags, quantity_kg=bags * line['bag_weight_kg'])
+    rest_bags = line['bags'] - bags
+    rest = dict(line, bags=rest_bags, quantity_kg=rest_bags * line['bag_weight_kg'])
+    return head, rest
+
+def pack_vehicles(lines, vehicles):
+    """Group shipment lines by route and bin-pack them onto vehicles.
+
+    Routes are (state, city) of the customer. Within a route, orders are placed
+    whole with first-fit decreasing, best-fit into already opened trucks, and new
+    trucks are taken smallest-that-fits from those based in the same state first.
+    Orders larger than any truck are split by bags. Sorting is O(n log n), but
+    each order scans the open trucks of its route and each new truck scans the
+    pool, so a run is O(n * (k + m)) for n orders, k trucks per route and m
+    vehicles (see bench_dispatch_planner.py).
+    """
+    routes = defaultdict(lambda: defaultdict(list))
+    for line in lines:
+        routes[(line['state'], line['city'])][line['sales_order_id']].append(line)
+
+    pool = sorted(vehicles, key=lambda v: v['capacity_kg'])
+    loads = []
+    unassigned = []
+
+    def take_vehicle(state, needed_kg):
+        if not pool:
+            return None
+        local = [v for v in pool if v['state'] == state] or pool
+        fitting = [v for v in local if v['capacity_kg'] >= needed_kg]
+        vehicle = fitting[0] if fitting else local[-1]
+        pool.remove(vehicle)
+        load = {'vehicle': vehicle, 'route': None, 'lines': [], 'load_kg': 0.0}
+        loads.append(load)
+        return load
+
+    # Biggest routes first so they get first pick of the large trucks
+    route_order = sorted(routes.items(), key=lambda r: -sum(l['quantity_kg'] for o in r[1].values() for l in o))
+    for (state, city), orders in route_order:
+        route_loads = []
+        order_groups = sorted(orders.values(), key=lambda o: -sum(l['quantity_kg'] for l in o))
+        for order_lines in order_groups:
+            order_kg = sum(l['quantity_kg'] for l in order_lines)
+
+            fitting = [load for load in route_loads if load['vehicle']['capacity_kg'] - load['load_kg'] >= order_kg - 1e-6]
+            if fitting:
+                target = min(fitting, key=lambda load: load['vehicle']['capacity_kg'] - load['load_kg'])
+                target['lines'].extend(order_lines)
+                target['load_kg'] += order_kg
+                continue
+
+            pending = list(order_lines)
+            while pending:
+                line = pending.pop(0)
+                open_loads = [load for load in route_loads if load['vehicle']['capacity_kg'] - load['load_kg'] >= line['bag_weight_kg']]
+                target = max(open_loads, key=lambda load: load['vehicle']['capacity_kg'] - load['load_kg']) if open_loads else None
+                if not target:
+                    target = take_vehicle(state, sum(l['quantity_kg'] for l in pending) + line['quantity_kg'])
+                    if not target:
+                        unassigned.append(line)
+                        unassigned.extend(pending)
+                        break
+                    target['route'] = {'state': state, 'city': city}
+                    route_loads.append(target)
+                head, rest = _split_line(line, target['vehicle']['capacity_kg'] - target['load_kg'])
+                if head:
+                    target['lines'].append(head)
+                    target['load_kg'] += head['quantity_kg']
+                if rest:
+                    pending.insert(0, rest)
+
+    return loads, unassigned
+
+def build_loading_sheets(loads):
+    """Per-vehicle loading sheets with stops and bag lines"""
+    sheets = []
+    for number, load in enumerate(sorted(loads, key=lambda l: -l['load_kg']), start=1):
+        if not load['lines']:
+            continue
+        vehicle = load['vehicle']
+        stops = {}
+        for line in load['lines']:
+            stop = stops.setdefault(line['sales_order_id'], {
+                'order_number': line['order_number'],
+                'customer': line['customer'],
+                'city': line['city'],
+                'state': line['state'],
+                'lines': []
+            })
+            stop['lines'].append({
+                'product': line['product'],
+                'bag_weight_kg': line['bag_weight_kg'],
+                'bags': line['bags'],
+                'quantity_kg': line['quantity_kg']
+            })
+        sheets.append({
+            'sheet_number': number,
+            'vehicle_id': vehicle['id'],
+            'vehicle_number': vehicle['vehicle_number'],
+            'driver_name': vehicle['driver_name'],
+            'route': load['route'],
+            'capacity_kg': vehicle['capacity_kg'],
+            'load_kg': load['load_kg'],
+            'utilization': load['load_kg'] / vehicle['capacity_kg'] * 100 if vehicle['capacity_kg'] else 0,
+            'total_bags': sum(line['bags'] for line in load['lines']),
+            'stops': list(stops.values())
+        })
+    return sheets
+
+def plan_dispatch():
+    """Plan today's loads from open sales orders, stock and available vehicles"""
+    started = datetime.now()
+    demands, stock, vehicles = load_planning_data()
+    lines, shortfalls = allocate_bags(demands, stock)
+    loads, unassigned = pack_vehicles(lines, vehicles)
+    sheets = build_loading_sheets(loads)
+
+    return {
+        'generated_at': started.isoformat(),
+        'orders': len({d['sales_order_id'] for d in demands}),
+        'vehicles_available': len(vehicles),
+        'vehicles_used': len(sheets),
+        'loading_sheets': sheets,
+        'unassigned': [{
+            'order_number': line['order_number'],
+            'customer': line['customer'],
+            'product': line['product'],
+            'bag_weight_kg': line['bag_weight_kg'],
+            'bags': line['bags'],
+            'quantity_kg': line['quantity_kg']
+        } for line in unassigned],
+        'shortfalls': [{
+            'order_number': d['order_number'],
+            'customer': d['customer'],
+            'product': d['product'],
+            'quantity_kg': d['quantity_kg']
+        } for d in shortfalls],
+        'planning_ms': round((datetime.now() - started).total_seconds() * 1000, 1)
+    }
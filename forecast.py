@@ -0,0 +1,313 @@
+"""Seven-day level forecast for godowns and precleaning bins.
+
+Every container is projected hour by hour from its current stock:
+- godowns fill at each supplier's recent intake rate into them, spread over
+  the day like past intake;
+- godown to precleaning transfers continue at their recent rate while the
+  godown has stock;
+- precleaning bins are drawn down by approved production plans whose
+  transfer has not run yet, 36 hours before the order deadline, and by
+  open orders that are not planned yet, split over the bins by stock.
+
+Any write to stock, intake, plans or orders marks the forecast dirty and the
+scheduler leader re-projects within a minute; recent rates are re-read at
+most every RATE_REFRESH. Containers projected past CAPACITY_ALERT_LEVEL or
+short of a scheduled draw get an open CapacityAlert until a later
+projection clears it.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select, update
+from app import db
+from db_routing import RoutingSession
+from models import (
+    AggregationCursor, CapacityAlert, CapacityForecast, Godown, LineageEdge, PrecleaningBin, ProductionJobNew,
+    ProductionOrder, ProductionPlan, ProductionPlanItem, Supplier, Vehicle
+)
+from scheduling import leader_job
+from serializers import iso
+
+CURSOR = 'capacity_forecast'
+HORIZON_HOURS = 7 * 24
+HOUR = timedelta(hours=1)
+RATE_DAYS = int(os.environ.get("CAPACITY_RATE_DAYS", "14"))
+ALERT_LEVEL = float(os.environ.get("CAPACITY_ALERT_LEVEL", "0.9"))
+# Wheat leaves the precleaning bins this long before the order is due (24h and 12h cleaning)
+PLAN_LEAD = timedelta(hours=36)
+# An open order without a deadline is assumed to be planned and drawn this far ahead
+UNPLANNED_LEAD = timedelta(hours=24)
+RATE_REFRESH = timedelta(minutes=15)
+# Re-projected at least this often so the horizon keeps moving
+STALE_AFTER = timedelta(hours=1)
+
+# Writes that change a projection
+TRACKED = (Godown, PrecleaningBin, LineageEdge, ProductionPlan, ProductionPlanItem, ProductionOrder, ProductionJobNew)
+
+_rates = {'at': None}
+
+def _recent_rates(now):
+    """Hourly intake per godown by hour of day, and hourly godown-to-bin transfer rates, over the last RATE_DAYS"""
+    if _rates['at'] is not None and now - _rates['at'] < RATE_REFRESH:
+        return _rates['intake'], _rates['transfers'], _rates['suppliers']
+
+    # Lineage edges are stamped in UTC; intake is profiled by local hour
+    utc_offset = timedelta(hours=round((datetime.now() - datetime.utcnow()).total_seconds() / 3600))
+    since = datetime.utcnow() - timedelta(days=RATE_DAYS)
+    hours = RATE_DAYS * 24
+
+    intake_edges = db.session.execute(
+        select(LineageEdge.child_id, Vehicle.supplier_id, LineageEdge.quantity, LineageEdge.created_at)
+        .join(Vehicle, Vehicle.id == LineageEdge.parent_id)
+        .where(LineageEdge.source == 'weight_entry', LineageEdge.parent_type == 'vehicle',
+               LineageEdge.child_type == 'godown', LineageEdge.created_at >= since, LineageEdge.quantity > 0)
+    ).all()
+    suppliers = {}
+    by_hour = [0.0] * 24
+    for godown_id, supplier_id, quantity, created_at in intake_edges:
+        suppliers.setdefault(godown_id, {})
+        suppliers[godown_id][supplier_id] = suppliers[godown_id].get(supplier_id, 0) + quantity / RATE_DAYS
+        by_hour[(created_at + utc_offset).hour] += quantity
+    total = sum(by_hour)
+    profile = [24 * amount / total for amount in by_hour] if total else [1.0] * 24
+    # Expected intake in each hour of the day, per godown
+    intake = {
+        godown_id: [sum(per_day.values()) / 24 * weight for weight in profile]
+        for godown_id, per_day in suppliers.items()
+    }
+
+    transfers = {
+        (godown_id, bin_id): quantity / hours
+        for godown_id, bin_id, quantity in db.session.execute(
+            select(LineageEdge.parent_id, LineageEdge.child_id, func.sum(LineageEdge.quantity))
+            .where(LineageEdge.source == 'precleaning', LineageEdge.parent_type == 'godown',
+                   LineageEdge.child_type == 'precleaning_bin', LineageEdge.created_at >= since)
+            .group_by(LineageEdge.parent_id, LineageEdge.child_id)
+        ) if quantity
+    }
+    _rates.update(at=now, intake=intake, transfers=transfers, suppliers=suppliers)
+    return intake, transfers, suppliers
+
+def _draw_hour(due, lead, start):
+    """Index of the projected hour a draw lead before due falls in (0 when it is already due)"""
+    if due is None:
+        return 0
+    return max(int(((due - lead) - start) / HOUR), 0)
+
+def _scheduled_draws(start, bins):
+    """[(hour index, precleaning bin id, quantity)] for planned and not yet planned orders"""
+    transferred = select(ProductionJobNew.order_id).where(
+        ProductionJobNew.stage == 'transfer', ProductionJobNew.status == 'completed'
+    )
+    draws = [
+        (_draw_hour(deadline, PLAN_LEAD, start), bin_id, quantity)
+        for bin_id, quantity, deadline in db.session.execute(
+            select(ProductionPlanItem.precleaning_bin_id, ProductionPlanItem.quantity, ProductionOrder.deadline)
+            .join(ProductionPlan, ProductionPlan.id == ProductionPlanItem.plan_id)
+            .join(ProductionOrder, ProductionOrder.id == ProductionPlan.order_id)
+            .where(ProductionPlan.status == 'approved', ProductionOrder.status != 'completed',
+                   ProductionOrder.id.not_in(transferred))
+        )
+    ]
+
+    stocked = {bin_id: level for bin_id, level in bins.items() if level > 0}
+    total = sum(stocked.values())
+    for quantity, deadline in db.session.execute(
+        select(ProductionOrder.quantity, ProductionOrder.deadline)
+        .where(ProductionOrder.status == 'pending', ~ProductionOrder.id.in_(select(ProductionPlan.order_id)))
+    ):
+        hour = _draw_hour(deadline, PLAN_LEAD, start) if deadline else int(UNPLANNED_LEAD / HOUR)
+        for bin_id, level in stocked.items():
+            draws.append((hour, bin_id, quantity * level / total))
+    return draws
+
+def project(now=None):
+    """Hourly levels of every godown and precleaning bin over the horizon; returns (first hour end, {key: projection})"""
+    now = now or datetime.now()
+    start = now.replace(minute=0, second=0, microsecond=0) + HOUR
+    intake, transfers, _ = _recent_rates(now)
+
+    godowns = {g.id: g for g in Godown.query.all()}
+    bins = {b.id: b for b in PrecleaningBin.query.all()}
+    levels = {('godown', i): g.current_stock or 0.0 for i, g in godowns.items()}
+    levels.update({('precleaning_bin', i): b.current_stock or 0.0 for i, b in bins.items()})
+    capacities = {('godown', i): g.capacity for i, g in godowns.items()}
+    capacities.update({('precleaning_bin', i): b.capacity for i, b in bins.items()})
+
+    draws = {}
+    for hour, bin_id, quantity in _scheduled_draws(start, {i: b.current_stock or 0.0 for i, b in bins.items()}):
+        if hour < HORIZON_HOURS and ('precleaning_bin', bin_id) in levels:
+            draws.setdefault(hour, []).append((('precleaning_bin', bin_id), quantity))
+
+    first_hour = now.hour  # hour of day of the first projected hour
+    series = {key: [] for key in levels}
+    shortfall = {key: 0.0 for key in levels}
+    empty_at = {}
+    # All containers advance together one hour at a time, since transfers couple godowns and bins
+    for hour in range(HORIZON_HOURS):
+        hour_of_day = (first_hour + hour) % 24
+        for godown_id, per_hour in intake.items():
+            if ('godown', godown_id) in levels:
+                levels[('godown', godown_id)] += per_hour[hour_of_day]
+        for (godown_id, bin_id), rate in transfers.items():
+            source, target = ('godown', godown_id), ('precleaning_bin', bin_id)
+            if source in levels and target in levels:
+                moved = min(rate, levels[source])
+                levels[source] -= moved
+                levels[target] += moved
+        for key, quantity in draws.get(hour, ()):
+            taken = min(quantity, levels[key])
+            levels[key] -= taken
+            if taken < quantity:
+                shortfall[key] += quantity - taken
+                empty_at.setdefault(key, start + hour * HOUR)
+        for key, level in levels.items():
+            series[key].append(level)
+
+    projections = {}
+    for key, hourly in series.items():
+        capacity = capacities[key]
+        peak = max(range(len(hourly)), key=hourly.__getitem__)
+        full = next((h for h, level in enumerate(hourly) if capacity and level >= capacity * ALERT_LEVEL), None)
+        projections[key] = {
+            'level': godowns[key[1]].current_stock if key[0] == 'godown' else bins[key[1]].current_stock,
+            'capacity': capacity,
+            'peak_level': hourly[peak],
+            'peak_at': start + peak * HOUR,
+            'full_at': start + full * HOUR if full is not None else None,
+            'empty_at': empty_at.get(key),
+            'shortfall': shortfall[key],
+            'levels': hourly
+        }
+    return start, projections
+
+def _raise_alerts(projections, now):
+    open_alerts = {(a.container_type, a.container_id, a.kind): a for a in CapacityAlert.query.filter_by(status='open')}
+    projected = {}
+    for (container_type, container_id), p in projections.items():
+        if p['full_at'] is not None:
+            projected[(container_type, container_id, 'overflow')] = (p['full_at'], p['peak_level'], p['capacity'])
+        if p['empty_at'] is not None:
+            projected[(container_type, container_id, 'shortfall')] = (p['empty_at'], p['shortfall'], p['capacity'])
+
+    raised = []
+    for key, (expected_at, level, capacity) in projected.items():
+        alert = open_alerts.get(key)
+        if alert is None:
+            alert = CapacityAlert(container_type=key[0], container_id=key[1], kind=key[2], raised_at=now)
+            db.session.add(alert)
+            raised.append(alert)
+        alert.expected_at = expected_at
+        alert.level = round(level, 2)
+        alert.capacity = capacity
+    for key, alert in open_alerts.items():
+        if key not in projected:
+            alert.status = 'resolved'
+            alert.resolved_at = now
+    return raised
+
+def refresh_forecast(force=False, now=None):
+    """Re-project when something changed or the last projection is stale; returns the number of alerts raised, or None if skipped"""
+    now = now or datetime.now()
+    cursor = AggregationCursor.query.filter_by(name=CURSOR).first()
+    if cursor is None:
+        cursor = AggregationCursor(name=CURSOR)
+        db.session.add(cursor)
+    dirty_seen = cursor.dirty_from
+    if not force and dirty_seen is None and cursor.computed_to and now - cursor.computed_to < STALE_AFTER:
+        return None
+
+    start, projections = project(now)
+    rows = {(f.container_type, f.container_id): f for f in CapacityForecast.query.all()}
+    for (container_type, container_id), p in projections.items():
+        row = rows.pop((container_type, container_id), None)
+        if row is None:
+            row = CapacityForecast(container_type=container_type, container_id=container_id)
+            db.session.add(row)
+        row.computed_at = now
+        row.start_at = start
+        row.levels = json.dumps([round(level, 2) for level in p['levels']])
+        for name in ('level', 'capacity', 'peak_level', 'peak_at', 'full_at', 'empty_at', 'shortfall'):
+            setattr(row, name, p[name])
+    for row in rows.values():
+        # The container was removed
+        db.session.delete(row)
+
+    raised = _raise_alerts(projections, now)
+    cursor.computed_to = now
+    db.session.flush()
+    if dirty_seen is not None:
+        # Leave dirty_from alone if another change arrived while projecting
+        db.session.execute(
+            update(AggregationCursor)
+            .where(AggregationCursor.id == cursor.id, AggregationCursor.dirty_from == dirty_seen)
+            .values(dirty_from=None)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    for alert in raised:
+        current_app.logger.warning(
+            f"Capacity alert: {alert.container_type} {alert.container_id} {alert.kind} expected at {alert.expected_at:%Y-%m-%d %H:%M}"
+        )
+    return len(raised)
+
+@leader_job('refresh_capacity_forecast', minutes=1)
+def refresh_capacity_forecast():
+    """Re-project godown and precleaning bin levels after stock, intake, plan or order changes"""
+    return refresh_forecast()
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_forecast_dirty(session, flush_context):
+    """Flag the forecast for the next leader run when a flush touches anything it is projected from"""
+    if not has_app_context():
+        return
+    if not any(isinstance(obj, TRACKED) for obj in (*session.new, *session.dirty, *session.deleted)):
+        return
+    stmt = update(AggregationCursor).where(
+        AggregationCursor.name == CURSOR, AggregationCursor.dirty_from.is_(None)
+    ).values(dirty_from=datetime.now())
+    session.connection(bind_arguments={'clause': stmt}).execute(stmt)
+
+def forecast_summary(with_levels=False):
+    """Stored projections with container names and godown intake per supplier, and the open alerts"""
+    names = {('godown', g.id): g.name for g in Godown.query.all()}
+    names.update({('precleaning_bin', b.id): b.name for b in PrecleaningBin.query.all()})
+    _, _, suppliers = _recent_rates(datetime.now())
+    supplier_names = dict(db.session.execute(select(Supplier.id, Supplier.company_name)).all())
+    containers = []
+    for row in CapacityForecast.query.order_by(CapacityForecast.container_type, CapacityForecast.container_id):
+        item = {
+            'type': row.container_type,
+            'id': row.container_id,
+            'name': names.get((row.container_type, row.container_id)),
+            'level': row.level,
+            'capacity': row.capacity,
+            'peak_level': round(row.peak_level, 2) if row.peak_level is not None else None,
+            'peak_at': iso(row.peak_at),
+            'full_at': iso(row.full_at),
+            'empty_at': iso(row.empty_at),
+            'shortfall': round(row.shortfall or 0, 2),
+            'computed_at': iso(row.computed_at)
+        }
+        if row.container_type == 'godown':
+            item['intake_per_day'] = {
+                supplier_names.get(supplier_id, str(supplier_id)): round(per_day, 2)
+                for supplier_id, per_day in suppliers.get(row.container_id, {}).items()
+            }
+        if with_levels:
+            item['start_at'] = iso(row.start_at)
+            item['levels'] = json.loads(row.levels or '[]')
+        containers.append(item)
+    alerts = [{
+        'id': alert.id,
+        'type': alert.container_type,
+        'container_id': alert.container_id,
+        'name': names.get((alert.container_type, alert.container_id)),
+        'kind': alert.kind,
+        'expected_at': iso(alert.expected_at),
+        'level': alert.level,
+        'capacity': alert.capacity,
+        'raised_at': iso(alert.raised_at)
+    } for alert in CapacityAlert.query.filter_by(status='open').order_by(CapacityAlert.expected_at)]
+    return containers, alerts
@@ -0,0 +1,298 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import db
+from models import (
+    FinishedGoods, LineageEdge, LineageClosure, ProductionPlan, ProductionPlanItem, Transfer, Vehicle
+)
+
+# Node types in flow order: supplier -> vehicle -> godown -> precleaning_bin -> production_order -> finished_goods
+NODE_TYPES = ['supplier', 'vehicle', 'godown', 'precleaning_bin', 'production_order', 'finished_goods']
+
+# Long-lived containers and how long wheat stays in one (days). The closure stops at a container, so
+# a bin does not inherit every truck its godown ever received; traces pass through a container at
+# query time, linking what left it only to what went in during the preceding window.
+CONTAINER_DAYS = {
+    'godown': float(os.environ.get("LINEAGE_GODOWN_DAYS", "120")),
+    'precleaning_bin': float(os.environ.get("LINEAGE_BIN_DAYS", "7")),
+}
+
+def node_of(obj):
+    """Return the (node_type, node_id) lineage key for a model instance or key tuple"""
+    if isinstance(obj, tuple):
+        return obj
+    if obj.id is None:
+        db.session.flush()
+    return obj.__tablename__, obj.id
+
+def _inherited(parent_type, parent_id):
+    """{ancestor: depth} a child of the given parent gets in the closure"""
+    inherited = {(parent_type, parent_id): 1}
+    if parent_type in CONTAINER_DAYS:
+        return inherited
+    for ancestor_type, ancestor_id, depth in db.session.query(
+        LineageClosure.ancestor_type, LineageClosure.ancestor_id, LineageClosure.depth
+    ).filter_by(descendant_type=parent_type, descendant_id=parent_id).all():
+        key = (ancestor_type, ancestor_id)
+        inherited[key] = min(inherited.get(key, depth + 1), depth + 1)
+    return inherited
+
+def record_movement(parent, child, quantity=None, source=None):
+    """Record that material moved from parent into child and extend the closure index.
+
+    parent and child are model instances or (node_type, node_id) tuples. The child
+    inherits the ancestors its parent has at the time of the movement, unless the
+    parent is a container (see CONTAINER_DAYS), whose history is traced at query time.
+    Must be called inside the caller's transaction; nothing is committed here.
+    """
+    parent_type, parent_id = node_of(parent)
+    child_type, child_id = node_of(child)
+
+    edge = LineageEdge(
+        parent_type=parent_type,
+        parent_id=parent_id,
+        child_type=child_type,
+        child_id=child_id,
+        quantity=quantity,
+        source=source
+    )
+    db.session.add(edge)
+
+    # Ancestors of the parent (plus the parent itself) become ancestors of the child
+    candidates = _inherited(parent_type, parent_id)
+
+    existing = set(db.session.query(
+        LineageClosure.ancestor_type, LineageClosure.ancestor_id
+    ).filter_by(descendant_type=child_type, descendant_id=child_id).all())
+
+    new_rows = [
+        {
+            'ancestor_type': ancestor_type,
+            'ancestor_id': ancestor_id,
+            'descendant_type': child_type,
+            'descendant_id': child_id,
+            'depth': depth
+        }
+        for (ancestor_type, ancestor_id), depth in candidates.items()
+        if (ancestor_type, ancestor_id) not in existing
+    ]
+    if new_rows:
+        db.session.bulk_insert_mappings(LineageClosure, new_rows)
+
+    return edge
+
+def record_movements(parent, children, source=None):
+    """Batch form of record_movement for freshly created children sharing one parent.
+
+    children is a list of (child, quantity) pairs. The children must not have any
+    lineage yet, so the parent's ancestors are read once and bulk inserted for all.
+    """
+    parent_type, parent_id = node_of(parent)
+    child_keys = [(node_of(child), quantity) for child, quantity in children]
+    if not child_keys:
+        return
+
+    inherited = _inherited(parent_type, parent_id)
+
+    db.session.bulk_insert_mappings(LineageEdge, [
+        {
+            'parent_type': parent_type,
+            'parent_id': parent_id,
+            'child_type': child_type,
+            'child_id': child_id,
+            'quantity': quantity,
+            'source': source
+        }
+        for (child_type, child_id), quantity in child_keys
+    ])
+    db.session.bulk_insert_mappings(LineageClosure, [
+        {
+            'ancestor_type': ancestor_type,
+            'ancestor_id': ancestor_id,
+            'descendant_type': child_type,
+            'descendant_id': child_id,
+            'depth': depth
+        }
+        for (child_type, child_id), _ in child_keys
+        for (ancestor_type, ancestor_id), depth in inherited.items()
+    ])
+
+def _keep(found, key, depth):
+    if key not in found or depth < found[key]:
+        found[key] = depth
+        return True
+    return False
+
+def _closure(nodes, forward):
+    """{node: {related: depth}} from the closure index, descendants when forward else ancestors"""
+    related = {}
+    by_type = {}
+    for node_type, node_id in nodes:
+        by_type.setdefault(node_type, set()).add(node_id)
+    for node_type, node_ids in by_type.items():
+        if forward:
+            query = LineageClosure.query.filter(
+                LineageClosure.ancestor_type == node_type, LineageClosure.ancestor_id.in_(node_ids))
+        else:
+            query = LineageClosure.query.filter(
+                LineageClosure.descendant_type == node_type, LineageClosure.descendant_id.in_(node_ids))
+        for row in query.all():
+            start, other = ((row.ancestor_type, row.ancestor_id), (row.descendant_type, row.descendant_id))
+            if not forward:
+                start, other = other, start
+            entry = related.setdefault(start, {})
+            entry[other] = min(entry.get(other, row.depth), row.depth)
+    return related
+
+def _through_container(container, edges, forward):
+    """Edges out of (forward) or into a container within its window after or before the given edges"""
+    window = timedelta(days=CONTAINER_DAYS[container[0]])
+    times = [edge.created_at for edge in edges if edge.created_at]
+    if not times:
+        return []
+    if forward:
+        query = LineageEdge.query.filter(
+            LineageEdge.parent_type == container[0], LineageEdge.parent_id == container[1],
+            LineageEdge.created_at >= min(times), LineageEdge.created_at <= max(times) + window)
+        return [e for e in query.all() if any(t <= e.created_at <= t + window for t in times)]
+    query = LineageEdge.query.filter(
+        LineageEdge.child_type == container[0], LineageEdge.child_id == container[1],
+        LineageEdge.created_at >= min(times) - window, LineageEdge.created_at <= max(times))
+    return [e for e in query.all() if any(t - window <= e.created_at <= t for t in times)]
+
+def _container_edges(container, forward):
+    """Every edge out of (forward) or into a container"""
+    if forward:
+        return LineageEdge.query.filter_by(parent_type=container[0], parent_id=container[1]).all()
+    return LineageEdge.query.filter_by(child_type=container[0], child_id=container[1]).all()
+
+def _trace(starts, forward):
+    """{node: depth} reachable from starts, passing through containers by their time windows"""
+    found = {}
+    seen_edges = set()
+    # (node, depth, edge it was reached by); a container is entered once per edge, each with its own window
+    queue = [(start, 0, None) for start in starts]
+    while queue:
+        batch, queue = queue, []
+        related = _closure({node for node, _, _ in batch if node[0] not in CONTAINER_DAYS}, forward)
+        for node, depth, via in batch:
+            if node[0] in CONTAINER_DAYS:
+                edges = _through_container(node, [via], forward) if via else _container_edges(node, forward)
+                hops = [(depth, edges)]
+            else:
+                reached = related.get(node, {})
+                for other, distance in reached.items():
+                    _keep(found, other, depth + distance)
+                # Containers on the way: pass through them by the edges that link them to this node
+                on_path = {node} | {k for k in reached if k[0] not in CONTAINER_DAYS}
+                hops = []
+                for container in [k for k in reached if k[0] in CONTAINER_DAYS]:
+                    linking = [
+                        e for e in _container_edges(container, not forward)
+                        if ((e.parent_type, e.parent_id) if forward else (e.child_type, e.child_id)) in on_path
+                    ]
+                    hops.append((depth + reached[container], _through_container(container, linking, forward)))
+            for base, edges in hops:
+                for edge in edges:
+                    if edge.id in seen_edges:
+                        continue
+                    seen_edges.add(edge.id)
+                    other = (edge.child_type, edge.child_id) if forward else (edge.parent_type, edge.parent_id)
+                    if _keep(found, other, base + 1) or other[0] in CONTAINER_DAYS:
+                        queue.append((other, base + 1, edge))
+    for start in starts:
+        found.pop(start, None)
+    return found
+
+def trace_forward(node_type, node_id, descendant_type=None):
+    """Everything that contains material from the given node (e.g. which bags contain this truck)"""
+    found = _trace({(node_type, node_id)}, forward=True)
+    return [(key[0], key[1], depth) for key, depth in found.items() if not descendant_type or key[0] == descendant_type]
+
+def trace_backward(node_type, node_ids, ancestor_type=None):
+    """Every source whose material went into the given node(s) (e.g. which trucks are in this batch)"""
+    if isinstance(node_ids, int):
+        node_ids = [node_ids]
+    if not node_ids:
+        return []
+    found = _trace({(node_type, node_id) for node_id in node_ids}, forward=False)
+    return sorted((key[0], key[1], depth) for key, depth in found.items() if not ancestor_type or key[0] == ancestor_type)
+
+def rebuild_closure(log=None):
+    """Rebuild the closure table from LineageEdge in time order"""
+    LineageClosure.query.delete()
+    db.session.flush()
+
+    ancestors = {}
+    for edge in LineageEdge.query.order_by(LineageEdge.created_at, LineageEdge.id).all():
+        parent = (edge.parent_type, edge.parent_id)
+        child = (edge.child_type, edge.child_id)
+        inherited = {} if edge.parent_type in CONTAINER_DAYS else dict(ancestors.get(parent, {}))
+        child_ancestors = ancestors.setdefault(child, {})
+        for key, depth in inherited.items():
+            child_ancestors[key] = min(child_ancestors.get(key, depth + 1), depth + 1)
+        child_ancestors[parent] = 1
+
+    rows = [
+        {
+            'ancestor_type': ancestor[0],
+            'ancestor_id': ancestor[1],
+            'descendant_type': descendant[0],
+            'descendant_id': descendant[1],
+            'depth': depth
+        }
+        for descendant, ancestor_map in ancestors.items()
+        for ancestor, depth in ancestor_map.items()
+    ]
+    if rows:
+        db.session.bulk_insert_mappings(LineageClosure, rows)
+    db.session.commit()
+    if log:
+        log(f"{len(rows)} closure row(s) rebuilt")
+    return len(rows)
+
+def import_existing(log=None):
+    """Add edges for movements recorded before lineage was, from vehicles, transfers, plans and finished goods.
+
+    Only rows older than the first recorded edge are imported, so running it
+    again adds nothing. Returns the number of edges added.
+    """
+    first = db.session.query(func.min(LineageEdge.created_at)).scalar()
+
+    def before(column):
+        return [column < first] if first else []
+
+    edges = []
+    for vehicle in Vehicle.query.filter(*before(Vehicle.arrival_time)).order_by(Vehicle.id):
+        edges.append(('supplier', vehicle.supplier_id, 'vehicle', vehicle.id, None, 'vehicle_entry', vehicle.arrival_time))
+        if vehicle.godown_id and vehicle.final_weight:
+            edges.append(('vehicle', vehicle.id, 'godown', vehicle.godown_id, vehicle.final_weight, 'weight_entry',
+                          vehicle.entry_time or vehicle.arrival_time))
+    for transfer in Transfer.query.filter(
+        Transfer.from_godown_id.isnot(None), Transfer.to_precleaning_bin_id.isnot(None), *before(Transfer.transfer_time)
+    ).order_by(Transfer.id):
+        edges.append(('godown', transfer.from_godown_id, 'precleaning_bin', transfer.to_precleaning_bin_id,
+                      transfer.quantity, 'precleaning', transfer.transfer_time))
+    for item, plan in db.session.query(ProductionPlanItem, ProductionPlan).join(
+        ProductionPlan, ProductionPlanItem.plan_id == ProductionPlan.id
+    ).filter(*before(ProductionPlan.planning_date)).order_by(ProductionPlanItem.id):
+        edges.append(('precleaning_bin', item.precleaning_bin_id, 'production_order', plan.order_id,
+                      item.quantity, 'production_plan', plan.planning_date))
+    for goods in FinishedGoods.query.filter(*before(FinishedGoods.production_date)).order_by(FinishedGoods.id):
+        edges.append(('production_order', goods.order_id, 'finished_goods', goods.id, goods.quantity, 'packing',
+                      goods.production_date))
+
+    edges.sort(key=lambda edge: edge[6] or datetime.min)
+    if edges:
+        db.session.bulk_insert_mappings(LineageEdge, [{
+            'parent_type': parent_type, 'parent_id': parent_id, 'child_type': child_type, 'child_id': child_id,
+            'quantity': quantity, 'source': source, 'created_at': created_at
+        } for parent_type, parent_id, child_type, child_id, quantity, source, created_at in edges])
+    db.session.commit()
+    if log:
+        log(f"{len(edges)} movement(s) imported")
+    return len(edges)
+
+def rebuild_lineage(log=None):
+    """Import movements that predate the lineage tables, then rebuild the closure; returns (edges, rows)"""
+    return import_existing(log=log), rebuild_closure(log=log)
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from flask import current_app, flash, g, has_request_context, request, session
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import db
+from db_routing import RoutingSession
+from models import IdempotencyKey
+from scheduling import leader_job
+
+UNSAFE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+HEADER = 'Idempotency-Key'
+FORM_FIELD = '_idempotency_key'
+FORM_MIMETYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+# Replayed with the stored body; everything else is regenerated on the way out
+REPLAYED_HEADERS = ('Content-Type', 'Location')
+# Stored next to the headers: messages the first copy flashed, shown again to the repeat
+FLASHES = '_flashes'
+
+# Explicit keys are honoured for a day; requests without one are deduplicated by fingerprint for a few seconds,
+# which catches double-clicks and blind retries without merging genuinely repeated submissions
+KEY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+FINGERPRINT_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_FINGERPRINT_SECONDS", "10"))
+# How long a repeat waits for the first request to finish before answering 409
+WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# A request still 'processing' after this long is assumed dead and its key freed
+PROCESSING_TIMEOUT_SECONDS = 300
+MAX_BODY_BYTES = 256 * 1024
+
+def idempotent(view):
+    """Deduplicate a state-changing GET route (links such as start_production_execution)"""
+    view.idempotent = True
+    return view
+
+def idempotency_exempt(view):
+    """Skip deduplication for a route that handles its own keys"""
+    view.idempotent = False
+    return view
+
+def _request_key():
+    """(key hash, ttl) for the current request, or None when it is not deduplicated"""
+    view = current_app.view_functions.get(request.endpoint)
+    marked = getattr(view, 'idempotent', None)
+    if marked is False or (request.method not in UNSAFE_METHODS and not marked):
+        return None
+
+    is_form = request.mimetype in FORM_MIMETYPES
+    client_key = request.headers.get(HEADER) or (request.form.get(FORM_FIELD) if is_form else None)
+
+    # Keys and fingerprints are per caller, so one user is never answered with another's result
+    identity = g.get('identity') or {}
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(f"user={identity.get('id')} token={identity.get('token')}\n".encode())
+    if client_key:
+        digest.update(b'key\n' + client_key.encode())
+        return digest.hexdigest(), KEY_TTL_SECONDS
+
+    digest.update(b'fingerprint\n')
+    digest.update(f"{request.remote_addr}\n{request.user_agent.string}\n".encode())
+    digest.update(request.query_string + b'\n')
+    if is_form:
+        # The body stream is consumed by form parsing, so hash the parsed fields and uploads
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}\n".encode())
+        for name, file in request.files.items(multi=True):
+            file.stream.seek(0, os.SEEK_END)
+            digest.update(f"{name}:{file.filename}:{file.stream.tell()}\n".encode())
+            file.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest(), FINGERPRINT_TTL_SECONDS
+
+def _replay(row):
+    response = current_app.response_class(row.response_body or b'', status=row.response_status)
+    headers = json.loads(row.response_headers) if row.response_headers else []
+    for name, value in headers:
+        if name == FLASHES:
+            # Only the messages; the caller's own session (and sign-in) is never replaced
+            for category, message in json.loads(value):
+                flash(message, category)
+        else:
+            response.headers[name] = value
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _read(key):
+    with db.engine.connect() as connection:
+        return connection.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).first()
+
+def _busy():
+    return current_app.response_class(
+        json.dumps({'success': False, 'error': 'The database is busy, please try again'}),
+        status=503, mimetype='application/json'
+    )
+
+def _claim(key, ttl):
+    """Reserve the key; returns None if reserved, else a response to send instead.
+
+    The key row is inserted in its own short transaction, so the request's
+    transaction does not hold the write lock from the start and unrelated
+    requests are not serialized behind it. A request that commits nothing, or
+    fails, releases the key again so it can simply be sent again. A
+    concurrent copy finds the 'processing' row and waits for its result.
+    """
+    deadline = time.monotonic() + WAIT_SECONDS
+    while True:
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(IdempotencyKey).values(
+                    key=key, method=request.method, path=request.path[:255], status='processing',
+                    created_at=now, expires_at=now + timedelta(seconds=PROCESSING_TIMEOUT_SECONDS)
+                ))
+            g._idempotency = {'key': key, 'ttl': ttl, 'committed': False}
+            return None
+        except IntegrityError:
+            pass
+        except OperationalError as e:
+            # SQLite gave up waiting for another request's write lock: not a repeat of this one
+            current_app.logger.warning(f"Could not reserve idempotency key: {e}")
+            return _busy()
+
+        row = _read(key)
+        if row is not None and row.expires_at <= now:
+            # Expired, or abandoned by a worker that died mid-request: free it and reserve again
+            with db.engine.begin() as connection:
+                connection.execute(delete(IdempotencyKey).where(IdempotencyKey.id == row.id, IdempotencyKey.expires_at <= now))
+            continue
+        if row is not None and row.status == 'completed':
+            return _replay(row)
+        if time.monotonic() >= deadline:
+            return current_app.response_class(
+                json.dumps({'success': False, 'error': 'The same request is still being processed'}),
+                status=409, mimetype='application/json'
+            )
+        # The first copy is still running; answer with its result once it finishes
+        time.sleep(0.025)
+
+def _release(engine, logger, key):
+    try:
+        with engine.begin() as connection:
+            connection.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.key == key, IdempotencyKey.status == 'processing'
+            ))
+    except Exception as e:
+        logger.warning(f"Could not release idempotency key: {e}")
+
+def _store_summary(engine, logger, key, ttl, summary):
+    try:
+        with engine.begin() as connection:
+            connection.execute(update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+                status='completed', expires_at=datetime.utcnow() + timedelta(seconds=ttl), **summary
+            ))
+    except Exception as e:
+        logger.warning(f"Could not record idempotency key: {e}")
+
+def _before_request():
+    if request.endpoint is None:
+        return None
+    claim = _request_key()
+    if claim is None:
+        return None
+    return _claim(*claim)
+
+def _after_request(response):
+    state = g.pop('_idempotency', None)
+    if state is None:
+        return response
+    engine, logger = db.engine, current_app.logger
+    if not state['committed']:
+        # Nothing was written (validation error, rollback): the request may be sent again
+        _release(engine, logger, state['key'])
+        return response
+
+    body = b'' if response.direct_passthrough else response.get_data()
+    headers = [(name, value) for name, value in response.headers.items() if name in REPLAYED_HEADERS]
+    if session.get('_flashes'):
+        headers.append((FLASHES, json.dumps(session['_flashes'])))
+    summary = {
+        'response_status': response.status_code,
+        'response_headers': json.dumps(headers),
+        'response_body': body if len(body) <= MAX_BODY_BYTES else b''
+    }
+    # Written once the response has been sent, so the client never waits on it
+    response.call_on_close(lambda: _store_summary(engine, logger, state['key'], state['ttl'], summary))
+    return response
+
+def _teardown(exc):
+    # after_request is skipped when an error propagates (e.g. in debug mode); free the key then
+    state = g.pop('_idempotency', None)
+    if state is not None:
+        _release(db.engine, current_app.logger, state['key'])
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_committed(session):
+    if has_request_context():
+        state = g.get('_idempotency')
+        if state is not None:
+            state['committed'] = True
+
+@leader_job('purge_idempotency_keys', minutes=30)
+def purge_idempotency_keys():
+    """Drop expired idempotency keys"""
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    db.session.commit()
+
+def init_idempotency(app):
+    # Registered after compression: after_request hooks run in reverse, so the stored body is uncompressed
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown)
@@ -0,0 +1,295 @@
+import math
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, insert, update
+from app import db
+from audit import record_insert, record_update
+from models import (FinishedGoods, FinishedGoodsStock, FinishedGoodsLot, DispatchAllocation, PackingProcess,
+                    ProductionJobNew, SalesDispatch, StorageArea, Product)
+
+def adjust_stock(storage_area_id, product_id, bag_weight, bags):
+    """Add (or with negative bags remove) bags from the materialised stock balance"""
+    balance = FinishedGoodsStock.query.filter_by(
+        storage_area_id=storage_area_id,
+        product_id=product_id,
+        bag_weight_kg=bag_weight
+    ).with_for_update().first()
+
+    if not balance:
+        balance = FinishedGoodsStock(
+            storage_area_id=storage_area_id,
+            product_id=product_id,
+            bag_weight_kg=bag_weight,
+            bag_count=0,
+            quantity_kg=0
+        )
+        db.session.add(balance)
+
+    balance.bag_count = (balance.bag_count or 0) + bags
+    balance.quantity_kg = balance.bag_count * bag_weight
+    if balance.bag_count < 0:
+        raise ValueError('Stock balance cannot go below zero')
+    return balance
+
+def _adjust_area_kg(storage_area_id, delta_kg):
+    area_id, stock_kg = db.session.execute(
+        update(StorageArea)
+        .where(StorageArea.id == storage_area_id)
+        .values(current_stock_kg=func.coalesce(StorageArea.current_stock_kg, 0) + delta_kg)
+        .returning(StorageArea.id, StorageArea.current_stock_kg)
+        .execution_options(synchronize_session='fetch', stock_update=True)
+    ).one()
+    record_update('storage_area', area_id, {'current_stock_kg': (stock_kg - delta_kg, stock_kg)})
+
+def receive_lots(lots):
+    """Put freshly packed bags into stock.
+
+    lots is a list of dicts with finished_goods_id, storage_area_id, product_id,
+    bag_weight, bag_count and production_date. StorageArea.current_stock_kg is
+    left to the caller, which already bumps it for packing.
+    """
+    lots = [lot for lot in lots if lot.get('storage_area_id') and lot.get('bag_count')]
+    if not lots:
+        return
+
+    lot_rows = [{
+        'finished_goods_id': lot['finished_goods_id'],
+        'storage_area_id': lot['storage_area_id'],
+        'product_id': lot['product_id'],
+        'bag_weight_kg': lot['bag_weight'],
+        'bags_remaining': lot['bag_count'],
+        'production_date': lot.get('production_date') or datetime.now()
+    } for lot in lots]
+    lot_ids = db.session.scalars(
+        insert(FinishedGoodsLot).returning(FinishedGoodsLot.id, sort_by_parameter_order=True),
+        lot_rows
+    ).all()
+    record_insert('finished_goods_lot', zip(lot_ids, lot_rows))
+
+    totals = {}
+    for lot in lots:
+        key = (lot['storage_area_id'], lot['product_id'], lot['bag_weight'])
+        totals[key] = totals.get(key, 0) + lot['bag_count']
+    for (storage_area_id, product_id, bag_weight), bags in totals.items():
+        adjust_stock(storage_area_id, product_id, bag_weight, bags)
+
+def take_fifo(product_id, bag_weight=None, bag_count=None, quantity_kg=None, storage_area_id=None):
+    """Remove whole bags from the oldest lots first and return [(lot, bags_taken)].
+
+    Ask either for bag_count bags of one bag_weight, or for quantity_kg made up of
+    whole bags of any weight. Raises ValueError when stock is short.
+    """
+    if bag_count is None and quantity_kg is None:
+        raise ValueError('Specify a bag count or a quantity to allocate')
+    if bag_count is not None and bag_weight is None:
+        raise ValueError('Bag weight is required when allocating by bag count')
+
+    query = FinishedGoodsLot.query.filter(
+        FinishedGoodsLot.product_id == product_id,
+        FinishedGoodsLot.bags_remaining > 0
+    )
+    if bag_weight is not None:
+        query = query.filter(FinishedGoodsLot.bag_weight_kg == bag_weight)
+    if storage_area_id:
+        query = query.filter(FinishedGoodsLot.storage_area_id == storage_area_id)
+    lots = query.order_by(FinishedGoodsLot.production_date, FinishedGoodsLot.id).with_for_update().all()
+
+    taken = []
+    if bag_count is not None:
+        needed = bag_count
+        for lot in lots:
+            if needed <= 0:
+                break
+            bags = min(lot.bags_remaining, needed)
+            taken.append((lot, bags))
+            needed -= bags
+        if needed > 0:
+            raise ValueError(f'Only {bag_count - needed} of {bag_count} bags of {bag_weight:g} kg are in stock')
+    else:
+        remaining_kg = quantity_kg
+        for lot in lots:
+            if remaining_kg < lot.bag_weight_kg - 1e-6:
+                continue
+            bags = min(lot.bags_remaining, int((remaining_kg + 1e-6) // lot.bag_weight_kg))
+            if bags:
+                taken.append((lot, bags))
+                remaining_kg -= bags * lot.bag_weight_kg
+            if remaining_kg <= 1e-6:
+                break
+        if remaining_kg > 1e-6:
+            raise ValueError(f'Only {quantity_kg - remaining_kg:.2f} of {quantity_kg:.2f} kg can be allocated in whole bags')
+
+    for lot, bags in taken:
+        lot.bags_remaining -= bags
+    return taken
+
+def transfer_stock(from_storage_id, to_storage_id, product_id, bag_weight=None, bag_count=None, quantity_kg=None):
+    """Move bags between storage areas oldest lot first; returns (bags, kg) moved"""
+    if int(from_storage_id) == int(to_storage_id):
+        raise ValueError('Source and destination storage areas must be different')
+
+    taken = take_fifo(product_id, bag_weight, bag_count, quantity_kg, storage_area_id=from_storage_id)
+
+    moved_bags = 0
+    moved_kg = 0
+    for lot, bags in taken:
+        db.session.add(FinishedGoodsLot(
+            finished_goods_id=lot.finished_goods_id,
+            storage_area_id=to_storage_id,
+            product_id=lot.product_id,
+            bag_weight_kg=lot.bag_weight_kg,
+            bags_remaining=bags,
+            production_date=lot.production_date
+        ))
+        adjust_stock(from_storage_id, lot.product_id, lot.bag_weight_kg, -bags)
+        adjust_stock(to_storage_id, lot.product_id, lot.bag_weight_kg, bags)
+        moved_bags += bags
+        moved_kg += bags * lot.bag_weight_kg
+
+    _adjust_area_kg(from_storage_id, -moved_kg)
+    _adjust_area_kg(to_storage_id, moved_kg)
+    return moved_bags, moved_kg
+
+def dispatch_stock(sales_dispatch, bag_weight, bag_count, storage_area_id=None):
+    """Allocate a dispatch from stock FIFO and record which lots it came from"""
+    taken = take_fifo(sales_dispatch.product_id, bag_weight, bag_count, storage_area_id=storage_area_id)
+    if sales_dispatch.id is None:
+        db.session.flush()
+
+    area_kg = {}
+    allocations = []
+    for lot, bags in taken:
+        quantity = bags * lot.bag_weight_kg
+        allocation = DispatchAllocation(
+            sales_dispatch_id=sales_dispatch.id,
+            finished_goods_id=lot.finished_goods_id,
+            storage_area_id=lot.storage_area_id,
+            bag_count=bags,
+            quantity_kg=quantity
+        )
+        db.session.add(allocation)
+        allocations.append(allocation)
+        adjust_stock(lot.storage_area_id, lot.product_id, lot.bag_weight_kg, -bags)
+        area_kg[lot.storage_area_id] = area_kg.get(lot.storage_area_id, 0) + quantity
+
+    for area_id, quantity in area_kg.items():
+        _adjust_area_kg(area_id, -quantity)
+    return allocations
+
+def available_stock(product_id=None, storage_area_id=None):
+    """What can be shipped now: one indexed query over the stock balance table"""
+    query = db.session.query(FinishedGoodsStock, Product.name, StorageArea.name).join(
+        Product, FinishedGoodsStock.product_id == Product.id
+    ).join(
+        StorageArea, FinishedGoodsStock.storage_area_id == StorageArea.id
+    ).filter(FinishedGoodsStock.bag_count > 0)
+    if product_id:
+        query = query.filter(FinishedGoodsStock.product_id == product_id)
+    if storage_area_id:
+        query = query.filter(FinishedGoodsStock.storage_area_id == storage_area_id)
+
+    return [{
+        'storage_area_id': stock.storage_area_id,
+        'storage_area': area_name,
+        'product_id': stock.product_id,
+        'product': product_name,
+        'bag_weight_kg': stock.bag_weight_kg,
+        'bag_count': stock.bag_count,
+        'quantity_kg': stock.quantity_kg,
+        'updated_at': stock.updated_at.isoformat() if stock.updated_at else None
+    } for stock, product_name, area_name in query.order_by(Product.name, StorageArea.name, FinishedGoodsStock.bag_weight_kg).all()]
+
+def rebuild_stock():
+    """Recompute FinishedGoodsStock from the remaining lots"""
+    FinishedGoodsStock.query.delete()
+    rows = db.session.query(
+        FinishedGoodsLot.storage_area_id,
+        FinishedGoodsLot.product_id,
+        FinishedGoodsLot.bag_weight_kg,
+        func.sum(FinishedGoodsLot.bags_remaining)
+    ).group_by(
+        FinishedGoodsLot.storage_area_id, FinishedGoodsLot.product_id, FinishedGoodsLot.bag_weight_kg
+    ).all()
+
+    db.session.bulk_insert_mappings(FinishedGoodsStock, [{
+        'storage_area_id': storage_area_id,
+        'product_id': product_id,
+        'bag_weight_kg': bag_weight,
+        'bag_count': bags,
+        'quantity_kg': bags * bag_weight,
+        'updated_at': datetime.now()
+    } for storage_area_id, product_id, bag_weight, bags in rows if bags])
+    db.session.commit()
+    return len(rows)
+
+def import_existing_lots(log=None):
+    """Seed lots for finished goods packed before lots were tracked, less what was dispatched before them.
+
+    Each old FinishedGoods row was written with a PackingProcess row of the
+    same order, product, bag weight and count, which holds its storage area;
+    they are paired in id order. Dispatches without allocations made before
+    the first existing lot are taken from the seeded lots oldest first (a part
+    bag counts as a whole one) and recorded as allocations. Only goods without
+    lots are seeded, so running it again adds nothing. Call rebuild_stock()
+    afterwards. Returns (lots, bags dispatched).
+    """
+    first_lot = db.session.query(func.min(FinishedGoodsLot.production_date)).scalar()
+    with_lots = {goods_id for (goods_id,) in db.session.query(FinishedGoodsLot.finished_goods_id).distinct()}
+
+    areas = defaultdict(list)
+    for packing, order_id in db.session.query(PackingProcess, ProductionJobNew.order_id).join(
+        ProductionJobNew, PackingProcess.job_id == ProductionJobNew.id
+    ).order_by(PackingProcess.id):
+        areas[(order_id, packing.product_id, packing.bag_weight_kg, packing.number_of_bags)].append(packing.storage_area_id)
+
+    lots = []
+    seen = defaultdict(int)
+    goods = FinishedGoods.query.filter(FinishedGoods.bag_weight > 0, FinishedGoods.bag_count > 0).order_by(FinishedGoods.id)
+    for row in goods:
+        key = (row.order_id, row.product_id, row.bag_weight, row.bag_count)
+        position = seen[key]
+        seen[key] += 1
+        if row.id in with_lots or position >= len(areas[key]) or not areas[key][position]:
+            continue
+        lots.append(FinishedGoodsLot(
+            finished_goods_id=row.id,
+            storage_area_id=areas[key][position],
+            product_id=row.product_id,
+            bag_weight_kg=row.bag_weight,
+            bags_remaining=row.bag_count,
+            production_date=row.production_date or row.created_at or datetime.now()
+        ))
+    db.session.add_all(lots)
+
+    dispatched = 0
+    if lots:
+        by_product = defaultdict(list)
+        for lot in sorted(lots, key=lambda lot: lot.production_date):
+            by_product[lot.product_id].append(lot)
+        dispatches = SalesDispatch.query.filter(
+            ~SalesDispatch.id.in_(db.session.query(DispatchAllocation.sales_dispatch_id)),
+            *([SalesDispatch.created_at < first_lot] if first_lot else [])
+        ).order_by(SalesDispatch.created_at, SalesDispatch.id)
+        for dispatch in dispatches:
+            remaining_kg = (dispatch.bag_weight_kg * dispatch.bag_count if dispatch.bag_weight_kg and dispatch.bag_count
+                            else (dispatch.quantity or 0) * 1000)
+            for lot in by_product[dispatch.product_id]:
+                if remaining_kg <= 1e-6:
+                    break
+                if not lot.bags_remaining or (dispatch.bag_weight_kg and lot.bag_weight_kg != dispatch.bag_weight_kg):
+                    continue
+                bags = min(lot.bags_remaining, math.ceil(remaining_kg / lot.bag_weight_kg - 1e-6))
+                lot.bags_remaining -= bags
+                remaining_kg -= bags * lot.bag_weight_kg
+                dispatched += bags
+                db.session.add(DispatchAllocation(
+                    sales_dispatch_id=dispatch.id,
+                    finished_goods_id=lot.finished_goods_id,
+                    storage_area_id=lot.storage_area_id,
+                    bag_count=bags,
+                    quantity_kg=bags * lot.bag_weight_kg
+                ))
+    db.session.commit()
+    if log:
+        log(f"{len(lots)} lot(s) imported, {dispatched} bag(s) already dispatched")
+    return len(lots), dispatched
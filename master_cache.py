@@ -0,0 +1,159 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from flask import g
+from sqlalchemy import event, insert, inspect, update
+from sqlalchemy.orm import joinedload
+from app import db
+from db_routing import RoutingSession
+from models import Supplier, Customer, Product, GodownType, Godown, StorageArea, PrecleaningBin, TableVersion
+
+# list name -> (model, tables whose writes invalidate it, relationships loaded into the snapshot)
+MASTER_LISTS = {
+    'suppliers': (Supplier, ('supplier',), ()),
+    'customers': (Customer, ('customer',), ()),
+    'products': (Product, ('product',), ()),
+    'godown_types': (GodownType, ('godown_type',), ()),
+    'godowns': (Godown, ('godown', 'godown_type'), ('godown_type',)),
+    'storage_areas': (StorageArea, ('storage_area',), ()),
+    'precleaning_bins': (PrecleaningBin, ('precleaning_bin',), ()),
+}
+
+CACHED_TABLES = {table for _, tables, _ in MASTER_LISTS.values() for table in tables}
+
+# Stock levels change with every truck, transfer and packing run. They are kept out of the snapshots and
+# read live, so those writes do not invalidate the lists; UPDATE statements that only move stock pass
+# execution_options(stock_update=True)
+VOLATILE_COLUMNS = {
+    'godown': ('current_stock',),
+    'storage_area': ('current_stock_kg',),
+    'precleaning_bin': ('current_stock',),
+}
+
+class MasterRow:
+    """Read-only copy of a master record that can be shared between requests"""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    def to_dict(self):
+        return {
+            key: value.isoformat() if isinstance(value, (datetime, date)) else value.to_dict() if isinstance(value, MasterRow) else value
+            for key, value in self.__dict__.items()
+        }
+
+def _snapshot(obj, relations=()):
+    volatile = VOLATILE_COLUMNS.get(obj.__table__.name, ())
+    values = {column.key: getattr(obj, column.key) for column in obj.__mapper__.column_attrs if column.key not in volatile}
+    for name in relations:
+        related = getattr(obj, name)
+        values[name] = _snapshot(related) if related is not None else None
+    return MasterRow(values)
+
+class LRUCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+cache = LRUCache()
+
+def table_versions():
+    """Current version of every cached table, read once per request/app context"""
+    versions = g.get('_master_versions')
+    if versions is None:
+        versions = dict(db.session.query(TableVersion.table_name, TableVersion.version).all())
+        g._master_versions = versions
+    return versions
+
+def list_version(name):
+    versions = table_versions()
+    return tuple(versions.get(table, 0) for table in MASTER_LISTS[name][1])
+
+def etag_for(name):
+    return f"{name}-{'.'.join(str(v) for v in list_version(name))}"
+
+def master_list(name, stock=True):
+    """All rows of a master table as shared read-only snapshots, reloaded only after a write.
+
+    Stock columns are read live and added unless stock is False (the ETag of the list does not cover them).
+    """
+    model, _, relations = MASTER_LISTS[name]
+    key = (name, list_version(name))
+    rows = cache.get(key)
+    if rows is None:
+        options = [joinedload(getattr(model, relation)) for relation in relations]
+        rows = tuple(_snapshot(obj, relations) for obj in model.query.options(*options).order_by(model.id).all())
+        cache.put(key, rows)
+    volatile = VOLATILE_COLUMNS.get(model.__table__.name)
+    if volatile and stock:
+        live = {row[0]: dict(zip(volatile, row[1:])) for row in db.session.query(
+            model.id, *(getattr(model, column) for column in volatile)
+        ).all()}
+        empty = dict.fromkeys(volatile)
+        rows = tuple(MasterRow({**row.__dict__, **live.get(row.id, empty)}) for row in rows)
+    return rows
+
+def bump_versions(session, tables):
+    """Increment the version rows of the written tables inside the session's transaction"""
+    tables = sorted(tables)
+    stmt = update(TableVersion).where(TableVersion.table_name.in_(tables)).values(version=TableVersion.version + 1)
+    connection = session.connection(bind_arguments={'clause': stmt})
+    if connection.execute(stmt).rowcount < len(tables):
+        existing = {name for (name,) in connection.execute(
+            db.select(TableVersion.table_name).where(TableVersion.table_name.in_(tables))
+        )}
+        missing = [{'table_name': name, 'version': 1} for name in tables if name not in existing]
+        if missing:
+            connection.execute(insert(TableVersion), missing)
+    g.pop('_master_versions', None)
+
+def _written_tables(objects):
+    return {obj.__table__.name for obj in objects if getattr(obj, '__table__', None) is not None} & CACHED_TABLES
+
+def _changed_cached_columns(obj):
+    volatile = VOLATILE_COLUMNS.get(obj.__table__.name, ())
+    state = inspect(obj)
+    return any(state.attrs[attr.key].history.has_changes() for attr in state.mapper.column_attrs if attr.key not in volatile)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    updated = [obj for obj in session.dirty if getattr(obj, '__table__', None) is not None and _changed_cached_columns(obj)]
+    tables = _written_tables(session.new) | _written_tables(updated) | _written_tables(session.deleted)
+    if tables:
+        bump_versions(session, tables)
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _bump_on_bulk_write(orm_execute_state):
+    # Query.update()/delete() and update(Model) statements bypass the flush
+    if orm_execute_state.execution_options.get('stock_update'):
+        return
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None:
+        table = orm_execute_state.bind_mapper.local_table.name
+        if table in CACHED_TABLES:
+            bump_versions(orm_execute_state.session, {table})
+
+def seed_versions():
+    """Create the version rows for every cached table (called by init-db)"""
+    existing = {name for (name,) in db.session.query(TableVersion.table_name).all()}
+    for table in sorted(CACHED_TABLES - existing):
+        db.session.add(TableVersion(table_name=table, version=0))
+    db.session.commit()
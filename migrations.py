@@ -0,0 +1,342 @@
+"""Versioned schema migrations for SQLite and PostgreSQL.
+
+Tables that do not exist yet are created straight from models.py. Changes to
+existing tables are declared in MIGRATIONS and applied once each, in order,
+by `flask migrate`; applied versions are recorded in schema_migration.
+
+Every operation checks the live schema before acting and commits on its own,
+so a migration interrupted halfway is finished by running it again. On
+PostgreSQL the operations avoid long table locks: DDL gives up after
+MIGRATION_LOCK_TIMEOUT instead of queueing every request behind it, indexes
+are built CONCURRENTLY, foreign keys are validated separately and backfills
+update a batch of rows per short transaction.
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import case, inspect, insert, or_, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateColumn
+from app import db
+from models import SchemaMigration
+
+# pg_advisory_lock key held while migrating, so two deploys never run the same step at once
+MIGRATION_LOCK_KEY = 7301452012
+
+LOCK_TIMEOUT = os.environ.get("MIGRATION_LOCK_TIMEOUT", "5s")
+LOCK_RETRIES = int(os.environ.get("MIGRATION_LOCK_RETRIES", "5"))
+BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "1000"))
+BATCH_PAUSE_SECONDS = float(os.environ.get("MIGRATION_BATCH_PAUSE", "0.05"))
+
+def _is_postgres(engine):
+    return engine.dialect.name == 'postgresql'
+
+def _quote(engine, name):
+    return engine.dialect.identifier_preparer.quote(name)
+
+def _execute_ddl(engine, statement, log):
+    """Run one DDL statement in its own transaction, retrying when a table lock is not granted in time"""
+    for attempt in range(1, LOCK_RETRIES + 1):
+        try:
+            with engine.begin() as connection:
+                if _is_postgres(engine):
+                    connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                connection.execute(text(statement))
+            return
+        except OperationalError as e:
+            locked = 'lock timeout' in str(e) or 'database is locked' in str(e)
+            if not locked or attempt == LOCK_RETRIES:
+                raise
+            log(f"  table busy, retrying ({attempt}/{LOCK_RETRIES - 1})")
+            time.sleep(attempt)
+
+class AddColumn:
+    """Add a column that is declared on the model, typed for the current database"""
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+
+    def describe(self):
+        return f"add column {self.table}.{self.column}"
+
+    def apply(self, engine, log):
+        column = db.metadata.tables[self.table].c[self.column]
+        existing = {c['name'] for c in inspect(engine).get_columns(self.table)}
+        table = _quote(engine, self.table)
+        if self.column not in existing:
+            definition = str(CreateColumn(column).compile(dialect=engine.dialect))
+            references = ''
+            if not _is_postgres(engine):
+                # SQLite cannot add a constraint later, but accepts an inline reference on a nullable column
+                references = ''.join(
+                    f" REFERENCES {_quote(engine, fk.column.table.name)} ({_quote(engine, fk.column.name)})"
+                    for fk in column.foreign_keys
+                )
+            _execute_ddl(engine, f"ALTER TABLE {table} ADD COLUMN {definition}{references}", log)
+
+        if _is_postgres(engine):
+            constrained = {tuple(fk['constrained_columns']) for fk in inspect(engine).get_foreign_keys(self.table)}
+            for fk in column.foreign_keys:
+                if (self.column,) in constrained:
+                    continue
+                # NOT VALID takes only a brief lock; validation scans the table without blocking writes
+                name = _quote(engine, f"{self.table}_{self.column}_fkey")
+                _execute_ddl(engine, (
+                    f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({_quote(engine, self.column)}) "
+                    f"REFERENCES {_quote(engine, fk.column.table.name)} ({_quote(engine, fk.column.name)}) NOT VALID"
+                ), log)
+                _execute_ddl(engine, f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}", log)
+
+class CreateIndex:
+    """Build an index declared in a model's __table_args__; CONCURRENTLY on PostgreSQL"""
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+    def describe(self):
+        return f"create index {self.name} on {self.table}"
+
+    def apply(self, engine, log):
+        index = next(i for i in db.metadata.tables[self.table].indexes if i.name == self.name)
+        existing = {i['name'] for i in inspect(engine).get_indexes(self.table)}
+        name = _quote(engine, self.name)
+        columns = ', '.join(_quote(engine, column.name) for column in index.columns)
+        unique = 'UNIQUE ' if index.unique else ''
+
+        if not _is_postgres(engine):
+            if self.name not in existing:
+                _execute_ddl(engine, f"CREATE {unique}INDEX {name} ON {_quote(engine, self.table)} ({columns})", log)
+            return
+
+        # CONCURRENTLY cannot run inside a transaction, and a failed build leaves an invalid index behind
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            if self.name in existing:
+                valid = connection.execute(text(
+                    "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+                ), {'name': self.name}).scalar()
+                if valid:
+                    return
+                log(f"  dropping invalid index {self.name} left by an interrupted build")
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            connection.execute(text(f"CREATE {unique}INDEX CONCURRENTLY {name} ON {_quote(engine, self.table)} ({columns})"))
+
+class Backfill:
+    """Update existing rows in primary-key batches, one short transaction each, pausing between batches.
+
+    values is a dict or a function of the table returning one; where is a
+    function of the table returning the condition rows still to fix must meet.
+    """
+
+    def __init__(self, table, values, where=None, batch_size=None, pause=None):
+        self.table = table
+        self.values = values
+        self.where = where
+        self.batch_size = batch_size or BATCH_SIZE
+        self.pause = BATCH_PAUSE_SECONDS if pause is None else pause
+
+    def describe(self):
+        return f"backfill {self.table}"
+
+    def apply(self, engine, log):
+        table = db.metadata.tables[self.table]
+        values = self.values(table) if callable(self.values) else self.values
+        conditions = [self.where(table)] if self.where else []
+        last_id, total = 0, 0
+        while True:
+            with engine.begin() as connection:
+                ids = connection.execute(
+                    select(table.c.id).where(table.c.id > last_id, *conditions).order_by(table.c.id).limit(self.batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                connection.execute(update(table).where(table.c.id.in_(ids)).values(values))
+            last_id = ids[-1]
+            total += len(ids)
+            time.sleep(self.pause)
+        if total:
+            log(f"  {total} row(s) updated")
+
+class Rebuild:
+    """Rebuild derived rows with an application function taking log=, e.g. a projection of data that predates it.
+
+    The function must be safe to run again, since an interrupted migration is.
+    """
+
+    def __init__(self, description, function):
+        self.description = description
+        self.function = function
+
+    def describe(self):
+        return self.description
+
+    def apply(self, engine, log):
+        self.function(log=lambda line: log(f"  {line}"))
+
+def _production_timelines(log):
+    from timeline import import_and_replay
+    import_and_replay(log=log)
+
+def _lineage(log):
+    from genealogy import rebuild_lineage
+    rebuild_lineage(log=log)
+
+def _finished_goods_lots(log):
+    from inventory import import_existing_lots, rebuild_stock
+    import_existing_lots(log=log)
+    log(f"{rebuild_stock()} stock balance(s) rebuilt")
+
+class Migration:
+    def __init__(self, version, description, operations):
+        self.version = version
+        self.description = description
+        self.operations = operations
+
+# Append new steps at the end with the next version; never edit one that has shipped
+MIGRATIONS = [
+    Migration('0001', 'Sample photos on quality tests', [
+        AddColumn('quality_test', 'sample_photos_before'),
+        AddColumn('quality_test', 'sample_photos_after'),
+    ]),
+    Migration('0002', 'Lab testing fields on quality tests', [
+        AddColumn('quality_test', column) for column in (
+            'shrivelled_broken', 'damaged', 'weevilled', 'other_food_grains', 'sprouted', 'immature',
+            'test_weight', 'gluten', 'protein', 'falling_number', 'ash_content', 'wet_gluten',
+            'dry_gluten', 'sedimentation_value'
+        )
+    ]),
+    Migration('0003', 'Finished good type on production orders', [
+        AddColumn('production_order', 'finished_good_type'),
+    ]),
+    Migration('0004', 'Cleaning process locking, reminders and next job', [
+        AddColumn('cleaning_process', 'next_process_job_id'),
+        AddColumn('cleaning_process', 'is_locked'),
+        AddColumn('cleaning_process', 'reminder_sent_5min'),
+        AddColumn('cleaning_process', 'reminder_sent_10min'),
+        AddColumn('cleaning_process', 'reminder_sent_30min'),
+        Backfill('cleaning_process', {'is_locked': True}, where=lambda t: t.c.is_locked.is_(None)),
+        Backfill(
+            'cleaning_process', {'reminder_sent_5min': False, 'reminder_sent_10min': False, 'reminder_sent_30min': False},
+            where=lambda t: t.c.reminder_sent_5min.is_(None)
+        ),
+    ]),
+    Migration('0005', 'B1 scale and yield tracking on grinding, cleaning frequency on machines', [
+        AddColumn('grinding_process', 'b1_scale_operator'),
+        AddColumn('grinding_process', 'b1_scale_start_time'),
+        AddColumn('grinding_process', 'b1_scale_weight_kg'),
+        AddColumn('grinding_process', 'bran_percentage_alert'),
+        AddColumn('grinding_process', 'main_products_percentage'),
+        AddColumn('production_machine', 'cleaning_frequency_minutes'),
+        Backfill(
+            'production_machine',
+            lambda t: {'cleaning_frequency_minutes': case(
+                (t.c.process_step == 'cleaning_24h', 5), (t.c.process_step == 'cleaning_12h', 2), else_=180
+            )},
+            where=lambda t: or_(t.c.cleaning_frequency_minutes.is_(None), t.c.cleaning_frequency_minutes == 0)
+        ),
+    ]),
+    Migration('0006', 'Bag serial ranges on finished goods', [
+        AddColumn('finished_goods', 'first_bag_serial'),
+        AddColumn('finished_goods', 'last_bag_serial'),
+    ]),
+    Migration('0007', 'Bag weight and count on sales dispatches', [
+        AddColumn('sales_dispatch', 'bag_weight_kg'),
+        AddColumn('sales_dispatch', 'bag_count'),
+    ]),
+    Migration('0008', 'Index finished goods by batch for labels and recalls', [
+        CreateIndex('finished_goods', 'ix_finished_goods_batch'),
+    ]),
+    Migration('0009', 'Rated throughput on production machines', [
+        AddColumn('production_machine', 'rated_kg_per_hour'),
+    ]),
+    Migration('0010', 'Creation times on finished goods, production plans and cleaning processes', [
+        AddColumn('finished_goods', 'created_at'),
+        AddColumn('production_plan', 'created_at'),
+        AddColumn('cleaning_process', 'created_at'),
+    ]),
+    Migration('0011', 'Passwords, last sign-in and plant roles on users', [
+        AddColumn('user', 'password_hash'),
+        AddColumn('user', 'last_login_at'),
+        Backfill(
+            'user',
+            lambda t: {'role': case(
+                (t.c.role == 'lab_instructor', 'lab'), else_='production'
+            )},
+            where=lambda t: t.c.role.in_(['operator', 'lab_instructor', 'production_manager'])
+        ),
+    ]),
+    Migration('0012', 'Production timelines for orders that predate the event log', [
+        Rebuild('import production events and rebuild order timelines', _production_timelines),
+    ]),
+    Migration('0013', 'Lineage for earlier movements; closure stops at godowns and bins', [
+        Rebuild('import movements and rebuild the lineage closure', _lineage),
+    ]),
+    Migration('0014', 'Finished goods lots and stock for bags packed before lots were tracked', [
+        Rebuild('import finished goods lots and rebuild stock balances', _finished_goods_lots),
+    ]),
+]
+
+@contextmanager
+def _migration_lock(engine):
+    if not _is_postgres(engine):
+        # SQLite serialises writers itself and is not shared between hosts
+        yield
+        return
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            connection.commit()
+
+def _record(engine, migrations, duration_ms):
+    with engine.begin() as connection:
+        connection.execute(insert(SchemaMigration), [{
+            'version': migration.version,
+            'description': migration.description,
+            'applied_at': datetime.utcnow(),
+            'duration_ms': duration_ms
+        } for migration in migrations])
+
+def applied_versions(engine=None):
+    engine = engine or db.engine
+    if not inspect(engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    with engine.connect() as connection:
+        return set(connection.execute(select(SchemaMigration.version)).scalars())
+
+def migration_status():
+    """(version, description, applied) for every declared migration"""
+    applied = applied_versions()
+    return [(m.version, m.description, m.version in applied) for m in MIGRATIONS]
+
+def migrate(log=print):
+    """Create missing tables, then apply pending migrations in order; returns the versions applied"""
+    engine = db.engine
+    done = []
+    with _migration_lock(engine):
+        fresh = not inspect(engine).get_table_names()
+        # Only creates tables that do not exist; never touches existing ones
+        db.metadata.create_all(bind=engine)
+        if fresh:
+            # Tables created from the current models already have every change
+            _record(engine, MIGRATIONS, 0)
+            log(f"New database: {len(MIGRATIONS)} migration(s) marked as applied")
+            return []
+
+        applied = applied_versions(engine)
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            log(f"Applying {migration.version}: {migration.description}")
+            started = time.perf_counter()
+            for operation in migration.operations:
+                log(f"  {operation.describe()}")
+                operation.apply(engine, log)
+            _record(engine, [migration], (time.perf_counter() - started) * 1000)
+            done.append(migration.version)
+    return done
@@ -216,11 +216,17 @@ class FinishedGoods(db.Model):
     production_date = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     batch_number = db.Column(db.String(50))
+    first_bag_serial = db.Column(db.Integer)  # per-batch bag serial range for labels
+    last_bag_serial = db.Column(db.Integer)
 
     # Relationships
     product = db.relationship('Product', backref='finished_goods')
     storage = db.relationship('FinishedGoodsStorage', backref='stored_goods')
 
+    __table_args__ = (
+        db.Index('ix_finished_goods_batch', 'batch_number', 'last_bag_serial'),
+    )
+
 class SalesOrder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
@@ -286,6 +292,8 @@ class SalesDispatch(db.Model):
     vehicle_number = db.Column(db.String(20))
     driver_name = db.Column(db.String(100))
     notes = db.Column(db.Text)
+    bag_weight_kg = db.Column(db.Float)
+    bag_count = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.String(100))
 
@@ -302,10 +310,12 @@ class DispatchItem(db.Model):
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    role = db.Column(db.String(50), nullable=False)  # admin, operator, lab_instructor, production_manager
+    role = db.Column(db.String(50), nullable=False)  # gate, lab, production, packing, dispatch, admin
     phone = db.Column(db.String(20))
     is_blocked = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    password_hash = db.Column(db.String(255))  # users without one cannot sign in
+    last_login_at = db.Column(db.DateTime)
 
 class CleaningReminder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -532,6 +542,7 @@ class ProductionMachine(db.Model):
     location = db.Column(db.String(100))
     cleaning_frequency_hours = db.Column(db.Float, default=3.0)  # Changed to Float for minutes support (0.08 = 5 min, 0.03 = 2 min)
     cleaning_frequency_minutes = db.Column(db.Integer, default=180)  # Frequency in minutes (5 min for 24h, 2 min for 12h)
+    rated_kg_per_hour = db.Column(db.Float)  # ideal throughput, the basis of the OEE performance figure
     last_cleaned = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='operational')
     is_active = db.Column(db.Boolean, default=False)  # Active during process
@@ -603,4 +614,373 @@ class ProductionOrderTracking(db.Model):
     grinding_output_kg = db.Column(db.Float)
     grinding_bran_percentage = db.Column(db.Float)
     packing_total_bags = db.Column(db.Integer)
-    packing_total_weight_kg = db.Column(db.Float)
\ No newline at end of file
+    packing_total_weight_kg = db.Column(db.Float)
+# Lot genealogy - material movements from truck to bag
+class LineageEdge(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    parent_type = db.Column(db.String(50), nullable=False)  # supplier, vehicle, godown, precleaning_bin, production_order, finished_goods
+    parent_id = db.Column(db.Integer, nullable=False)
+    child_type = db.Column(db.String(50), nullable=False)
+    child_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Float)
+    source = db.Column(db.String(50))  # vehicle_entry, weight_entry, precleaning, production_plan, production_transfer, packing
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_lineage_edge_parent', 'parent_type', 'parent_id'),
+        db.Index('ix_lineage_edge_child', 'child_type', 'child_id'),
+    )
+
+# Transitive closure of LineageEdge so forward/backward lookups are a single indexed query
+class LineageClosure(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    ancestor_type = db.Column(db.String(50), nullable=False)
+    ancestor_id = db.Column(db.Integer, nullable=False)
+    descendant_type = db.Column(db.String(50), nullable=False)
+    descendant_id = db.Column(db.Integer, nullable=False)
+    depth = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('ancestor_type', 'ancestor_id', 'descendant_type', 'descendant_id', name='uq_lineage_closure_pair'),
+        db.Index('ix_lineage_closure_descendant', 'descendant_type', 'descendant_id', 'ancestor_type'),
+    )
+
+# Printable barcode label sheets generated in the background after packing
+class LabelSheet(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('production_job_new.id'), nullable=False)
+    batch_number = db.Column(db.String(50), nullable=False)
+    label_format = db.Column(db.String(10), default='zpl')  # zpl, pdf
+    serial_start = db.Column(db.Integer, nullable=False)
+    serial_end = db.Column(db.Integer, nullable=False)
+    file_name = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    job = db.relationship('ProductionJobNew', backref=db.backref('label_sheets', lazy=True))
+
+# Finished goods inventory - materialised stock per (storage area, product, bag weight)
+class FinishedGoodsStock(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    storage_area_id = db.Column(db.Integer, db.ForeignKey('storage_area.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    bag_weight_kg = db.Column(db.Float, nullable=False)
+    bag_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity_kg = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    storage_area = db.relationship('StorageArea', backref=db.backref('stock_balances', lazy=True))
+    product = db.relationship('Product', backref=db.backref('stock_balances', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('storage_area_id', 'product_id', 'bag_weight_kg', name='uq_finished_goods_stock_key'),
+        db.Index('ix_finished_goods_stock_product', 'product_id', 'bag_weight_kg', 'bag_count'),
+    )
+
+# Remaining bags of a packed lot in a storage area, consumed oldest first on dispatch
+class FinishedGoodsLot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    finished_goods_id = db.Column(db.Integer, db.ForeignKey('finished_goods.id'), nullable=False)
+    storage_area_id = db.Column(db.Integer, db.ForeignKey('storage_area.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    bag_weight_kg = db.Column(db.Float, nullable=False)
+    bags_remaining = db.Column(db.Integer, nullable=False, default=0)
+    production_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    finished_goods = db.relationship('FinishedGoods', backref=db.backref('lots', lazy=True))
+    storage_area = db.relationship('StorageArea', backref=db.backref('lots', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_finished_goods_lot_fifo', 'product_id', 'bag_weight_kg', 'storage_area_id', 'production_date'),
+    )
+
+# Which lots a dispatch was filled from
+class DispatchAllocation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sales_dispatch_id = db.Column(db.Integer, db.ForeignKey('sales_dispatch.id'), nullable=False)
+    finished_goods_id = db.Column(db.Integer, db.ForeignKey('finished_goods.id'), nullable=False)
+    storage_area_id = db.Column(db.Integer, db.ForeignKey('storage_area.id'), nullable=False)
+    bag_count = db.Column(db.Integer, nullable=False)
+    quantity_kg = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    sales_dispatch = db.relationship('SalesDispatch', backref=db.backref('allocations', lazy=True))
+    finished_goods = db.relationship('FinishedGoods', backref=db.backref('dispatch_allocations', lazy=True))
+
+# Run history of background jobs that only the scheduler leader executes
+class ScheduledJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), unique=True, nullable=False)
+    trigger = db.Column(db.String(200))
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+    last_duration_ms = db.Column(db.Float)
+    last_status = db.Column(db.String(20))  # running, success, failed
+    last_error = db.Column(db.Text)
+    last_worker = db.Column(db.String(100))  # hostname:pid of the leader that ran it
+    run_count = db.Column(db.Integer, default=0)
+    failure_count = db.Column(db.Integer, default=0)
+
+# Durable queue of slow work taken off the request path; picked up by the task worker
+class BackgroundTask(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text)  # JSON keyword arguments for the task
+    status = db.Column(db.String(20), default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=5)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    result = db.Column(db.Text)  # JSON return value
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_background_task_ready', 'status', 'run_after'),
+    )
+
+# Write counter per master table, bumped in the writing transaction; cached master lists are keyed by it
+class TableVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), unique=True, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Form submission replayed from an offline device; the key makes every replay of the same event a no-op
+class SyncEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)  # vehicle_entry, quality_test, packing
+    device_id = db.Column(db.String(64))
+    recorded_at = db.Column(db.DateTime)  # when the operator submitted it on the device
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    result = db.Column(db.Text)  # JSON returned to the device, replayed for duplicates
+
+# Key of a state-changing request and a summary of its first response, replayed to repeats until it expires
+class IdempotencyKey(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of method, path and client key or request fingerprint
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='processing')  # processing, completed
+    response_status = db.Column(db.Integer)
+    response_headers = db.Column(db.Text)  # JSON list of [name, value]
+    response_body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Named counter behind order, job, batch and dispatch numbers; workers take values from it in blocks
+class SequenceCounter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    value = db.Column(db.BigInteger, nullable=False, default=0)  # last value handed out
+
+# Schema migration from migrations.MIGRATIONS that has been applied to this database
+class SchemaMigration(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(20), unique=True, nullable=False)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_ms = db.Column(db.Float)
+
+# Run, cleaning and idle time and output of one machine over a 15-minute or 1-hour bucket; buckets with no activity are not stored
+class MachineBucket(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    machine_id = db.Column(db.Integer, db.ForeignKey('production_machine.id'), nullable=False)
+    bucket_minutes = db.Column(db.Integer, nullable=False)  # 15 or 60
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    run_seconds = db.Column(db.Float, nullable=False, default=0)
+    cleaning_seconds = db.Column(db.Float, nullable=False, default=0)
+    idle_seconds = db.Column(db.Float, nullable=False, default=0)
+    throughput_kg = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('machine_id', 'bucket_minutes', 'bucket_start', name='uq_machine_bucket'),
+        db.Index('ix_machine_bucket_range', 'bucket_minutes', 'bucket_start'),
+    )
+
+# Progress of an incremental aggregation: folded up to computed_to, with older events changed since dirty_from
+class AggregationCursor(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False)
+    computed_to = db.Column(db.DateTime)
+    dirty_from = db.Column(db.DateTime)
+
+# Weighbridge indicator: the vehicle called onto it and the latest weight its ingestion service read
+class Weighbridge(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'))  # vehicle the operator called onto the bridge
+    visit_stage = db.Column(db.String(10))  # before/after: which weight the vehicle now on the bridge is giving
+    live_weight = db.Column(db.Float)
+    live_stable = db.Column(db.Boolean, default=False)
+    live_at = db.Column(db.DateTime)
+    last_reading_id = db.Column(db.Integer)
+
+    vehicle = db.relationship('Vehicle')
+
+# Stable weight detected by the weighbridge ingestion service, and the vehicle weight it was recorded as
+class WeighbridgeReading(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    weighbridge_id = db.Column(db.Integer, db.ForeignKey('weighbridge.id'), nullable=False)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'))  # None when no vehicle was waiting unambiguously
+    stage = db.Column(db.String(10))  # before (loaded), after (empty)
+    weight = db.Column(db.Float, nullable=False)
+    std_dev = db.Column(db.Float)  # spread of the window the weight was taken from
+    captured_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_weighbridge_reading_bridge', 'weighbridge_id', 'id'),
+    )
+
+# Sensor reporting into the telemetry store (moisture, temperature, bin level, B1 scale flow)
+class Sensor(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)  # e.g. moisture.cleaning_bin.3
+    kind = db.Column(db.String(30))  # moisture, temperature, bin_level, b1_flow
+    unit = db.Column(db.String(20))
+    last_value = db.Column(db.Float)
+    last_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Raw samples of one sensor within one minute, packed as float32 arrays (seconds into the minute, then values)
+class SensorChunk(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensor.id'), nullable=False)
+    minute = db.Column(db.DateTime, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_sensor_chunk_range', 'sensor_id', 'minute'),
+    )
+
+# Count, min, max and sum of one sensor's samples over a 1-minute, 15-minute or 1-hour bucket
+class SensorRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensor.id'), nullable=False)
+    bucket_seconds = db.Column(db.Integer, nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    sum_value = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('sensor_id', 'bucket_seconds', 'bucket_start', name='uq_sensor_rollup'),
+    )
+
+# Projected hourly level of a godown or precleaning bin over the forecast horizon
+class CapacityForecast(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    container_type = db.Column(db.String(20), nullable=False)  # godown, precleaning_bin
+    container_id = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+    start_at = db.Column(db.DateTime, nullable=False)  # end of the first projected hour
+    level = db.Column(db.Float)  # current stock the projection starts from
+    capacity = db.Column(db.Float)
+    peak_level = db.Column(db.Float)
+    peak_at = db.Column(db.DateTime)
+    full_at = db.Column(db.DateTime)  # first hour at or above the alert level
+    empty_at = db.Column(db.DateTime)  # first hour scheduled draws exceed the stock
+    shortfall = db.Column(db.Float, default=0)
+    levels = db.Column(db.Text)  # JSON list of hourly levels
+
+    __table_args__ = (
+        db.UniqueConstraint('container_type', 'container_id', name='uq_capacity_forecast_container'),
+    )
+
+# Projected overflow or shortfall of a container, open until a later projection no longer shows it
+class CapacityAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    container_type = db.Column(db.String(20), nullable=False)
+    container_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # overflow, shortfall
+    expected_at = db.Column(db.DateTime)
+    level = db.Column(db.Float)  # projected peak level, or the missing quantity for a shortfall
+    capacity = db.Column(db.Float)
+    status = db.Column(db.String(20), default='open')  # open, resolved
+    raised_at = db.Column(db.DateTime, default=datetime.now)
+    resolved_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_capacity_alert_open', 'status', 'container_type', 'container_id'),
+    )
+
+# Searchable copy of a vehicle, order, job, batch or party; kept in step with its source row by search.py
+class SearchDocument(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(30), nullable=False)  # vehicle, production_order, production_job, batch, ...
+    entity_id = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(100), nullable=False)  # number or name shown as the result
+    detail = db.Column(db.String(255))
+    ref = db.Column(db.String(100))  # order number the result links to, where it belongs to an order
+    terms = db.Column(db.Text, nullable=False)  # lowercased numbers and names, numbers also without separators
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='uq_search_document_entity'),
+    )
+
+# Bearer token of a device integration (weighbridge PC, sensor gateway); only the SHA-256 of the token is stored
+class ApiToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    role = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime)
+    revoked_at = db.Column(db.DateTime)
+
+# Append-only record of one row change: the columns that changed, who changed them and from where
+class AuditEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(64), nullable=False)  # table name, e.g. vehicle, production_job_new
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    changes = db.Column(db.Text)  # JSON {column: [old, new]}; old is null on insert, new is null on delete
+    actor = db.Column(db.String(100))  # signed-in user or device token, null for jobs and CLI commands
+    source = db.Column(db.String(100))  # endpoint of the request, or the flask command; null for scheduled jobs
+    occurred_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_audit_event_entity', 'entity_type', 'entity_id', 'occurred_at'),
+        db.Index('ix_audit_event_time', 'occurred_at'),
+    )
+
+# Immutable record of one production action on an order; the order timelines are projected from these
+class ProductionEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)  # no foreign key: events outlive deleted orders
+    job_id = db.Column(db.Integer)
+    stage = db.Column(db.String(50))  # stage of the job, null for order-level events
+    kind = db.Column(db.String(30), nullable=False)  # plan_approved, job_started, job_paused, machine_cleaned, ground, packed, ...
+    data = db.Column(db.Text)  # JSON snapshot of what the action recorded (quantities, operator, machine)
+    actor = db.Column(db.String(100))  # signed-in user or device token, null for jobs and CLI commands
+    occurred_at = db.Column(db.DateTime, nullable=False)  # plant local time, like the job timestamps
+
+    __table_args__ = (
+        db.Index('ix_production_event_order', 'order_id', 'id'),
+        db.Index('ix_production_event_time', 'occurred_at'),
+    )
+
+# Projection of an order's production events: status, per-job state and stage durations, read by the tracking pages
+class OrderTimeline(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, unique=True, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # planned, in_progress, completed
+    current_stage = db.Column(db.String(50))
+    plan_approved_at = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    active_minutes = db.Column(db.Float, default=0)  # running time of all jobs, pauses excluded
+    jobs = db.Column(db.Text)  # JSON list of job states with their transfers, cleanings, grinding and packing
+    stage_minutes = db.Column(db.Text)  # JSON {stage: running minutes}
+    events = db.Column(db.Text)  # JSON list of {at, kind, job_id, stage, actor}
+    event_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime)
@@ -0,0 +1,337 @@
+"""Machine utilisation and OEE folded into 15-minute and 1-hour buckets.
+
+Run time comes from grinding and cleaning processes and from transfer and
+packing jobs, cleaning downtime from machine cleaning logs, and throughput
+from grinding output and packed bags. A process is credited to the machine
+named on it, otherwise to every machine of its stage (output is split
+between them). Cleaning wins over running when they overlap; whatever is
+left of the bucket is idle.
+
+The fold re-computes a trailing window every few minutes, so running
+processes keep extending into new buckets. An edit to something older than
+the window moves the cursor's dirty_from back so the next fold covers it.
+"""
+import os
+from datetime import datetime, timedelta
+from flask import has_app_context
+from sqlalchemy import and_, delete, event, func, insert, or_, select, update
+from app import db
+from db_routing import RoutingSession
+from models import (
+    AggregationCursor, CleaningProcess, GrindingProcess, MachineBucket, MachineCleaningLog, PackingProcess,
+    ProductionJobNew, ProductionMachine
+)
+from scheduling import leader_job
+from serializers import iso
+
+CURSOR = 'machine_buckets'
+BUCKET = timedelta(minutes=15)
+HOUR = timedelta(hours=1)
+# Re-folded on every run; changes older than this mark the cursor dirty instead
+LOOKBACK = timedelta(hours=int(os.environ.get("OEE_LOOKBACK_HOURS", "48")))
+# Folded on the first run, when there is no cursor yet
+INITIAL_DAYS = int(os.environ.get("OEE_INITIAL_DAYS", "31"))
+# An interval left open (never ended) stops counting after this long
+MAX_OPEN = timedelta(hours=48)
+
+# Job stages without their own process rows, and the machine process step they run on
+JOB_STAGES = {'transfer': 'precleaning', 'packing': 'packing'}
+CLEANING_STAGES = {'24_hour': 'cleaning_24h', '12_hour': 'cleaning_12h'}
+
+# Timestamps whose change affects the buckets
+TRACKED_TIMES = {
+    GrindingProcess: ('start_time', 'end_time'),
+    CleaningProcess: ('start_time', 'end_time', 'actual_end_time'),
+    PackingProcess: ('packed_time',),
+    ProductionJobNew: ('started_at', 'completed_at'),
+    MachineCleaningLog: ('cleaning_start_time', 'cleaning_end_time'),
+}
+
+def _floor(moment, step):
+    return datetime.min + (moment - datetime.min) // step * step
+
+def _merge(segments):
+    merged = []
+    for start, end in sorted(segments):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def _length(merged):
+    return sum((end - start).total_seconds() for start, end in merged)
+
+def _overlap(a, b):
+    """Seconds covered by both merged interval lists"""
+    total, i, j = 0.0, 0, 0
+    while i < len(a) and j < len(b):
+        start, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if end > start:
+            total += (end - start).total_seconds()
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+class _Machines:
+    def __init__(self):
+        machines = ProductionMachine.query.all()
+        self.by_name = {m.name.strip().lower(): m.id for m in machines if m.name}
+        self.by_stage = {}
+        for m in machines:
+            self.by_stage.setdefault(m.process_step, []).append(m.id)
+
+    def resolve(self, machine_name, stage):
+        if machine_name and machine_name.strip().lower() in self.by_name:
+            return [self.by_name[machine_name.strip().lower()]]
+        return self.by_stage.get(stage, [])
+
+def _collect(window_start, window_end, now):
+    """(machine ids, 'run' | 'cleaning', start, end, kg) for everything overlapping the window"""
+    from archive import load_history
+    machines = _Machines()
+    earliest = window_start - MAX_OPEN
+    events = []
+
+    def open_end(start):
+        return min(now, start + MAX_OPEN)
+
+    for process in GrindingProcess.query.filter(
+        GrindingProcess.start_time < window_end, GrindingProcess.start_time >= earliest,
+        or_(GrindingProcess.end_time.is_(None), GrindingProcess.end_time > window_start)
+    ):
+        end = process.end_time or open_end(process.start_time)
+        kg = (process.total_output_kg or 0) if process.end_time else 0
+        events.append((machines.resolve(process.machine_name, 'grinding'), 'run', process.start_time, end, kg))
+
+    cleaning_end = func.coalesce(CleaningProcess.actual_end_time, CleaningProcess.end_time)
+    for process in CleaningProcess.query.filter(
+        CleaningProcess.status.in_(['running', 'completed']),
+        CleaningProcess.start_time < window_end, CleaningProcess.start_time >= earliest, cleaning_end > window_start
+    ):
+        end = process.actual_end_time or (min(process.end_time, now) if process.status == 'running' else process.end_time)
+        events.append((machines.resolve(process.machine_name, CLEANING_STAGES.get(process.process_type)), 'run', process.start_time, end, 0))
+
+    for job in ProductionJobNew.query.filter(
+        ProductionJobNew.stage.in_(list(JOB_STAGES)), ProductionJobNew.status.in_(['in_progress', 'completed']),
+        ProductionJobNew.started_at < window_end, ProductionJobNew.started_at >= earliest,
+        or_(ProductionJobNew.completed_at.is_(None), ProductionJobNew.completed_at > window_start)
+    ):
+        end = job.completed_at or open_end(job.started_at)
+        events.append((machines.by_stage.get(JOB_STAGES[job.stage], []), 'run', job.started_at, end, 0))
+
+    for packed_time, kg in db.session.query(PackingProcess.packed_time, PackingProcess.total_packed_kg).filter(
+        PackingProcess.packed_time >= window_start, PackingProcess.packed_time < window_end
+    ):
+        events.append((machines.by_stage.get('packing', []), 'run', packed_time, packed_time, kg or 0))
+
+    # Cleaning logs may already have been archived when an older window is rebuilt
+    for log in load_history(MachineCleaningLog, start=earliest, end=window_end):
+        start = log.cleaning_start_time
+        if log.cleaning_end_time:
+            end = log.cleaning_end_time
+        elif log.cleaning_duration_minutes:
+            end = start + timedelta(minutes=log.cleaning_duration_minutes)
+        elif log.status == 'in_progress':
+            end = open_end(start)
+        else:
+            continue
+        if end > window_start:
+            events.append(([log.machine_id], 'cleaning', start, end, 0))
+    return events
+
+def fold_buckets(window_start, window_end, now):
+    """15-minute buckets {(machine_id, bucket_start): [run, cleaning, idle, kg]} for [window_start, window_end)"""
+    segments = {}  # (machine_id, bucket_start) -> {'run': [...], 'cleaning': [...]}
+    output = {}
+
+    for machine_ids, kind, start, end, kg in _collect(window_start, window_end, now):
+        if not machine_ids or start is None or end is None or end < start:
+            continue
+        share = kg / len(machine_ids)
+        if start == end:
+            # Point event (a packing entry): output only
+            if share and window_start <= start < window_end:
+                for machine_id in machine_ids:
+                    key = (machine_id, _floor(start, BUCKET))
+                    output[key] = output.get(key, 0) + share
+            continue
+
+        duration = (end - start).total_seconds()
+        bucket = _floor(max(start, window_start), BUCKET)
+        while bucket < min(end, window_end):
+            low, high = max(start, bucket), min(end, bucket + BUCKET)
+            for machine_id in machine_ids:
+                key = (machine_id, bucket)
+                segments.setdefault(key, {'run': [], 'cleaning': []})[kind].append((low, high))
+                if share:
+                    output[key] = output.get(key, 0) + share * (high - low).total_seconds() / duration
+            bucket += BUCKET
+
+    buckets = {}
+    for key in set(segments) | set(output):
+        _, bucket = key
+        elapsed = (min(bucket + BUCKET, now) - bucket).total_seconds()
+        kinds = segments.get(key, {'run': [], 'cleaning': []})
+        cleaning = _merge(kinds['cleaning'])
+        run_merged = _merge(kinds['run'])
+        cleaning_s = _length(cleaning)
+        run_s = _length(run_merged) - _overlap(run_merged, cleaning)
+        buckets[key] = [run_s, cleaning_s, max(elapsed - run_s - cleaning_s, 0.0), output.get(key, 0.0)]
+    return buckets
+
+def _hourly(buckets, now):
+    hours = {}
+    for (machine_id, bucket), values in buckets.items():
+        key = (machine_id, _floor(bucket, HOUR))
+        totals = hours.setdefault(key, [0.0, 0.0, 0.0, 0.0])
+        for i in range(4):
+            totals[i] += values[i]
+    # Quarters with no activity are not stored, so idle time is the rest of the elapsed hour
+    for (machine_id, hour), totals in hours.items():
+        elapsed = (min(hour + HOUR, now) - hour).total_seconds()
+        totals[2] = max(elapsed - totals[0] - totals[1], 0.0)
+    return hours
+
+def _rows(buckets, minutes):
+    return [{
+        'machine_id': machine_id, 'bucket_minutes': minutes, 'bucket_start': bucket,
+        'run_seconds': run, 'cleaning_seconds': cleaning, 'idle_seconds': idle, 'throughput_kg': kg
+    } for (machine_id, bucket), (run, cleaning, idle, kg) in buckets.items() if run or cleaning or kg]
+
+def refresh_buckets(since=None, now=None):
+    """Re-fold machine buckets from since (default: the cursor) up to now; returns (window start, rows written)"""
+    now = now or datetime.now()
+    cursor = AggregationCursor.query.filter_by(name=CURSOR).first()
+    if cursor is None:
+        cursor = AggregationCursor(name=CURSOR)
+        db.session.add(cursor)
+
+    if since is None:
+        candidates = [now - LOOKBACK] if cursor.computed_to else [now - timedelta(days=INITIAL_DAYS)]
+        if cursor.computed_to:
+            candidates.append(cursor.computed_to)
+        if cursor.dirty_from:
+            candidates.append(cursor.dirty_from)
+        since = min(candidates)
+    dirty_seen = cursor.dirty_from
+
+    # Whole hours, so every hour bucket in the window is rebuilt from all four of its quarters
+    window_start = _floor(since, HOUR)
+    window_end = _floor(now, BUCKET) + BUCKET
+    quarters = fold_buckets(window_start, window_end, now)
+    rows = _rows(quarters, 15) + _rows(_hourly(quarters, now), 60)
+
+    db.session.execute(delete(MachineBucket).where(MachineBucket.bucket_start >= window_start))
+    if rows:
+        db.session.execute(insert(MachineBucket), rows)
+    cursor.computed_to = now
+    db.session.flush()
+    if dirty_seen is not None:
+        # Leave dirty_from alone if an older change arrived while folding
+        db.session.execute(
+            update(AggregationCursor)
+            .where(AggregationCursor.id == cursor.id, AggregationCursor.dirty_from == dirty_seen)
+            .values(dirty_from=None)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return window_start, len(rows)
+
+@leader_job('refresh_machine_buckets', minutes=5)
+def refresh_machine_buckets():
+    """Fold recent machine activity into the 15-minute and hourly buckets"""
+    return refresh_buckets()
+
+def _changed_times(obj):
+    state = db.inspect(obj)
+    for name in TRACKED_TIMES[type(obj)]:
+        value = getattr(obj, name)
+        if isinstance(value, datetime):
+            yield value
+        for old in state.attrs[name].history.deleted:
+            if isinstance(old, datetime):
+                yield old
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_backdated_changes(session, flush_context):
+    """Move the cursor back when a flush touches activity older than the trailing window"""
+    if not has_app_context():
+        return
+    times = [t for obj in (*session.new, *session.dirty, *session.deleted) if type(obj) in TRACKED_TIMES for t in _changed_times(obj)]
+    if not times:
+        return
+    earliest = min(times)
+    if earliest >= datetime.now() - LOOKBACK:
+        return
+    stmt = update(AggregationCursor).where(
+        AggregationCursor.name == CURSOR,
+        or_(AggregationCursor.dirty_from.is_(None), AggregationCursor.dirty_from > earliest)
+    ).values(dirty_from=earliest)
+    session.connection(bind_arguments={'clause': stmt}).execute(stmt)
+
+def machine_dashboard(start, end, bucket_minutes=60, machine_id=None):
+    """Buckets and OEE totals per machine for [start, end), read in one range query.
+
+    Availability is run time over run plus cleaning time; performance is
+    throughput over the machine's rated_kg_per_hour for its run time. Quality
+    is not recorded per machine, so OEE is availability x performance.
+    """
+    machines = ProductionMachine.query.order_by(ProductionMachine.id)
+    if machine_id is not None:
+        machines = machines.filter(ProductionMachine.id == machine_id)
+    machines = machines.all()
+
+    conditions = [
+        MachineBucket.bucket_minutes == bucket_minutes,
+        MachineBucket.bucket_start >= start,
+        MachineBucket.bucket_start < end
+    ]
+    if machine_id is not None:
+        conditions.append(MachineBucket.machine_id == machine_id)
+    rows = db.session.execute(
+        select(MachineBucket.machine_id, MachineBucket.bucket_start, MachineBucket.run_seconds,
+               MachineBucket.cleaning_seconds, MachineBucket.idle_seconds, MachineBucket.throughput_kg)
+        .where(and_(*conditions))
+        .order_by(MachineBucket.machine_id, MachineBucket.bucket_start)
+    ).all()
+
+    by_machine = {}
+    for row in rows:
+        by_machine.setdefault(row.machine_id, []).append(row)
+
+    span = (min(end, datetime.now()) - start).total_seconds()
+    result = []
+    for machine in machines:
+        buckets = by_machine.get(machine.id, [])
+        run = sum(b.run_seconds for b in buckets)
+        cleaning = sum(b.cleaning_seconds for b in buckets)
+        kg = sum(b.throughput_kg for b in buckets)
+        availability = run / (run + cleaning) if run + cleaning else None
+        performance = None
+        if machine.rated_kg_per_hour and run:
+            performance = kg / (machine.rated_kg_per_hour * run / 3600)
+        result.append({
+            'id': machine.id,
+            'name': machine.name,
+            'process_step': machine.process_step,
+            'status': machine.status,
+            'rated_kg_per_hour': machine.rated_kg_per_hour,
+            'totals': {
+                'run_hours': round(run / 3600, 3),
+                'cleaning_hours': round(cleaning / 3600, 3),
+                'idle_hours': round(max(span - run - cleaning, 0) / 3600, 3),
+                'throughput_kg': round(kg, 2),
+                'availability': round(availability, 4) if availability is not None else None,
+                'performance': round(performance, 4) if performance is not None else None,
+                'oee': round(availability * performance, 4) if availability is not None and performance is not None else None
+            },
+            'buckets': [
+                [iso(b.bucket_start), round(b.run_seconds), round(b.cleaning_seconds), round(b.idle_seconds), round(b.throughput_kg, 2)]
+                for b in buckets
+            ]
+        })
+    return result
@@ -0,0 +1,186 @@
+import json
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app import db
+from auth import has_permission
+from models import Vehicle, QualityTest, ProductionJobNew, SyncEvent
+from utils import save_upload
+
+SYNC_BATCH_LIMIT = 50
+
+# Cached by the service worker at install so operator tablets work without Wi-Fi
+OFFLINE_PAGES = ['core.index', 'intake.vehicle_entry', 'quality.quality_control', 'production.production_execution']
+OFFLINE_MASTER_LISTS = ['suppliers', 'products', 'godowns', 'storage_areas']
+
+def _recorded_at(value):
+    """Device timestamp (ISO 8601, usually UTC) as naive server-local time"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid recorded_at: {value}')
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+
+def record_vehicle_entry(data, files, recorded_at=None):
+    """Register an arriving vehicle from the vehicle entry form. The caller commits."""
+    from genealogy import record_movement
+    vehicle = Vehicle()
+    vehicle.vehicle_number = data['vehicle_number']
+    vehicle.supplier_id = int(data['supplier_id'])
+    vehicle.driver_name = data.get('driver_name')
+    vehicle.driver_phone = data.get('driver_phone')
+    vehicle.bill_photo = save_upload(files.get('bill_photo'), 'bill')
+    vehicle.vehicle_photo_before = save_upload(files.get('vehicle_photo'), 'vehicle')
+    vehicle.arrival_time = recorded_at or datetime.now()
+
+    db.session.add(vehicle)
+    record_movement(('supplier', vehicle.supplier_id), vehicle, source='vehicle_entry')
+    db.session.flush()
+    return {'vehicle_id': vehicle.id}
+
+def record_quality_test(data, files, recorded_at=None):
+    """Record a lab test on a pending vehicle from the quality control form. The caller commits."""
+    vehicle = db.session.get(Vehicle, int(data['vehicle_id']))
+    if vehicle is None:
+        raise ValueError(f"Unknown vehicle: {data['vehicle_id']}")
+
+    quality_test = QualityTest()
+    quality_test.vehicle_id = vehicle.id
+    quality_test.sample_bags_tested = int(data['sample_bags_tested'])
+    quality_test.total_bags = int(data['total_bags'])
+    quality_test.category_assigned = data['category_assigned']
+    quality_test.moisture_content = float(data.get('moisture_content') or 0)
+    quality_test.quality_notes = data.get('quality_notes')
+    quality_test.lab_instructor = data['lab_instructor']
+    quality_test.approved = data.get('approved') == 'on'
+    if recorded_at:
+        quality_test.test_time = recorded_at
+
+    vehicle.status = 'quality_check'
+    vehicle.quality_category = data['category_assigned']
+
+    db.session.add(quality_test)
+    db.session.flush()
+    return {'quality_test_id': quality_test.id}
+
+def _listed(data, key):
+    value = data.get(key)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def record_packing(data, files, recorded_at=None):
+    """Pack and complete a packing job from the packing form (repeated fields arrive as lists). The caller commits."""
+    from packing import pack_batch, create_label_sheet, schedule_label_sheet, LABEL_FORMATS
+    job = db.session.get(ProductionJobNew, int(data['job_id']))
+    if job is None or job.stage != 'packing':
+        raise ValueError(f"Not a packing job: {data['job_id']}")
+    if job.status == 'completed':
+        raise ValueError(f'Packing job {job.job_number} is already completed')
+
+    operator = data['operator_name']
+    product_ids = _listed(data, 'product_id')
+    bag_weights = _listed(data, 'bag_weight')
+    bag_counts = _listed(data, 'bag_count')
+    storage_area_ids = _listed(data, 'storage_area_id')
+    shallow_storages = _listed(data, 'shallow_storage')
+    lines = [{
+        'product_id': product_ids[i],
+        'bag_weight': bag_weights[i] if i < len(bag_weights) else None,
+        'bag_count': bag_counts[i] if i < len(bag_counts) else None,
+        'storage_area_id': storage_area_ids[i] if i < len(storage_area_ids) else None,
+        'shallow_storage': shallow_storages[i] if i < len(shallow_storages) else None
+    } for i in range(len(product_ids))]
+
+    result = pack_batch(job, lines, operator, packing_photo=save_upload(files.get('packing_photo'), 'packing'))
+    if data.get('label_format') in LABEL_FORMATS:
+        label_sheet = create_label_sheet(job, result, data['label_format'])
+        result['label_task_id'] = schedule_label_sheet(label_sheet).id
+        result['label_sheet_id'] = label_sheet.id
+
+    job.status = 'completed'
+    job.completed_at = recorded_at or datetime.now()
+    job.completed_by = operator
+    return result
+
+# Event type -> handler(data, files, recorded_at); each returns a JSON-able result and leaves the commit to the caller
+EVENT_HANDLERS = {
+    'vehicle_entry': record_vehicle_entry,
+    'quality_test': record_quality_test,
+    'packing': record_packing,
+}
+
+# Permission the device's user needs for each event type, as for the form it was recorded from
+EVENT_PERMISSIONS = {
+    'vehicle_entry': 'intake',
+    'quality_test': 'quality',
+    'packing': 'packing',
+}
+
+def _replayed(key):
+    event = SyncEvent.query.filter_by(idempotency_key=key).first()
+    if event is None:
+        return None
+    return {'key': key, 'status': 'duplicate', 'result': json.loads(event.result) if event.result else None}
+
+def apply_event(event, files, device_id=None):
+    """Apply one queued device event exactly once.
+
+    The SyncEvent row and the event's own writes commit together, so a
+    replay (retry after a lost response, or two tabs syncing at once) finds
+    the key and gets the stored result back instead of writing again.
+    Returns a status of applied, duplicate, rejected (bad data, do not
+    retry) or error (retry later).
+    """
+    key = str(event.get('key') or '')
+    if not key or len(key) > 64:
+        return {'key': key, 'status': 'rejected', 'error': 'Missing or invalid idempotency key'}
+
+    replay = _replayed(key)
+    if replay:
+        return replay
+
+    handler = EVENT_HANDLERS.get(event.get('type'))
+    if handler is None:
+        return {'key': key, 'status': 'rejected', 'error': f"Unknown event type: {event.get('type')}"}
+    if not has_permission(EVENT_PERMISSIONS[event['type']]):
+        return {'key': key, 'status': 'rejected', 'error': 'Not permitted for your role'}
+
+    try:
+        recorded_at = _recorded_at(event.get('recorded_at'))
+        result = handler(event.get('data') or {}, files, recorded_at)
+        db.session.add(SyncEvent(
+            idempotency_key=key,
+            event_type=event['type'],
+            device_id=device_id,
+            recorded_at=recorded_at,
+            result=json.dumps(result, default=str)
+        ))
+        db.session.commit()
+        return {'key': key, 'status': 'applied', 'result': result}
+    except IntegrityError:
+        db.session.rollback()
+        # Another request applied the same key first
+        replay = _replayed(key)
+        if replay:
+            return replay
+        return {'key': key, 'status': 'error', 'error': 'Conflicting write, retry'}
+    except (KeyError, ValueError, TypeError) as e:
+        db.session.rollback()
+        return {'key': key, 'status': 'rejected', 'error': f'Missing field: {e}' if isinstance(e, KeyError) else str(e)}
+    except Exception as e:
+        db.session.rollback()
+        return {'key': key, 'status': 'error', 'error': str(e)}
+
+def sync_batch(events, files, device_id=None):
+    """Apply a device's queued events in the order they were recorded.
+
+    Uploaded photos arrive as files named '<key>.<field>'.
+    """
+    results = []
+    for event in events:
+        prefix = f"{event.get('key')}."
+        event_files = {name[len(prefix):]: file for name, file in files.items() if name.startswith(prefix)}
+        results.append(apply_event(event, event_files, device_id))
+    return results
@@ -0,0 +1,276 @@
+import os
+from datetime import datetime
+from sqlalchemy import case, func, insert, update
+from flask import current_app
+from app import db
+from audit import record_insert, record_update
+from models import PackingProcess, FinishedGoods, StorageArea, LabelSheet, Product
+from genealogy import record_movements
+from inventory import receive_lots
+from sequences import reserve
+from tasks import PermanentError
+from timeline import record_packed
+
+LABEL_FORMATS = ('zpl', 'pdf')
+
+def format_bag_serial(batch_number, serial):
+    """Printed serial for a single bag, e.g. BATCH-PO-2025...-20250901-00042"""
+    return f"{batch_number}-{serial:05d}"
+
+def parse_packing_lines(lines):
+    """Validate raw packing lines (dicts from JSON or the packing form) into typed rows"""
+    parsed = []
+    for i, line in enumerate(lines):
+        if not line.get('product_id') or not line.get('bag_weight') or not line.get('bag_count'):
+            continue
+        try:
+            row = {
+                'product_id': int(line['product_id']),
+                'bag_weight': float(line['bag_weight']),
+                'bag_count': int(line['bag_count']),
+                'storage_area_id': int(line['storage_area_id']) if line.get('storage_area_id') else None,
+                'shallow_kg': float(line['shallow_storage']) if line.get('shallow_storage') else 0
+            }
+        except (TypeError, ValueError):
+            raise ValueError(f'Line {i + 1}: product, bag weight and bag count must be numbers')
+        if row['bag_weight'] <= 0 or row['bag_count'] <= 0:
+            raise ValueError(f'Line {i + 1}: bag weight and bag count must be greater than zero')
+        parsed.append(row)
+    return parsed
+
+def pack_batch(job, lines, operator, packing_photo=None):
+    """Record many packing lines for a job in one round of bulk statements.
+
+    Storage areas are loaded once, their balances are bumped with a single
+    aggregated UPDATE, and PackingProcess/FinishedGoods rows are bulk inserted
+    with consecutive bag serial ranges per batch. The caller commits.
+    """
+    if job.status == 'completed':
+        raise ValueError(f'Packing job {job.job_number} is already completed')
+    rows = parse_packing_lines(lines)
+    if not rows:
+        raise ValueError('No packing lines to record')
+
+    storage_ids = {row['storage_area_id'] for row in rows if row['storage_area_id']}
+    if storage_ids:
+        found = {area_id for (area_id,) in db.session.query(StorageArea.id).filter(StorageArea.id.in_(storage_ids)).all()}
+        missing = storage_ids - found
+        if missing:
+            raise ValueError(f'Unknown storage area(s): {", ".join(str(i) for i in sorted(missing))}')
+
+    now = datetime.now()
+    batch_number = f"BATCH-{job.order.order_number}-{now.strftime('%Y%m%d')}"
+    # One counter per batch hands out the whole serial range at once, so two packers on the
+    # same batch never print the same serial; batches packed before it existed seed it
+    serial_start, serial_end = reserve(
+        f'bag_serial:{batch_number}', sum(row['bag_count'] for row in rows),
+        initial=lambda: db.session.query(func.max(FinishedGoods.last_bag_serial)).filter(
+            FinishedGoods.batch_number == batch_number
+        ).scalar() or 0
+    )
+    last_serial = serial_start - 1
+
+    packing_rows = []
+    goods_rows = []
+    area_totals = {}
+
+    for row in rows:
+        total_kg = row['bag_weight'] * row['bag_count']
+        packing_rows.append({
+            'job_id': job.id,
+            'product_id': row['product_id'],
+            'bag_weight_kg': row['bag_weight'],
+            'number_of_bags': row['bag_count'],
+            'total_packed_kg': total_kg,
+            'packed_time': now,
+            'operator_name': operator,
+            'storage_area_id': row['storage_area_id'],
+            'stored_in_shallow_kg': row['shallow_kg'],
+            'packing_photo': packing_photo
+        })
+        goods_rows.append({
+            'order_id': job.order_id,
+            'product_id': row['product_id'],
+            'quantity': total_kg,
+            'storage_type': 'bags',
+            'bag_weight': row['bag_weight'],
+            'bag_count': row['bag_count'],
+            'production_date': now,
+            'created_at': now,
+            'batch_number': batch_number,
+            'first_bag_serial': last_serial + 1,
+            'last_bag_serial': last_serial + row['bag_count']
+        })
+        last_serial += row['bag_count']
+        if row['storage_area_id']:
+            area_totals[row['storage_area_id']] = area_totals.get(row['storage_area_id'], 0) + total_kg
+
+    packing_ids = db.session.scalars(
+        insert(PackingProcess).returning(PackingProcess.id, sort_by_parameter_order=True),
+        packing_rows
+    ).all()
+    record_insert('packing_process', zip(packing_ids, packing_rows))
+    record_packed(job, packing_rows)
+    goods_ids = db.session.scalars(
+        insert(FinishedGoods).returning(FinishedGoods.id, sort_by_parameter_order=True),
+        goods_rows
+    ).all()
+    record_insert('finished_goods', zip(goods_ids, goods_rows))
+
+    if area_totals:
+        areas = db.session.execute(
+            update(StorageArea)
+            .where(StorageArea.id.in_(list(area_totals)))
+            .values(current_stock_kg=func.coalesce(StorageArea.current_stock_kg, 0) + case(area_totals, value=StorageArea.id, else_=0))
+            .returning(StorageArea.id, StorageArea.current_stock_kg)
+            .execution_options(synchronize_session='fetch', stock_update=True)
+        ).all()
+        for area_id, stock_kg in areas:
+            record_update('storage_area', area_id, {'current_stock_kg': (stock_kg - area_totals[area_id], stock_kg)})
+
+    receive_lots([{
+        'finished_goods_id': goods_id,
+        'storage_area_id': row['storage_area_id'],
+        'product_id': row['product_id'],
+        'bag_weight': row['bag_weight'],
+        'bag_count': row['bag_count'],
+        'production_date': now
+    } for goods_id, row in zip(goods_ids, rows)])
+
+    record_movements(
+        ('production_order', job.order_id),
+        [(('finished_goods', goods_id), goods['quantity']) for goods_id, goods in zip(goods_ids, goods_rows)],
+        source='packing'
+    )
+
+    return {
+        'batch_number': batch_number,
+        'lines': len(rows),
+        'total_bags': sum(row['bag_count'] for row in rows),
+        'total_packed_kg': sum(goods['quantity'] for goods in goods_rows),
+        'finished_goods_ids': list(goods_ids),
+        'serial_start': serial_start,
+        'serial_end': serial_end
+    }
+
+def create_label_sheet(job, result, label_format='zpl'):
+    """Add a pending LabelSheet covering the serial range of a pack_batch result"""
+    if label_format not in LABEL_FORMATS:
+        raise ValueError(f'Label format must be one of: {", ".join(LABEL_FORMATS)}')
+    sheet = LabelSheet(
+        job_id=job.id,
+        batch_number=result['batch_number'],
+        label_format=label_format,
+        serial_start=result['serial_start'],
+        serial_end=result['serial_end'],
+        status='pending'
+    )
+    db.session.add(sheet)
+    return sheet
+
+def schedule_label_sheet(sheet):
+    """Queue rendering of a LabelSheet; the task runs once the caller commits"""
+    from tasks import enqueue
+    if sheet.id is None:
+        db.session.flush()
+    return enqueue('generate_label_sheet', sheet_id=sheet.id)
+
+def _label_rows(sheet):
+    """Yield (serial_text, product_name, bag_weight) for every bag on the sheet"""
+    goods = db.session.query(FinishedGoods, Product.name).join(Product, FinishedGoods.product_id == Product.id).filter(
+        FinishedGoods.batch_number == sheet.batch_number,
+        FinishedGoods.last_bag_serial >= sheet.serial_start,
+        FinishedGoods.first_bag_serial <= sheet.serial_end
+    ).order_by(FinishedGoods.first_bag_serial).all()
+
+    for item, product_name in goods:
+        for serial in range(max(item.first_bag_serial, sheet.serial_start), min(item.last_bag_serial, sheet.serial_end) + 1):
+            yield format_bag_serial(sheet.batch_number, serial), product_name, item.bag_weight
+
+def _zpl_text(text):
+    """Field data for ^FH_: command prefixes, the escape itself and control characters as hex bytes"""
+    return ''.join(
+        ''.join(f'_{byte:02X}' for byte in char.encode('utf-8')) if char in '^~_' or ord(char) < 32 else char
+        for char in str(text)
+    )
+
+def render_zpl(sheet):
+    """One ZPL label per bag with a Code 128 barcode of the bag serial"""
+    batch_number = _zpl_text(sheet.batch_number)
+    labels = []
+    for serial_text, product_name, bag_weight in _label_rows(sheet):
+        labels.append(
+            "^XA\n"
+            "^CI28\n"
+            "^CF0,30\n"
+            f"^FO40,30^FH_^FD{_zpl_text(product_name)} {bag_weight:g} kg^FS\n"
+            f"^FO40,70^FH_^FD{batch_number}^FS\n"
+            "^BY2,3,80\n"
+            f"^FO40,110^BCN,80,Y,N,N^FD{serial_text}^FS\n"
+            "^XZ\n"
+        )
+    return ''.join(labels)
+
+def render_pdf(sheet, path):
+    """A4 sheets of 3 x 8 labels with Code 128 barcodes (needs reportlab)"""
+    try:
+        from reportlab.graphics.barcode import code128
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+        from reportlab.pdfgen import canvas
+    except ImportError as e:
+        raise PermanentError('PDF label sheets need the reportlab package; use ZPL labels instead') from e
+
+    page_width, page_height = A4
+    columns, rows = 3, 8
+    label_width = page_width / columns
+    label_height = page_height / rows
+
+    pdf = canvas.Canvas(path, pagesize=A4)
+    for index, (serial_text, product_name, bag_weight) in enumerate(_label_rows(sheet)):
+        position = index % (columns * rows)
+        if index and position == 0:
+            pdf.showPage()
+        x = (position % columns) * label_width + 5 * mm
+        y = page_height - (position // columns + 1) * label_height + 5 * mm
+
+        pdf.setFont('Helvetica-Bold', 9)
+        pdf.drawString(x, y + label_height - 14 * mm, f"{product_name} {bag_weight:g} kg")
+        barcode = code128.Code128(serial_text, barHeight=12 * mm, barWidth=0.25 * mm)
+        barcode.drawOn(pdf, x - 5 * mm, y + 6 * mm)
+        pdf.setFont('Helvetica', 7)
+        pdf.drawString(x, y + 2 * mm, serial_text)
+    pdf.save()
+
+def generate_label_sheet(sheet_id):
+    """Background task: write the label file into the upload folder"""
+    sheet = db.session.get(LabelSheet, sheet_id)
+    if not sheet or sheet.status == 'completed':
+        return None
+
+    try:
+        sheet.status = 'running'
+        db.session.commit()
+
+        file_name = f"labels_{sheet.batch_number}_{sheet.id}.{sheet.label_format}"
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_name)
+        if sheet.label_format == 'pdf':
+            render_pdf(sheet, path)
+        else:
+            with open(path, 'w') as f:
+                f.write(render_zpl(sheet))
+
+        sheet.file_name = file_name
+        sheet.status = 'completed'
+        sheet.completed_at = datetime.now()
+        db.session.commit()
+        return {'file_name': file_name}
+
+    except Exception as e:
+        db.session.rollback()
+        sheet = db.session.get(LabelSheet, sheet_id)
+        sheet.status = 'failed'
+        sheet.error = str(e)
+        db.session.commit()
+        # The task queue retries other errors; a PermanentError fails the task at once
+        raise
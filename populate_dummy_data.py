@@ -1,7 +1,7 @@
 
 from datetime import datetime, timedelta
 import random
-from app import app, db
+from app import create_app, db
 from models import (
     Supplier, GodownType, Godown, PrecleaningBin, Product, Customer, Vehicle,
     QualityTest, Transfer, CleaningMachine, CleaningLog, ProductionOrder,
@@ -11,10 +11,15 @@ from models import (
     CleaningBin, CleaningProcess, GrindingProcess, ProductOutput, PackingProcess,
     StorageArea, StorageTransfer, ProcessReminder
 )
+from migrations import migrate
+from sequences import batch_number, dispatch_number, job_number
+
+app = create_app(run_scheduler=False)
 
 def populate_dummy_data():
     """Populate all tables with comprehensive dummy data"""
     with app.app_context():
+        migrate()
         try:
             # Clear existing data
             print("Clearing existing data...")
@@ -435,7 +440,7 @@ def populate_dummy_data():
                     bag_weight=random.choice([25.0, 30.0, 50.0]),
                     bag_count=random.randint(20, 100),
                     storage_id=random.randint(1, 5),
-                    batch_number=f'BATCH{2025}{1000+i}',
+                    batch_number=batch_number(),
                     production_date=datetime.now() - timedelta(days=random.randint(1, 15))
                 )
                 finished_goods.append(finished_good)
@@ -536,7 +541,7 @@ def populate_dummy_data():
             dispatches = []
             for i in range(10):
                 dispatch = Dispatch(
-                    dispatch_number=f'DISP{2025}{3000+i}',
+                    dispatch_number=dispatch_number(),
                     sales_order_id=random.randint(1, len(sales_orders)),
                     vehicle_id=random.randint(1, 5),
                     dispatch_date=datetime.now() - timedelta(days=random.randint(0, 10)),
@@ -644,7 +649,7 @@ def populate_dummy_data():
             production_jobs = []
             for i in range(6):
                 job = ProductionJobNew(
-                    job_number=f'JOB{datetime.now().strftime("%Y%m%d")}{1000+i}',
+                    job_number=job_number(),
                     order_id=random.randint(1, min(7, len(production_orders))),
                     plan_id=random.randint(1, len(production_plans)),
                     stage=random.choice(['transfer', 'cleaning', 'grinding', 'packing']),
@@ -1,2363 +0,0 @@
-import os
-from datetime import datetime, timedelta
-from flask import request, render_template, redirect, url_for, flash, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
-from app import app, db
-from models import *
-
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def generate_order_number(prefix='ORD'):
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    return f"{prefix}-{timestamp}"
-
-@app.route('/')
-def index():
-    # Dashboard data
-    pending_vehicles = Vehicle.query.filter_by(status='pending').count()
-    quality_check_vehicles = Vehicle.query.filter_by(status='quality_check').count()
-    active_orders = ProductionOrder.query.filter(ProductionOrder.status.in_(['pending', 'planned', 'in_progress'])).count()
-    pending_dispatches = Dispatch.query.filter_by(status='loaded').count()
-
-    # Recent activities
-    recent_vehicles = Vehicle.query.order_by(Vehicle.created_at.desc()).limit(5).all()
-    recent_orders = ProductionOrder.query.order_by(ProductionOrder.created_at.desc()).limit(5).all()
-
-    return render_template('index.html', 
-                         pending_vehicles=pending_vehicles,
-                         quality_check_vehicles=quality_check_vehicles,
-                         active_orders=active_orders,
-                         pending_dispatches=pending_dispatches,
-                         recent_vehicles=recent_vehicles,
-                         recent_orders=recent_orders)
-
-@app.route('/vehicle_entry', methods=['GET', 'POST'])
-def vehicle_entry():
-    if request.method == 'POST':
-        try:
-            # Handle file uploads
-            bill_photo = None
-            vehicle_photo = None
-
-            if 'bill_photo' in request.files:
-                file = request.files['bill_photo']
-                if file and file.filename and file.filename != '' and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"bill_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    bill_photo = filename
-
-            if 'vehicle_photo' in request.files:
-                file = request.files['vehicle_photo']
-                if file and file.filename and file.filename != '' and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"vehicle_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    vehicle_photo = filename
-
-            vehicle = Vehicle()
-            vehicle.vehicle_number = request.form['vehicle_number']
-            vehicle.supplier_id = int(request.form['supplier_id'])
-            vehicle.driver_name = request.form.get('driver_name')
-            vehicle.driver_phone = request.form.get('driver_phone')
-            vehicle.bill_photo = bill_photo
-            vehicle.vehicle_photo_before = vehicle_photo
-            vehicle.arrival_time = datetime.now()
-
-            db.session.add(vehicle)
-            db.session.commit()
-            flash('Vehicle entry recorded successfully!', 'success')
-            return redirect(url_for('vehicle_entry'))
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error recording vehicle entry: {str(e)}', 'error')
-
-    suppliers = Supplier.query.all()
-    pending_vehicles = Vehicle.query.filter_by(status='pending').order_by(Vehicle.arrival_time.desc()).all()
-
-    return render_template('vehicle_entry.html', suppliers=suppliers, vehicles=pending_vehicles)
-
-@app.route('/quality_control', methods=['GET', 'POST'])
-def quality_control():
-    if request.method == 'POST':
-        try:
-            vehicle_id = request.form['vehicle_id']
-            vehicle = Vehicle.query.get_or_404(vehicle_id)
-
-            quality_test = QualityTest()
-            quality_test.vehicle_id = int(vehicle_id)
-            quality_test.sample_bags_tested = int(request.form['sample_bags_tested'])
-            quality_test.total_bags = int(request.form['total_bags'])
-            quality_test.category_assigned = request.form['category_assigned']
-            quality_test.moisture_content = float(request.form.get('moisture_content', 0))
-            quality_test.quality_notes = request.form.get('quality_notes')
-            quality_test.lab_instructor = request.form['lab_instructor']
-            quality_test.approved = request.form.get('approved') == 'on'
-
-            vehicle.status = 'quality_check'
-            vehicle.quality_category = request.form['category_assigned']
-
-            db.session.add(quality_test)
-            db.session.commit()
-            flash('Quality test recorded successfully!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error recording quality test: {str(e)}', 'error')
-
-    pending_vehicles = Vehicle.query.filter_by(status='pending').all()
-    quality_tests = QualityTest.query.join(Vehicle).order_by(QualityTest.test_time.desc()).all()
-
-    return render_template('quality_control.html', vehicles=pending_vehicles, quality_tests=quality_tests)
-
-@app.route('/weight_entry', methods=['GET', 'POST'])
-def weight_entry():
-    if request.method == 'POST':
-        try:
-            vehicle_id = request.form['vehicle_id']
-            vehicle = Vehicle.query.get_or_404(vehicle_id)
-
-            if 'vehicle_photo_after' in request.files:
-                file = request.files['vehicle_photo_after']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    vehicle.vehicle_photo_after = filename
-
-            vehicle.net_weight_before = float(request.form['net_weight_before'])
-            vehicle.net_weight_after = float(request.form['net_weight_after'])
-            vehicle.final_weight = vehicle.net_weight_before - vehicle.net_weight_after
-            vehicle.godown_id = request.form['godown_id']
-            vehicle.status = 'unloaded'
-
-            # Update godown inventory
-            godown = Godown.query.get(vehicle.godown_id)
-            if godown:
-                godown.current_stock += vehicle.final_weight
-
-            db.session.commit()
-            flash('Weight entry recorded and inventory updated!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error recording weight entry: {str(e)}', 'error')
-
-    approved_vehicles = Vehicle.query.filter_by(status='approved', owner_approved=True).all()
-    godowns = Godown.query.all()
-
-    return render_template('weight_entry.html', vehicles=approved_vehicles, godowns=godowns)
-
-@app.route('/precleaning', methods=['GET', 'POST'])
-def precleaning():
-    if request.method == 'POST':
-        try:
-            # Handle file uploads
-            transfer_photo = None
-
-            if 'transfer_photo' in request.files:
-                file = request.files['transfer_photo']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"transfer_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    transfer_photo = filename
-
-            transfer = Transfer()
-            transfer.from_godown_id = int(request.form['from_godown_id'])
-            transfer.to_precleaning_bin_id = int(request.form['to_precleaning_bin_id'])
-            transfer.quantity = float(request.form['quantity'])
-            transfer.transfer_type = 'godown_to_precleaning'
-            transfer.operator = request.form['operator']
-            transfer.notes = request.form.get('notes')
-            transfer.evidence_photo = transfer_photo
-
-            # Update stocks
-            from_godown = Godown.query.get(transfer.from_godown_id)
-            to_bin = PrecleaningBin.query.get(transfer.to_precleaning_bin_id)
-
-            if from_godown and to_bin:
-                from_godown.current_stock -= transfer.quantity
-                to_bin.current_stock += transfer.quantity
-
-            db.session.add(transfer)
-            db.session.commit()
-            flash('Transfer completed successfully!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error processing transfer: {str(e)}', 'error')
-
-    godowns = Godown.query.filter(Godown.current_stock > 0).all()
-    precleaning_bins = PrecleaningBin.query.all()
-    recent_transfers = Transfer.query.filter_by(transfer_type='godown_to_precleaning').order_by(Transfer.transfer_time.desc()).limit(10).all()
-
-    return render_template('precleaning.html', godowns=godowns, precleaning_bins=precleaning_bins, transfers=recent_transfers)
-
-@app.route('/production_orders', methods=['GET', 'POST'])
-def production_orders():
-    if request.method == 'POST':
-        try:
-            order = ProductionOrder()
-            order.order_number = generate_order_number('PO')
-
-            # Handle customer field - check if it's customer_id or customer name
-            if request.form.get('customer_id'):
-                order.customer_id = int(request.form['customer_id'])
-            elif request.form.get('customer'):
-                # If customer name is provided, find or create customer
-                customer_name = request.form['customer']
-                customer = Customer.query.filter_by(company_name=customer_name).first()
-                if customer:
-                    order.customer_id = customer.id
-                else:
-                    # Create new customer with minimal info
-                    new_customer = Customer(company_name=customer_name)
-                    db.session.add(new_customer)
-                    db.session.flush()
-                    order.customer_id = new_customer.id
-
-            order.quantity = float(request.form['quantity'])
-
-            # Handle product field - check if it's product_id or product name
-            if request.form.get('product_id'):
-                product = Product.query.get(int(request.form['product_id']))
-                order.product = product.name if product else 'Unknown Product'
-            elif request.form.get('product'):
-                order.product = request.form['product']
-
-            order.finished_good_type = request.form.get('finished_good_type')
-            order.deadline = datetime.strptime(request.form['deadline'], '%Y-%m-%d') if request.form.get('deadline') else None
-            order.priority = request.form.get('priority', 'normal')
-            order.description = request.form.get('notes')  # Map notes to description
-            order.created_by = request.form.get('created_by', 'System')
-            order.target_completion = datetime.strptime(request.form['target_completion'], '%Y-%m-%d') if request.form.get('target_completion') else None
-
-            db.session.add(order)
-            db.session.commit()
-            flash('Production order created successfully!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            print(f"Production order creation error: {str(e)}")  # Debug print
-            flash(f'Error creating production order: {str(e)}', 'error')
-
-    orders = ProductionOrder.query.order_by(ProductionOrder.created_at.desc()).all()
-    customers = Customer.query.all()
-    products = Product.query.filter_by(category='Main Product').all()
-
-    return render_template('production_orders.html', orders=orders, customers=customers, products=products)
-
-@app.route('/production_planning')
-@app.route('/production_planning/<int:order_id>', methods=['GET', 'POST'])
-def production_planning(order_id=None):
-    order = None
-    existing_plan = None
-
-    if order_id:
-        order = ProductionOrder.query.get_or_404(order_id)
-        existing_plan = ProductionPlan.query.filter_by(order_id=order_id).first()
-
-    if request.method == 'POST' and order:
-        try:
-            # Create production plan
-            plan = ProductionPlan()
-            plan.order_id = order_id
-            plan.planned_by = request.form['planned_by']
-            db.session.add(plan)
-            db.session.flush()  # Get the plan ID
-
-            total_percentage = 0
-            precleaning_bins = request.form.getlist('precleaning_bin_id')
-            percentages = request.form.getlist('percentage')
-
-            for i, bin_id in enumerate(precleaning_bins):
-                if bin_id and percentages[i]:
-                    percentage = float(percentages[i])
-                    quantity = (percentage / 100) * order.quantity
-
-                    plan_item = ProductionPlanItem()
-                    plan_item.plan_id = plan.id
-                    plan_item.precleaning_bin_id = int(bin_id)
-                    plan_item.percentage = percentage
-                    plan_item.quantity = quantity
-                    db.session.add(plan_item)
-                    total_percentage += percentage
-
-            if abs(total_percentage - 100) > 0.1:
-                flash('Total percentage must equal 100%!', 'error')
-                db.session.rollback()
-                return redirect(url_for('production_planning', order_id=order_id))
-
-            plan.total_percentage = total_percentage
-            plan.status = 'approved'
-            order.status = 'planned'
-
-            db.session.commit()
-            flash('Production plan created successfully!', 'success')
-            return redirect(url_for('production_orders'))
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error creating production plan: {str(e)}', 'error')
-
-    # Data for template
-    orders = ProductionOrder.query.filter_by(status='pending').all()
-    precleaning_bins = PrecleaningBin.query.filter(PrecleaningBin.current_stock > 0).all()
-    bins = precleaning_bins  # For sidebar display
-    plans = ProductionPlan.query.order_by(ProductionPlan.planning_date.desc()).limit(10).all()
-    products = Product.query.filter_by(category='Main Product').all()
-
-    return render_template('production_planning.html', 
-                         order=order, 
-                         orders=orders, 
-                         precleaning_bins=precleaning_bins,
-                         bins=bins, 
-                         plans=plans, 
-                         products=products,
-                         existing_plan=existing_plan)
-
-@app.route('/edit_production_order/<int:order_id>', methods=['GET', 'POST'])
-def edit_production_order(order_id):
-    order = ProductionOrder.query.get_or_404(order_id)
-    
-    if request.method == 'POST':
-        try:
-            order.quantity = float(request.form['quantity'])
-            order.product = request.form.get('product')
-            order.finished_good_type = request.form.get('finished_good_type')
-            order.deadline = datetime.strptime(request.form['deadline'], '%Y-%m-%d') if request.form.get('deadline') else None
-            order.priority = request.form.get('priority', 'normal')
-            order.description = request.form.get('notes')
-            order.target_completion = datetime.strptime(request.form['target_completion'], '%Y-%m-%d') if request.form.get('target_completion') else None
-            
-            db.session.commit()
-            flash('Production order updated successfully!', 'success')
-            return redirect(url_for('production_orders'))
-            
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error updating production order: {str(e)}', 'error')
-    
-    customers = Customer.query.all()
-    products = Product.query.filter_by(category='Main Product').all()
-    return render_template('edit_production_order.html', order=order, customers=customers, products=products)
-
-@app.route('/delete_production_order/<int:order_id>', methods=['POST'])
-def delete_production_order(order_id):
-    try:
-        order = ProductionOrder.query.get_or_404(order_id)
-        db.session.delete(order)
-        db.session.commit()
-        flash('Production order deleted successfully!', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error deleting production order: {str(e)}', 'error')
-    return redirect(url_for('production_orders'))
-
-@app.route('/reports')
-def reports():
-    # Various report data
-    vehicle_stats = db.session.query(
-        Vehicle.status, 
-        db.func.count(Vehicle.id).label('count')
-    ).group_by(Vehicle.status).all()
-
-    godown_inventory = Godown.query.join(GodownType).all()
-
-    production_stats = db.session.query(
-        ProductionOrder.status,
-        db.func.count(ProductionOrder.id).label('count')
-    ).group_by(ProductionOrder.status).all()
-
-    return render_template('reports.html', 
-                         vehicle_stats=vehicle_stats,
-                         godown_inventory=godown_inventory,
-                         production_stats=production_stats)
-
-@app.route('/masters', methods=['GET', 'POST'])
-def masters():
-    if request.method == 'POST':
-        try:
-            form_type = request.form.get('form_type')
-            
-            if form_type == 'supplier':
-                supplier = Supplier()
-                supplier.company_name = request.form['company_name']
-                supplier.contact_person = request.form.get('contact_person')
-                supplier.phone = request.form.get('phone')
-                supplier.address = request.form.get('address')
-                supplier.city = request.form.get('city')
-                supplier.state = request.form.get('state')
-                supplier.postal_code = request.form.get('postal_code')
-                db.session.add(supplier)
-                flash('Supplier added successfully!', 'success')
-                
-            elif form_type == 'customer':
-                customer = Customer()
-                customer.company_name = request.form['company_name']
-                customer.contact_person = request.form.get('contact_person')
-                customer.phone = request.form.get('phone')
-                customer.email = request.form.get('email')
-                customer.address = request.form.get('address')
-                customer.city = request.form.get('city')
-                customer.state = request.form.get('state')
-                customer.postal_code = request.form.get('postal_code')
-                db.session.add(customer)
-                flash('Customer added successfully!', 'success')
-                
-            elif form_type == 'product':
-                product = Product()
-                product.name = request.form['name']
-                product.category = request.form.get('category', 'Main Product')
-                product.description = request.form.get('description')
-                db.session.add(product)
-                flash('Product added successfully!', 'success')
-                
-            elif form_type == 'godown_type':
-                godown_type = GodownType()
-                godown_type.name = request.form['name']
-                godown_type.description = request.form.get('description')
-                db.session.add(godown_type)
-                flash('Godown type added successfully!', 'success')
-                
-            db.session.commit()
-            
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error adding record: {str(e)}', 'error')
-            
-        return redirect(url_for('masters'))
-
-    suppliers = Supplier.query.all()
-    customers = Customer.query.all()
-    products = Product.query.all()
-    godown_types = GodownType.query.all()
-
-    return render_template('masters.html',
-                         suppliers=suppliers,
-                         customers=customers,
-                         products=products,
-                         godown_types=godown_types)
-
-@app.route('/godown_management', methods=['GET', 'POST'])
-def godown_management():
-    if request.method == 'POST':
-        try:
-            godown = Godown()
-            godown.name = request.form['name']
-            godown.type_id = int(request.form['type_id'])
-            godown.capacity = float(request.form.get('capacity', 0))
-            godown.current_stock = float(request.form.get('current_stock', 0))
-            
-            db.session.add(godown)
-            db.session.commit()
-            flash('Godown added successfully!', 'success')
-            
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error adding godown: {str(e)}', 'error')
-            
-        return redirect(url_for('godown_management'))
-
-    godowns = Godown.query.join(GodownType).all()
-    godown_types = GodownType.query.all()
-
-    return render_template('godown_management.html', godowns=godowns, godown_types=godown_types)
-
-@app.route('/cleaning_management', methods=['GET', 'POST'])
-def cleaning_management():
-    if request.method == 'POST':
-        try:
-            # Handle photo uploads
-            photo_before = None
-            photo_after = None
-
-            if 'photo_before' in request.files:
-                file = request.files['photo_before']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"before_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    photo_before = filename
-
-            if 'photo_after' in request.files:
-                file = request.files['photo_after']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    photo_after = filename
-
-            cleaning_log = CleaningLog()
-            cleaning_log.machine_id = int(request.form['machine_id'])
-            cleaning_log.cleaned_by = request.form['cleaned_by']
-            cleaning_log.photo_before = photo_before
-            cleaning_log.photo_after = photo_after
-            cleaning_log.waste_collected = float(request.form.get('waste_collected', 0))
-            cleaning_log.notes = request.form.get('notes')
-
-            # Update machine's last cleaned time
-            machine = CleaningMachine.query.get(request.form['machine_id'])
-            if machine:
-                machine.last_cleaned = datetime.now()
-
-            db.session.add(cleaning_log)
-            db.session.commit()
-            flash('Cleaning log recorded successfully!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error recording cleaning log: {str(e)}', 'error')
-
-    machines = CleaningMachine.query.all()
-    recent_logs = CleaningLog.query.join(CleaningMachine).order_by(CleaningLog.cleaning_time.desc()).limit(20).all()
-
-    # Check for machines due for cleaning
-    due_machines = []
-    for machine in machines:
-        if machine.last_cleaned:
-            next_cleaning = machine.last_cleaned + timedelta(hours=machine.cleaning_frequency_hours)
-            if datetime.now() >= next_cleaning:
-                due_machines.append(machine)
-        else:
-            due_machines.append(machine)  # Never cleaned
-
-    return render_template('cleaning_management.html', machines=machines, cleaning_logs=recent_logs, due_machines=due_machines)
-
-@app.route('/sales_dispatch', methods=['GET', 'POST'])
-def sales_dispatch():
-    if request.method == 'POST':
-        try:
-            dispatch = SalesDispatch()
-            dispatch.order_id = int(request.form['order_id'])
-            dispatch.customer_id = int(request.form['customer_id'])
-            dispatch.product_id = int(request.form['product_id'])
-            dispatch.quantity = float(request.form['quantity'])
-            dispatch.dispatch_date = datetime.strptime(request.form['dispatch_date'], '%Y-%m-%d')
-            dispatch.vehicle_number = request.form['vehicle_number']
-            dispatch.driver_name = request.form['driver_name']
-            dispatch.notes = request.form.get('notes')
-
-            db.session.add(dispatch)
-            db.session.commit()
-            flash('Dispatch record created successfully!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error creating dispatch: {str(e)}', 'error')
-
-    completed_orders = ProductionOrder.query.filter_by(status='completed').all()
-    customers = Customer.query.all()
-    products = Product.query.all()
-    dispatches = SalesDispatch.query.order_by(SalesDispatch.created_at.desc()).limit(20).all()
-
-    return render_template('sales_dispatch.html', 
-                         orders=completed_orders, 
-                         customers=customers, 
-                         products=products, 
-                         dispatches=dispatches)
-
-@app.route('/approve_vehicle/<int:vehicle_id>')
-def approve_vehicle(vehicle_id):
-    try:
-        vehicle = Vehicle.query.get_or_404(vehicle_id)
-        vehicle.owner_approved = True
-        vehicle.status = 'approved'
-        db.session.commit()
-        flash('Vehicle approved for unloading!', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error approving vehicle: {str(e)}', 'error')
-    return redirect(url_for('quality_control'))
-
-@app.route('/reject_vehicle/<int:vehicle_id>')
-def reject_vehicle(vehicle_id):
-    try:
-        vehicle = Vehicle.query.get_or_404(vehicle_id)
-        vehicle.status = 'rejected'
-        vehicle.owner_approved = False
-        db.session.commit()
-        flash('Vehicle rejected!', 'warning')
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error rejecting vehicle: {str(e)}', 'error')
-    return redirect(url_for('quality_control'))
-
-@app.route('/production_dashboard')
-def production_dashboard():
-    """Main production management dashboard"""
-    try:
-        # Get dashboard statistics
-        total_orders = ProductionOrder.query.count()
-        active_productions = ProductionJobNew.query.filter(
-            ProductionJobNew.status.in_(['in_progress', 'pending'])
-        ).count()
-        pending_plans = ProductionPlan.query.filter_by(status='draft').count()
-        
-        # Get today's completed orders
-        from datetime import date
-        today = date.today()
-        completed_today = ProductionOrder.query.filter(
-            ProductionOrder.status == 'completed',
-            db.func.date(ProductionOrder.created_at) == today
-        ).count()
-        
-        return render_template('production_dashboard.html',
-                             total_orders=total_orders,
-                             active_productions=active_productions,
-                             pending_plans=pending_plans,
-                             completed_today=completed_today)
-    except Exception as e:
-        flash(f'Error loading dashboard: {str(e)}', 'error')
-        return redirect(url_for('index'))
-
-@app.route('/production_tracking')
-def production_tracking():
-    """General production tracking overview with links to detailed views"""
-    orders = ProductionOrder.query.order_by(ProductionOrder.created_at.desc()).limit(20).all()
-    recent_orders = ProductionOrder.query.order_by(ProductionOrder.created_at.desc()).limit(10).all()
-
-    # Build tracking data for each order
-    tracking_data = []
-    for order in orders:
-        jobs = ProductionJobNew.query.filter_by(order_id=order.id).all()
-        plan = ProductionPlan.query.filter_by(order_id=order.id).first()
-
-        order_data = {
-            'order': order,
-            'plan': plan,
-            'jobs': jobs,
-            'total_jobs': len(jobs),
-            'completed_jobs': len([j for j in jobs if j.status == 'completed']),
-            'in_progress_jobs': len([j for j in jobs if j.status == 'in_progress']),
-            'pending_jobs': len([j for j in jobs if j.status == 'pending'])
-        }
-        tracking_data.append(order_data)
-
-    return render_template('production_tracking.html', tracking_data=tracking_data, recent_orders=recent_orders)
-
-@app.route('/machine_cleaning')
-def machine_cleaning():
-    """General machine cleaning overview"""
-    machines = CleaningMachine.query.all()
-
-    # Get recent cleaning logs
-    recent_logs = MachineCleaningLog.query.join(ProductionMachine).order_by(MachineCleaningLog.cleaning_start_time.desc()).limit(20).all()
-
-    # Get in-progress cleanings
-    in_progress = MachineCleaningLog.query.filter_by(status='in_progress').all()
-
-    # Check for machines due for cleaning
-    due_machines = []
-    for machine in machines:
-        if machine.last_cleaned:
-            next_cleaning = machine.last_cleaned + timedelta(hours=machine.cleaning_frequency_hours)
-            if datetime.now() >= next_cleaning:
-                due_machines.append(machine)
-        else:
-            due_machines.append(machine)  # Never cleaned
-
-    return render_template('machine_cleaning_overview.html', 
-                         machines=machines, 
-                         recent_logs=recent_logs,
-                         in_progress=in_progress, 
-                         due_machines=due_machines)
-
-@app.route('/storage_management')
-def storage_management():
-    """Storage and finished goods management"""
-    storage_areas = StorageArea.query.all()
-    finished_goods = FinishedGoods.query.order_by(FinishedGoods.created_at.desc()).limit(50).all()
-
-    # Calculate storage utilization
-    total_capacity = sum([area.capacity_kg for area in storage_areas])
-    total_current = sum([area.current_stock_kg for area in storage_areas])
-    utilization_percent = (total_current / total_capacity * 100) if total_capacity > 0 else 0
-
-    return render_template('storage_management.html', 
-                         storage_areas=storage_areas,
-                         finished_goods=finished_goods,
-                         total_capacity=total_capacity,
-                         total_current=total_current,
-                         utilization_percent=utilization_percent)
-
-@app.route('/init_data')
-def init_data():
-    """Initialize sample data for testing"""
-    try:
-        # Create sample suppliers if none exist
-        if Supplier.query.count() == 0:
-            suppliers = [
-                Supplier(company_name='ABC Farm Supplies', contact_person='John Doe', phone='9876543210', address='Sample Address 1'),
-                Supplier(company_name='XYZ Agricultural Co.', contact_person='Jane Smith', phone='9876543211', address='Sample Address 2')
-            ]
-            for supplier in suppliers:
-                db.session.add(supplier)
-
-        # Create sample customers if none exist
-        if Customer.query.count() == 0:
-            customers = [
-                Customer(company_name='Sample Customer 1', contact_person='Customer Rep 1', phone='9876543212', address='Customer Address 1'),
-                Customer(company_name='Sample Customer 2', contact_person='Customer Rep 2', phone='9876543213', address='Customer Address 2')
-            ]
-            for customer in customers:
-                db.session.add(customer)
-
-        # Create sample products if none exist
-        if Product.query.count() == 0:
-            products = [
-                Product(name='Wheat Flour', category='Main Product', description='Premium wheat flour'),
-                Product(name='Wheat Bran', category='Bran', description='High quality wheat bran'),
-                Product(name='Fine Flour', category='Main Product', description='Fine wheat flour')
-            ]
-            for product in products:
-                db.session.add(product)
-
-        # Try to create a production machine to test the table structure
-        try:
-            test_machine = ProductionMachine.query.first()
-            if not test_machine:
-                test_machine = ProductionMachine(
-                    name='Test Grinding Machine',
-                    machine_type='grinding',
-                    process_step='grinding',
-                    cleaning_frequency_hours=3.0,
-                    cleaning_frequency_minutes=180
-                )
-                db.session.add(test_machine)
-        except Exception as machine_error:
-            print(f"Column might already exist or error: {machine_error}")
-
-        db.session.commit()
-        flash('Sample data initialized successfully!', 'success')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error initializing sample data: {str(e)}', 'error')
-
-    return redirect(url_for('index'))
-
-@app.route('/production_execution', methods=['GET', 'POST'])
-def production_execution():
-    if request.method == 'POST':
-        try:
-            action = request.form.get('action')
-
-            if action == 'start_job':
-                # Start a new production job
-                plan_id = int(request.form['plan_id'])
-                stage = request.form['stage']
-                operator_name = request.form['operator_name']
-                notes = request.form.get('notes', '')
-
-                plan = ProductionPlan.query.get_or_404(plan_id)
-
-                # Generate unique job number
-                job_number = f"JOB{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-                job = ProductionJobNew()
-                job.job_number = job_number
-                job.order_id = plan.order_id
-                job.plan_id = plan_id
-                job.stage = stage
-                job.status = 'pending'
-                job.started_by = operator_name
-                job.notes = notes
-                job.created_at = datetime.now()
-
-                db.session.add(job)
-                db.session.commit()
-
-                flash(f'Production job {job_number} started successfully!', 'success')
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error processing request: {str(e)}', 'error')
-
-    # Get data for template
-    active_jobs = ProductionJobNew.query.filter(ProductionJobNew.status.in_(['pending', 'in_progress'])).all()
-    approved_plans = ProductionPlan.query.filter_by(status='approved').all()
-    precleaning_bins = PrecleaningBin.query.filter(PrecleaningBin.current_stock > 0).all()
-
-    return render_template('production_execution.html',
-                         active_jobs=active_jobs,
-                         approved_plans=approved_plans,
-                         precleaning_bins=precleaning_bins)
-
-@app.route('/packing_execution/<int:job_id>', methods=['GET', 'POST'])
-def packing_execution(job_id):
-    job = ProductionJobNew.query.get_or_404(job_id)
-
-    # Check for grinding process in this job or related grinding jobs
-    grinding_process = GrindingProcess.query.filter_by(job_id=job_id).first()
-    if not grinding_process:
-        # Look for grinding process in other jobs with the same order_id
-        related_jobs = ProductionJobNew.query.filter_by(order_id=job.order_id, stage='grinding').all()
-        for related_job in related_jobs:
-            grinding_process = GrindingProcess.query.filter_by(job_id=related_job.id).first()
-            if grinding_process:
-                break
-
-    if not grinding_process:
-        flash('Grinding process must be completed before packing!', 'error')
-        return redirect(url_for('production_execution'))
-
-    if request.method == 'POST':
-        try:
-            if request.form.get('action') == 'pack_products':
-                operator = request.form['operator_name']
-
-                # Handle photo upload
-                packing_photo = None
-                if 'packing_photo' in request.files:
-                    file = request.files['packing_photo']
-                    if file and file.filename and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        filename = f"packing_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        packing_photo = filename
-
-                # Process all products from the form (handle multiple products)
-                product_ids = request.form.getlist('product_id')
-                bag_weights = request.form.getlist('bag_weight')
-                bag_counts = request.form.getlist('bag_count')
-                storage_area_ids = request.form.getlist('storage_area_id')
-                shallow_storages = request.form.getlist('shallow_storage')
-
-                total_packed_count = 0
-
-                for i in range(len(product_ids)):
-                    if product_ids[i] and bag_weights[i] and bag_counts[i]:
-                        product_id = int(product_ids[i])
-                        bag_weight = float(bag_weights[i])
-                        number_of_bags = int(bag_counts[i])
-                        storage_area_id = storage_area_ids[i] if i < len(storage_area_ids) and storage_area_ids[i] else None
-                        stored_in_shallow = float(shallow_storages[i]) if i < len(shallow_storages) and shallow_storages[i] else 0
-
-                        # Create packing process
-                        packing = PackingProcess()
-                        packing.job_id = job_id
-                        packing.product_id = product_id
-                        packing.bag_weight_kg = bag_weight
-                        packing.number_of_bags = number_of_bags
-                        packing.total_packed_kg = bag_weight * number_of_bags
-                        packing.operator_name = operator
-                        packing.storage_area_id = int(storage_area_id) if storage_area_id else None
-                        packing.stored_in_shallow_kg = stored_in_shallow
-                        packing.packing_photo = packing_photo
-
-                        # Update storage area stock if selected
-                        if storage_area_id:
-                            storage_area = StorageArea.query.get(int(storage_area_id))
-                            if storage_area:
-                                storage_area.current_stock_kg += packing.total_packed_kg
-
-                        db.session.add(packing)
-
-                        # Create finished goods entry - THIS IS THE FIX FOR FINISHED GOODS DATA
-                        finished_goods = FinishedGoods()
-                        finished_goods.order_id = job.order_id
-                        finished_goods.product_id = product_id
-                        finished_goods.quantity = packing.total_packed_kg
-                        finished_goods.storage_type = 'bags'
-                        finished_goods.bag_weight = bag_weight
-                        finished_goods.bag_count = number_of_bags
-                        finished_goods.batch_number = f"BATCH-{job.order.order_number}-{datetime.now().strftime('%Y%m%d')}"
-
-                        db.session.add(finished_goods)
-                        total_packed_count += 1
-
-                # Mark job as completed
-                job.status = 'completed'
-                job.completed_at = datetime.now()
-                job.completed_by = operator
-
-                db.session.commit()
-
-                flash(f'Packing process completed successfully! Processed {total_packed_count} products.', 'success')
-                return redirect(url_for('production_execution'))
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error in packing process: {str(e)}', 'error')
-
-    products = Product.query.filter_by(category='Main Product').all()
-    storage_areas = StorageArea.query.all()
-    existing_packing = PackingProcess.query.filter_by(job_id=job_id).all()
-
-    # Get finished goods for this order - THIS FIXES THE DATA DISPLAY
-    finished_goods = FinishedGoods.query.filter_by(order_id=job.order_id).all()
-
-    return render_template('packing_execution.html', 
-                         job=job, 
-                         grinding_process=grinding_process,
-                         products=products,
-                         storage_areas=storage_areas,
-                         existing_packing=existing_packing,
-                         finished_goods=finished_goods)
-
-# LIVE PRODUCTION DASHBOARD FOR CONCURRENT OPERATIONS
-@app.route('/live_production_dashboard')
-def live_production_dashboard():
-    """Dashboard showing all concurrent live production operations"""
-
-    # Get all active production jobs
-    active_jobs = ProductionJobNew.query.filter(
-        ProductionJobNew.status.in_(['in_progress', 'pending'])
-    ).order_by(ProductionJobNew.created_at.desc()).all()
-
-    # Get all running cleaning processes
-    running_cleanings = CleaningProcess.query.filter_by(status='running').all()
-
-    # Get all active grinding processes
-    active_grindings = GrindingProcess.query.filter_by(status='pending').all()
-
-    # Get all in-progress machine cleanings
-    active_machine_cleanings = MachineCleaningLog.query.filter_by(status='in_progress').all()
-
-    # Build live operations data
-    live_operations = []
-
-    for job in active_jobs:
-        operation = {
-            'job': job,
-            'type': 'production_job',
-            'order': job.order,
-            'cleaning_processes': CleaningProcess.query.filter_by(job_id=job.id).all(),
-            'grinding_processes': GrindingProcess.query.filter_by(job_id=job.id).all(),
-            'packing_processes': PackingProcess.query.filter_by(job_id=job.id).all(),
-            'machine_cleanings': MachineCleaningLog.query.filter_by(job_id=job.id).all()
-        }
-        live_operations.append(operation)
-
-    # Get concurrent bin operations (multiple bins being used simultaneously)
-    concurrent_bins = CleaningBin.query.filter(
-        CleaningBin.status.in_(['cleaning', 'occupied'])
-    ).all()
-
-    return render_template('live_production_dashboard.html',
-                         live_operations=live_operations,
-                         running_cleanings=running_cleanings,
-                         active_grindings=active_grindings,
-                         active_machine_cleanings=active_machine_cleanings,
-                         concurrent_bins=concurrent_bins)
-
-@app.route('/live_production_monitor')
-def live_production_monitor():
-    """Dedicated live production monitoring view with step controls"""
-    return render_template('live_production_monitor.html')
-
-# PRODUCTION ORDER DETAILS WITH MACHINE CLEANING RECORDS
-@app.route('/order_tracking/<order_number>')
-def order_tracking_detail(order_number):
-    """Display detailed tracking for a specific order"""
-    order = ProductionOrder.query.filter_by(order_number=order_number).first_or_404()
-    plan = ProductionPlan.query.filter_by(order_id=order.id).first()
-    jobs = ProductionJobNew.query.filter_by(order_id=order.id).order_by(ProductionJobNew.created_at).all()
-
-    # Build job details with associated processes INCLUDING MACHINE CLEANING RECORDS
-    job_details = []
-    for job in jobs:
-        # Get machine cleaning logs for this job
-        machine_cleanings = MachineCleaningLog.query.filter_by(job_id=job.id).all()
-
-        # Get cleaning schedules for this job  
-        cleaning_schedules = CleaningSchedule.query.filter_by(job_id=job.id).all()
-
-        # Calculate cleaning statistics
-        completed_cleanings = [c for c in machine_cleanings if c.status == 'completed']
-        total_cleaning_time = sum([c.cleaning_duration_minutes or 0 for c in completed_cleanings])
-
-        job_detail = {
-            'job': job,
-            'transfers': ProductionTransfer.query.filter_by(job_id=job.id).all(),
-            'cleaning_processes': CleaningProcess.query.filter_by(job_id=job.id).all(),
-            'grinding_processes': GrindingProcess.query.filter_by(job_id=job.id).all(),
-            'packing_processes': PackingProcess.query.filter_by(job_id=job.id).all(),
-            'machine_cleanings': machine_cleanings,  # MACHINE CLEANING RECORDS INCLUDED
-            'cleaning_schedules': cleaning_schedules,
-            'cleaning_stats': {
-                'total_cleanings': len(completed_cleanings),
-                'total_cleaning_time_minutes': total_cleaning_time,
-                'pending_cleanings': len([s for s in cleaning_schedules if s.status == 'scheduled']),
-                'cancelled_cleanings': len([s for s in cleaning_schedules if s.status == 'cancelled'])
-            }
-        }
-        job_details.append(job_detail)
-
-    return render_template('order_tracking.html', 
-                         order=order, 
-                         plan=plan, 
-                         job_details=job_details)
-
-# MACHINE CLEANING PROCESS WITH PROPER CONTROLS
-@app.route('/process_machine_cleaning/<int:job_id>', methods=['GET', 'POST'])
-def process_machine_cleaning(job_id):
-    job = ProductionJobNew.query.get_or_404(job_id)
-
-    if request.method == 'POST':
-        try:
-            action = request.form.get('action')
-
-            if action == 'start_cleaning':
-                machine_id = int(request.form['machine_id'])
-
-                # Handle before photo upload
-                before_photo = None
-                if 'before_photo' in request.files:
-                    file = request.files['before_photo']
-                    if file and file.filename and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        filename = f"machine_before_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        before_photo = filename
-
-                # Create cleaning log
-                cleaning_log = MachineCleaningLog(
-                    machine_id=machine_id,
-                    production_order_id=job.order_id,
-                    job_id=job_id,
-                    process_step=job.stage,
-                    cleaned_by=request.form['cleaned_by'],
-                    photo_before=before_photo,
-                    status='in_progress'
-                )
-
-                db.session.add(cleaning_log)
-                db.session.commit()
-
-                flash('Machine cleaning started!', 'success')
-                return redirect(url_for('complete_process_machine_cleaning', log_id=cleaning_log.id))
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error starting machine cleaning: {str(e)}', 'error')
-
-    # Get machines that need cleaning
-    machines = CleaningMachine.query.all()
-
-    # Get pending and recent cleaning logs for this job
-    pending_cleanings = MachineCleaningLog.query.filter_by(
-        job_id=job_id,
-        status='scheduled'
-    ).all()
-
-    recent_logs = MachineCleaningLog.query.filter_by(
-        job_id=job_id
-    ).order_by(MachineCleaningLog.cleaning_start_time.desc()).limit(10).all()
-
-    # Get in-progress cleaning logs for this job
-    in_progress_cleanings = MachineCleaningLog.query.filter_by(
-        job_id=job_id,
-        status='in_progress'
-    ).all()
-
-    return render_template('process_machine_cleaning.html',
-                         job=job,
-                         machines=machines,
-                         pending_cleanings=pending_cleanings,
-                         recent_logs=recent_logs,
-                         in_progress_cleanings=in_progress_cleanings)
-
-@app.route('/complete_process_machine_cleaning/<int:log_id>', methods=['GET', 'POST'])
-def complete_process_machine_cleaning(log_id):
-    log = MachineCleaningLog.query.get_or_404(log_id)
-
-    if request.method == 'POST':
-        try:
-            # Handle after photo upload
-            after_photo = None
-            if 'after_photo' in request.files:
-                file = request.files['after_photo']
-                if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filename = f"machine_after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    after_photo = filename
-
-            # Complete the cleaning log
-            log.cleaning_end_time = datetime.now()
-            log.photo_after = after_photo
-            log.waste_collected_kg = float(request.form.get('waste_collected', 0))
-            log.notes = request.form.get('notes', '')
-            log.status = 'completed'
-
-            # Calculate cleaning duration
-            if log.cleaning_start_time:
-                duration = log.cleaning_end_time - log.cleaning_start_time
-                log.cleaning_duration_minutes = int(duration.total_seconds() / 60)
-
-            # Update machine last cleaned time
-            if log.machine:
-                log.machine.last_cleaned = log.cleaning_end_time
-
-            db.session.commit()
-
-            flash('Machine cleaning completed successfully!', 'success')
-            return redirect(url_for('process_machine_cleaning', job_id=log.job_id))
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error completing machine cleaning: {str(e)}', 'error')
-
-    return render_template('complete_machine_cleaning.html', log=log)
-
-@app.route('/uploads/<filename>')
-def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-# CRUD API Routes for better functionality
-@app.route('/api/delete_supplier/<int:supplier_id>', methods=['POST'])
-def delete_supplier(supplier_id):
-    try:
-        supplier = Supplier.query.get_or_404(supplier_id)
-        db.session.delete(supplier)
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Supplier deleted successfully'})
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)})
-
-@app.route('/api/delete_customer/<int:customer_id>', methods=['POST'])
-def delete_customer(customer_id):
-    try:
-        customer = Customer.query.get_or_404(customer_id)
-        db.session.delete(customer)
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Customer deleted successfully'})
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)})
-
-@app.route('/api/delete_product/<int:product_id>', methods=['POST'])
-def delete_product(product_id):
-    try:
-        product = Product.query.get_or_404(product_id)
-        db.session.delete(product)
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Product deleted successfully'})
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)})
-
-@app.route('/api/delete_godown/<int:godown_id>', methods=['POST'])
-def delete_godown(godown_id):
-    try:
-        godown = Godown.query.get_or_404(godown_id)
-        db.session.delete(godown)
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Godown deleted successfully'})
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)})
-
-@app.route('/api/order_tracking/<order_number>')
-def api_order_tracking(order_number):
-    """API endpoint to get order tracking data"""
-    try:
-        order = ProductionOrder.query.filter_by(order_number=order_number).first()
-        if not order:
-            return jsonify({'success': False, 'error': 'Order not found'}), 404
-            
-        jobs = ProductionJobNew.query.filter_by(order_id=order.id).order_by(ProductionJobNew.created_at).all()
-        
-        # Build job data
-        jobs_data = []
-        for job in jobs:
-            job_data = {
-                'id': job.id,
-                'job_number': job.job_number,
-                'stage': job.stage,
-                'status': job.status,
-                'started_at': job.started_at.isoformat() if job.started_at else None,
-                'completed_at': job.completed_at.isoformat() if job.completed_at else None,
-                'started_by': job.started_by,
-                'completed_by': job.completed_by,
-                'machines_active': job.status == 'in_progress'
-            }
-            jobs_data.append(job_data)
-        
-        order_data = {
-            'id': order.id,
-            'order_number': order.order_number,
-            'customer': order.customer.company_name if order.customer_id else 'N/A',
-            'product': order.product,
-            'quantity': order.quantity,
-            'status': order.status,
-            'created_at': order.created_at.isoformat() if order.created_at else None,
-            'deadline': order.deadline.isoformat() if order.deadline else None
-        }
-        
-        return jsonify({
-            'success': True,
-            'order': order_data,
-            'jobs': jobs_data
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/production_jobs_by_stage')
-def api_production_jobs_by_stage():
-    """API endpoint to get production jobs grouped by stage"""
-    try:
-        jobs_by_stage = {
-            'cleaning_24h': [],
-            'cleaning_12h': [],
-            'grinding': [],
-            'packing': []
-        }
-
-        # Get all active jobs
-        active_jobs = ProductionJobNew.query.filter(
-            ProductionJobNew.status.in_(['pending', 'in_progress'])
-        ).all()
-
-        for job in active_jobs:
-            # Check if previous stage is completed for workflow
-            can_proceed = job.status == 'pending'
-            if job.stage == 'cleaning_12h':
-                # Check if 24h cleaning is completed
-                cleaning_24h_job = ProductionJobNew.query.filter_by(
-                    order_id=job.order_id, 
-                    stage='cleaning_24h', 
-                    status='completed'
-                ).first()
-                can_proceed = can_proceed and bool(cleaning_24h_job)
-            elif job.stage == 'grinding':
-                # Check if 12h cleaning is completed
-                cleaning_12h_job = ProductionJobNew.query.filter_by(
-                    order_id=job.order_id, 
-                    stage='cleaning_12h', 
-                    status='completed'
-                ).first()
-                can_proceed = can_proceed and bool(cleaning_12h_job)
-            elif job.stage == 'packing':
-                # Check if grinding is completed
-                grinding_job = ProductionJobNew.query.filter_by(
-                    order_id=job.order_id, 
-                    stage='grinding', 
-                    status='completed'
-                ).first()
-                can_proceed = can_proceed and bool(grinding_job)
-
-            job_data = {
-                'id': job.id,
-                'job_number': job.job_number,
-                'order_number': job.order.order_number if job.order else 'N/A',
-                'status': job.status,
-                'stage': job.stage,
-                'progress': calculate_job_progress(job),
-                'can_proceed': can_proceed,
-                'is_previous_step': False,
-                'is_running': job.status == 'in_progress',
-                'created_at': job.created_at.strftime('%Y-%m-%d %H:%M') if job.created_at else '',
-                'started_at': job.started_at.strftime('%Y-%m-%d %H:%M') if job.started_at else '',
-                'started_by': job.started_by or '',
-                'completed_at': job.completed_at.strftime('%Y-%m-%d %H:%M') if job.completed_at else '',
-                'completed_by': job.completed_by or ''
-            }
-
-            if job.stage in jobs_by_stage:
-                jobs_by_stage[job.stage].append(job_data)
-
-        return jsonify({
-            'success': True,
-            'data': jobs_by_stage,  # Fix API response format
-            'total_jobs': len(active_jobs)
-        })
-
-    except Exception as e:
-        app.logger.error(f"API error in production_jobs_by_stage: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'jobs': {
-                'cleaning_24h': [],
-                'cleaning_12h': [],
-                'grinding': [],
-                'packing': []
-            }
-        }), 200  # Return 200 but with error flag
-
-@app.route('/api/job_details/<int:job_id>')
-def api_job_details(job_id):
-    """API endpoint to get detailed job information"""
-    try:
-        job = ProductionJobNew.query.get_or_404(job_id)
-
-        job_data = {
-            'id': job.id,
-            'job_number': job.job_number,
-            'order_number': job.order.order_number if job.order else 'N/A',
-            'status': job.status,
-            'stage': job.stage,
-            'created_at': job.created_at.strftime('%Y-%m-%d %H:%M') if job.created_at else '',
-            'started_at': job.started_at.strftime('%Y-%m-%d %H:%M') if job.started_at else '',
-            'started_by': job.started_by,
-            'completed_at': job.completed_at.strftime('%Y-%m-%d %H:%M') if job.completed_at else '',
-            'completed_by': job.completed_by,
-            'notes': job.notes
-        }
-
-        return jsonify({'success': True, 'job': job_data})
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/start_production_execution/<int:order_id>')
-def start_production_execution(order_id):
-    """Start production execution by creating jobs for all stages"""
-    try:
-        order = ProductionOrder.query.get_or_404(order_id)
-        plan = ProductionPlan.query.filter_by(order_id=order_id).first()
-
-        if not plan:
-            flash('No production plan found for this order!', 'error')
-            return redirect(url_for('production_planning', order_id=order_id))
-
-        if plan.status != 'approved':
-            flash('Production plan must be approved before starting execution!', 'error')
-            return redirect(url_for('production_planning', order_id=order_id))
-
-        # Check if jobs already exist
-        existing_jobs = ProductionJobNew.query.filter_by(order_id=order_id).count()
-        if existing_jobs > 0:
-            flash('Production jobs already exist for this order!', 'info')
-            return redirect(url_for('production_execution'))
-
-        # Create jobs for all production stages
-        stages = ['transfer', 'cleaning_24h', 'cleaning_12h', 'grinding', 'packing']
-
-        for i, stage in enumerate(stages):
-            job = ProductionJobNew()
-            job.job_number = f"JOB-{order.order_number}-{stage.upper()}-{datetime.now().strftime('%m%d%H%M')}"
-            job.order_id = order_id
-            job.plan_id = plan.id
-            job.stage = stage
-            job.status = 'pending'
-            job.started_by = 'System'
-            job.notes = f'Auto-created job for {stage} stage'
-            job.created_at = datetime.now()
-
-            db.session.add(job)
-
-        # Update order status
-        order.status = 'in_progress'
-
-        db.session.commit()
-        flash('Production execution started! All jobs have been created.', 'success')
-        return redirect(url_for('production_execution'))
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error starting production execution: {str(e)}', 'error')
-        return redirect(url_for('production_planning', order_id=order_id))
-
-@app.route('/production_execution/cleaning_setup/<int:job_id>')
-def cleaning_setup(job_id):
-    """Set up 24-hour cleaning process"""
-    job = ProductionJobNew.query.get_or_404(job_id)
-    # Get available cleaning bins
-    cleaning_bins = CleaningBin.query.filter_by(status='available').all()
-    return render_template('cleaning_setup.html', job=job, cleaning_bins=cleaning_bins)
-
-@app.route('/production_execution/cleaning_12h_setup/<int:job_id>', methods=['GET', 'POST'])
-def cleaning_12h_setup(job_id):
-    """Set up 12-hour cleaning process"""
-    job = ProductionJobNew.query.get_or_404(job_id)
-    
-    if request.method == 'POST':
-        try:
-            # Get duration from form
-            duration_option = request.form.get('duration_option', '12')
-            if duration_option == 'custom':
-                duration_hours = float(request.form.get('custom_hours', 12))
-            else:
-                duration_hours = float(duration_option)
-
-            # Create 12-hour cleaning process
-            cleaning_process = CleaningProcess()
-            cleaning_process.job_id = job_id
-            cleaning_process.process_type = f'{int(duration_hours)}_hour' if duration_hours == int(duration_hours) else 'custom'
-            cleaning_process.duration_hours = duration_hours
-            cleaning_process.start_time = datetime.now()
-            cleaning_process.end_time = datetime.now() + timedelta(hours=duration_hours)
-            cleaning_process.start_moisture = float(request.form.get('start_moisture', 0)) if request.form.get('start_moisture') else None
-            cleaning_process.target_moisture = float(request.form.get('target_moisture', 0)) if request.form.get('target_moisture') else None
-            cleaning_process.operator_name = request.form['operator_name']
-            cleaning_process.machine_name = request.form.get('machine_name', '12-Hour Cleaning Machine')
-            cleaning_process.status = 'running'
-
-            # Handle cleaning bin assignment if provided
-            if request.form.get('cleaning_bin_id'):
-                cleaning_process.cleaning_bin_id = int(request.form['cleaning_bin_id'])
-                # Update bin status
-                cleaning_bin = CleaningBin.query.get(cleaning_process.cleaning_bin_id)
-                if cleaning_bin:
-                    cleaning_bin.status = 'cleaning'
-
-            # Update job status
-            job.status = 'in_progress'
-            job.started_at = datetime.now()
-            job.started_by = request.form['operator_name']
-
-            db.session.add(cleaning_process)
-            db.session.commit()
-
-            flash(f'{duration_hours}-hour cleaning process started successfully!', 'success')
-            return redirect(url_for('production_execution'))
-
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error starting 12-hour cleaning process: {str(e)}', 'error')
-            return redirect(url_for('cleaning_12h_setup', job_id=job_id))
-    
-    # GET request - show the form
-    cleaning_bins_12h = CleaningBin.query.filter_by(status='available').all()
-    return render_template('cleaning_12h_setup.html', job=job, cleaning_bins_12h=cleaning_bins_12h)
-
-@app.route('/production_execution/b1_scale/<int:job_id>', methods=['GET', 'POST'])
-def b1_scale_process(job_id):
-    """B1 scale and grinding process"""
-    job = ProductionJobNew.query.get_or_404(job_id)
-    
-    if request.method == 'POST':
-        try:
-            action = request.form.get('action')
-            
-            if action == 'start_b1_scale':
-                # Update grinding process with B1 scale info
-                grinding_process = GrindingProcess.query.filter_by(job_id=job_id).first()
-                if not grinding_process:
-                    # Create new grinding process
-                    grinding_process = GrindingProcess()
-                    grinding_process.job_id = job_id
-                    grinding_process.machine_name = 'B1 Scale + Grinding Machine'
-                    grinding_process.start_time = datetime.now()
-                    grinding_process.status = 'in_progress'
-                    db.session.add(grinding_process)
-                
-                # Update B1 scale specific fields
-                grinding_process.b1_scale_operator = request.form['operator_name']
-                grinding_process.b1_scale_start_time = datetime.now()
-                grinding_process.b1_scale_weight_kg = float(request.form['input_weight'])
-                grinding_process.input_quantity_kg = float(request.form['input_weight'])
-                grinding_process.operator_name = request.form['operator_name']
-                
-                # Update job status
-                job.status = 'in_progress'
-                job.started_at = datetime.now()
-                job.started_by = request.form['operator_name']
-                
-                db.session.commit()
-                flash('B1 Scale process started successfully!', 'success')
-                return redirect(url_for('grinding_execution', job_id=job_id))
-                
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error starting B1 scale process: {str(e)}', 'error')
-    
-    # Check if grinding process exists
-    existing_grinding = GrindingProcess.query.filter_by(job_id=job_id).first()
-    
-    # Get or create B1 machine for template
-    b1_machine = B1ScaleCleaning.query.first()
-    if not b1_machine:
-        b1_machine = B1ScaleCleaning(
-            machine_name='B1 Scale',
-            cleaning_frequency_minutes=60,
-            last_cleaned=datetime.now(),
-            status='due'
-        )
-        db.session.add(b1_machine)
-        db.session.commit()
-    
-    # Check if cleaning is required
-    cleaning_required = False
-    if b1_machine.last_cleaned:
-        time_since_cleaned = datetime.now() - b1_machine.last_cleaned
-        if time_since_cleaned.total_seconds() > (b1_machine.cleaning_frequency_minutes * 60):
-            cleaning_required = True
-    else:
-        cleaning_required = True
-    
-    # Calculate time until cleaning
-    time_until_cleaning = 0
-    cleaning_urgent = False
-    if b1_machine.last_cleaned:
-        time_since_cleaned = datetime.now() - b1_machine.last_cleaned
-        time_until_cleaning = (b1_machine.cleaning_frequency_minutes * 60) - time_since_cleaned.total_seconds()
-        time_until_cleaning = max(0, time_until_cleaning / 60)  # Convert to minutes
-        cleaning_urgent = time_until_cleaning <= 5
-    
-    return render_template('b1_scale_process.html', 
-                         job=job, 
-                         existing_grinding=existing_grinding,
-                         b1_machine=b1_machine,
-                         cleaning_required=cleaning_required,
-                         time_until_cleaning=time_until_cleaning,
-                         cleaning_urgent=cleaning_urgent)
-
-@app.route('/grinding_execution/<int:job_id>', methods=['GET', 'POST'])
-def grinding_execution(job_id):
-    """Handle grinding process execution"""
-    job = ProductionJobNew.query.get_or_404(job_id)
-    
-    if request.method == 'POST':
-        try:
-            action = request.form.get('action')
-            
-            if action == 'start_grinding':
-                # Handle photo uploads
-                start_photo = None
-                if 'start_photo' in request.files:
-                    file = request.files['start_photo']
-                    if file and file.filename and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        filename = f"grinding_start_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        start_photo = filename
-                
-                # Create grinding process
-                grinding = GrindingProcess()
-                grinding.job_id = job_id
-                grinding.machine_name = request.form['machine_name']
-                grinding.operator_name = request.form['operator_name']
-                grinding.input_quantity_kg = float(request.form['input_quantity'])
-                grinding.start_time = datetime.now()
-                grinding.start_photo = start_photo
-                grinding.status = 'in_progress'
-                
-                # Update job status
-                job.status = 'in_progress'
-                job.started_at = datetime.now()
-                job.started_by = request.form['operator_name']
-                
-                db.session.add(grinding)
-                db.session.commit()
-                
-                flash('Grinding process started successfully!', 'success')
-                return redirect(url_for('grinding_execution', job_id=job_id))
-                
-            elif action == 'complete_grinding':
-                # Complete the grinding process
-                grinding = GrindingProcess.query.filter_by(job_id=job_id).first()
-                if not grinding:
-                    flash('No grinding process found for this job!', 'error')
-                    return redirect(url_for('grinding_execution', job_id=job_id))
-                
-                # Handle end photo upload
-                end_photo = None
-                if 'end_photo' in request.files:
-                    file = request.files['end_photo']
-                    if file and file.filename and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        filename = f"grinding_end_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        end_photo = filename
-                
-                # Update grinding process with completion data
-                grinding.total_output_kg = float(request.form['total_output'])
-                grinding.main_products_kg = float(request.form['main_products'])
-                grinding.bran_kg = float(request.form['bran'])
-                grinding.bran_percentage = (grinding.bran_kg / grinding.total_output_kg) * 100 if grinding.total_output_kg > 0 else 0
-                grinding.main_products_percentage = (grinding.main_products_kg / grinding.total_output_kg) * 100 if grinding.total_output_kg > 0 else 0
-                grinding.end_time = datetime.now()
-                grinding.end_photo = end_photo
-                grinding.status = 'completed'
-                grinding.notes = request.form.get('notes', '')
-                
-                # Check bran percentage (should be 23-25%)
-                if grinding.bran_percentage > 25:
-                    grinding.bran_percentage_alert = True
-                    flash(f'Warning: Bran percentage ({grinding.bran_percentage:.1f}%) is higher than expected (23-25%)', 'warning')
-                
-                # Update job status
-                job.status = 'completed'
-                job.completed_at = datetime.now()
-                job.completed_by = request.form['operator_name']
-                
-                db.session.commit()
-                
-                flash('Grinding process completed successfully!', 'success')
-                return redirect(url_for('production_execution'))
-                
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error processing grinding: {str(e)}', 'error')
-    
-    # Check if grinding process exists
-    existing_grinding = GrindingProcess.query.filter_by(job_id=job_id).first()
-    
-    return render_template('grinding_execution.html', 
-                         job=job, 
-                         existing_grinding=existing_grinding)
-
-@app.route('/production_execution/packing/<int:job_id>')
-def packing_execution_route(job_id):
-    """Redirect to existing packing execution"""
-    return redirect(url_for('packing_execution', job_id=job_id))
-
-@app.route('/process_cleaning_24h/<int:job_id>', methods=['POST'])
-def process_cleaning_24h(job_id):
-    """Process 24-hour cleaning start"""
-    try:
-        job = ProductionJobNew.query.get_or_404(job_id)
-
-        # Get duration from form
-        duration_option = request.form.get('duration_option', '24')
-        if duration_option == 'custom':
-            duration_hours = float(request.form.get('custom_hours', 24))
-        else:
-            duration_hours = float(duration_option)
-
-        # Create cleaning process
-        cleaning_process = CleaningProcess()
-        cleaning_process.job_id = job_id
-        cleaning_process.process_type = f'{int(duration_hours)}_hour' if duration_hours == int(duration_hours) else 'custom'
-        cleaning_process.duration_hours = duration_hours
-        cleaning_process.start_time = datetime.now()
-        cleaning_process.end_time = datetime.now() + timedelta(hours=duration_hours)
-        cleaning_process.start_moisture = float(request.form.get('initial_moisture', 0)) if request.form.get('initial_moisture') else None
-        cleaning_process.operator_name = request.form['operator_name']
-        cleaning_process.machine_name = request.form.get('machine_name', 'Cleaning Machine')
-        cleaning_process.status = 'running'
-
-        # Handle cleaning bin assignment if provided
-        if request.form.get('cleaning_bin_id'):
-            cleaning_process.cleaning_bin_id = int(request.form['cleaning_bin_id'])
-            # Update bin status
-            cleaning_bin = CleaningBin.query.get(cleaning_process.cleaning_bin_id)
-            if cleaning_bin:
-                cleaning_bin.status = 'cleaning'
-
-        # Update job status
-        job.status = 'in_progress'
-        job.started_at = datetime.now()
-        job.started_by = request.form['operator_name']
-
-        db.session.add(cleaning_process)
-        db.session.commit()
-
-        flash(f'{duration_hours}-hour cleaning process started successfully!', 'success')
-        return redirect(url_for('production_execution'))
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error starting cleaning process: {str(e)}', 'error')
-        return redirect(url_for('cleaning_setup', job_id=job_id))
-
-def calculate_job_progress(job):
-    """Calculate job progress based on stage and status"""
-    try:
-        if job.status == 'completed':
-            return 100
-        elif job.status == 'pending':
-            return 0
-        elif job.status == 'in_progress':
-            # Calculate progress based on stage type
-            if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                cleaning_process = CleaningProcess.query.filter_by(job_id=job.id).first()
-                if cleaning_process:
-                    elapsed = datetime.now() - cleaning_process.start_time
-                    total_duration = timedelta(hours=cleaning_process.duration_hours)
-                    progress = min(100, (elapsed.total_seconds() / total_duration.total_seconds()) * 100)
-                    return int(progress)
-            elif job.stage == 'grinding':
-                grinding_process = GrindingProcess.query.filter_by(job_id=job.id).first()
-                if grinding_process and grinding_process.status == 'running':
-                    return 75  # Running grinding process
-            elif job.stage == 'packing':
-                return 50  # Basic progress for packing
-            return 50  # Default in-progress
-    except Exception:
-        pass
-    return 0
-
-# Enhanced execution control routes
-@app.route('/api/start_grinding/<int:job_id>', methods=['POST'])
-def api_start_grinding(job_id):
-    """API endpoint to start grinding process"""
-    try:
-        job = ProductionJobNew.query.get_or_404(job_id)
-        
-        if job.stage != 'grinding':
-            return jsonify({'success': False, 'message': 'This job is not a grinding job'})
-        
-        if job.status != 'pending':
-            return jsonify({'success': False, 'message': 'Job must be in pending status to start'})
-        
-        # Check if previous stage (12h cleaning) is completed
-        cleaning_12h_job = ProductionJobNew.query.filter_by(
-            order_id=job.order_id, 
-            stage='cleaning_12h', 
-            status='completed'
-        ).first()
-        
-        if not cleaning_12h_job:
-            return jsonify({'success': False, 'message': '12-hour cleaning must be completed before starting grinding'})
-        
-        # Redirect to grinding execution page
-        return jsonify({
-            'success': True, 
-            'redirect_url': url_for('grinding_execution', job_id=job_id),
-            'message': 'Redirecting to grinding execution...'
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/job_control/<int:job_id>/<action>', methods=['POST'])
-def job_control(job_id, action):
-    """Control job execution: pause, resume, complete, cancel"""
-    try:
-        job = ProductionJobNew.query.get_or_404(job_id)
-        data = request.json if request.is_json else request.form
-        operator = data.get('operator_name', 'System')
-        notes = data.get('notes', '')
-        auto_move_next = data.get('auto_move_next', False)
-        
-        if action == 'pause':
-            if job.status == 'in_progress':
-                job.status = 'paused'
-                # Pause related processes
-                if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                    cleaning_process = CleaningProcess.query.filter_by(job_id=job_id, status='running').first()
-                    if cleaning_process:
-                        cleaning_process.status = 'paused'
-                
-                db.session.commit()
-                return jsonify({'success': True, 'message': f'Job {job.job_number} paused successfully'})
-            else:
-                return jsonify({'success': False, 'message': 'Can only pause jobs that are in progress'})
-                
-        elif action == 'resume':
-            if job.status == 'paused':
-                job.status = 'in_progress'
-                # Resume related processes
-                if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                    cleaning_process = CleaningProcess.query.filter_by(job_id=job_id, status='paused').first()
-                    if cleaning_process:
-                        cleaning_process.status = 'running'
-                
-                db.session.commit()
-                return jsonify({'success': True, 'message': f'Job {job.job_number} resumed successfully'})
-            else:
-                return jsonify({'success': False, 'message': 'Can only resume paused jobs'})
-                
-        elif action == 'complete':
-            if job.status in ['in_progress', 'paused']:
-                job.status = 'completed'
-                job.completed_at = datetime.now()
-                job.completed_by = operator
-                if notes:
-                    job.notes = (job.notes or '') + f'\nCompletion notes: {notes}'
-                
-                # Complete related processes
-                if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                    cleaning_process = CleaningProcess.query.filter_by(job_id=job_id).first()
-                    if cleaning_process:
-                        cleaning_process.status = 'completed'
-                        cleaning_process.actual_end_time = datetime.now()
-                        # Free up cleaning bin
-                        if cleaning_process.cleaning_bin_id:
-                            cleaning_bin = CleaningBin.query.get(cleaning_process.cleaning_bin_id)
-                            if cleaning_bin:
-                                cleaning_bin.status = 'available'
-                                
-                elif job.stage == 'grinding':
-                    grinding_process = GrindingProcess.query.filter_by(job_id=job_id).first()
-                    if grinding_process:
-                        grinding_process.status = 'completed'
-                        grinding_process.end_time = datetime.now()
-                
-                # Auto-progression to next step
-                if auto_move_next:
-                    next_stage = get_next_production_stage(job.stage)
-                    if next_stage:
-                        next_job = ProductionJobNew.query.filter_by(
-                            order_id=job.order_id, 
-                            stage=next_stage, 
-                            status='pending'
-                        ).first()
-                        
-                        if next_job:
-                            next_job.status = 'pending'  # Ready to start
-                            db.session.add(next_job)
-                
-                db.session.commit()
-                
-                message = f'Job {job.job_number} completed successfully'
-                if auto_move_next and next_stage:
-                    message += f'. Next stage ({next_stage}) is now ready to start.'
-                
-                return jsonify({'success': True, 'message': message})
-            else:
-                return jsonify({'success': False, 'message': 'Can only complete jobs that are in progress or paused'})
-                
-        elif action == 'cancel':
-            if job.status in ['pending', 'in_progress', 'paused']:
-                job.status = 'cancelled'
-                job.completed_at = datetime.now()
-                job.completed_by = operator
-                if notes:
-                    job.notes = (job.notes or '') + f'\nCancellation notes: {notes}'
-                
-                # Cancel related processes
-                if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                    cleaning_process = CleaningProcess.query.filter_by(job_id=job_id).filter(
-                        CleaningProcess.status.in_(['running', 'paused'])
-                    ).first()
-                    if cleaning_process:
-                        cleaning_process.status = 'cancelled'
-                        if cleaning_process.cleaning_bin_id:
-                            cleaning_bin = CleaningBin.query.get(cleaning_process.cleaning_bin_id)
-                            if cleaning_bin:
-                                cleaning_bin.status = 'available'
-                
-                db.session.commit()
-                return jsonify({'success': True, 'message': f'Job {job.job_number} cancelled successfully'})
-            else:
-                return jsonify({'success': False, 'message': 'Can only cancel jobs that are pending, in progress, or paused'})
-        
-        else:
-            return jsonify({'success': False, 'message': 'Invalid action'}), 400
-            
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-def get_next_production_stage(current_stage):
-    """Get the next production stage in sequence"""
-    stage_sequence = ['transfer', 'cleaning_24h', 'cleaning_12h', 'grinding', 'packing']
-    
-    try:
-        current_index = stage_sequence.index(current_stage)
-        if current_index < len(stage_sequence) - 1:
-            return stage_sequence[current_index + 1]
-    except ValueError:
-        pass
-    
-    return None
-
-@app.route('/api/job_progress/<int:job_id>')
-def job_progress_api(job_id):
-    """Get real-time progress for a specific job"""
-    try:
-        job = ProductionJobNew.query.get_or_404(job_id)
-        
-        progress_data = {
-            'job_id': job.id,
-            'job_number': job.job_number,
-            'stage': job.stage,
-            'status': job.status,
-            'progress': calculate_job_progress(job),
-            'started_at': job.started_at.isoformat() if job.started_at else None,
-            'estimated_completion': None,
-            'current_step': '',
-            'operator': job.started_by,
-            'can_control': job.status in ['pending', 'in_progress', 'paused']
-        }
-        
-        # Add stage-specific details
-        if job.stage in ['cleaning_24h', 'cleaning_12h']:
-            cleaning_process = CleaningProcess.query.filter_by(job_id=job_id).first()
-            if cleaning_process:
-                progress_data['current_step'] = f'{cleaning_process.process_type} cleaning'
-                progress_data['estimated_completion'] = cleaning_process.end_time.isoformat()
-                progress_data['machine'] = cleaning_process.machine_name
-                progress_data['operator'] = cleaning_process.operator_name
-                
-                # Calculate remaining time
-                if cleaning_process.status == 'running':
-                    remaining = cleaning_process.end_time - datetime.now()
-                    if remaining.total_seconds() > 0:
-                        progress_data['time_remaining'] = str(remaining).split('.')[0]  # Remove microseconds
-                    else:
-                        progress_data['time_remaining'] = 'Overdue'
-                        
-        elif job.stage == 'grinding':
-            grinding_process = GrindingProcess.query.filter_by(job_id=job_id).first()
-            if grinding_process:
-                progress_data['current_step'] = 'Grinding process'
-                progress_data['machine'] = grinding_process.machine_name
-                progress_data['operator'] = grinding_process.operator_name
-                if grinding_process.input_quantity_kg:
-                    progress_data['input_quantity'] = grinding_process.input_quantity_kg
-                if grinding_process.total_output_kg:
-                    progress_data['output_quantity'] = grinding_process.total_output_kg
-                    
-        return jsonify({'success': True, 'progress': progress_data})
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/dashboard_stats')
-def api_dashboard_stats():
-    """API endpoint for dashboard statistics"""
-    try:
-        total_orders = ProductionOrder.query.count()
-        active_productions = ProductionJobNew.query.filter(
-            ProductionJobNew.status.in_(['in_progress', 'pending'])
-        ).count()
-        pending_plans = ProductionPlan.query.filter_by(status='draft').count()
-        
-        # Get today's completed orders
-        from datetime import date
-        today = date.today()
-        completed_today = ProductionOrder.query.filter(
-            ProductionOrder.status == 'completed',
-            db.func.date(ProductionOrder.created_at) == today
-        ).count()
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'total_orders': total_orders,
-                'active_productions': active_productions,
-                'pending_plans': pending_plans,
-                'completed_today': completed_today
-            }
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/recent_orders')
-def api_recent_orders():
-    """API endpoint for recent orders"""
-    try:
-        orders = ProductionOrder.query.order_by(
-            ProductionOrder.created_at.desc()
-        ).limit(10).all()
-        
-        orders_data = []
-        for order in orders:
-            orders_data.append({
-                'id': order.id,
-                'order_number': order.order_number,
-                'product': order.product,
-                'status': order.status,
-                'created_at': order.created_at.isoformat() if order.created_at else None
-            })
-        
-        return jsonify({
-            'success': True,
-            'orders': orders_data
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/approved_plans')
-def api_approved_plans():
-    """API endpoint for approved production plans"""
-    try:
-        plans = db.session.query(ProductionPlan, ProductionOrder).join(
-            ProductionOrder, ProductionPlan.order_id == ProductionOrder.id
-        ).filter(ProductionPlan.status == 'approved').all()
-        
-        plans_data = []
-        for plan, order in plans:
-            plans_data.append({
-                'plan_id': plan.id,
-                'order_id': order.id,
-                'order_number': order.order_number,
-                'product': order.product,
-                'quantity': order.quantity
-            })
-        
-        return jsonify({
-            'success': True,
-            'plans': plans_data
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/active_processes')
-def active_processes_api():
-    """Get all active processes for real-time monitoring"""
-    try:
-        active_jobs = ProductionJobNew.query.filter(
-            ProductionJobNew.status.in_(['in_progress', 'paused'])
-        ).all()
-        
-        processes = []
-        for job in active_jobs:
-            process_data = {
-                'job_id': job.id,
-                'job_number': job.job_number,
-                'order_number': job.order.order_number if job.order else '',
-                'stage': job.stage,
-                'status': job.status,
-                'progress': calculate_job_progress(job),
-                'operator': job.started_by,
-                'started_at': job.started_at.isoformat() if job.started_at else None
-            }
-            
-            # Add process-specific details
-            if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                cleaning_process = CleaningProcess.query.filter_by(job_id=job.id).first()
-                if cleaning_process:
-                    process_data['end_time'] = cleaning_process.end_time.isoformat()
-                    process_data['machine'] = cleaning_process.machine_name
-                    
-            elif job.stage == 'grinding':
-                grinding_process = GrindingProcess.query.filter_by(job_id=job.id).first()
-                if grinding_process:
-                    process_data['machine'] = grinding_process.machine_name
-                    
-            processes.append(process_data)
-            
-        return jsonify({'success': True, 'processes': processes})
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/production_pipeline_status')
-def api_production_pipeline_status():
-    """Get overall production pipeline status"""
-    try:
-        stages = ['transfer', 'cleaning_24h', 'cleaning_12h', 'grinding', 'packing']
-        pipeline_status = {}
-        
-        for stage in stages:
-            active_count = ProductionJobNew.query.filter_by(
-                stage=stage, 
-                status='in_progress'
-            ).count()
-            
-            total_count = ProductionJobNew.query.filter_by(stage=stage).filter(
-                ProductionJobNew.status.in_(['pending', 'in_progress', 'paused'])
-            ).count()
-            
-            completed_count = ProductionJobNew.query.filter_by(
-                stage=stage, 
-                status='completed'
-            ).count()
-            
-            pipeline_status[stage] = {
-                'active': active_count,
-                'total': total_count,
-                'completed': completed_count
-            }
-        
-        return jsonify({'success': True, 'pipeline': pipeline_status})
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/job_timer/<int:job_id>')
-def api_job_timer(job_id):
-    """Get real-time timer data for a specific job"""
-    try:
-        job = ProductionJobNew.query.get_or_404(job_id)
-        
-        response_data = {
-            'success': True,
-            'job_id': job.id,
-            'status': job.status,
-            'elapsed_time': '--:--:--',
-            'start_time': job.started_at.isoformat() if job.started_at else None,
-            'cleaning_reminder': None
-        }
-        
-        if job.started_at and job.status == 'in_progress':
-            # Calculate elapsed time
-            elapsed = datetime.now() - job.started_at
-            hours = int(elapsed.total_seconds() // 3600)
-            minutes = int((elapsed.total_seconds() % 3600) // 60)
-            seconds = int(elapsed.total_seconds() % 60)
-            response_data['elapsed_time'] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            
-            # Check for machine cleaning reminders
-            if job.stage in ['cleaning_24h', 'cleaning_12h']:
-                cleaning_frequency_minutes = 5 if job.stage == 'cleaning_24h' else 2
-                elapsed_minutes = elapsed.total_seconds() / 60
-                
-                # Calculate reminder count (how many cleaning cycles have passed)
-                reminder_count = int(elapsed_minutes // cleaning_frequency_minutes)
-                
-                if reminder_count > 0:
-                    # Check if we should show a reminder
-                    time_since_last_reminder = elapsed_minutes % cleaning_frequency_minutes
-                    
-                    # Show reminder in the last 30 seconds of each cycle
-                    should_show = time_since_last_reminder >= (cleaning_frequency_minutes - 0.5)
-                    
-                    response_data['cleaning_reminder'] = {
-                        'reminder_count': reminder_count,
-                        'should_show': should_show,
-                        'frequency_minutes': cleaning_frequency_minutes,
-                        'next_cleaning_in': cleaning_frequency_minutes - time_since_last_reminder
-                    }
-        
-        return jsonify(response_data)
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/cleaning_alerts')
-def api_cleaning_alerts():
-    """Get current machine cleaning alerts"""
-    try:
-        alerts = []
-        
-        # Get all active cleaning processes
-        active_jobs = ProductionJobNew.query.filter(
-            ProductionJobNew.status == 'in_progress',
-            ProductionJobNew.stage.in_(['cleaning_24h', 'cleaning_12h'])
-        ).all()
-        
-        for job in active_jobs:
-            if job.started_at:
-                elapsed = datetime.now() - job.started_at
-                elapsed_minutes = elapsed.total_seconds() / 60
-                
-                # Determine cleaning frequency
-                frequency_minutes = 5 if job.stage == 'cleaning_24h' else 2
-                
-                # Check if cleaning is due
-                if elapsed_minutes >= frequency_minutes:
-                    cycles_completed = int(elapsed_minutes // frequency_minutes)
-                    time_since_last = elapsed_minutes % frequency_minutes
-                    
-                    # If more than 30 seconds overdue, show alert
-                    if time_since_last >= 0.5:
-                        next_due = job.started_at + timedelta(minutes=(cycles_completed + 1) * frequency_minutes)
-                        
-                        alerts.append({
-                            'job_id': job.id,
-                            'job_number': job.job_number,
-                            'stage': job.stage,
-                            'machine_name': f"{job.stage.replace('_', ' ').title()} Machine",
-                            'due_time': next_due.strftime('%H:%M:%S'),
-                            'overdue_minutes': time_since_last,
-                            'cycles_completed': cycles_completed
-                        })
-        
-        return jsonify({'success': True, 'alerts': alerts})
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/cleaning_reminders')
-def api_cleaning_reminders():
-    """Get machine cleaning reminders for active jobs"""
-    try:
-        reminders = []
-        
-        # Get all active jobs
-        active_jobs = ProductionJobNew.query.filter(
-            ProductionJobNew.status.in_(['in_progress'])
-        ).all()
-        
-        for job in active_jobs:
-            if job.started_at and job.stage in ['cleaning_24h', 'cleaning_12h']:
-                elapsed = datetime.now() - job.started_at
-                elapsed_minutes = elapsed.total_seconds() / 60
-                
-                # Determine cleaning frequency (5 min for 24h, 2 min for 12h)
-                frequency_minutes = 5 if job.stage == 'cleaning_24h' else 2
-                
-                # Calculate next cleaning time
-                cycles_completed = int(elapsed_minutes // frequency_minutes)
-                next_cleaning_minutes = (cycles_completed + 1) * frequency_minutes
-                next_cleaning_time = job.started_at + timedelta(minutes=next_cleaning_minutes)
-                time_until_cleaning = (next_cleaning_time - datetime.now()).total_seconds() / 60
-                
-                # Show reminder if cleaning is due soon or overdue
-                if time_until_cleaning <= 1:  # Within 1 minute or overdue
-                    urgent = time_until_cleaning <= 0
-                    
-                    reminders.append({
-                        'job_id': job.id,
-                        'job_number': job.job_number,
-                        'stage': job.stage,
-                        'machine_name': f"{job.stage.replace('_', ' ').title()} Machine",
-                        'next_cleaning_time': next_cleaning_time.strftime('%H:%M:%S'),
-                        'time_until_minutes': max(0, time_until_cleaning),
-                        'urgent': urgent,
-                        'cycles_completed': cycles_completed
-                    })
-        
-        return jsonify({'success': True, 'reminders': reminders})
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/submit_machine_cleaning', methods=['POST'])
-def api_submit_machine_cleaning():
-    """Submit machine cleaning data"""
-    try:
-        job_id = request.form.get('job_id')
-        process_type = request.form.get('process_type')
-        cleaned_by = request.form.get('cleaned_by')
-        waste_collected = float(request.form.get('waste_collected', 0))
-        notes = request.form.get('notes', '')
-        
-        # Handle photo uploads
-        photo_before = None
-        photo_after = None
-        
-        if 'photo_before' in request.files:
-            file = request.files['photo_before']
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"machine_before_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                photo_before = filename
-        
-        if 'photo_after' in request.files:
-            file = request.files['photo_after']
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filename = f"machine_after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                photo_after = filename
-        
-        # Get or create production machine
-        machine = ProductionMachine.query.filter_by(
-            process_step=process_type,
-            name=f"{process_type.replace('_', ' ').title()} Machine"
-        ).first()
-        
-        if not machine:
-            machine = ProductionMachine(
-                name=f"{process_type.replace('_', ' ').title()} Machine",
-                machine_type='cleaning',
-                process_step=process_type,
-                cleaning_frequency_hours=0.08 if process_type == 'cleaning_12h' else 0.03  # 2 min or 5 min in hours
-            )
-            db.session.add(machine)
-            db.session.flush()
-        
-        # Create cleaning log
-        cleaning_log = MachineCleaningLog(
-            machine_id=machine.id,
-            job_id=int(job_id),
-            process_step=process_type,
-            cleaned_by=cleaned_by,
-            photo_before=photo_before,
-            photo_after=photo_after,
-            waste_collected_kg=waste_collected,
-            notes=notes,
-            status='completed',
-            cleaning_end_time=datetime.now()
-        )
-        
-        # Calculate duration (assume 5 minutes standard)
-        cleaning_log.cleaning_duration_minutes = 5
-        
-        # Update machine last cleaned time
-        machine.last_cleaned = datetime.now()
-        
-        db.session.add(cleaning_log)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True, 
-            'message': 'Machine cleaning completed successfully!',
-            'cleaning_id': cleaning_log.id
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/debug_production_order')
-def debug_production_order():
-    """Debug route to test production order creation"""
-    try:
-        from sqlalchemy import text
-
-        # Test database connection
-        result = db.session.execute(text("SELECT 1")).fetchone()
-        print("Database connection: OK")
-
-        # Check production_order table structure
-        result = db.session.execute(text("""
-            SELECT column_name, data_type, is_nullable
-            FROM information_schema.columns 
-            WHERE table_name = 'production_order'
-            ORDER BY column_name;
-        """)).fetchall()
-
-        print("Production Order table structure:")
-        for row in result:
-            print(f"  {row[0]}: {row[1]} (nullable: {row[2]})")
-
-        # Test creating a simple production order
-        test_order = ProductionOrder(
-            order_number=generate_order_number('TEST'),
-            quantity=100.0,
-            product='Test Product',
-            created_by='Debug Test'
-        )
-
-        db.session.add(test_order)
-        db.session.commit()
-
-        return f"Debug successful! Test order created with ID: {test_order.id}"
-
-    except Exception as e:
-        db.session.rollback()
-        return f"Debug error: {str(e)}"
-
-# Simple Production Dashboard Route
-@app.route("/production_execution_simple")
-def simple_production_dashboard():
-    """Simple and user-friendly production dashboard"""
-    return render_template("simple_production_dashboard.html")
-
-@app.route("/api/simple_job_control/<int:job_id>", methods=["POST"])
-def simple_job_control(job_id):
-    """Simple job control API"""
-    from flask import request, jsonify
-    from datetime import datetime
-    
-    job = ProductionJobNew.query.get_or_404(job_id)
-    action = request.form.get("action")
-    
-    try:
-        if action == "quick_start":
-            operator_name = request.form.get("operator_name")
-            notes = request.form.get("notes", "")
-            
-            job.status = "in_progress"
-            job.started_at = datetime.now()
-            job.started_by = operator_name
-            
-            if notes:
-                job.notes = notes
-            
-            db.session.commit()
-            return jsonify({"success": True, "message": f"Job {job.job_number} started successfully"})
-            
-        elif action == "pause":
-            job.status = "paused"
-            db.session.commit()
-            return jsonify({"success": True, "message": f"Job {job.job_number} paused"})
-            
-        elif action == "resume":
-            job.status = "in_progress"
-            db.session.commit()
-            return jsonify({"success": True, "message": f"Job {job.job_number} resumed"})
-            
-        elif action == "complete":
-            job.status = "completed"
-            job.completed_at = datetime.now()
-            db.session.commit()
-            return jsonify({"success": True, "message": f"Job {job.job_number} completed"})
-            
-        else:
-            return jsonify({"success": False, "message": "Invalid action"})
-            
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"success": False, "message": str(e)})
-
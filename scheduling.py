@@ -0,0 +1,228 @@
+import os
+import socket
+import time
+import click
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from app import db, scheduler
+from models import ScheduledJob
+
+# pg_try_advisory_lock key shared by every worker of this app
+ADVISORY_LOCK_KEY = 7301452011
+
+LEADER_RETRY_SECONDS = int(os.environ.get("SCHEDULER_LEADER_RETRY_SECONDS", "15"))
+
+def scheduler_enabled():
+    """Whether this process runs the scheduler: web workers and `flask run`, not other CLI commands.
+
+    SCHEDULER_ENABLED=1 or 0 overrides the guess.
+    """
+    forced = os.environ.get("SCHEDULER_ENABLED")
+    if forced:
+        return forced.lower() in ("1", "true", "yes")
+    # The flask CLI sets this before loading the app for any command
+    if os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        return True
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.info_name == "run"
+
+class AdvisoryLock:
+    """PostgreSQL session advisory lock held on a dedicated connection.
+
+    The lock is released by the server when the connection goes away, so a dead
+    leader frees it without any cleanup.
+    """
+
+    def __init__(self, url):
+        self.engine = create_engine(url, poolclass=NullPool)
+        self.connection = None
+
+    def acquire(self):
+        try:
+            if self.connection is None:
+                self.connection = self.engine.connect()
+            acquired = self.connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+            self.connection.commit()
+            return bool(acquired)
+        except Exception:
+            self._reset()
+            return False
+
+    def alive(self):
+        try:
+            self.connection.execute(text("SELECT 1"))
+            self.connection.commit()
+            return True
+        except Exception:
+            self._reset()
+            return False
+
+    def _reset(self):
+        if self.connection is not None:
+            try:
+                self.connection.invalidate()
+            except Exception:
+                pass
+        self.connection = None
+
+class FileLock:
+    """flock() on a lock file next to the SQLite database; released by the kernel when the process exits"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        import fcntl
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{socket.gethostname()}:{os.getpid()}\n".encode())
+        self.fd = fd
+        return True
+
+    def alive(self):
+        return self.fd is not None
+
+class LeaderElection:
+    """Elect one worker to run leader jobs; followers keep retrying so leadership hands over when it dies"""
+
+    def __init__(self):
+        self.is_leader = False
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = None
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        url = app.config["SQLALCHEMY_DATABASE_URI"]
+        # Keep an existing lock when the app is created again in the same process
+        if self.lock is None:
+            if url.startswith("postgres"):
+                self.lock = AdvisoryLock(url)
+            else:
+                os.makedirs(app.instance_path, exist_ok=True)
+                self.lock = FileLock(os.environ.get("SCHEDULER_LOCK_FILE", os.path.join(app.instance_path, "scheduler.lock")))
+
+        scheduler.add_job(
+            id="scheduler_leader_election",
+            func=self.campaign,
+            trigger="interval",
+            seconds=LEADER_RETRY_SECONDS,
+            replace_existing=True
+        )
+        self.campaign()
+
+    def campaign(self):
+        if self.is_leader:
+            if not self.lock.alive():
+                self.is_leader = False
+                self.app.logger.warning(f"Scheduler leadership lost by {self.identity}")
+            return
+        if self.lock.acquire():
+            self.is_leader = True
+            self.app.logger.info(f"Scheduler leader is now {self.identity}")
+
+election = LeaderElection()
+
+# job_id -> {'func', 'trigger', 'trigger_args'} for every leader-only job
+_leader_jobs = {}
+
+def _describe_trigger(trigger, trigger_args):
+    return f"{trigger}[{', '.join(f'{k}={v}' for k, v in sorted(trigger_args.items()))}]"
+
+def _schedule(job_id):
+    job = _leader_jobs[job_id]
+    scheduler.add_job(
+        id=job_id,
+        func=run_leader_job,
+        args=[job_id],
+        trigger=job['trigger'],
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        **job['trigger_args']
+    )
+
+def leader_job(job_id, trigger='interval', **trigger_args):
+    """Register a function as a background job that only the elected leader runs.
+
+    Every worker schedules it, but followers skip the run, so the work happens
+    once across all gunicorn workers. Runs are recorded in ScheduledJob.
+    """
+    def decorator(func):
+        _leader_jobs[job_id] = {'func': func, 'trigger': trigger, 'trigger_args': trigger_args}
+        if election.app is not None:
+            _schedule(job_id)
+        return func
+    return decorator
+
+def run_leader_job(job_id):
+    """Run one leader job inside an app context and record its outcome"""
+    if not election.is_leader:
+        return
+    job = _leader_jobs[job_id]
+
+    with election.app.app_context():
+        record = ScheduledJob.query.filter_by(job_id=job_id).first()
+        if not record:
+            record = ScheduledJob(job_id=job_id, run_count=0, failure_count=0)
+            db.session.add(record)
+        record.trigger = _describe_trigger(job['trigger'], job['trigger_args'])
+        record.last_started_at = datetime.utcnow()
+        record.last_status = 'running'
+        record.last_worker = election.identity
+        db.session.commit()
+
+        started = time.perf_counter()
+        try:
+            job['func']()
+            status, error = 'success', None
+        except Exception as e:
+            db.session.rollback()
+            status, error = 'failed', str(e)
+            election.app.logger.error(f"Leader job {job_id} failed: {error}")
+
+        record = ScheduledJob.query.filter_by(job_id=job_id).first()
+        record.last_finished_at = datetime.utcnow()
+        record.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        record.last_status = status
+        record.last_error = error
+        record.run_count = (record.run_count or 0) + 1
+        if error:
+            record.failure_count = (record.failure_count or 0) + 1
+        db.session.commit()
+
+def init_leader_election(app):
+    """Start campaigning for leadership and schedule every registered leader job"""
+    election.init_app(app)
+    for job_id in _leader_jobs:
+        _schedule(job_id)
+
+def job_registry():
+    """Registered leader jobs with their next run and last recorded outcome"""
+    records = {r.job_id: r for r in ScheduledJob.query.all()}
+    jobs = []
+    for job_id, job in sorted(_leader_jobs.items()):
+        record = records.get(job_id)
+        scheduled = scheduler.get_job(job_id)
+        jobs.append({
+            'job_id': job_id,
+            'trigger': _describe_trigger(job['trigger'], job['trigger_args']),
+            'next_run_time': scheduled.next_run_time.isoformat() if scheduled and scheduled.next_run_time else None,
+            'last_started_at': record.last_started_at.isoformat() if record and record.last_started_at else None,
+            'last_finished_at': record.last_finished_at.isoformat() if record and record.last_finished_at else None,
+            'last_duration_ms': record.last_duration_ms if record else None,
+            'last_status': record.last_status if record else None,
+            'last_error': record.last_error if record else None,
+            'last_worker': record.last_worker if record else None,
+            'run_count': record.run_count if record else 0,
+            'failure_count': record.failure_count if record else 0
+        })
+    return jobs
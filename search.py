@@ -0,0 +1,298 @@
+"""Global search over vehicles, orders, jobs, batches, dispatches and parties.
+
+Every searchable row has one search_document holding its label, a short
+detail line and its search terms: numbers and names lowercased, numbers
+also with spaces and dashes removed so "MH12AB" finds "MH 12 AB 1234".
+Documents are written in the same flush as their source row, and rows whose
+terms include a parent's name (a vehicle's supplier, a job's order number)
+are rewritten when that parent changes.
+
+On SQLite the terms are indexed by an FTS5 trigram table kept up to date by
+triggers on search_document; on PostgreSQL by a pg_trgm GIN index. Both
+answer substring matches of three or more characters from the index, so
+typeahead lookups stay within a few milliseconds.
+"""
+import re
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import DDL, case, delete, event, insert, inspect, literal_column, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import column, table
+from app import db
+from db_routing import RoutingSession
+from models import (
+    Customer, DispatchVehicle, FinishedGoods, ProductionJobNew, ProductionOrder, SalesDispatch, SalesOrder,
+    SearchDocument, Supplier, Vehicle
+)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MIN_INDEXED_LENGTH = 3  # trigram index: shorter words are matched by scanning the candidates
+REBUILD_BATCH_SIZE = 500
+
+FTS_TABLE = 'search_document_fts'
+_fts = table(FTS_TABLE, column('rowid'), column('rank'))
+
+for statement in (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"terms, content='search_document', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, terms) VALUES (new.id, new.terms); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, terms) VALUES ('delete', old.id, old.terms); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, terms) VALUES ('delete', old.id, old.terms); "
+    f"INSERT INTO {FTS_TABLE}(rowid, terms) VALUES (new.id, new.terms); END",
+):
+    event.listen(SearchDocument.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+event.listen(SearchDocument.__table__, 'before_create',
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect='postgresql'))
+event.listen(SearchDocument.__table__, 'after_create', DDL(
+    "CREATE INDEX IF NOT EXISTS ix_search_document_terms_trgm ON search_document USING gin (terms gin_trgm_ops)"
+).execute_if(dialect='postgresql'))
+
+def _compact(value):
+    return re.sub(r'[\W_]+', '', value)
+
+def _terms(numbers, names):
+    words = []
+    for value in numbers:
+        if value:
+            value = str(value).lower()
+            words.append(value)
+            if _compact(value) != value:
+                words.append(_compact(value))
+    words.extend(str(value).lower() for value in names if value)
+    return ' '.join(words)
+
+def _name(session, model, pk):
+    party = session.get(model, pk) if pk else None
+    return party.company_name if party else None
+
+def _order_number(session, order_id):
+    order = session.get(ProductionOrder, order_id) if order_id else None
+    return order.order_number if order else None
+
+def _detail(*parts):
+    return ' · '.join(str(part) for part in parts if part)[:255] or None
+
+# Each builder returns (label, detail, ref, numbers, names) for a row, or None when it has nothing to find it by
+
+def _vehicle(session, vehicle):
+    supplier = _name(session, Supplier, vehicle.supplier_id)
+    return (vehicle.vehicle_number, _detail(supplier, vehicle.driver_name), None,
+            [vehicle.vehicle_number], [vehicle.driver_name, supplier])
+
+def _party(session, party):
+    return party.company_name, _detail(party.contact_person, party.city), None, [], [party.company_name, party.contact_person]
+
+def _production_order(session, order):
+    customer = _name(session, Customer, order.customer_id)
+    return (order.order_number, _detail(order.product, f'{order.quantity:g} t' if order.quantity else None, customer),
+            order.order_number, [order.order_number], [customer])
+
+def _production_job(session, job):
+    order_number = _order_number(session, job.order_id)
+    return (job.job_number, _detail(job.stage.replace('_', ' ') if job.stage else None, order_number), order_number,
+            [job.job_number, order_number], [])
+
+def _batch(session, goods):
+    if not goods.batch_number:
+        return None
+    order_number = _order_number(session, goods.order_id)
+    product = goods.product.name if goods.product else None
+    return (goods.batch_number, _detail(product, f'{goods.quantity:g}' if goods.quantity else None, order_number),
+            order_number, [goods.batch_number, order_number], [product])
+
+def _sales_order(session, order):
+    customer = _name(session, Customer, order.customer_id)
+    return order.order_number, _detail(customer), None, [order.order_number], [customer]
+
+def _sales_dispatch(session, dispatch):
+    if not dispatch.vehicle_number:
+        return None
+    customer = _name(session, Customer, dispatch.customer_id)
+    order_number = _order_number(session, dispatch.order_id)
+    return (dispatch.vehicle_number, _detail(customer, dispatch.driver_name, order_number), order_number,
+            [dispatch.vehicle_number, order_number], [dispatch.driver_name, customer])
+
+def _dispatch_vehicle(session, vehicle):
+    return (vehicle.vehicle_number, _detail(vehicle.driver_name, vehicle.city), None,
+            [vehicle.vehicle_number], [vehicle.driver_name])
+
+def _order_link(doc):
+    return url_for('production.order_tracking_detail', order_number=doc.ref) if doc.ref else None
+
+class SearchKind:
+    def __init__(self, name, model, build, fields, link, parents=()):
+        self.name = name
+        self.model = model
+        self.build = build
+        self.fields = fields  # columns the document is built from; other writes leave it alone
+        self.link = link
+        self.parents = parents  # (parent model, its columns shown here, foreign key column of this model)
+
+KINDS = {kind.name: kind for kind in (
+    SearchKind('vehicle', Vehicle, _vehicle, ('vehicle_number', 'driver_name', 'supplier_id'),
+               lambda doc: url_for('intake.vehicle_entry'), [(Supplier, ('company_name',), Vehicle.supplier_id)]),
+    SearchKind('supplier', Supplier, _party, ('company_name', 'contact_person', 'city'),
+               lambda doc: url_for('core.masters')),
+    SearchKind('customer', Customer, _party, ('company_name', 'contact_person', 'city'),
+               lambda doc: url_for('core.masters')),
+    SearchKind('production_order', ProductionOrder, _production_order,
+               ('order_number', 'product', 'quantity', 'customer_id'), _order_link,
+               [(Customer, ('company_name',), ProductionOrder.customer_id)]),
+    SearchKind('production_job', ProductionJobNew, _production_job, ('job_number', 'stage', 'order_id'), _order_link,
+               [(ProductionOrder, ('order_number',), ProductionJobNew.order_id)]),
+    SearchKind('batch', FinishedGoods, _batch, ('batch_number', 'product_id', 'quantity', 'order_id'), _order_link,
+               [(ProductionOrder, ('order_number',), FinishedGoods.order_id)]),
+    SearchKind('sales_order', SalesOrder, _sales_order, ('order_number', 'customer_id'),
+               lambda doc: url_for('dispatch.dispatch_planning'), [(Customer, ('company_name',), SalesOrder.customer_id)]),
+    SearchKind('sales_dispatch', SalesDispatch, _sales_dispatch,
+               ('vehicle_number', 'driver_name', 'customer_id', 'order_id'), lambda doc: url_for('dispatch.sales_dispatch'),
+               [(Customer, ('company_name',), SalesDispatch.customer_id),
+                (ProductionOrder, ('order_number',), SalesDispatch.order_id)]),
+    SearchKind('dispatch_vehicle', DispatchVehicle, _dispatch_vehicle, ('vehicle_number', 'driver_name', 'city'),
+               lambda doc: url_for('dispatch.dispatch_planning')),
+)}
+
+_KINDS_BY_MODEL = {kind.model: kind for kind in KINDS.values()}
+
+def document(session, kind, obj):
+    """Column values of obj's search document, or None when it should have none"""
+    built = kind.build(session, obj)
+    if built is None:
+        return None
+    label, detail, ref, numbers, names = built
+    return {
+        'entity_type': kind.name, 'entity_id': obj.id, 'label': str(label)[:100], 'detail': detail,
+        'ref': ref, 'terms': _terms(numbers, names), 'updated_at': datetime.utcnow()
+    }
+
+def _changed(obj, fields):
+    attrs = inspect(obj).attrs
+    return any(attrs[field].history.has_changes() for field in fields)
+
+def _write(connection, docs, removed):
+    """Replace the documents of the given (type, id) keys: removed ones are deleted, docs upserted"""
+    for entity_type in {key[0] for key in removed}:
+        ids = [entity_id for kind, entity_id in removed if kind == entity_type]
+        connection.execute(delete(SearchDocument).where(
+            SearchDocument.entity_type == entity_type, SearchDocument.entity_id.in_(ids)
+        ))
+    for doc in docs:
+        stmt = update(SearchDocument).where(
+            SearchDocument.entity_type == doc['entity_type'], SearchDocument.entity_id == doc['entity_id']
+        ).values(doc)
+        if connection.execute(stmt).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(SearchDocument).values(doc))
+        except IntegrityError:
+            # Written by a concurrent transaction first
+            connection.execute(stmt)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _index_after_flush(session, flush_context):
+    """Write the search documents of the rows this flush created, changed or deleted"""
+    touched = {}  # (kind name, id) -> object to rebuild from, or None to drop
+    parents = []
+    for obj in session.deleted:
+        kind = _KINDS_BY_MODEL.get(type(obj))
+        if kind:
+            touched[(kind.name, obj.id)] = None
+    for obj in session.new:
+        kind = _KINDS_BY_MODEL.get(type(obj))
+        if kind:
+            touched[(kind.name, obj.id)] = obj
+    for obj in session.dirty:
+        kind = _KINDS_BY_MODEL.get(type(obj))
+        if kind and (kind.name, obj.id) not in touched and _changed(obj, kind.fields):
+            touched[(kind.name, obj.id)] = obj
+        parents.append(obj)
+
+    # Children showing a renamed parent are rebuilt as well
+    for kind in KINDS.values():
+        for parent_model, fields, foreign_key in kind.parents:
+            ids = [obj.id for obj in parents if type(obj) is parent_model and _changed(obj, fields)]
+            if ids:
+                for child in session.query(kind.model).filter(foreign_key.in_(ids)):
+                    touched.setdefault((kind.name, child.id), child)
+    if not touched:
+        return
+
+    docs, removed = [], []
+    for (name, entity_id), obj in touched.items():
+        doc = document(session, KINDS[name], obj) if obj is not None else None
+        if doc is None:
+            removed.append((name, entity_id))
+        else:
+            docs.append(doc)
+    connection = session.connection(bind_arguments={'mapper': SearchDocument.__mapper__})
+    _write(connection, docs, removed)
+
+def rebuild_index(log=None):
+    """Recreate every search document from the source tables; returns {kind: documents written}"""
+    written = {}
+    for kind in KINDS.values():
+        db.session.execute(delete(SearchDocument).where(SearchDocument.entity_type == kind.name))
+        count = 0
+        batch = []
+        for obj in db.session.query(kind.model).order_by(kind.model.id).yield_per(REBUILD_BATCH_SIZE):
+            doc = document(db.session, kind, obj)
+            if doc:
+                batch.append(doc)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                db.session.execute(insert(SearchDocument), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(SearchDocument), batch)
+            count += len(batch)
+        db.session.commit()
+        written[kind.name] = count
+        if log:
+            log(f"{kind.name}: {count} document(s)")
+    if db.engine.dialect.name == 'sqlite':
+        # Merge the index segments the bulk load left behind
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+        db.session.commit()
+    return written
+
+def _tokens(query):
+    return re.findall(r'\w+', (query or '').lower())
+
+def search(query, limit=DEFAULT_LIMIT, types=None):
+    """Documents matching every word of query, labels starting with it first; [{type, id, label, detail, url}]"""
+    words = _tokens(query)
+    if not words:
+        return []
+    limit = min(max(limit, 1), MAX_LIMIT)
+    stmt = select(SearchDocument.entity_type, SearchDocument.entity_id, SearchDocument.label,
+                  SearchDocument.detail, SearchDocument.ref)
+    ordering = [case((SearchDocument.label.istartswith(query.strip(), autoescape=True), 0), else_=1)]
+
+    indexed = [word for word in words if len(word) >= MIN_INDEXED_LENGTH]
+    scanned = words
+    if db.session.get_bind(clause=stmt).dialect.name == 'sqlite' and indexed:
+        # Words of three or more characters come from the trigram index, the rest filter its candidates
+        stmt = stmt.join(_fts, _fts.c.rowid == SearchDocument.id).where(
+            literal_column(FTS_TABLE).op('MATCH')(' AND '.join(f'"{word}"' for word in indexed))
+        )
+        ordering.append(_fts.c.rank)
+        scanned = [word for word in words if len(word) < MIN_INDEXED_LENGTH]
+    stmt = stmt.where(*[SearchDocument.terms.contains(word, autoescape=True) for word in scanned])
+    if types:
+        stmt = stmt.where(SearchDocument.entity_type.in_(types))
+    ordering.append(SearchDocument.label)
+
+    rows = db.session.execute(stmt.order_by(*ordering).limit(limit)).all()
+    return [{
+        'type': row.entity_type,
+        'id': row.entity_id,
+        'label': row.label,
+        'detail': row.detail,
+        'url': KINDS[row.entity_type].link(row) if row.entity_type in KINDS else None
+    } for row in rows]
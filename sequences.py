@@ -0,0 +1,91 @@
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import SequenceCounter
+
+# Values each worker takes per round trip; unused values of a block are skipped when the worker exits
+BLOCK_SIZE = int(os.environ.get("SEQUENCE_BLOCK_SIZE", "50"))
+
+_blocks = {}  # (database url, sequence name) -> [next value, last value of the block]
+_lock = threading.Lock()
+
+# A forked worker must not hand out the numbers cached by its parent
+os.register_at_fork(after_in_child=_blocks.clear)
+
+def _bump(executor, name, count, initial):
+    """Advance a counter by count and return the (first, last) values taken; executor is a Session or Connection"""
+    statement = (
+        update(SequenceCounter)
+        .where(SequenceCounter.name == name)
+        .values(value=SequenceCounter.value + count)
+        .returning(SequenceCounter.value)
+    )
+    last = executor.execute(statement).scalar()
+    if last is None:
+        start = initial() if callable(initial) else initial
+        try:
+            with executor.begin_nested():
+                executor.execute(insert(SequenceCounter).values(name=name, value=start + count))
+            last = start + count
+        except IntegrityError:
+            # Another worker created the counter first
+            last = executor.execute(statement).scalar()
+    return last - count + 1, last
+
+def _embedded():
+    return db.engine.dialect.name == 'sqlite'
+
+def _allocate(name, count, initial):
+    if _embedded():
+        # SQLite has a single writer and no network hop: take the values inside the caller's
+        # transaction, which usually already holds the write lock a second connection would wait on
+        return _bump(db.session, name, count, initial)
+    # Elsewhere the counter row commits on its own so it is never locked for the length of a request
+    with db.engine.begin() as connection:
+        return _bump(connection, name, count, initial)
+
+def next_value(name, initial=0):
+    """Next value of a named sequence.
+
+    On a server database each worker reserves BLOCK_SIZE values at a time and
+    hands them out from memory, so most calls make no round trip. Values are
+    unique and increasing within a worker; across workers they are only
+    roughly ordered, and gaps appear when a worker exits mid-block.
+    """
+    if _embedded():
+        return _allocate(name, 1, initial)[0]
+
+    key = (str(db.engine.url), name)
+    with _lock:
+        block = _blocks.get(key)
+        if block is None or block[0] > block[1]:
+            block = _blocks[key] = list(_allocate(name, BLOCK_SIZE, initial))
+        value = block[0]
+        block[0] += 1
+        return value
+
+def reserve(name, count, initial=0):
+    """Take count consecutive values of a named sequence at once and return (first, last).
+
+    initial (a number or a callable) seeds a sequence that does not exist yet.
+    """
+    return _allocate(name, count, initial)
+
+def _number(prefix, sequence):
+    return f"{prefix}-{datetime.now().strftime('%Y%m%d')}-{next_value(sequence):06d}"
+
+def order_number(prefix='PO'):
+    """Readable, sortable order number such as PO-20250314-000042"""
+    return _number(prefix, f'order:{prefix}')
+
+def job_number():
+    return _number('JOB', 'job')
+
+def batch_number():
+    return _number('BATCH', 'batch')
+
+def dispatch_number():
+    return _number('DSP', 'dispatch')
@@ -0,0 +1,123 @@
+import json
+from operator import attrgetter
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Formatted timestamps are reused across requests: dashboards poll the same jobs every few seconds
+_TIMESTAMP_CACHE_SIZE = 8192
+_minute_cache = {}
+_iso_cache = {}
+
+def minute(value):
+    """'YYYY-MM-DD HH:MM' as the dashboards display it, '' for missing values"""
+    if value is None:
+        return ''
+    text = _minute_cache.get(value)
+    if text is None:
+        text = f"{value.year:04d}-{value.month:02d}-{value.day:02d} {value.hour:02d}:{value.minute:02d}"
+        if len(_minute_cache) >= _TIMESTAMP_CACHE_SIZE:
+            _minute_cache.clear()
+        _minute_cache[value] = text
+    return text
+
+def iso(value):
+    """ISO 8601 timestamp, None for missing values"""
+    if value is None:
+        return None
+    text = _iso_cache.get(value)
+    if text is None:
+        text = value.isoformat()
+        if len(_iso_cache) >= _TIMESTAMP_CACHE_SIZE:
+            _iso_cache.clear()
+        _iso_cache[value] = text
+    return text
+
+class Field:
+    """One output key: read from an attribute path or a callable, optionally formatted"""
+
+    def __init__(self, key, source=None, fmt=None, default=None):
+        self.key = key
+        if callable(source):
+            self.get = source
+        else:
+            self.get = attrgetter(source or key)
+        self.fmt = fmt
+        self.default = default
+
+class Schema:
+    """Field list declared once per model and applied to many rows"""
+
+    def __init__(self, *fields):
+        self.fields = [field if isinstance(field, Field) else Field(field) for field in fields]
+        self._plan = [(f.key, f.get, f.fmt, f.default) for f in self.fields]
+
+    def dump(self, obj, **extra):
+        row = {}
+        for key, get, fmt, default in self._plan:
+            value = get(obj)
+            if fmt is not None:
+                value = fmt(value)
+            elif value is None and default is not None:
+                value = default
+            row[key] = value
+        if extra:
+            row.update(extra)
+        return row
+
+    def dump_many(self, objs):
+        dump = self.dump
+        return [dump(obj) for obj in objs]
+
+def _order_number(default):
+    return lambda obj: obj.order.order_number if obj.order else default
+
+JOB_SUMMARY = Schema(
+    'id', 'job_number',
+    Field('order_number', _order_number('N/A')),
+    'status', 'stage',
+    Field('created_at', fmt=minute),
+    Field('started_at', fmt=minute),
+    Field('started_by', default=''),
+    Field('completed_at', fmt=minute),
+    Field('completed_by', default=''),
+)
+
+JOB_DETAIL = Schema(
+    'id', 'job_number',
+    Field('order_number', _order_number('N/A')),
+    'status', 'stage',
+    Field('created_at', fmt=minute),
+    Field('started_at', fmt=minute),
+    'started_by',
+    Field('completed_at', fmt=minute),
+    'completed_by',
+    'notes',
+)
+
+ACTIVE_PROCESS = Schema(
+    Field('job_id', 'id'),
+    'job_number',
+    Field('order_number', _order_number('')),
+    'stage', 'status',
+    Field('operator', 'started_by'),
+    Field('started_at', fmt=iso),
+)
+
+RECENT_ORDER = Schema(
+    'id', 'order_number', 'product', 'status',
+    Field('created_at', fmt=iso),
+)
+
+def dumps(payload):
+    """Compact JSON bytes; uses orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+
+def json_response(payload, status=200):
+    """Drop-in for jsonify() on hot endpoints"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
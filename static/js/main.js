@@ -26,6 +26,9 @@ function initializeMainApp() {
     
     // Form validation
     initializeFormValidation();
+
+    // Duplicate-submit protection
+    initializeIdempotencyKeys();
 }
 
 function updateCurrentTime() {
@@ -84,6 +87,27 @@ function initializeFormValidation() {
     });
 }
 
+// One key per rendered form: a double-click or resubmit of the same form is answered once by the server
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function initializeIdempotencyKeys() {
+    document.querySelectorAll('form').forEach(form => {
+        if (form.method.toLowerCase() !== 'post' || form.querySelector('input[name="_idempotency_key"]')) {
+            return;
+        }
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = '_idempotency_key';
+        input.value = newIdempotencyKey();
+        form.appendChild(input);
+    });
+}
+
 // Utility functions
 function showAlert(message, type = 'info', duration = 5000) {
     const alertsContainer = document.querySelector('.alerts-container') || document.querySelector('.container-fluid');
@@ -189,6 +213,9 @@ function makeRequest(url, options = {}) {
     };
     
     const config = Object.assign(defaults, options);
+    if (config.method.toUpperCase() !== 'GET') {
+        config.headers = Object.assign({ 'Idempotency-Key': newIdempotencyKey() }, config.headers);
+    }
     
     return fetch(url, config)
         .then(response => {
@@ -0,0 +1,302 @@
+// Offline outbox: operator forms are saved to IndexedDB first and synced to the server in the background.
+// Loaded by the pages (app.js bundle) and by the service worker (importScripts).
+
+(function (global) {
+    const DB_NAME = 'wheat-offline';
+    const DB_VERSION = 1;
+    const SYNC_URL = '/api/sync/batch';
+    const SYNC_TAG = 'outbox-sync';
+    const BATCH_SIZE = 20;
+    const RETRY_INTERVAL_MS = 30000;
+
+    let dbPromise = null;
+    let syncing = null;
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    db.createObjectStore('events', { keyPath: 'key' }).createIndex('seq', 'seq');
+                    db.createObjectStore('meta');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return dbPromise;
+    }
+
+    // Run fn(store) in a transaction and resolve with the result of the request it returns
+    async function withStore(name, mode, fn) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(name, mode);
+            const request = fn(transaction.objectStore(name));
+            transaction.oncomplete = () => resolve(request ? request.result : undefined);
+            transaction.onerror = () => reject(transaction.error);
+            transaction.onabort = () => reject(transaction.error);
+        });
+    }
+
+    function newKey() {
+        if (global.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function deviceId() {
+        let id = await withStore('meta', 'readonly', store => store.get('device_id'));
+        if (!id) {
+            id = newKey();
+            await withStore('meta', 'readwrite', store => store.put(id, 'device_id'));
+        }
+        return id;
+    }
+
+    function list() {
+        return withStore('events', 'readonly', store => store.index('seq').getAll());
+    }
+
+    function remove(key) {
+        return withStore('events', 'readwrite', store => store.delete(key));
+    }
+
+    async function update(key, changes) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction('events', 'readwrite');
+            const store = transaction.objectStore('events');
+            const request = store.get(key);
+            request.onsuccess = () => {
+                if (request.result) {
+                    store.put(Object.assign(request.result, changes));
+                }
+            };
+            transaction.oncomplete = () => resolve();
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+
+    // Queue one event; the idempotency key travels with every retry so the server applies it once
+    async function add(type, data, files) {
+        const event = {
+            key: newKey(),
+            seq: Date.now() + Math.random(),
+            type: type,
+            recorded_at: new Date().toISOString(),
+            data: data,
+            files: files || {},
+            status: 'queued',
+            attempts: 0,
+            error: null
+        };
+        await withStore('events', 'readwrite', store => store.put(event));
+        notify();
+        return event;
+    }
+
+    function notify() {
+        if (global.document) {
+            global.dispatchEvent(new CustomEvent('outbox:change'));
+        } else if (global.clients) {
+            global.clients.matchAll().then(clients => clients.forEach(client => client.postMessage({ type: 'outbox:change' })));
+        }
+    }
+
+    async function drain() {
+        let sent = 0;
+        for (;;) {
+            const queued = (await list()).filter(event => event.status === 'queued').slice(0, BATCH_SIZE);
+            if (!queued.length) {
+                break;
+            }
+
+            const body = new FormData();
+            body.append('device_id', await deviceId());
+            body.append('events', JSON.stringify(queued.map(event => ({
+                key: event.key,
+                type: event.type,
+                recorded_at: event.recorded_at,
+                data: event.data
+            }))));
+            queued.forEach(event => {
+                Object.entries(event.files).forEach(([field, file]) => {
+                    body.append(`${event.key}.${field}`, file, file.name || field);
+                });
+            });
+
+            const response = await fetch(SYNC_URL, { method: 'POST', body: body, credentials: 'same-origin' });
+            if (!response.ok) {
+                throw new Error(`Sync failed: HTTP ${response.status}`);
+            }
+
+            let progressed = false;
+            for (const result of (await response.json()).results) {
+                if (result.status === 'applied' || result.status === 'duplicate') {
+                    await remove(result.key);
+                    sent += 1;
+                    progressed = true;
+                } else if (result.status === 'rejected') {
+                    // The server will never accept this one; keep it for the operator to review
+                    await update(result.key, { status: 'rejected', error: result.error });
+                    progressed = true;
+                } else {
+                    const event = queued.find(e => e.key === result.key);
+                    await update(result.key, { attempts: (event ? event.attempts : 0) + 1, error: result.error });
+                }
+            }
+            notify();
+            if (!progressed) {
+                // Only server-side errors left; try again on the next trigger
+                break;
+            }
+        }
+        return sent;
+    }
+
+    // Send everything queued; concurrent callers share one run
+    function sync() {
+        if (!syncing) {
+            syncing = drain().finally(() => { syncing = null; });
+        }
+        return syncing;
+    }
+
+    function requestBackgroundSync() {
+        if (global.navigator && navigator.serviceWorker) {
+            navigator.serviceWorker.ready
+                .then(registration => registration.sync && registration.sync.register(SYNC_TAG))
+                .catch(() => {});
+        }
+    }
+
+    // Repeated field names (multi-line forms) become arrays; files are kept as blobs
+    async function queueForm(form, submitter) {
+        const formData = new FormData(form);
+        if (submitter && submitter.name) {
+            formData.append(submitter.name, submitter.value);
+        }
+        const data = {};
+        const files = {};
+        formData.delete('_idempotency_key');
+        for (const [name, value] of formData.entries()) {
+            if (value instanceof Blob) {
+                if (value.size) {
+                    files[name] = value;
+                }
+            } else if (name in data) {
+                data[name] = [].concat(data[name], value);
+            } else {
+                data[name] = value;
+            }
+        }
+
+        const event = await add(form.dataset.offlineEvent, data, files);
+        form.reset();
+        form.querySelectorAll('.photo-preview, .image-preview').forEach(preview => preview.remove());
+        // The form is reused for the next entry, which is a different request
+        const formKey = form.querySelector('input[name="_idempotency_key"]');
+        if (formKey) {
+            formKey.value = newKey();
+        }
+        sync().catch(() => {});
+        requestBackgroundSync();
+        return event;
+    }
+
+    const Outbox = { SYNC_TAG, add, list, remove, sync, queueForm, requestBackgroundSync };
+    global.Outbox = Outbox;
+
+    if (!global.document) {
+        return;
+    }
+
+    function alertUser(message, type) {
+        if (typeof showAlert === 'function') {
+            showAlert(message, type);
+        }
+    }
+
+    async function renderStatus() {
+        let badge = document.getElementById('outboxStatus');
+        if (!badge) {
+            badge = document.createElement('button');
+            badge.id = 'outboxStatus';
+            badge.type = 'button';
+            badge.style.position = 'fixed';
+            badge.style.left = '1rem';
+            badge.style.bottom = '1rem';
+            badge.style.zIndex = '1080';
+            badge.addEventListener('click', onStatusClick);
+            document.body.appendChild(badge);
+        }
+
+        const events = await list();
+        const queued = events.filter(event => event.status === 'queued').length;
+        const rejected = events.length - queued;
+        const online = navigator.onLine;
+        const parts = [];
+        if (!online) parts.push('Offline');
+        if (queued) parts.push(`${queued} waiting to sync`);
+        if (rejected) parts.push(`${rejected} failed`);
+
+        badge.hidden = !parts.length;
+        badge.className = `btn btn-sm shadow ${rejected ? 'btn-danger' : queued ? 'btn-warning' : 'btn-secondary'}`;
+        badge.innerHTML = `<i class="fas fa-${online ? 'cloud-arrow-up' : 'plug-circle-xmark'} me-1"></i>${parts.join(' · ')}`;
+    }
+
+    async function onStatusClick() {
+        const rejected = (await list()).filter(event => event.status === 'rejected');
+        if (rejected.length) {
+            const details = rejected.map(event => `- ${event.type.replace('_', ' ')} (${new Date(event.recorded_at).toLocaleString()}): ${event.error}`);
+            if (confirm(`The server did not accept these entries:\n${details.join('\n')}\n\nDiscard them?`)) {
+                await Promise.all(rejected.map(event => remove(event.key)));
+            }
+        }
+        sync().catch(() => {}).finally(renderStatus);
+    }
+
+    document.addEventListener('submit', event => {
+        const form = event.target;
+        if (!form.dataset || !form.dataset.offlineEvent || event.defaultPrevented || !global.indexedDB) {
+            return;
+        }
+        event.preventDefault();
+        queueForm(form, event.submitter).then(() => {
+            alertUser('Saved on this device. It will be sent to the server automatically.', 'success');
+            if (form.dataset.offlineNext) {
+                global.location.href = form.dataset.offlineNext;
+            }
+        }).catch(error => {
+            // Storage unavailable (private mode, quota): fall back to a normal submit
+            console.error('Outbox unavailable:', error);
+            delete form.dataset.offlineEvent;
+            form.requestSubmit(event.submitter);
+        });
+    });
+
+    global.addEventListener('outbox:change', renderStatus);
+    global.addEventListener('online', () => { renderStatus(); sync().catch(() => {}); });
+    global.addEventListener('offline', renderStatus);
+
+    document.addEventListener('DOMContentLoaded', () => {
+        if (!global.indexedDB) {
+            return;
+        }
+        if (navigator.serviceWorker) {
+            navigator.serviceWorker.register('/sw.js').catch(error => console.error('Service worker registration failed:', error));
+            navigator.serviceWorker.addEventListener('message', message => {
+                if (message.data && message.data.type === 'outbox:change') {
+                    renderStatus();
+                }
+            });
+        }
+        renderStatus();
+        sync().catch(() => {});
+        setInterval(() => { if (navigator.onLine) sync().catch(() => {}); }, RETRY_INTERVAL_MS);
+    });
+})(self);
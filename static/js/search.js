@@ -0,0 +1,114 @@
+// Global search box in the page header: typeahead over /api/search, Enter or click opens the result.
+
+(function () {
+    const SEARCH_URL = '/api/search';
+    const DEBOUNCE_MS = 120;
+    const TYPE_ICONS = {
+        vehicle: 'fa-truck', dispatch_vehicle: 'fa-truck', sales_dispatch: 'fa-shipping-fast',
+        supplier: 'fa-industry', customer: 'fa-user-tie', production_order: 'fa-clipboard-list',
+        production_job: 'fa-cogs', batch: 'fa-box', sales_order: 'fa-file-invoice'
+    };
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text == null ? '' : text;
+        return div.innerHTML;
+    }
+
+    function init() {
+        const input = document.getElementById('globalSearch');
+        const menu = document.getElementById('globalSearchResults');
+        if (!input || !menu) {
+            return;
+        }
+        let timer = null;
+        let controller = null;
+        let results = [];
+        let active = -1;
+
+        function close() {
+            menu.classList.remove('show');
+            active = -1;
+        }
+
+        function highlight(index) {
+            active = index;
+            menu.querySelectorAll('.dropdown-item').forEach((item, i) => item.classList.toggle('active', i === index));
+        }
+
+        function render() {
+            if (!results.length) {
+                menu.innerHTML = '<span class="dropdown-item-text text-muted small">No matches</span>';
+            } else {
+                menu.innerHTML = results.map((result, i) =>
+                    `<a class="dropdown-item d-flex align-items-center" href="${escapeHtml(result.url || '#')}" data-index="${i}">` +
+                    `<i class="fas ${TYPE_ICONS[result.type] || 'fa-search'} me-2 text-muted"></i>` +
+                    `<span><span class="fw-semibold">${escapeHtml(result.label)}</span>` +
+                    `<small class="d-block text-muted">${escapeHtml(result.detail || result.type.replace(/_/g, ' '))}</small></span></a>`
+                ).join('');
+            }
+            menu.classList.add('show');
+            active = -1;
+        }
+
+        async function lookup(query) {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            try {
+                const response = await fetch(`${SEARCH_URL}?q=${encodeURIComponent(query)}`, {
+                    signal: controller.signal, credentials: 'same-origin'
+                });
+                const data = await response.json();
+                if (data.success && input.value.trim() === query) {
+                    results = data.results;
+                    render();
+                }
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    close();
+                }
+            }
+        }
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < 2) {
+                close();
+                return;
+            }
+            timer = setTimeout(() => lookup(query), DEBOUNCE_MS);
+        });
+
+        input.addEventListener('keydown', (event) => {
+            if (!menu.classList.contains('show') || !results.length) {
+                return;
+            }
+            if (event.key === 'ArrowDown') {
+                event.preventDefault();
+                highlight(Math.min(active + 1, results.length - 1));
+            } else if (event.key === 'ArrowUp') {
+                event.preventDefault();
+                highlight(Math.max(active - 1, 0));
+            } else if (event.key === 'Enter') {
+                event.preventDefault();
+                const result = results[Math.max(active, 0)];
+                if (result.url) {
+                    window.location.href = result.url;
+                }
+            } else if (event.key === 'Escape') {
+                close();
+            }
+        });
+
+        document.addEventListener('click', (event) => {
+            if (!menu.contains(event.target) && event.target !== input) {
+                close();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', init);
+})();
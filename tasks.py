@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from importlib import import_module
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from app import db
+from models import BackgroundTask
+from scheduling import leader_job
+
+# Task name -> "module:function"; modules are imported only when a task of that kind runs
+TASKS = {
+    'generate_label_sheet': 'packing:generate_label_sheet',
+    'rebuild_stock': 'inventory:rebuild_stock',
+    'rebuild_closure': 'genealogy:rebuild_closure',
+}
+
+RETRY_BASE_SECONDS = int(os.environ.get("TASK_RETRY_BASE_SECONDS", "10"))
+RETRY_MAX_SECONDS = 3600
+# A running task whose worker has been silent this long is handed to another worker
+LEASE_SECONDS = int(os.environ.get("TASK_LEASE_SECONDS", "600"))
+# While a handler runs its lease is renewed this often, so long tasks are not run twice
+HEARTBEAT_SECONDS = max(LEASE_SECONDS / 3, 1)
+
+class PermanentError(Exception):
+    """Raised by a handler when retrying cannot help (e.g. a missing package); the task fails at once"""
+
+def enqueue(name, max_attempts=5, delay_seconds=0, **payload):
+    """Queue a task in the caller's transaction; it becomes visible to workers on commit"""
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    task = BackgroundTask(
+        name=name,
+        payload=json.dumps(payload, default=str),
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    db.session.add(task)
+    db.session.flush()
+    return task
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: 10s, 20s, 40s ... capped at an hour"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(1.0, 1.25)
+
+def claim_next(worker_id):
+    """Lock the next due task for this worker, or return None.
+
+    SKIP LOCKED lets several workers poll the table on PostgreSQL without
+    blocking each other; the conditional UPDATE keeps SQLite (which ignores
+    FOR UPDATE) from handing one task to two workers. It also matches the
+    lease that was read, so of two workers reclaiming the same expired task
+    only one wins, and neither does if its owner renewed the lease meanwhile.
+    """
+    now = datetime.utcnow()
+    due = or_(
+        and_(BackgroundTask.status == 'queued', BackgroundTask.run_after <= now),
+        and_(BackgroundTask.status == 'running', BackgroundTask.locked_at < now - timedelta(seconds=LEASE_SECONDS))
+    )
+    candidate = db.session.query(BackgroundTask.id, BackgroundTask.status, BackgroundTask.locked_at).filter(due).order_by(
+        BackgroundTask.run_after, BackgroundTask.id
+    ).limit(1).with_for_update(skip_locked=True).first()
+    if not candidate:
+        db.session.rollback()
+        return None
+
+    claimed = db.session.execute(
+        update(BackgroundTask)
+        .where(BackgroundTask.id == candidate.id, BackgroundTask.status == candidate.status,
+               BackgroundTask.locked_at.is_(None) if candidate.locked_at is None
+               else BackgroundTask.locked_at == candidate.locked_at)
+        .values(status='running', locked_by=worker_id, locked_at=now, started_at=now,
+                attempts=BackgroundTask.attempts + 1)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+    return db.session.get(BackgroundTask, candidate.id)
+
+@contextmanager
+def _lease_heartbeat(task_id, worker_id):
+    """Renew the task's lease from a side thread, on its own connection, until the block exits"""
+    engine = db.engine
+    logger = current_app.logger
+    done = threading.Event()
+
+    def beat():
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                with engine.begin() as connection:
+                    renewed = connection.execute(
+                        update(BackgroundTask)
+                        .where(BackgroundTask.id == task_id, BackgroundTask.locked_by == worker_id,
+                               BackgroundTask.status == 'running')
+                        .values(locked_at=datetime.utcnow())
+                    ).rowcount
+            except Exception as e:
+                logger.warning(f"Task {task_id}: lease renewal failed: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Task {task_id}: lease lost to another worker")
+                return
+
+    thread = threading.Thread(target=beat, name=f"task-{task_id}-lease", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+def run_task(task):
+    """Execute a claimed task and record success, a scheduled retry or the final failure.
+
+    Nothing is recorded when the lease was lost to another worker meanwhile;
+    that worker's run decides the outcome.
+    """
+    task_id = task.id
+    name = task.name
+    payload = json.loads(task.payload or '{}')
+    worker_id, attempts, max_attempts = task.locked_by, task.attempts, task.max_attempts
+    permanent = False
+
+    try:
+        module_name, func_name = TASKS[name].split(':')
+        with _lease_heartbeat(task_id, worker_id):
+            result = getattr(import_module(module_name), func_name)(**payload)
+        error = None
+    except Exception as e:
+        db.session.rollback()
+        result = None
+        error = f'{type(e).__name__}: {e}'
+        permanent = isinstance(e, PermanentError)
+        current_app.logger.error(f"Task {task_id} ({name}) failed: {error}")
+
+    if error is None:
+        outcome = {'status': 'succeeded', 'result': json.dumps(result, default=str), 'error': None,
+                   'finished_at': datetime.utcnow()}
+    elif attempts < max_attempts and not permanent:
+        outcome = {'status': 'queued', 'error': error,
+                   'run_after': datetime.utcnow() + timedelta(seconds=retry_delay(attempts))}
+    else:
+        outcome = {'status': 'failed', 'error': error, 'finished_at': datetime.utcnow()}
+    recorded = db.session.execute(
+        update(BackgroundTask)
+        .where(BackgroundTask.id == task_id, BackgroundTask.status == 'running',
+               BackgroundTask.locked_by == worker_id, BackgroundTask.attempts == attempts)
+        .values(locked_by=None, locked_at=None, **outcome)
+    ).rowcount
+    db.session.commit()
+    if not recorded:
+        current_app.logger.warning(f"Task {task_id} ({name}): lease lost to another worker, outcome not recorded")
+    return db.session.get(BackgroundTask, task_id)
+
+def run_pending(worker_id, limit=None):
+    """Run due tasks until the queue is empty (or limit tasks ran); returns how many ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        task = claim_next(worker_id)
+        if not task:
+            break
+        run_task(task)
+        ran += 1
+    return ran
+
+def run_worker(poll_seconds=1.0, once=False):
+    """Task worker loop for `flask --app main task-worker`; stops cleanly on SIGTERM/SIGINT"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    current_app.logger.info(f"Task worker {worker_id} started")
+
+    while not stopping:
+        ran = run_pending(worker_id, limit=1)
+        if once and not ran:
+            break
+        if not ran:
+            time.sleep(poll_seconds)
+    db.session.remove()
+
+def task_status(task):
+    return {
+        'id': task.id,
+        'name': task.name,
+        'status': task.status,
+        'attempts': task.attempts,
+        'max_attempts': task.max_attempts,
+        'run_after': task.run_after.isoformat() if task.run_after else None,
+        'created_at': task.created_at.isoformat() if task.created_at else None,
+        'started_at': task.started_at.isoformat() if task.started_at else None,
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+        'result': json.loads(task.result) if task.result else None,
+        'error': task.error
+    }
+
+if os.environ.get("TASK_QUEUE_IN_SCHEDULER", "1") == "1":
+    @leader_job('drain_task_queue', seconds=5)
+    def drain_task_queue():
+        """Without a dedicated task worker, the scheduler leader works through the queue"""
+        run_pending(f"{socket.gethostname()}:{os.getpid()}:scheduler", limit=50)
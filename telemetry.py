@@ -0,0 +1,224 @@
+"""Sensor telemetry: moisture, temperature, bin levels and B1 scale flow.
+
+Each ingested batch is stored once as raw per-minute chunks (float32
+arrays, eight bytes a sample) and folded straight into 1-minute, 15-minute
+and 1-hour rollups holding count, min, max and sum. Range queries read the
+coarsest rollup that still gives the requested resolution, so a 24-hour
+chart is 1440 indexed rows; only sub-minute buckets decode raw chunks. Raw
+chunks and minute rollups are purged after their retention period, the
+coarser rollups are kept.
+"""
+import os
+import sys
+from array import array
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import Sensor, SensorChunk, SensorRollup
+from scheduling import leader_job
+from serializers import iso
+
+ROLLUP_SECONDS = (60, 900, 3600)
+# Bucket sizes a query may be answered in, finest first; a chart gets at most MAX_POINTS of them
+BUCKET_STEPS = (1, 5, 15, 60, 300, 900, 3600, 6 * 3600, 86400)
+MAX_POINTS = 1500
+MAX_SAMPLES_PER_REQUEST = 20000
+RAW_RETENTION_DAYS = int(os.environ.get("TELEMETRY_RAW_DAYS", "7"))
+MINUTE_RETENTION_DAYS = int(os.environ.get("TELEMETRY_MINUTE_DAYS", "90"))
+
+_EPOCH = datetime(2000, 1, 1)
+
+def _floor(moment, seconds):
+    """Start of the bucket of the given size that moment falls in (whole minutes and hours of the local clock)"""
+    elapsed = moment - _EPOCH
+    micros = (elapsed.days * 86400 + elapsed.seconds) * 1_000_000 + elapsed.microseconds
+    return moment - timedelta(microseconds=micros % (seconds * 1_000_000))
+
+def _timestamp(value):
+    """Sample time from epoch seconds or ISO 8601, as naive server-local time"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid sample time: {value}')
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+
+def _pack(offsets, values):
+    packed = array('f', offsets) + array('f', values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+def _unpack(data, count):
+    packed = array('f')
+    packed.frombytes(data)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed[:count], packed[count:]
+
+def get_sensor(name, kind=None, unit=None):
+    """The sensor with this name, registered on first use"""
+    sensor = Sensor.query.filter_by(name=name).first()
+    if sensor is None:
+        sensor = Sensor(name=name, kind=kind or name.split('.')[0], unit=unit)
+        try:
+            with db.session.begin_nested():
+                db.session.add(sensor)
+        except IntegrityError:
+            # Registered by a concurrent batch
+            sensor = Sensor.query.filter_by(name=name).one()
+    return sensor
+
+def _merge_rollup(sensor_id, seconds, bucket_start, stats):
+    count, low, high, total = stats
+    statement = (
+        update(SensorRollup)
+        .where(SensorRollup.sensor_id == sensor_id, SensorRollup.bucket_seconds == seconds,
+               SensorRollup.bucket_start == bucket_start)
+        .values(
+            sample_count=SensorRollup.sample_count + count,
+            min_value=case((SensorRollup.min_value < low, SensorRollup.min_value), else_=low),
+            max_value=case((SensorRollup.max_value > high, SensorRollup.max_value), else_=high),
+            sum_value=SensorRollup.sum_value + total
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(statement).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(SensorRollup).values(
+                sensor_id=sensor_id, bucket_seconds=seconds, bucket_start=bucket_start,
+                sample_count=count, min_value=low, max_value=high, sum_value=total
+            ))
+    except IntegrityError:
+        # Another batch created the bucket first
+        db.session.execute(statement)
+
+def ingest(sensor, samples):
+    """Store (time, value) samples of one sensor and fold them into the rollups; returns the number stored. The caller commits."""
+    minutes = {}
+    for moment, value in samples:
+        minutes.setdefault(_floor(moment, 60), []).append((moment, float(value)))
+    if not minutes:
+        return 0
+
+    chunks = []
+    rollups = {}
+    for minute, rows in minutes.items():
+        rows.sort()
+        values = [value for _, value in rows]
+        chunks.append({
+            'sensor_id': sensor.id, 'minute': minute, 'sample_count': len(rows),
+            'data': _pack([(moment - minute).total_seconds() for moment, _ in rows], values)
+        })
+        for seconds in ROLLUP_SECONDS:
+            key = (seconds, _floor(minute, seconds))
+            count, low, high, total = rollups.get(key, (0, values[0], values[0], 0.0))
+            rollups[key] = (count + len(values), min(low, *values), max(high, *values), total + sum(values))
+
+    db.session.execute(insert(SensorChunk), chunks)
+    for (seconds, bucket_start), stats in sorted(rollups.items()):
+        _merge_rollup(sensor.id, seconds, bucket_start, stats)
+
+    latest_minute = max(minutes)
+    last_at, last_value = minutes[latest_minute][-1]
+    if sensor.last_at is None or last_at >= sensor.last_at:
+        sensor.last_at = last_at
+        sensor.last_value = last_value
+    return sum(chunk['sample_count'] for chunk in chunks)
+
+def ingest_series(series):
+    """Ingest [{'sensor', 'kind', 'unit', 'samples': [[time, value], ...]}, ...]; returns {sensor name: samples stored}. The caller commits."""
+    stored = {}
+    for entry in series:
+        name = entry.get('sensor')
+        if not name:
+            raise ValueError('Every series needs a sensor name')
+        sensor = get_sensor(name, entry.get('kind'), entry.get('unit'))
+        try:
+            samples = [(_timestamp(moment), float(value)) for moment, value in entry.get('samples') or []]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'{name}: samples must be [time, value] pairs ({e})')
+        stored[name] = stored.get(name, 0) + ingest(sensor, samples)
+    return stored
+
+def pick_bucket(start, end, max_points=MAX_POINTS):
+    """Finest bucket size (seconds) that keeps [start, end) within max_points buckets"""
+    span = (end - start).total_seconds()
+    for seconds in BUCKET_STEPS:
+        if span / seconds <= max_points:
+            return seconds
+    return BUCKET_STEPS[-1]
+
+def _raw_buckets(sensor_id, start, end, seconds):
+    chunks = db.session.execute(
+        select(SensorChunk.minute, SensorChunk.sample_count, SensorChunk.data)
+        .where(SensorChunk.sensor_id == sensor_id, SensorChunk.minute >= _floor(start, 60), SensorChunk.minute < end)
+        .order_by(SensorChunk.minute, SensorChunk.id)
+    ).all()
+    # Samples are binned by their offset from the first bucket, without building a datetime for each one
+    anchor = _floor(start, seconds)
+    lowest, highest = (start - anchor).total_seconds(), (end - anchor).total_seconds()
+    indexed = {}
+    for chunk in chunks:
+        offsets, values = _unpack(chunk.data, chunk.sample_count)
+        lead = (chunk.minute - anchor).total_seconds()
+        for offset, value in zip(offsets, values):
+            at = lead + offset
+            if lowest <= at < highest:
+                _add(indexed, int(at // seconds), 1, value, value, value)
+    return {anchor + timedelta(seconds=index * seconds): stats for index, stats in indexed.items()}
+
+def _add(buckets, key, count, low, high, total):
+    current = buckets.get(key)
+    if current is None:
+        buckets[key] = [count, low, high, total]
+    else:
+        current[0] += count
+        current[1] = min(current[1], low)
+        current[2] = max(current[2], high)
+        current[3] += total
+
+def _rollup_buckets(sensor_id, start, end, seconds):
+    # The coarsest stored rollup the requested size is a whole multiple of
+    source = max(level for level in ROLLUP_SECONDS if seconds % level == 0)
+    rows = db.session.execute(
+        select(SensorRollup.bucket_start, SensorRollup.sample_count, SensorRollup.min_value,
+               SensorRollup.max_value, SensorRollup.sum_value)
+        .where(and_(SensorRollup.sensor_id == sensor_id, SensorRollup.bucket_seconds == source,
+                    SensorRollup.bucket_start >= _floor(start, source), SensorRollup.bucket_start < end))
+        .order_by(SensorRollup.bucket_start)
+    ).all()
+    buckets = {}
+    for row in rows:
+        _add(buckets, _floor(row.bucket_start, seconds), row.sample_count, row.min_value, row.max_value, row.sum_value)
+    return buckets
+
+def series(sensor, start, end, bucket_seconds=None):
+    """Min, max, average and count per bucket for [start, end): (bucket seconds, [[start, min, max, avg, count], ...]).
+
+    Sizes of a minute or more are answered from the rollups, so bucket
+    edges fall on whole rollup buckets; smaller sizes decode raw chunks.
+    """
+    seconds = bucket_seconds or pick_bucket(start, end)
+    if seconds % 60:
+        buckets = _raw_buckets(sensor.id, start, end, seconds)
+    else:
+        buckets = _rollup_buckets(sensor.id, start, end, seconds)
+    return seconds, [
+        [iso(moment), round(low, 3), round(high, 3), round(total / count, 3), count]
+        for moment, (count, low, high, total) in sorted(buckets.items())
+    ]
+
+@leader_job('purge_telemetry', hours=1)
+def purge_telemetry():
+    """Drop raw sensor chunks and minute rollups past their retention"""
+    now = datetime.now()
+    db.session.execute(delete(SensorChunk).where(SensorChunk.minute < now - timedelta(days=RAW_RETENTION_DAYS)))
+    db.session.execute(delete(SensorRollup).where(
+        SensorRollup.bucket_seconds == 60, SensorRollup.bucket_start < now - timedelta(days=MINUTE_RETENTION_DAYS)
+    ))
+    db.session.commit()
@@ -0,0 +1,118 @@
+"""Tempering water for the cleaning bins.
+
+The water needed to bring a lot from its current to its target moisture
+follows from a mass balance on the dry matter. Not all of it is taken up,
+so each bin carries an absorption factor learned from its completed
+processes: the moisture gain actually reached over the gain the water
+added should have given. The factor is pulled towards the plant-wide one
+(and that towards 1) until enough history has accumulated.
+"""
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from app import db
+from models import CleaningProcess, ProductionJobNew, ProductionOrder, Sensor
+
+HISTORY_DAYS = int(os.environ.get("TEMPERING_HISTORY_DAYS", "180"))
+# Completed processes' worth of weight the prior keeps against a bin's own history
+PRIOR_WEIGHT = 5
+FACTOR_LIMITS = (0.5, 1.5)
+# A moisture sensor reading older than this is not offered as the current moisture
+SENSOR_MAX_AGE = timedelta(minutes=30)
+
+def water_required(mass_kg, current, target):
+    """Litres of water that take mass_kg of wheat from current to target moisture (% wet basis) if fully absorbed"""
+    if mass_kg is None or current is None or target is None or target <= current:
+        return 0.0
+    return mass_kg * (target - current) / (100 - target)
+
+def moisture_after(mass_kg, current, water_liters):
+    """Moisture (% wet basis) mass_kg of wheat at current moisture reaches once water_liters is fully absorbed"""
+    return (mass_kg * current / 100 + water_liters) / (mass_kg + water_liters) * 100
+
+def _shrink(ratios, prior):
+    factor = (sum(ratios) + PRIOR_WEIGHT * prior) / (len(ratios) + PRIOR_WEIGHT)
+    return min(max(factor, FACTOR_LIMITS[0]), FACTOR_LIMITS[1])
+
+def absorption_factors(now=None):
+    """({cleaning bin id: (factor, completed processes it was learned from)}, plant-wide factor) from one history query"""
+    since = (now or datetime.now()) - timedelta(days=HISTORY_DAYS)
+    rows = db.session.execute(
+        select(CleaningProcess.cleaning_bin_id, CleaningProcess.start_moisture, CleaningProcess.end_moisture,
+               CleaningProcess.water_added_liters, ProductionOrder.quantity)
+        .join(ProductionJobNew, ProductionJobNew.id == CleaningProcess.job_id)
+        .join(ProductionOrder, ProductionOrder.id == ProductionJobNew.order_id)
+        .where(CleaningProcess.status == 'completed', CleaningProcess.start_time >= since,
+               CleaningProcess.start_moisture.isnot(None), CleaningProcess.end_moisture.isnot(None),
+               CleaningProcess.water_added_liters > 0, ProductionOrder.quantity > 0)
+    ).all()
+
+    by_bin = {}
+    for bin_id, start, end, water, tons in rows:
+        expected_gain = moisture_after(tons * 1000, start, water) - start
+        if expected_gain > 0:
+            by_bin.setdefault(bin_id, []).append((end - start) / expected_gain)
+
+    plant = _shrink([ratio for ratios in by_bin.values() for ratio in ratios], 1.0)
+    return {bin_id: (_shrink(ratios, plant), len(ratios)) for bin_id, ratios in by_bin.items() if bin_id}, plant
+
+def measured_moisture(bin_ids, now=None):
+    """{cleaning bin id: latest reading of its moisture.cleaning_bin.<id> sensor}, for sensors that reported recently"""
+    names = {f'moisture.cleaning_bin.{bin_id}': bin_id for bin_id in bin_ids}
+    if not names:
+        return {}
+    cutoff = (now or datetime.now()) - SENSOR_MAX_AGE
+    sensors = Sensor.query.filter(Sensor.name.in_(names), Sensor.last_at >= cutoff).all()
+    return {names[sensor.name]: sensor.last_value for sensor in sensors}
+
+def suggest(lots, now=None):
+    """Water suggestions for many lots at once: dicts with cleaning_bin_id, mass_kg, current and target moisture.
+
+    Factors are learned once for the whole batch; a lot without a current
+    moisture takes its bin's sensor reading when there is a fresh one.
+    """
+    factors, plant = absorption_factors(now)
+    sensed = measured_moisture({lot['cleaning_bin_id'] for lot in lots if lot.get('cleaning_bin_id')}, now)
+    suggestions = []
+    for lot in lots:
+        bin_id = lot.get('cleaning_bin_id')
+        current = lot.get('current_moisture')
+        if current is None:
+            current = sensed.get(bin_id)
+        factor, samples = factors.get(bin_id, (plant, 0))
+        raw = water_required(lot.get('mass_kg'), current, lot.get('target_moisture'))
+        suggestion = {
+            **lot,
+            'current_moisture': current,
+            'moisture_source': 'entered' if lot.get('current_moisture') is not None else 'sensor' if current is not None else None,
+            'absorption_factor': round(factor, 3),
+            'history_samples': samples,
+            'water_liters_ideal': round(raw, 1),
+            'water_liters': round(raw / factor, 1)
+        }
+        if lot.get('water_added_liters') is not None:
+            suggestion['water_remaining_liters'] = round(max(raw / factor - lot['water_added_liters'], 0), 1)
+        suggestions.append(suggestion)
+    return suggestions
+
+def lot_mass_kg(job):
+    """Mass of the lot a cleaning job is tempering, from its order quantity (tons)"""
+    return job.order.quantity * 1000 if job.order and job.order.quantity else None
+
+def active_lots():
+    """Lots in the cleaning bins now being tempered towards a target moisture"""
+    processes = CleaningProcess.query.options(
+        joinedload(CleaningProcess.cleaning_bin), joinedload(CleaningProcess.job).joinedload(ProductionJobNew.order)
+    ).filter(
+        CleaningProcess.status.in_(['running', 'paused']), CleaningProcess.target_moisture.isnot(None)
+    ).all()
+    return [{
+        'cleaning_process_id': process.id,
+        'cleaning_bin_id': process.cleaning_bin_id,
+        'bin_name': process.cleaning_bin.name if process.cleaning_bin else None,
+        'mass_kg': lot_mass_kg(process.job),
+        'current_moisture': process.start_moisture,
+        'target_moisture': process.target_moisture,
+        'water_added_liters': process.water_added_liters
+    } for process in processes]
@@ -0,0 +1,113 @@
+// Service worker: app shell and master data for offline use, background sync of the outbox
+importScripts('{{ url_for("static", filename="js/outbox.js") }}');
+
+const VERSION = '{{ version }}';
+const SHELL_CACHE = `shell-${VERSION}`;
+const PAGE_CACHE = 'pages';
+const DATA_CACHE = 'master-data';
+const PAGES = {{ pages|tojson }};
+const ASSETS = {{ assets|tojson }};
+const MASTER_DATA = {{ master_data|tojson }};
+const NETWORK_TIMEOUT_MS = 3000;
+
+function precache(cacheName, urls) {
+    return caches.open(cacheName).then(cache => Promise.all(urls.map(url => {
+        const sameOrigin = new URL(url, self.location.href).origin === self.location.origin;
+        return fetch(new Request(url, { mode: sameOrigin ? 'same-origin' : 'no-cors', credentials: 'same-origin' }))
+            .then(response => (response.ok || response.type === 'opaque') && cache.put(url, response))
+            .catch(() => null);
+    })));
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(Promise.all([
+        precache(SHELL_CACHE, ASSETS),
+        precache(PAGE_CACHE, PAGES),
+        precache(DATA_CACHE, MASTER_DATA)
+    ]).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys()
+        .then(names => Promise.all(names.filter(name => name.startsWith('shell-') && name !== SHELL_CACHE).map(name => caches.delete(name))))
+        .then(() => self.clients.claim()));
+});
+
+function store(cacheName, request, response) {
+    if (response.ok || response.type === 'opaque') {
+        const copy = response.clone();
+        caches.open(cacheName).then(cache => cache.put(request, copy));
+    }
+    return response;
+}
+
+function offlinePage() {
+    return caches.match('/', { ignoreVary: true }).then(page => page || new Response(
+        '<!DOCTYPE html><meta name="viewport" content="width=device-width, initial-scale=1"><title>Offline</title>' +
+        '<p style="font-family:sans-serif;padding:2rem">This page has not been opened on this device yet and the server is unreachable.</p>',
+        { headers: { 'Content-Type': 'text/html; charset=utf-8' } }
+    ));
+}
+
+// Fresh copy when the network answers quickly, the cached one when it is slow or down
+async function networkFirst(request, cacheName) {
+    const network = fetch(request).then(response => store(cacheName, request, response));
+    const timeout = new Promise(resolve => setTimeout(resolve, NETWORK_TIMEOUT_MS, null));
+    try {
+        const response = await Promise.race([network, timeout]);
+        if (response) {
+            return response;
+        }
+        return (await caches.match(request, { ignoreVary: true })) || await network;
+    } catch (error) {
+        const cached = await caches.match(request, { ignoreVary: true });
+        if (cached) {
+            return cached;
+        }
+        if (request.mode === 'navigate') {
+            return offlinePage();
+        }
+        throw error;
+    }
+}
+
+// Fingerprinted bundles and versioned CDN files never change
+async function cacheFirst(request) {
+    return (await caches.match(request)) || store(SHELL_CACHE, request, await fetch(request));
+}
+
+// Unversioned /static files: answer from cache, refresh it for next time
+async function staleWhileRevalidate(request) {
+    const cached = await caches.match(request);
+    const network = fetch(request).then(response => store(SHELL_CACHE, request, response));
+    if (cached) {
+        network.catch(() => null);
+        return cached;
+    }
+    return network;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin;
+
+    if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request, PAGE_CACHE));
+    } else if (sameOrigin && url.pathname.startsWith('/api/masters/')) {
+        event.respondWith(networkFirst(request, DATA_CACHE));
+    } else if (sameOrigin && url.pathname.startsWith('/static/')) {
+        event.respondWith(staleWhileRevalidate(request));
+    } else if (!sameOrigin || url.pathname.startsWith('/assets/')) {
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === Outbox.SYNC_TAG) {
+        event.waitUntil(Outbox.sync());
+    }
+});
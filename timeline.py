@@ -0,0 +1,584 @@
+"""Production timeline: every production action kept as an immutable event.
+
+A flush that approves a plan, creates, starts, pauses, resumes or completes
+a job, transfers wheat, starts or finishes a cleaning process, finishes a
+machine cleaning, starts or finishes grinding or packs bags adds an event to
+production_event. Each event carries a snapshot of what the action recorded,
+so it reads the same after the rows change or are archived.
+
+The events are written when the transaction commits, together with the
+order_timeline rows they change. An order's timeline is a fold of its events
+in id order: status, the state and running/paused minutes of every job with
+its transfers, cleanings, grinding and packing, running minutes per stage
+and the event list. The tracking pages read that one row instead of the job
+and process tables. replay() drops every timeline and folds the whole log
+again; orders that predate the log are imported from their current rows
+first, by migration 0012 or `flask replay-timeline`. Triggers reject UPDATE
+and DELETE on production_event.
+
+Bulk statements bypass the flush: packing.pack_batch records its packing
+lines with record_packed(); other status changes go through the ORM.
+"""
+import json
+from datetime import datetime
+from sqlalchemy import DDL, delete, event, exists, insert, inspect, select, update
+from app import db
+from audit import discard_rolled_back, load_old_values, origin
+from db_routing import RoutingSession
+from models import (
+    CleaningProcess, GrindingProcess, MachineCleaningLog, OrderTimeline, PackingProcess, PrecleaningBin,
+    ProductionEvent, ProductionJobNew, ProductionMachine, ProductionOrder, ProductionPlan, ProductionTransfer, Product
+)
+from serializers import iso
+
+REPLAY_BATCH = 500
+
+_PENDING = 'timeline_pending'
+
+# Snapshot columns, named as on the rows so the tracking templates read events like the rows they replace
+JOB_FIELDS = ('job_number', 'stage', 'started_by', 'notes', 'created_at')
+TRANSFER_FIELDS = ('quantity_transferred', 'transfer_time', 'operator_name')
+CLEANING_FIELDS = (
+    'process_type', 'duration_hours', 'start_time', 'end_time', 'start_moisture', 'target_moisture', 'machine_name',
+    'operator_name'
+)
+CLEANING_END_FIELDS = ('actual_end_time', 'end_moisture', 'water_added_liters', 'waste_collected_kg')
+MACHINE_CLEANING_FIELDS = (
+    'process_step', 'cleaned_by', 'cleaning_start_time', 'cleaning_end_time', 'cleaning_duration_minutes',
+    'waste_collected_kg', 'photo_before', 'photo_after'
+)
+GRINDING_FIELDS = ('machine_name', 'start_time', 'input_quantity_kg', 'operator_name')
+GROUND_FIELDS = ('end_time', 'total_output_kg', 'main_products_kg', 'bran_kg', 'bran_percentage')
+PACKING_FIELDS = ('bag_weight_kg', 'number_of_bags', 'total_packed_kg', 'packed_time', 'operator_name')
+
+for dialect, statements in (
+    ('sqlite', [
+        f"CREATE TRIGGER IF NOT EXISTS production_event_no_{verb.lower()} BEFORE {verb} ON production_event "
+        f"BEGIN SELECT RAISE(ABORT, 'production_event is append-only'); END"
+        for verb in ('UPDATE', 'DELETE')
+    ]),
+    ('postgresql', [
+        "CREATE OR REPLACE FUNCTION production_event_append_only() RETURNS trigger AS $$ "
+        "BEGIN RAISE EXCEPTION 'production_event is append-only'; END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER production_event_append_only BEFORE UPDATE OR DELETE ON production_event "
+        "FOR EACH ROW EXECUTE FUNCTION production_event_append_only()",
+    ]),
+):
+    for statement in statements:
+        event.listen(ProductionEvent.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+def _snapshot(obj, fields):
+    data = {}
+    for field in fields:
+        value = obj[field] if isinstance(obj, dict) else getattr(obj, field)
+        data[field] = iso(value) if isinstance(value, datetime) else value
+    return data
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+def _minutes(start, end):
+    return max((end - start).total_seconds() / 60, 0) if start and end else 0
+
+def _status_change(obj, action):
+    """(old, new) status of a flushed row, None when it did not change; old is None for inserts"""
+    if action == 'insert':
+        return None, obj.status
+    history = inspect(obj).attrs.status.history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return (old, new) if old != new else None
+
+def _name(session, model, pk):
+    row = session.get(model, pk) if pk else None
+    return row.name if row else None
+
+def _machine(session, machine_id):
+    machine = session.get(ProductionMachine, machine_id) if machine_id else None
+    return {'name': machine.name, 'location': machine.location} if machine else {'name': None, 'location': None}
+
+# Event builders: (kind, occurred_at, data) for one row, also used to import rows that predate the log
+
+def _plan_approved(session, plan):
+    return 'plan_approved', None, {'plan_id': plan.id, 'planned_by': plan.planned_by}
+
+def _job_created(session, job):
+    return 'job_created', job.created_at, _snapshot(job, JOB_FIELDS)
+
+def _job_started(session, job):
+    return 'job_started', job.started_at, {'started_by': job.started_by}
+
+def _job_paused(session, job):
+    return 'job_paused', None, {}
+
+def _job_resumed(session, job):
+    return 'job_resumed', None, {}
+
+def _job_completed(session, job):
+    return 'job_completed', job.completed_at, {'completed_by': job.completed_by}
+
+def _transferred(session, transfer):
+    return 'transferred', transfer.transfer_time, {
+        'id': transfer.id, 'from_bin': {'name': _name(session, PrecleaningBin, transfer.from_precleaning_bin_id)},
+        **_snapshot(transfer, TRANSFER_FIELDS)
+    }
+
+def _cleaning_started(session, cleaning):
+    return 'cleaning_started', cleaning.start_time, {'id': cleaning.id, **_snapshot(cleaning, CLEANING_FIELDS)}
+
+def _cleaning_completed(session, cleaning):
+    return 'cleaning_completed', cleaning.actual_end_time, {
+        'id': cleaning.id, **_snapshot(cleaning, CLEANING_FIELDS + CLEANING_END_FIELDS)
+    }
+
+def _machine_cleaned(session, log):
+    return 'machine_cleaned', log.cleaning_end_time, {
+        'id': log.id, 'machine': _machine(session, log.machine_id), **_snapshot(log, MACHINE_CLEANING_FIELDS)
+    }
+
+def _grinding_started(session, grinding):
+    return 'grinding_started', grinding.start_time, {'id': grinding.id, **_snapshot(grinding, GRINDING_FIELDS)}
+
+def _ground(session, grinding):
+    return 'ground', grinding.end_time, {'id': grinding.id, **_snapshot(grinding, GRINDING_FIELDS + GROUND_FIELDS)}
+
+def _packed(session, packing):
+    return 'packed', packing.packed_time, {
+        'id': packing.id, 'product': _name(session, Product, packing.product_id), **_snapshot(packing, PACKING_FIELDS)
+    }
+
+# What a flushed row means, as event builders to run
+
+def _plan_events(plan, action):
+    change = _status_change(plan, action)
+    if change and change[1] == 'approved':
+        yield _plan_approved
+
+def _job_events(job, action):
+    if action == 'insert':
+        yield _job_created
+    change = _status_change(job, action)
+    if change is None:
+        return
+    old, new = change
+    if new == 'in_progress':
+        yield _job_resumed if old == 'paused' else _job_started
+    elif new == 'paused':
+        yield _job_paused
+    elif new == 'completed':
+        yield _job_completed
+
+def _transfer_events(transfer, action):
+    if action == 'insert':
+        yield _transferred
+
+def _cleaning_events(cleaning, action):
+    change = _status_change(cleaning, action)
+    if change is None:
+        return
+    old, new = change
+    if new == 'running' and old in (None, 'pending'):
+        yield _cleaning_started
+    elif new == 'completed':
+        yield _cleaning_completed
+
+def _machine_cleaning_events(log, action):
+    change = _status_change(log, action)
+    if change and change[1] == 'completed':
+        yield _machine_cleaned
+
+def _grinding_events(grinding, action):
+    change = _status_change(grinding, action)
+    if change is None:
+        return
+    if change[1] == 'in_progress':
+        yield _grinding_started
+    elif change[1] == 'completed':
+        yield _ground
+
+def _packing_events(packing, action):
+    if action == 'insert':
+        yield _packed
+
+WATCHED = {
+    ProductionPlan: _plan_events,
+    ProductionJobNew: _job_events,
+    ProductionTransfer: _transfer_events,
+    CleaningProcess: _cleaning_events,
+    MachineCleaningLog: _machine_cleaning_events,
+    GrindingProcess: _grinding_events,
+    PackingProcess: _packing_events,
+}
+
+# A status set on a row expired by an earlier commit must still show what it changed from
+for _model in WATCHED:
+    load_old_values(inspect(_model), {'status'})
+
+def _owner(session, obj):
+    """(order id, job id, stage) an event on obj belongs to"""
+    if isinstance(obj, ProductionPlan):
+        return obj.order_id, None, None
+    job = obj if isinstance(obj, ProductionJobNew) else (session.get(ProductionJobNew, obj.job_id) if obj.job_id else None)
+    return (job.order_id, job.id, job.stage) if job else (None, None, None)
+
+def _record(order_id, job_id, stage, built):
+    kind, occurred_at, data = built
+    return {'order_id': order_id, 'job_id': job_id, 'stage': stage, 'kind': kind, 'data': data,
+            'occurred_at': occurred_at or datetime.now()}
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect(session, flush_context):
+    """Hold the events of this flush on the session until commit"""
+    records = []
+    for action, objects in (('insert', session.new), ('update', session.dirty)):
+        for obj in objects:
+            emitter = WATCHED.get(type(obj))
+            if emitter is None:
+                continue
+            builders = list(emitter(obj, action))
+            if not builders:
+                continue
+            order_id, job_id, stage = _owner(session, obj)
+            if order_id is None:
+                continue
+            records.extend(_record(order_id, job_id, stage, build(session, obj)) for build in builders)
+    for obj in session.deleted:
+        if isinstance(obj, ProductionOrder):
+            records.append(_record(obj.id, None, None, ('order_deleted', None, {})))
+    if records:
+        session.info.setdefault(_PENDING, []).append((session.get_nested_transaction(), records))
+
+def record_packed(job, packing_rows):
+    """Events for packing lines bulk inserted by packing.pack_batch, which the flush does not see"""
+    session = db.session()
+    records = [_record(job.order_id, job.id, job.stage, ('packed', row['packed_time'], {
+        'product': _name(session, Product, row['product_id']), **_snapshot(row, PACKING_FIELDS)
+    })) for row in packing_rows]
+    session.info.setdefault(_PENDING, []).append((session.get_nested_transaction(), records))
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    discard_rolled_back(session, _PENDING, previous_transaction)
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _write(session):
+    """Append the transaction's events and fold them into their orders' timelines, inside the transaction"""
+    if session.get_nested_transaction() is not None:
+        return
+    session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    actor, _ = origin()
+    records = [{**record, 'actor': actor} for _, batch in pending for record in batch]
+    stmt = insert(ProductionEvent)
+    connection = session.connection(bind_arguments={'clause': stmt})
+    # Locked before the events are numbered, so on PostgreSQL an order's events are folded in id order
+    rows = {row.order_id: row for row in connection.execute(
+        select(OrderTimeline).where(OrderTimeline.order_id.in_({r['order_id'] for r in records})).with_for_update()
+    )}
+    connection.execute(stmt, [{**record, 'data': json.dumps(record['data'], default=str)} for record in records])
+
+    states = {order_id: _state(row) for order_id, row in rows.items()}
+    for record in records:
+        order_id = record['order_id']
+        states[order_id] = _apply(states[order_id] if order_id in states else _new_state(), record)
+    now = datetime.utcnow()
+    for order_id, state in states.items():
+        row = rows.get(order_id)
+        if state is None:
+            if row is not None:
+                connection.execute(delete(OrderTimeline).where(OrderTimeline.id == row.id))
+        elif row is not None:
+            connection.execute(update(OrderTimeline).where(OrderTimeline.id == row.id).values(_values(state, now)))
+        else:
+            connection.execute(insert(OrderTimeline).values(order_id=order_id, **_values(state, now)))
+
+# Fold
+
+def _new_state():
+    return {'status': 'planned', 'current_stage': None, 'plan_approved_at': None, 'started_at': None,
+            'completed_at': None, 'active_minutes': 0, 'jobs': [], 'stage_minutes': {}, 'events': []}
+
+def _state(row):
+    return {
+        'status': row.status, 'current_stage': row.current_stage, 'plan_approved_at': iso(row.plan_approved_at),
+        'started_at': iso(row.started_at), 'completed_at': iso(row.completed_at), 'active_minutes': row.active_minutes or 0,
+        'jobs': json.loads(row.jobs or '[]'), 'stage_minutes': json.loads(row.stage_minutes or '{}'),
+        'events': json.loads(row.events or '[]'),
+    }
+
+def _values(state, now):
+    return {
+        'status': state['status'], 'current_stage': state['current_stage'],
+        'plan_approved_at': _parse(state['plan_approved_at']), 'started_at': _parse(state['started_at']),
+        'completed_at': _parse(state['completed_at']), 'active_minutes': state['active_minutes'],
+        'jobs': json.dumps(state['jobs']), 'stage_minutes': json.dumps(state['stage_minutes']),
+        'events': json.dumps(state['events']), 'event_count': len(state['events']), 'updated_at': now,
+    }
+
+def _new_job(job_id, stage):
+    return {
+        'id': job_id, 'job_number': None, 'stage': stage, 'status': 'pending', 'created_at': None,
+        'started_at': None, 'completed_at': None, 'started_by': None, 'completed_by': None, 'notes': None,
+        'active_minutes': 0, 'paused_minutes': 0, 'running_since': None, 'paused_since': None,
+        'transfers': [], 'cleaning_processes': [], 'machine_cleanings': [], 'grinding_processes': [],
+        'packing_processes': [],
+        'cleaning_stats': {'total_cleanings': 0, 'total_cleaning_time_minutes': 0, 'total_waste_kg': 0},
+    }
+
+def _job(state, record):
+    for job in state['jobs']:
+        if job['id'] == record['job_id']:
+            return job
+    job = _new_job(record['job_id'], record['stage'])
+    state['jobs'].append(job)
+    state['jobs'].sort(key=lambda j: j['id'])
+    return job
+
+def _process(processes, data, status):
+    """Merge data into the process entry with data's id, adding it if new"""
+    for process in processes:
+        if process['id'] == data['id']:
+            process.update(data, status=status)
+            return
+    processes.append({**data, 'status': status})
+
+def _stop_running(job, at):
+    if job['running_since']:
+        job['active_minutes'] = round(job['active_minutes'] + _minutes(_parse(job['running_since']), at), 1)
+        job['running_since'] = None
+
+def _end_pause(job, at):
+    if job['paused_since']:
+        job['paused_minutes'] = round(job['paused_minutes'] + _minutes(_parse(job['paused_since']), at), 1)
+        job['paused_since'] = None
+
+def _apply(state, record):
+    """The order state after one event; None once the order is deleted"""
+    kind, data, at = record['kind'], record['data'], record['occurred_at']
+    if kind == 'order_deleted':
+        return None
+    if state is None:
+        state = _new_state()
+    stamp = iso(at)
+    state['events'].append({'at': stamp, 'kind': kind, 'job_id': record['job_id'], 'stage': record['stage'],
+                            'actor': record['actor']})
+    if kind == 'plan_approved':
+        state['plan_approved_at'] = stamp
+        return _summarise(state)
+
+    job = _job(state, record)
+    if kind == 'job_created':
+        job.update(data)
+    elif kind == 'job_started':
+        _end_pause(job, at)
+        job.update(status='in_progress', started_at=job['started_at'] or stamp, running_since=stamp)
+        job['started_by'] = data.get('started_by') or job['started_by']
+    elif kind == 'job_paused':
+        _stop_running(job, at)
+        job.update(status='paused', paused_since=stamp)
+        for cleaning in job['cleaning_processes']:
+            if cleaning['status'] == 'running':
+                cleaning['status'] = 'paused'
+    elif kind == 'job_resumed':
+        _end_pause(job, at)
+        job.update(status='in_progress', running_since=stamp)
+        for cleaning in job['cleaning_processes']:
+            if cleaning['status'] == 'paused':
+                cleaning['status'] = 'running'
+    elif kind == 'job_completed':
+        _stop_running(job, at)
+        _end_pause(job, at)
+        job.update(status='completed', completed_at=stamp, completed_by=data.get('completed_by'))
+    elif kind == 'transferred':
+        job['transfers'].append(data)
+    elif kind == 'cleaning_started':
+        _process(job['cleaning_processes'], data, 'running')
+    elif kind == 'cleaning_completed':
+        _process(job['cleaning_processes'], data, 'completed')
+    elif kind == 'machine_cleaned':
+        job['machine_cleanings'].append({**data, 'status': 'completed'})
+        stats = job['cleaning_stats']
+        stats['total_cleanings'] += 1
+        stats['total_cleaning_time_minutes'] += data.get('cleaning_duration_minutes') or 0
+        stats['total_waste_kg'] = round(stats['total_waste_kg'] + (data.get('waste_collected_kg') or 0), 2)
+    elif kind == 'grinding_started':
+        _process(job['grinding_processes'], data, 'in_progress')
+    elif kind == 'ground':
+        _process(job['grinding_processes'], data, 'completed')
+    elif kind == 'packed':
+        job['packing_processes'].append(data)
+    return _summarise(state)
+
+def _summarise(state):
+    """Order-level fields derived from the job states"""
+    jobs = state['jobs']
+    stage_minutes = {}
+    for job in jobs:
+        stage_minutes[job['stage']] = round(stage_minutes.get(job['stage'], 0) + job['active_minutes'], 1)
+    state['stage_minutes'] = stage_minutes
+    state['active_minutes'] = round(sum(stage_minutes.values()), 1)
+    started = [job['started_at'] for job in jobs if job['started_at']]
+    state['started_at'] = min(started) if started else None
+    if jobs and all(job['status'] == 'completed' for job in jobs):
+        state['status'] = 'completed'
+        state['completed_at'] = max(job['completed_at'] for job in jobs)
+        state['current_stage'] = jobs[-1]['stage']
+        return state
+    state['completed_at'] = None
+    active = [job for job in jobs if job['status'] in ('in_progress', 'paused')]
+    waiting = [job for job in jobs if job['status'] == 'pending']
+    state['status'] = 'in_progress' if active or started or any(job['status'] == 'completed' for job in jobs) else 'planned'
+    state['current_stage'] = active[-1]['stage'] if active else (waiting[0]['stage'] if waiting else None)
+    return state
+
+# Reading
+
+def _revive(value, key=''):
+    """Timestamps in a timeline back to datetimes, for templates that format them"""
+    if isinstance(value, dict):
+        return {k: _revive(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_revive(v) for v in value]
+    if isinstance(value, str) and key.endswith(('_at', '_time', '_since')):
+        return _parse(value)
+    return value
+
+def _timeline_dict(row):
+    state = _state(row)
+    return {**_revive(state), 'order_id': row.order_id, 'event_count': row.event_count, 'updated_at': row.updated_at}
+
+def empty_timeline(order_id):
+    """Timeline of an order without events yet"""
+    return {**_new_state(), 'order_id': order_id, 'event_count': 0, 'updated_at': None}
+
+def order_timeline(order_id):
+    """The projected timeline of one order"""
+    row = db.session.execute(select(OrderTimeline).where(OrderTimeline.order_id == order_id)).scalars().first()
+    return _timeline_dict(row) if row is not None else empty_timeline(order_id)
+
+def order_timelines(order_ids):
+    """{order id: timeline} of the given orders that have one"""
+    if not order_ids:
+        return {}
+    rows = db.session.execute(select(OrderTimeline).where(OrderTimeline.order_id.in_(order_ids))).scalars()
+    return {row.order_id: _timeline_dict(row) for row in rows}
+
+def order_events(order_id):
+    """Every event of one order, oldest first"""
+    rows = db.session.execute(
+        select(ProductionEvent).where(ProductionEvent.order_id == order_id).order_by(ProductionEvent.id)
+    ).scalars().all()
+    return [{
+        'id': row.id, 'kind': row.kind, 'job_id': row.job_id, 'stage': row.stage,
+        'data': json.loads(row.data) if row.data else {}, 'actor': row.actor, 'occurred_at': iso(row.occurred_at)
+    } for row in rows]
+
+# Import and replay
+
+def _order_history(session, order):
+    """Events describing an order that predates the log, from its current rows, oldest first"""
+    from archive import load_history
+    built = []
+
+    def add(job, build, obj):
+        built.append(_record(order.id, job.id if job else None, job.stage if job else None, build(session, obj)))
+
+    plan = ProductionPlan.query.filter_by(order_id=order.id).first()
+    if plan is not None and plan.status in ('approved', 'executed'):
+        # The approval time is not kept on the plan; it was approved after it was drawn up
+        built.append(_record(order.id, None, None, ('plan_approved', plan.planning_date, _plan_approved(session, plan)[2])))
+    for job in ProductionJobNew.query.filter_by(order_id=order.id).order_by(ProductionJobNew.id):
+        add(job, _job_created, job)
+        if job.started_at or job.status in ('in_progress', 'paused'):
+            add(job, _job_started, job)
+        for transfer in ProductionTransfer.query.filter_by(job_id=job.id).order_by(ProductionTransfer.id):
+            add(job, _transferred, transfer)
+        for cleaning in CleaningProcess.query.filter_by(job_id=job.id).order_by(CleaningProcess.id):
+            if cleaning.status != 'pending':
+                add(job, _cleaning_started, cleaning)
+            if cleaning.status == 'completed':
+                add(job, _cleaning_completed, cleaning)
+        for log in load_history(MachineCleaningLog, job_id=job.id):
+            if log.status == 'completed':
+                add(job, _machine_cleaned, log)
+        for grinding in GrindingProcess.query.filter_by(job_id=job.id).order_by(GrindingProcess.id):
+            if grinding.status in ('in_progress', 'completed'):
+                add(job, _grinding_started, grinding)
+            if grinding.status == 'completed':
+                add(job, _ground, grinding)
+        for packing in PackingProcess.query.filter_by(job_id=job.id).order_by(PackingProcess.id):
+            add(job, _packed, packing)
+        if job.status == 'paused':
+            add(job, _job_paused, job)
+        elif job.status == 'completed':
+            add(job, _job_completed, job)
+    # Stable, so a job's creation stays ahead of actions stamped with the same time
+    return sorted(built, key=lambda record: record['occurred_at'])
+
+def import_existing(log=None):
+    """Add events for orders that have none yet, built from their jobs and processes; returns the event count"""
+    session = db.session
+    orders = ProductionOrder.query.filter(
+        ~exists().where(ProductionEvent.order_id == ProductionOrder.id)
+    ).order_by(ProductionOrder.id).all()
+    written = 0
+    for order in orders:
+        records = _order_history(session, order)
+        if not records:
+            continue
+        stmt = insert(ProductionEvent)
+        session.connection(bind_arguments={'clause': stmt}).execute(stmt, [
+            {**record, 'actor': None, 'data': json.dumps(record['data'], default=str)} for record in records
+        ])
+        written += len(records)
+        if log:
+            log(f"{order.order_number}: {len(records)} event(s) imported")
+    session.commit()
+    return written
+
+def import_and_replay(log=None):
+    """Import orders that predate the log, then rebuild every timeline; returns (imported, timelines, events)"""
+    imported = import_existing(log=log)
+    timelines, events = replay(log=log)
+    return imported, timelines, events
+
+def replay(log=None):
+    """Drop every order timeline and fold the whole event log again; returns (timelines, events)"""
+    session = db.session
+    now = datetime.utcnow()
+    stmt = insert(OrderTimeline)
+    connection = session.connection(bind_arguments={'clause': stmt})
+    connection.execute(delete(OrderTimeline))
+    events = select(ProductionEvent).order_by(ProductionEvent.order_id, ProductionEvent.id)
+    batch, timelines, folded = [], 0, 0
+    order_id, state = None, None
+
+    def finish():
+        nonlocal timelines
+        if state is not None:
+            batch.append({'order_id': order_id, **_values(state, now)})
+            timelines += 1
+        if len(batch) >= REPLAY_BATCH:
+            connection.execute(stmt, batch)
+            batch.clear()
+
+    for row in session.execute(events.execution_options(yield_per=REPLAY_BATCH)).scalars():
+        if row.order_id != order_id:
+            finish()
+            order_id, state = row.order_id, _new_state()
+        state = _apply(state, {
+            'kind': row.kind, 'job_id': row.job_id, 'stage': row.stage, 'actor': row.actor,
+            'data': json.loads(row.data) if row.data else {}, 'occurred_at': row.occurred_at,
+        })
+        folded += 1
+    finish()
+    if batch:
+        connection.execute(stmt, batch)
+    session.commit()
+    if log:
+        log(f"{folded} event(s) folded into {timelines} timeline(s)")
+    return timelines, folded
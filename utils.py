@@ -1,7 +1,7 @@
 import os
-import random
-import string
 from datetime import datetime
+from flask import current_app
+from werkzeug.utils import secure_filename
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
 
@@ -11,15 +11,13 @@ def allowed_file(filename):
 
 def generate_order_number(prefix='PO'):
     """Generate unique order number"""
-    timestamp = datetime.now().strftime('%Y%m%d%H%M')
-    random_suffix = ''.join(random.choices(string.digits, k=4))
-    return f"{prefix}{timestamp}{random_suffix}"
+    from sequences import order_number
+    return order_number(prefix)
 
 def generate_job_id():
     """Generate unique job ID"""
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"JOB{timestamp}{random_suffix}"
+    from sequences import job_number
+    return job_number()
 
 def calculate_production_percentages(plan_items, total_quantity):
     """Calculate quantities based on percentages"""
@@ -46,3 +44,11 @@ def get_file_url(filename):
         return f"/uploads/{filename}"
     return None
 # Removed duplicate functions - using the ones above
+
+def save_upload(file, prefix):
+    """Save an uploaded file under UPLOAD_FOLDER as <prefix>_<timestamp>_<name>; None if absent or not allowed"""
+    if not file or not file.filename or not allowed_file(file.filename):
+        return None
+    filename = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(file.filename)}"
+    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    return filename
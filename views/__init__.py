@@ -0,0 +1,10 @@
+"""Blueprints for each subsystem of the plant, registered by create_app()"""
+
+BLUEPRINTS = ['auth', 'core', 'intake', 'quality', 'inventory', 'production', 'cleaning', 'packing', 'dispatch', 'api']
+
+def register_blueprints(app):
+    """Import and register every blueprint; view modules are only loaded here"""
+    from importlib import import_module
+
+    for name in BLUEPRINTS:
+        app.register_blueprint(import_module(f'views.{name}').bp)
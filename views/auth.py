@@ -0,0 +1,35 @@
+"""Sign-in and sign-out"""
+from urllib.parse import urlsplit
+from flask import Blueprint, request, render_template, redirect, url_for, flash
+from auth import authenticate, login, logout, public
+from idempotency import idempotency_exempt
+
+bp = Blueprint('auth', __name__)
+
+def _safe_next(target):
+    # Only paths on this site, never another host; browsers read a backslash as a slash and drop control characters
+    if target and target.startswith('/') and target.isprintable() and '\\' not in target:
+        parts = urlsplit(target)
+        if not parts.scheme and not parts.netloc:
+            return target
+    return url_for('core.index')
+
+@bp.route('/login', methods=['GET', 'POST'])
+@public
+@idempotency_exempt
+def login_page():
+    if request.method == 'POST':
+        user = authenticate(request.form.get('username', '').strip(), request.form.get('password', ''))
+        if user:
+            login(user)
+            return redirect(_safe_next(request.form.get('next')))
+        flash('Invalid username or password', 'error')
+    return render_template('login.html', next=request.values.get('next', ''))
+
+@bp.route('/logout', methods=['POST'])
+@public
+@idempotency_exempt
+def logout_page():
+    logout()
+    flash('Signed out', 'success')
+    return redirect(url_for('auth.login_page'))
@@ -0,0 +1,405 @@
+"""Cleaning bins, B1 scale and machine cleaning"""
+import os
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, flash
+from werkzeug.utils import secure_filename
+from app import db
+from models import *
+from utils import allowed_file
+
+bp = Blueprint('cleaning', __name__)
+
+@bp.route('/cleaning_management', methods=['GET', 'POST'])
+def cleaning_management():
+    if request.method == 'POST':
+        try:
+            # Handle photo uploads
+            photo_before = None
+            photo_after = None
+
+            if 'photo_before' in request.files:
+                file = request.files['photo_before']
+                if file and file.filename and allowed_file(file.filename):
+                    filename = secure_filename(file.filename)
+                    filename = f"before_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                    photo_before = filename
+
+            if 'photo_after' in request.files:
+                file = request.files['photo_after']
+                if file and file.filename and allowed_file(file.filename):
+                    filename = secure_filename(file.filename)
+                    filename = f"after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                    photo_after = filename
+
+            cleaning_log = CleaningLog()
+            cleaning_log.machine_id = int(request.form['machine_id'])
+            cleaning_log.cleaned_by = request.form['cleaned_by']
+            cleaning_log.photo_before = photo_before
+            cleaning_log.photo_after = photo_after
+            cleaning_log.waste_collected = float(request.form.get('waste_collected', 0))
+            cleaning_log.notes = request.form.get('notes')
+
+            # Update machine's last cleaned time
+            machine = CleaningMachine.query.get(request.form['machine_id'])
+            if machine:
+                machine.last_cleaned = datetime.now()
+
+            db.session.add(cleaning_log)
+            db.session.commit()
+            flash('Cleaning log recorded successfully!', 'success')
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error recording cleaning log: {str(e)}', 'error')
+
+    machines = CleaningMachine.query.all()
+    recent_logs = CleaningLog.query.join(CleaningMachine).order_by(CleaningLog.cleaning_time.desc()).limit(20).all()
+
+    # Check for machines due for cleaning
+    due_machines = []
+    for machine in machines:
+        if machine.last_cleaned:
+            next_cleaning = machine.last_cleaned + timedelta(hours=machine.cleaning_frequency_hours)
+            if datetime.now() >= next_cleaning:
+                due_machines.append(machine)
+        else:
+            due_machines.append(machine)  # Never cleaned
+
+    return render_template('cleaning_management.html', machines=machines, cleaning_logs=recent_logs, due_machines=due_machines)
+
+@bp.route('/machine_cleaning')
+def machine_cleaning():
+    """General machine cleaning overview"""
+    machines = CleaningMachine.query.all()
+
+    # Get recent cleaning logs
+    recent_logs = MachineCleaningLog.query.join(ProductionMachine).order_by(MachineCleaningLog.cleaning_start_time.desc()).limit(20).all()
+
+    # Get in-progress cleanings
+    in_progress = MachineCleaningLog.query.filter_by(status='in_progress').all()
+
+    # Check for machines due for cleaning
+    due_machines = []
+    for machine in machines:
+        if machine.last_cleaned:
+            next_cleaning = machine.last_cleaned + timedelta(hours=machine.cleaning_frequency_hours)
+            if datetime.now() >= next_cleaning:
+                due_machines.append(machine)
+        else:
+            due_machines.append(machine)  # Never cleaned
+
+    return render_template('machine_cleaning_overview.html', 
+                         machines=machines, 
+                         recent_logs=recent_logs,
+                         in_progress=in_progress, 
+                         due_machines=due_machines)
+
+# MACHINE CLEANING PROCESS WITH PROPER CONTROLS
+@bp.route('/process_machine_cleaning/<int:job_id>', methods=['GET', 'POST'])
+def process_machine_cleaning(job_id):
+    job = ProductionJobNew.query.get_or_404(job_id)
+
+    if request.method == 'POST':
+        try:
+            action = request.form.get('action')
+
+            if action == 'start_cleaning':
+                machine_id = int(request.form['machine_id'])
+
+                # Handle before photo upload
+                before_photo = None
+                if 'before_photo' in request.files:
+                    file = request.files['before_photo']
+                    if file and file.filename and allowed_file(file.filename):
+                        filename = secure_filename(file.filename)
+                        filename = f"machine_before_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                        before_photo = filename
+
+                # Create cleaning log
+                cleaning_log = MachineCleaningLog(
+                    machine_id=machine_id,
+                    production_order_id=job.order_id,
+                    job_id=job_id,
+                    process_step=job.stage,
+                    cleaned_by=request.form['cleaned_by'],
+                    photo_before=before_photo,
+                    status='in_progress'
+                )
+
+                db.session.add(cleaning_log)
+                db.session.commit()
+
+                flash('Machine cleaning started!', 'success')
+                return redirect(url_for('cleaning.complete_process_machine_cleaning', log_id=cleaning_log.id))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error starting machine cleaning: {str(e)}', 'error')
+
+    # Get machines that need cleaning
+    machines = CleaningMachine.query.all()
+
+    # Get pending and recent cleaning logs for this job
+    pending_cleanings = MachineCleaningLog.query.filter_by(
+        job_id=job_id,
+        status='scheduled'
+    ).all()
+
+    recent_logs = MachineCleaningLog.query.filter_by(
+        job_id=job_id
+    ).order_by(MachineCleaningLog.cleaning_start_time.desc()).limit(10).all()
+
+    # Get in-progress cleaning logs for this job
+    in_progress_cleanings = MachineCleaningLog.query.filter_by(
+        job_id=job_id,
+        status='in_progress'
+    ).all()
+
+    return render_template('process_machine_cleaning.html',
+                         job=job,
+                         machines=machines,
+                         pending_cleanings=pending_cleanings,
+                         recent_logs=recent_logs,
+                         in_progress_cleanings=in_progress_cleanings)
+
+@bp.route('/complete_process_machine_cleaning/<int:log_id>', methods=['GET', 'POST'])
+def complete_process_machine_cleaning(log_id):
+    log = MachineCleaningLog.query.get_or_404(log_id)
+
+    if request.method == 'POST':
+        try:
+            # Handle after photo upload
+            after_photo = None
+            if 'after_photo' in request.files:
+                file = request.files['after_photo']
+                if file and file.filename and allowed_file(file.filename):
+                    filename = secure_filename(file.filename)
+                    filename = f"machine_after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                    after_photo = filename
+
+            # Complete the cleaning log
+            log.cleaning_end_time = datetime.now()
+            log.photo_after = after_photo
+            log.waste_collected_kg = float(request.form.get('waste_collected', 0))
+            log.notes = request.form.get('notes', '')
+            log.status = 'completed'
+
+            # Calculate cleaning duration
+            if log.cleaning_start_time:
+                duration = log.cleaning_end_time - log.cleaning_start_time
+                log.cleaning_duration_minutes = int(duration.total_seconds() / 60)
+
+            # Update machine last cleaned time
+            if log.machine:
+                log.machine.last_cleaned = log.cleaning_end_time
+
+            db.session.commit()
+
+            flash('Machine cleaning completed successfully!', 'success')
+            return redirect(url_for('cleaning.process_machine_cleaning', job_id=log.job_id))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error completing machine cleaning: {str(e)}', 'error')
+
+    return render_template('complete_machine_cleaning.html', log=log)
+
+@bp.route('/production_execution/cleaning_setup/<int:job_id>')
+def cleaning_setup(job_id):
+    """Set up 24-hour cleaning process"""
+    job = ProductionJobNew.query.get_or_404(job_id)
+    # Get available cleaning bins
+    cleaning_bins = CleaningBin.query.filter_by(status='available').all()
+    return render_template('cleaning_setup.html', job=job, cleaning_bins=cleaning_bins)
+
+@bp.route('/production_execution/cleaning_12h_setup/<int:job_id>', methods=['GET', 'POST'])
+def cleaning_12h_setup(job_id):
+    """Set up 12-hour cleaning process"""
+    job = ProductionJobNew.query.get_or_404(job_id)
+    
+    if request.method == 'POST':
+        try:
+            # Get duration from form
+            duration_option = request.form.get('duration_option', '12')
+            if duration_option == 'custom':
+                duration_hours = float(request.form.get('custom_hours', 12))
+            else:
+                duration_hours = float(duration_option)
+
+            # Create 12-hour cleaning process
+            cleaning_process = CleaningProcess()
+            cleaning_process.job_id = job_id
+            cleaning_process.process_type = f'{int(duration_hours)}_hour' if duration_hours == int(duration_hours) else 'custom'
+            cleaning_process.duration_hours = duration_hours
+            cleaning_process.start_time = datetime.now()
+            cleaning_process.end_time = datetime.now() + timedelta(hours=duration_hours)
+            cleaning_process.start_moisture = float(request.form.get('start_moisture', 0)) if request.form.get('start_moisture') else None
+            cleaning_process.target_moisture = float(request.form.get('target_moisture', 0)) if request.form.get('target_moisture') else None
+            cleaning_process.water_added_liters = float(request.form.get('water_added_liters') or 0)
+            cleaning_process.operator_name = request.form['operator_name']
+            cleaning_process.machine_name = request.form.get('machine_name', '12-Hour Cleaning Machine')
+            cleaning_process.status = 'running'
+
+            # Handle cleaning bin assignment if provided
+            if request.form.get('cleaning_bin_id'):
+                cleaning_process.cleaning_bin_id = int(request.form['cleaning_bin_id'])
+                # Update bin status
+                cleaning_bin = CleaningBin.query.get(cleaning_process.cleaning_bin_id)
+                if cleaning_bin:
+                    cleaning_bin.status = 'cleaning'
+
+            # Update job status
+            job.status = 'in_progress'
+            job.started_at = datetime.now()
+            job.started_by = request.form['operator_name']
+
+            db.session.add(cleaning_process)
+            db.session.commit()
+
+            flash(f'{duration_hours}-hour cleaning process started successfully!', 'success')
+            return redirect(url_for('production.production_execution'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error starting 12-hour cleaning process: {str(e)}', 'error')
+            return redirect(url_for('cleaning.cleaning_12h_setup', job_id=job_id))
+    
+    # GET request - show the form
+    from tempering import lot_mass_kg
+    cleaning_bins_12h = CleaningBin.query.filter_by(status='available').all()
+    return render_template('cleaning_12h_setup.html', job=job, cleaning_bins_12h=cleaning_bins_12h, lot_mass_kg=lot_mass_kg(job))
+
+@bp.route('/production_execution/b1_scale/<int:job_id>', methods=['GET', 'POST'])
+def b1_scale_process(job_id):
+    """B1 scale and grinding process"""
+    job = ProductionJobNew.query.get_or_404(job_id)
+    
+    if request.method == 'POST':
+        try:
+            action = request.form.get('action')
+            
+            if action == 'start_b1_scale':
+                # Update grinding process with B1 scale info
+                grinding_process = GrindingProcess.query.filter_by(job_id=job_id).first()
+                if not grinding_process:
+                    # Create new grinding process
+                    grinding_process = GrindingProcess()
+                    grinding_process.job_id = job_id
+                    grinding_process.machine_name = 'B1 Scale + Grinding Machine'
+                    grinding_process.start_time = datetime.now()
+                    grinding_process.status = 'in_progress'
+                    db.session.add(grinding_process)
+                
+                # Update B1 scale specific fields
+                grinding_process.b1_scale_operator = request.form['operator_name']
+                grinding_process.b1_scale_start_time = datetime.now()
+                grinding_process.b1_scale_weight_kg = float(request.form['input_weight'])
+                grinding_process.input_quantity_kg = float(request.form['input_weight'])
+                grinding_process.operator_name = request.form['operator_name']
+                
+                # Update job status
+                job.status = 'in_progress'
+                job.started_at = datetime.now()
+                job.started_by = request.form['operator_name']
+                
+                db.session.commit()
+                flash('B1 Scale process started successfully!', 'success')
+                return redirect(url_for('production.grinding_execution', job_id=job_id))
+                
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error starting B1 scale process: {str(e)}', 'error')
+    
+    # Check if grinding process exists
+    existing_grinding = GrindingProcess.query.filter_by(job_id=job_id).first()
+    
+    # Get or create B1 machine for template
+    b1_machine = B1ScaleCleaning.query.first()
+    if not b1_machine:
+        b1_machine = B1ScaleCleaning(
+            machine_name='B1 Scale',
+            cleaning_frequency_minutes=60,
+            last_cleaned=datetime.now(),
+            status='due'
+        )
+        db.session.add(b1_machine)
+        db.session.commit()
+    
+    # Check if cleaning is required
+    cleaning_required = False
+    if b1_machine.last_cleaned:
+        time_since_cleaned = datetime.now() - b1_machine.last_cleaned
+        if time_since_cleaned.total_seconds() > (b1_machine.cleaning_frequency_minutes * 60):
+            cleaning_required = True
+    else:
+        cleaning_required = True
+    
+    # Calculate time until cleaning
+    time_until_cleaning = 0
+    cleaning_urgent = False
+    if b1_machine.last_cleaned:
+        time_since_cleaned = datetime.now() - b1_machine.last_cleaned
+        time_until_cleaning = (b1_machine.cleaning_frequency_minutes * 60) - time_since_cleaned.total_seconds()
+        time_until_cleaning = max(0, time_until_cleaning / 60)  # Convert to minutes
+        cleaning_urgent = time_until_cleaning <= 5
+    
+    return render_template('b1_scale_process.html', 
+                         job=job, 
+                         existing_grinding=existing_grinding,
+                         b1_machine=b1_machine,
+                         cleaning_required=cleaning_required,
+                         time_until_cleaning=time_until_cleaning,
+                         cleaning_urgent=cleaning_urgent)
+
+@bp.route('/process_cleaning_24h/<int:job_id>', methods=['POST'])
+def process_cleaning_24h(job_id):
+    """Process 24-hour cleaning start"""
+    try:
+        job = ProductionJobNew.query.get_or_404(job_id)
+
+        # Get duration from form
+        duration_option = request.form.get('duration_option', '24')
+        if duration_option == 'custom':
+            duration_hours = float(request.form.get('custom_hours', 24))
+        else:
+            duration_hours = float(duration_option)
+
+        # Create cleaning process
+        cleaning_process = CleaningProcess()
+        cleaning_process.job_id = job_id
+        cleaning_process.process_type = f'{int(duration_hours)}_hour' if duration_hours == int(duration_hours) else 'custom'
+        cleaning_process.duration_hours = duration_hours
+        cleaning_process.start_time = datetime.now()
+        cleaning_process.end_time = datetime.now() + timedelta(hours=duration_hours)
+        cleaning_process.start_moisture = float(request.form.get('initial_moisture', 0)) if request.form.get('initial_moisture') else None
+        cleaning_process.operator_name = request.form['operator_name']
+        cleaning_process.machine_name = request.form.get('machine_name', 'Cleaning Machine')
+        cleaning_process.status = 'running'
+
+        # Handle cleaning bin assignment if provided
+        if request.form.get('cleaning_bin_id'):
+            cleaning_process.cleaning_bin_id = int(request.form['cleaning_bin_id'])
+            # Update bin status
+            cleaning_bin = CleaningBin.query.get(cleaning_process.cleaning_bin_id)
+            if cleaning_bin:
+                cleaning_bin.status = 'cleaning'
+
+        # Update job status
+        job.status = 'in_progress'
+        job.started_at = datetime.now()
+        job.started_by = request.form['operator_name']
+
+        db.session.add(cleaning_process)
+        db.session.commit()
+
+        flash(f'{duration_hours}-hour cleaning process started successfully!', 'success')
+        return redirect(url_for('production.production_execution'))
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error starting cleaning process: {str(e)}', 'error')
+        return redirect(url_for('cleaning.cleaning_setup', job_id=job_id))
@@ -0,0 +1,263 @@
+"""Dashboard, master data, reports and uploaded files"""
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, flash, jsonify, send_from_directory
+from app import db
+from auth import public, requires
+from models import *
+
+bp = Blueprint('core', __name__)
+
+@bp.route('/')
+def index():
+    # Dashboard data
+    pending_vehicles = Vehicle.query.filter_by(status='pending').count()
+    quality_check_vehicles = Vehicle.query.filter_by(status='quality_check').count()
+    active_orders = ProductionOrder.query.filter(ProductionOrder.status.in_(['pending', 'planned', 'in_progress'])).count()
+    pending_dispatches = Dispatch.query.filter_by(status='loaded').count()
+
+    # Recent activities
+    recent_vehicles = Vehicle.query.order_by(Vehicle.created_at.desc()).limit(5).all()
+    recent_orders = ProductionOrder.query.order_by(ProductionOrder.created_at.desc()).limit(5).all()
+
+    return render_template('index.html', 
+                         pending_vehicles=pending_vehicles,
+                         quality_check_vehicles=quality_check_vehicles,
+                         active_orders=active_orders,
+                         pending_dispatches=pending_dispatches,
+                         recent_vehicles=recent_vehicles,
+                         recent_orders=recent_orders)
+
+@bp.route('/reports')
+def reports():
+    from master_cache import master_list
+    # Various report data
+    vehicle_stats = db.session.query(
+        Vehicle.status, 
+        db.func.count(Vehicle.id).label('count')
+    ).group_by(Vehicle.status).all()
+
+    godown_inventory = master_list('godowns')
+
+    production_stats = db.session.query(
+        ProductionOrder.status,
+        db.func.count(ProductionOrder.id).label('count')
+    ).group_by(ProductionOrder.status).all()
+
+    return render_template('reports.html', 
+                         vehicle_stats=vehicle_stats,
+                         godown_inventory=godown_inventory,
+                         production_stats=production_stats)
+
+@bp.route('/masters', methods=['GET', 'POST'])
+def masters():
+    from master_cache import master_list
+    if request.method == 'POST':
+        try:
+            form_type = request.form.get('form_type')
+            
+            if form_type == 'supplier':
+                supplier = Supplier()
+                supplier.company_name = request.form['company_name']
+                supplier.contact_person = request.form.get('contact_person')
+                supplier.phone = request.form.get('phone')
+                supplier.address = request.form.get('address')
+                supplier.city = request.form.get('city')
+                supplier.state = request.form.get('state')
+                supplier.postal_code = request.form.get('postal_code')
+                db.session.add(supplier)
+                flash('Supplier added successfully!', 'success')
+                
+            elif form_type == 'customer':
+                customer = Customer()
+                customer.company_name = request.form['company_name']
+                customer.contact_person = request.form.get('contact_person')
+                customer.phone = request.form.get('phone')
+                customer.email = request.form.get('email')
+                customer.address = request.form.get('address')
+                customer.city = request.form.get('city')
+                customer.state = request.form.get('state')
+                customer.postal_code = request.form.get('postal_code')
+                db.session.add(customer)
+                flash('Customer added successfully!', 'success')
+                
+            elif form_type == 'product':
+                product = Product()
+                product.name = request.form['name']
+                product.category = request.form.get('category', 'Main Product')
+                product.description = request.form.get('description')
+                db.session.add(product)
+                flash('Product added successfully!', 'success')
+                
+            elif form_type == 'godown_type':
+                godown_type = GodownType()
+                godown_type.name = request.form['name']
+                godown_type.description = request.form.get('description')
+                db.session.add(godown_type)
+                flash('Godown type added successfully!', 'success')
+                
+            db.session.commit()
+            
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error adding record: {str(e)}', 'error')
+            
+        return redirect(url_for('core.masters'))
+
+    suppliers = master_list('suppliers')
+    customers = master_list('customers')
+    products = master_list('products')
+    godown_types = master_list('godown_types')
+
+    return render_template('masters.html',
+                         suppliers=suppliers,
+                         customers=customers,
+                         products=products,
+                         godown_types=godown_types)
+
+@bp.route('/init_data')
+@requires('admin')
+def init_data():
+    """Initialize sample data for testing"""
+    try:
+        # Create sample suppliers if none exist
+        if Supplier.query.count() == 0:
+            suppliers = [
+                Supplier(company_name='ABC Farm Supplies', contact_person='John Doe', phone='9876543210', address='Sample Address 1'),
+                Supplier(company_name='XYZ Agricultural Co.', contact_person='Jane Smith', phone='9876543211', address='Sample Address 2')
+            ]
+            for supplier in suppliers:
+                db.session.add(supplier)
+
+        # Create sample customers if none exist
+        if Customer.query.count() == 0:
+            customers = [
+                Customer(company_name='Sample Customer 1', contact_person='Customer Rep 1', phone='9876543212', address='Customer Address 1'),
+                Customer(company_name='Sample Customer 2', contact_person='Customer Rep 2', phone='9876543213', address='Customer Address 2')
+            ]
+            for customer in customers:
+                db.session.add(customer)
+
+        # Create sample products if none exist
+        if Product.query.count() == 0:
+            products = [
+                Product(name='Wheat Flour', category='Main Product', description='Premium wheat flour'),
+                Product(name='Wheat Bran', category='Bran', description='High quality wheat bran'),
+                Product(name='Fine Flour', category='Main Product', description='Fine wheat flour')
+            ]
+            for product in products:
+                db.session.add(product)
+
+        # Try to create a production machine to test the table structure
+        try:
+            test_machine = ProductionMachine.query.first()
+            if not test_machine:
+                test_machine = ProductionMachine(
+                    name='Test Grinding Machine',
+                    machine_type='grinding',
+                    process_step='grinding',
+                    cleaning_frequency_hours=3.0,
+                    cleaning_frequency_minutes=180
+                )
+                db.session.add(test_machine)
+        except Exception as machine_error:
+            print(f"Column might already exist or error: {machine_error}")
+
+        db.session.commit()
+        flash('Sample data initialized successfully!', 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error initializing sample data: {str(e)}', 'error')
+
+    return redirect(url_for('core.index'))
+
+@bp.route('/uploads/<filename>')
+def uploaded_file(filename):
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+@bp.route('/api/masters/<kind>')
+def api_master_list(kind):
+    """Cached master list with an ETag so unchanged lists revalidate as 304 Not Modified"""
+    from master_cache import MASTER_LISTS, master_list, etag_for
+    if kind not in MASTER_LISTS:
+        return jsonify({'success': False, 'error': f'Unknown master list: {kind}'}), 404
+
+    etag = etag_for(kind)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        # Without stock levels, which change without changing the ETag
+        response = jsonify({'success': True, kind: [row.to_dict() for row in master_list(kind, stock=False)]})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@bp.route('/sw.js')
+@public
+def service_worker():
+    """Service worker served from the site root so its scope covers every page"""
+    import hashlib
+    import json
+    from assets import asset_urls
+    from offline_sync import OFFLINE_PAGES, OFFLINE_MASTER_LISTS
+    context = {
+        'pages': [url_for(endpoint) for endpoint in OFFLINE_PAGES],
+        'assets': asset_urls('app.css') + asset_urls('app.js') + [
+            url_for('static', filename='manifest.webmanifest'),
+            url_for('static', filename='icons/icon.svg')
+        ],
+        'master_data': [url_for('core.api_master_list', kind=kind) for kind in OFFLINE_MASTER_LISTS]
+    }
+    # A new asset build changes the version, so browsers install the new worker and drop the old shell
+    context['version'] = hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()[:12]
+    response = current_app.response_class(render_template('sw.js', **context), mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# CRUD API Routes for better functionality
+@bp.route('/api/delete_supplier/<int:supplier_id>', methods=['POST'])
+@requires('admin')
+def delete_supplier(supplier_id):
+    try:
+        supplier = Supplier.query.get_or_404(supplier_id)
+        db.session.delete(supplier)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Supplier deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+
+@bp.route('/api/delete_customer/<int:customer_id>', methods=['POST'])
+@requires('admin')
+def delete_customer(customer_id):
+    try:
+        customer = Customer.query.get_or_404(customer_id)
+        db.session.delete(customer)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Customer deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+
+@bp.route('/api/delete_product/<int:product_id>', methods=['POST'])
+@requires('admin')
+def delete_product(product_id):
+    try:
+        product = Product.query.get_or_404(product_id)
+        db.session.delete(product)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Product deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+
+@bp.route('/api/delete_godown/<int:godown_id>', methods=['POST'])
+@requires('admin')
+def delete_godown(godown_id):
+    try:
+        godown = Godown.query.get_or_404(godown_id)
+        db.session.delete(godown)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Godown deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
@@ -0,0 +1,75 @@
+"""Sales dispatch and loading plans"""
+from datetime import datetime
+from flask import Blueprint, request, render_template, flash, jsonify
+from app import db
+from models import *
+
+bp = Blueprint('dispatch', __name__)
+
+@bp.route('/sales_dispatch', methods=['GET', 'POST'])
+def sales_dispatch():
+    from inventory import dispatch_stock, available_stock
+    from master_cache import master_list
+    if request.method == 'POST':
+        try:
+            dispatch = SalesDispatch()
+            dispatch.order_id = int(request.form['order_id'])
+            dispatch.customer_id = int(request.form['customer_id'])
+            dispatch.product_id = int(request.form['product_id'])
+            dispatch.dispatch_date = datetime.strptime(request.form['dispatch_date'], '%Y-%m-%d')
+            dispatch.vehicle_number = request.form['vehicle_number']
+            dispatch.driver_name = request.form['driver_name']
+            dispatch.notes = request.form.get('notes')
+
+            db.session.add(dispatch)
+
+            # Dispatches entered in bags are allocated from finished goods stock, oldest lot first
+            if request.form.get('bag_weight') and request.form.get('bag_count'):
+                dispatch.bag_weight_kg = float(request.form['bag_weight'])
+                dispatch.bag_count = int(request.form['bag_count'])
+                dispatch.quantity = dispatch.bag_weight_kg * dispatch.bag_count / 1000  # tons
+                dispatch_stock(dispatch, dispatch.bag_weight_kg, dispatch.bag_count,
+                               storage_area_id=int(request.form['storage_area_id']) if request.form.get('storage_area_id') else None)
+            else:
+                dispatch.quantity = float(request.form['quantity'])
+
+            db.session.commit()
+            flash('Dispatch record created successfully!', 'success')
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error creating dispatch: {str(e)}', 'error')
+
+    completed_orders = ProductionOrder.query.filter_by(status='completed').all()
+    customers = master_list('customers')
+    products = master_list('products')
+    dispatches = SalesDispatch.query.order_by(SalesDispatch.created_at.desc()).limit(20).all()
+    order_numbers = dict(db.session.query(ProductionOrder.id, ProductionOrder.order_number).filter(
+        ProductionOrder.id.in_({d.order_id for d in dispatches})).all()) if dispatches else {}
+
+    return render_template('sales_dispatch.html', 
+                         orders=completed_orders, 
+                         customers=customers, 
+                         products=products, 
+                         storage_areas=master_list('storage_areas'),
+                         stock=available_stock(),
+                         dispatches=dispatches,
+                         order_numbers=order_numbers,
+                         customer_names={c.id: c.company_name for c in customers},
+                         product_names={p.id: p.name for p in products})
+
+@bp.route('/dispatch_planning')
+def dispatch_planning():
+    """Printable loading sheets for open sales orders on available vehicles"""
+    from dispatch_planner import plan_dispatch
+    plan = plan_dispatch()
+    return render_template('dispatch_planning.html', plan=plan)
+
+@bp.route('/api/dispatch_plan')
+def api_dispatch_plan():
+    """Dispatch loading plan as JSON"""
+    from dispatch_planner import plan_dispatch
+    try:
+        return jsonify({'success': True, 'plan': plan_dispatch()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,101 @@
+"""Vehicle entry, weighbridge and vehicle approval"""
+import os
+from datetime import datetime
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, flash
+from werkzeug.utils import secure_filename
+from app import db
+from auth import requires
+from models import *
+from utils import allowed_file
+
+bp = Blueprint('intake', __name__)
+
+@bp.route('/vehicle_entry', methods=['GET', 'POST'])
+def vehicle_entry():
+    from offline_sync import record_vehicle_entry
+    from master_cache import master_list
+    if request.method == 'POST':
+        try:
+            record_vehicle_entry(request.form, request.files)
+            db.session.commit()
+            flash('Vehicle entry recorded successfully!', 'success')
+            return redirect(url_for('intake.vehicle_entry'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error recording vehicle entry: {str(e)}', 'error')
+
+    suppliers = master_list('suppliers')
+    pending_vehicles = Vehicle.query.filter_by(status='pending').order_by(Vehicle.arrival_time.desc()).all()
+
+    return render_template('vehicle_entry.html', suppliers=suppliers, vehicles=pending_vehicles)
+
+@bp.route('/weight_entry', methods=['GET', 'POST'])
+def weight_entry():
+    from genealogy import record_movement
+    from master_cache import master_list
+    from weighbridge import DEFAULT_BRIDGE
+    if request.method == 'POST':
+        try:
+            vehicle_id = request.form['vehicle_id']
+            vehicle = Vehicle.query.get_or_404(vehicle_id)
+
+            if 'vehicle_photo_after' in request.files:
+                file = request.files['vehicle_photo_after']
+                if file and file.filename and allowed_file(file.filename):
+                    filename = secure_filename(file.filename)
+                    filename = f"after_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                    vehicle.vehicle_photo_after = filename
+
+            vehicle.net_weight_before = float(request.form['net_weight_before'])
+            vehicle.net_weight_after = float(request.form['net_weight_after'])
+            vehicle.final_weight = vehicle.net_weight_before - vehicle.net_weight_after
+            vehicle.godown_id = request.form['godown_id']
+            vehicle.status = 'unloaded'
+
+            # Update godown inventory
+            godown = Godown.query.get(vehicle.godown_id)
+            if godown:
+                godown.current_stock += vehicle.final_weight
+                record_movement(vehicle, godown, quantity=vehicle.final_weight, source='weight_entry')
+
+            db.session.commit()
+            flash('Weight entry recorded and inventory updated!', 'success')
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error recording weight entry: {str(e)}', 'error')
+
+    approved_vehicles = Vehicle.query.filter_by(status='approved', owner_approved=True).all()
+    godowns = master_list('godowns')
+
+    return render_template('weight_entry.html', vehicles=approved_vehicles, godowns=godowns, bridge=DEFAULT_BRIDGE)
+
+@bp.route('/approve_vehicle/<int:vehicle_id>')
+@requires('quality')
+def approve_vehicle(vehicle_id):
+    try:
+        vehicle = Vehicle.query.get_or_404(vehicle_id)
+        vehicle.owner_approved = True
+        vehicle.status = 'approved'
+        db.session.commit()
+        flash('Vehicle approved for unloading!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error approving vehicle: {str(e)}', 'error')
+    return redirect(url_for('quality.quality_control'))
+
+@bp.route('/reject_vehicle/<int:vehicle_id>')
+@requires('quality')
+def reject_vehicle(vehicle_id):
+    try:
+        vehicle = Vehicle.query.get_or_404(vehicle_id)
+        vehicle.status = 'rejected'
+        vehicle.owner_approved = False
+        db.session.commit()
+        flash('Vehicle rejected!', 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error rejecting vehicle: {str(e)}', 'error')
+    return redirect(url_for('quality.quality_control'))
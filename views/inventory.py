@@ -0,0 +1,233 @@
+"""Godowns, precleaning transfers and finished goods storage"""
+import os
+from datetime import datetime
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, flash, jsonify
+from werkzeug.utils import secure_filename
+from app import db
+from auth import requires
+from models import *
+from utils import allowed_file
+
+bp = Blueprint('inventory', __name__)
+
+@bp.route('/precleaning', methods=['GET', 'POST'])
+def precleaning():
+    from genealogy import record_movement
+    from master_cache import master_list
+    if request.method == 'POST':
+        try:
+            # Handle file uploads
+            transfer_photo = None
+
+            if 'transfer_photo' in request.files:
+                file = request.files['transfer_photo']
+                if file and file.filename and allowed_file(file.filename):
+                    filename = secure_filename(file.filename)
+                    filename = f"transfer_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                    transfer_photo = filename
+
+            transfer = Transfer()
+            transfer.from_godown_id = int(request.form['from_godown_id'])
+            transfer.to_precleaning_bin_id = int(request.form['to_precleaning_bin_id'])
+            transfer.quantity = float(request.form['quantity'])
+            transfer.transfer_type = 'godown_to_precleaning'
+            transfer.operator = request.form['operator']
+            transfer.notes = request.form.get('notes')
+            transfer.evidence_photo = transfer_photo
+
+            # Update stocks
+            from_godown = Godown.query.get(transfer.from_godown_id)
+            to_bin = PrecleaningBin.query.get(transfer.to_precleaning_bin_id)
+
+            if from_godown and to_bin:
+                from_godown.current_stock -= transfer.quantity
+                to_bin.current_stock += transfer.quantity
+                record_movement(from_godown, to_bin, quantity=transfer.quantity, source='precleaning')
+
+            db.session.add(transfer)
+            db.session.commit()
+            flash('Transfer completed successfully!', 'success')
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error processing transfer: {str(e)}', 'error')
+
+    godowns = [g for g in master_list('godowns') if (g.current_stock or 0) > 0]
+    precleaning_bins = master_list('precleaning_bins')
+    recent_transfers = Transfer.query.filter_by(transfer_type='godown_to_precleaning').order_by(Transfer.transfer_time.desc()).limit(10).all()
+
+    return render_template('precleaning.html', godowns=godowns, precleaning_bins=precleaning_bins, transfers=recent_transfers)
+
+@bp.route('/godown_management', methods=['GET', 'POST'])
+def godown_management():
+    from master_cache import master_list
+    if request.method == 'POST':
+        try:
+            godown = Godown()
+            godown.name = request.form['name']
+            godown.type_id = int(request.form['type_id'])
+            godown.capacity = float(request.form.get('capacity', 0))
+            godown.current_stock = float(request.form.get('current_stock', 0))
+            
+            db.session.add(godown)
+            db.session.commit()
+            flash('Godown added successfully!', 'success')
+            
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error adding godown: {str(e)}', 'error')
+            
+        return redirect(url_for('inventory.godown_management'))
+
+    godowns = master_list('godowns')
+    godown_types = master_list('godown_types')
+
+    return render_template('godown_management.html', godowns=godowns, godown_types=godown_types)
+
+@bp.route('/storage_management', methods=['GET', 'POST'])
+def storage_management():
+    """Storage and finished goods management"""
+    from inventory import transfer_stock, available_stock
+    from master_cache import master_list
+    if request.method == 'POST' and request.form.get('action') == 'transfer_storage':
+        try:
+            transfer = StorageTransfer()
+            transfer.from_storage_id = int(request.form['from_storage_id'])
+            transfer.to_storage_id = int(request.form['to_storage_id'])
+            transfer.product_id = int(request.form['product_id'])
+            transfer.operator_name = request.form['operator_name']
+            transfer.reason = request.form.get('reason')
+
+            _, moved_kg = transfer_stock(transfer.from_storage_id, transfer.to_storage_id, transfer.product_id,
+                                         quantity_kg=float(request.form['quantity']))
+            transfer.quantity_kg = moved_kg
+
+            db.session.add(transfer)
+            db.session.commit()
+            flash(f'Transferred {moved_kg:.2f} kg successfully!', 'success')
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error transferring stock: {str(e)}', 'error')
+
+        return redirect(url_for('inventory.storage_management'))
+
+    storage_areas = master_list('storage_areas')
+    finished_goods = FinishedGoods.query.order_by(FinishedGoods.created_at.desc()).limit(50).all()
+
+    # Calculate storage utilization
+    total_capacity = sum([area.capacity_kg for area in storage_areas])
+    total_current = sum([area.current_stock_kg for area in storage_areas])
+    utilization_percent = (total_current / total_capacity * 100) if total_capacity > 0 else 0
+
+    recent_transfers = StorageTransfer.query.order_by(StorageTransfer.transfer_time.desc()).limit(20).all()
+    products = master_list('products')
+
+    return render_template('storage_management.html', 
+                         storage_areas=storage_areas,
+                         finished_goods=finished_goods,
+                         stock_balances=available_stock(),
+                         recent_transfers=recent_transfers,
+                         products=products,
+                         total_capacity=total_capacity,
+                         total_current=total_current,
+                         utilization_percent=utilization_percent)
+
+@bp.route('/api/inventory/available')
+def api_inventory_available():
+    """What can be shipped today, per storage area, product and bag weight"""
+    from inventory import available_stock
+    try:
+        product_id = request.args.get('product_id', type=int)
+        storage_area_id = request.args.get('storage_area_id', type=int)
+        return jsonify({'success': True, 'stock': available_stock(product_id, storage_area_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/api/inventory/transfer', methods=['POST'])
+def api_inventory_transfer():
+    """Move bags of a product between storage areas (oldest lots first)"""
+    from inventory import transfer_stock
+    try:
+        data = request.get_json(silent=True) or request.form
+        transfer = ProductStorageTransfer()
+        transfer.from_storage_area_id = int(data['from_storage_area_id'])
+        transfer.to_storage_area_id = int(data['to_storage_area_id'])
+        transfer.product_id = int(data['product_id'])
+        transfer.bag_weight_kg = float(data['bag_weight_kg'])
+        transfer.bag_count = int(data['bag_count'])
+        transfer.operator_name = data['operator_name']
+        transfer.reason = data.get('reason')
+        transfer.notes = data.get('notes')
+
+        _, moved_kg = transfer_stock(transfer.from_storage_area_id, transfer.to_storage_area_id, transfer.product_id,
+                                     bag_weight=transfer.bag_weight_kg, bag_count=transfer.bag_count)
+        transfer.quantity_kg = moved_kg
+
+        db.session.add(transfer)
+        db.session.commit()
+        return jsonify({'success': True, 'transfer_id': transfer.id, 'quantity_kg': moved_kg})
+
+    except (KeyError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/inventory/rebuild', methods=['POST'])
+@requires('admin')
+def api_inventory_rebuild():
+    """Queue a recalculation of stock balances (and optionally the lineage index)"""
+    from tasks import enqueue
+    try:
+        task_ids = [enqueue('rebuild_stock').id]
+        if (request.get_json(silent=True) or {}).get('include_lineage'):
+            task_ids.append(enqueue('rebuild_closure').id)
+        db.session.commit()
+        return jsonify({'success': True, 'task_ids': task_ids}), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/storage_details/<int:storage_area_id>')
+def api_storage_details(storage_area_id):
+    """Per-product stock held in one storage area"""
+    try:
+        area = StorageArea.query.get_or_404(storage_area_id)
+        balances = FinishedGoodsStock.query.filter(
+            FinishedGoodsStock.storage_area_id == storage_area_id,
+            FinishedGoodsStock.bag_count > 0
+        ).all()
+
+        products = {}
+        for balance in balances:
+            product = products.setdefault(balance.product_id, {
+                'name': balance.product.name,
+                'category': balance.product.category or '',
+                'total_quantity': 0,
+                'bag_details': [],
+                'shallow_storage': 0,
+                'last_updated': '',
+                'operators': []
+            })
+            product['total_quantity'] += balance.quantity_kg
+            product['bag_details'].append({
+                'bag_weight_kg': balance.bag_weight_kg,
+                'number_of_bags': balance.bag_count,
+                'total_packed_kg': balance.quantity_kg
+            })
+            if balance.updated_at:
+                product['last_updated'] = max(product['last_updated'], balance.updated_at.strftime('%Y-%m-%d %H:%M'))
+
+        total_quantity = sum(b.quantity_kg for b in balances)
+        return jsonify({
+            'success': True,
+            'products': list(products.values()),
+            'total_quantity': total_quantity,
+            'total_bags': sum(b.bag_count for b in balances),
+            'utilization': (area.current_stock_kg or 0) / area.capacity_kg * 100 if area.capacity_kg else 0
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
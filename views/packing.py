@@ -0,0 +1,163 @@
+"""Packing execution and bag labels"""
+import os
+from datetime import datetime
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, flash, jsonify
+from werkzeug.utils import secure_filename
+from app import db
+from models import *
+from utils import allowed_file
+
+bp = Blueprint('packing', __name__)
+
+@bp.route('/packing_execution/<int:job_id>', methods=['GET', 'POST'])
+def packing_execution(job_id):
+    from packing import pack_batch, create_label_sheet, schedule_label_sheet, LABEL_FORMATS
+    from master_cache import master_list
+    job = ProductionJobNew.query.get_or_404(job_id)
+
+    # Check for grinding process in this job or related grinding jobs
+    grinding_process = GrindingProcess.query.filter_by(job_id=job_id).first()
+    if not grinding_process:
+        # Look for grinding process in other jobs with the same order_id
+        related_jobs = ProductionJobNew.query.filter_by(order_id=job.order_id, stage='grinding').all()
+        for related_job in related_jobs:
+            grinding_process = GrindingProcess.query.filter_by(job_id=related_job.id).first()
+            if grinding_process:
+                break
+
+    if not grinding_process:
+        flash('Grinding process must be completed before packing!', 'error')
+        return redirect(url_for('production.production_execution'))
+
+    if request.method == 'POST':
+        try:
+            if request.form.get('action') in ('pack_products', 'complete_packing'):
+                operator = request.form['operator_name']
+
+                # Handle photo upload
+                packing_photo = None
+                if 'packing_photo' in request.files:
+                    file = request.files['packing_photo']
+                    if file and file.filename and allowed_file(file.filename):
+                        filename = secure_filename(file.filename)
+                        filename = f"packing_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+                        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                        packing_photo = filename
+
+                # Process all products from the form (handle multiple products)
+                product_ids = request.form.getlist('product_id')
+                bag_weights = request.form.getlist('bag_weight')
+                bag_counts = request.form.getlist('bag_count')
+                storage_area_ids = request.form.getlist('storage_area_id')
+                shallow_storages = request.form.getlist('shallow_storage')
+
+                lines = [{
+                    'product_id': product_ids[i],
+                    'bag_weight': bag_weights[i] if i < len(bag_weights) else None,
+                    'bag_count': bag_counts[i] if i < len(bag_counts) else None,
+                    'storage_area_id': storage_area_ids[i] if i < len(storage_area_ids) else None,
+                    'shallow_storage': shallow_storages[i] if i < len(shallow_storages) else None
+                } for i in range(len(product_ids))]
+
+                result = pack_batch(job, lines, operator, packing_photo=packing_photo)
+                total_packed_count = result['lines']
+
+                if request.form.get('label_format') in LABEL_FORMATS:
+                    schedule_label_sheet(create_label_sheet(job, result, request.form['label_format']))
+
+                # Mark job as completed
+                job.status = 'completed'
+                job.completed_at = datetime.now()
+                job.completed_by = operator
+
+                db.session.commit()
+
+                flash(f'Packing process completed successfully! Processed {total_packed_count} products.', 'success')
+                return redirect(url_for('production.production_execution'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error in packing process: {str(e)}', 'error')
+
+    products = [p for p in master_list('products') if p.category == 'Main Product']
+    storage_areas = master_list('storage_areas')
+    existing_packing = PackingProcess.query.filter_by(job_id=job_id).all()
+
+    # Get finished goods for this order - THIS FIXES THE DATA DISPLAY
+    finished_goods = FinishedGoods.query.filter_by(order_id=job.order_id).all()
+
+    return render_template('packing_execution.html', 
+                         job=job, 
+                         grinding_process=grinding_process,
+                         products=products,
+                         storage_areas=storage_areas,
+                         existing_packing=existing_packing,
+                         finished_goods=finished_goods)
+
+@bp.route('/api/packing/batch/<int:job_id>', methods=['POST'])
+def api_packing_batch(job_id):
+    """Record many packing lines in one call and optionally queue barcode labels"""
+    from packing import pack_batch, create_label_sheet, schedule_label_sheet, LABEL_FORMATS
+    try:
+        # Locked so two calls completing the same job cannot both pack it
+        job = db.session.get(ProductionJobNew, job_id, with_for_update=True)
+        if job is None:
+            return jsonify({'success': False, 'message': 'Job not found'}), 404
+        data = request.get_json(silent=True) or {}
+
+        if job.stage != 'packing':
+            return jsonify({'success': False, 'message': 'This job is not a packing job'}), 400
+        if job.status == 'completed':
+            return jsonify({'success': False, 'message': f'Packing job {job.job_number} is already completed'}), 409
+        if not data.get('operator_name'):
+            return jsonify({'success': False, 'message': 'operator_name is required'}), 400
+
+        label_format = data.get('label_format')
+        if label_format and label_format not in LABEL_FORMATS:
+            return jsonify({'success': False, 'message': f'label_format must be one of: {", ".join(LABEL_FORMATS)}'}), 400
+
+        result = pack_batch(job, data.get('lines') or [], data['operator_name'])
+
+        if label_format:
+            label_sheet = create_label_sheet(job, result, label_format)
+            result['label_task_id'] = schedule_label_sheet(label_sheet).id
+            result['label_sheet_id'] = label_sheet.id
+
+        if data.get('complete_job'):
+            job.status = 'completed'
+            job.completed_at = datetime.now()
+            job.completed_by = data['operator_name']
+
+        db.session.commit()
+
+        return jsonify({'success': True, 'result': result})
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/api/packing/labels/<int:sheet_id>')
+def api_label_sheet(sheet_id):
+    """Status of a background label sheet and its download link once rendered"""
+    sheet = LabelSheet.query.get_or_404(sheet_id)
+    return jsonify({
+        'success': True,
+        'label_sheet': {
+            'id': sheet.id,
+            'batch_number': sheet.batch_number,
+            'format': sheet.label_format,
+            'serial_start': sheet.serial_start,
+            'serial_end': sheet.serial_end,
+            'status': sheet.status,
+            'error': sheet.error,
+            'download_url': url_for('core.uploaded_file', filename=sheet.file_name) if sheet.file_name else None
+        }
+    })
+
+@bp.route('/production_execution/packing/<int:job_id>')
+def packing_execution_route(job_id):
+    """Redirect to existing packing execution"""
+    return redirect(url_for('packing.packing_execution', job_id=job_id))
@@ -0,0 +1,24 @@
+"""Lab quality tests on incoming vehicles"""
+from flask import Blueprint, request, render_template, flash
+from app import db
+from models import *
+
+bp = Blueprint('quality', __name__)
+
+@bp.route('/quality_control', methods=['GET', 'POST'])
+def quality_control():
+    from offline_sync import record_quality_test
+    if request.method == 'POST':
+        try:
+            record_quality_test(request.form, request.files)
+            db.session.commit()
+            flash('Quality test recorded successfully!', 'success')
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error recording quality test: {str(e)}', 'error')
+
+    pending_vehicles = Vehicle.query.filter_by(status='pending').all()
+    quality_tests = QualityTest.query.join(Vehicle).order_by(QualityTest.test_time.desc()).all()
+
+    return render_template('quality_control.html', vehicles=pending_vehicles, quality_tests=quality_tests)
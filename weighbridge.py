@@ -0,0 +1,272 @@
+"""Weighbridge indicator ingestion.
+
+`flask --app main weighbridge` reads the continuous weight output of the
+indicator (serial port, TCP, or the built-in simulator), detects when the
+weight has settled, records it against the vehicle waiting on the bridge and
+publishes the live weight for the weight entry form, which polls it from
+/api/weighbridge/<name>.
+"""
+import os
+import random
+import re
+import socket
+import statistics
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from models import Vehicle, Weighbridge, WeighbridgeReading
+from serializers import iso
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+DEFAULT_BRIDGE = os.environ.get("WEIGHBRIDGE_NAME", "main")
+# Frames in the rolling window, and the spread (kg) under which the window counts as settled
+WINDOW = int(os.environ.get("WEIGHBRIDGE_WINDOW", "10"))
+STABLE_STD_DEV_KG = float(os.environ.get("WEIGHBRIDGE_STABLE_KG", "5"))
+# Below this the bridge is empty; settled weights are rounded to the indicator's division
+MIN_LOAD_KG = float(os.environ.get("WEIGHBRIDGE_MIN_LOAD_KG", "200"))
+DIVISION_KG = float(os.environ.get("WEIGHBRIDGE_DIVISION_KG", "10"))
+# How often the unsettled live weight is written for the form to show
+LIVE_SECONDS = float(os.environ.get("WEIGHBRIDGE_LIVE_SECONDS", "1"))
+# Browsers reconnect an event stream by themselves, so each one only holds a worker this long
+# Settled readings returned to one poll at most; a form that was away longer only needs the latest
+MAX_POLL_READINGS = 20
+
+# "ST,GS,+0012340kg", "US,NT,  8760 kg", "  23450" ...; OL (overload) frames carry no weight
+FRAME = re.compile(rb'^\s*(?:(ST|US|OL)\s*,)?\s*(?:[A-Z]{2}\s*,)?\s*([+-]?)\s*(\d+(?:\.\d+)?)\s*(kg|t)?\s*$', re.I)
+
+Event = namedtuple('Event', 'kind weight std_dev')  # kind: stable, empty
+
+def parse_frame(frame):
+    """Weight in kg from one indicator line, or None for frames without a usable weight"""
+    match = FRAME.match(frame)
+    if not match or (match.group(1) or b'').upper() == b'OL':
+        return None
+    weight = float(match.group(3)) * (1000 if (match.group(4) or b'').lower() == b't' else 1)
+    return -weight if match.group(2) == b'-' else weight
+
+class StabilityDetector:
+    """Report each plateau of the weight once it has settled, and the bridge emptying after a load"""
+
+    def __init__(self, window=WINDOW, max_std_dev=STABLE_STD_DEV_KG, min_load=MIN_LOAD_KG, division=DIVISION_KG):
+        self.samples = deque(maxlen=window)
+        self.max_std_dev = max_std_dev
+        self.min_load = min_load
+        self.division = division
+        self.plateau = None  # last weight reported for the load now on the bridge
+        self.loaded = False
+        self.settled = False  # whether the current window is steady
+
+    def feed(self, weight):
+        """Add one frame; returns an Event when a weight settles or the bridge empties, otherwise None"""
+        self.samples.append(weight)
+        if len(self.samples) < self.samples.maxlen:
+            return None
+
+        if max(self.samples) < self.min_load:
+            self.settled = False
+            if self.loaded:
+                self.loaded = False
+                self.plateau = None
+                return Event('empty', None, None)
+            return None
+
+        mean = statistics.fmean(self.samples)
+        std_dev = statistics.pstdev(self.samples, mean)
+        self.settled = mean >= self.min_load and std_dev <= self.max_std_dev
+        if not self.settled:
+            return None
+        self.loaded = True
+        weight = round(mean / self.division) * self.division
+        # A truck shuffling forward settles again at a different weight; noise around the same one does not count
+        if self.plateau is not None and abs(weight - self.plateau) <= max(self.division, 3 * self.max_std_dev):
+            return None
+        self.plateau = weight
+        return Event('stable', weight, round(std_dev, 2))
+
+def serial_frames(port, baudrate=9600):
+    """Lines from an indicator on a serial port (needs pyserial)"""
+    if serial is None:
+        raise RuntimeError('pyserial is required to read a serial weighbridge: pip install pyserial')
+    with serial.Serial(port, baudrate, timeout=5) as connection:
+        while True:
+            line = connection.readline()
+            if line:
+                yield line
+
+def tcp_frames(host, port, reconnect_seconds=5):
+    """Lines from an indicator or serial-to-Ethernet converter over TCP, reconnecting when the link drops"""
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=10) as connection:
+                for line in connection.makefile('rb'):
+                    yield line
+        except OSError as e:
+            current_app.logger.warning(f"Weighbridge {host}:{port} unreachable: {e}")
+        time.sleep(reconnect_seconds)
+
+def simulated_frames(rate=10, noise_kg=3.0, realtime=True):
+    """Endless indicator output for trucks crossing the bridge loaded and again empty, with settling wobble"""
+    def frames(weight, seconds, wobble):
+        for _ in range(int(seconds * rate)):
+            yield f"{'ST' if wobble <= noise_kg else 'US'},GS,{weight + random.gauss(0, wobble):+09.0f}kg\r\n".encode()
+
+    def crossing(load):
+        yield from frames(0, 4, noise_kg)
+        for step in range(1, 11):
+            yield from frames(load * step / 10, 0.3, load * 0.01)
+        yield from frames(load, 2, load * 0.002)
+        yield from frames(load, 5, noise_kg)
+        for step in range(9, -1, -1):
+            yield from frames(load * step / 10, 0.3, load * 0.01)
+
+    while True:
+        tare = random.uniform(6000, 9000)
+        for frame in (*crossing(tare + random.uniform(12000, 22000)), *crossing(tare)):
+            yield frame
+            if realtime:
+                time.sleep(1 / rate)
+
+def _bridge(name):
+    bridge = Weighbridge.query.filter_by(name=name).first()
+    if bridge is None:
+        bridge = Weighbridge(name=name)
+        db.session.add(bridge)
+        db.session.flush()
+    return bridge
+
+def waiting_vehicle(bridge):
+    """The vehicle called onto the bridge, else the only approved vehicle still missing a weight"""
+    if bridge.vehicle_id:
+        return bridge.vehicle
+    candidates = Vehicle.query.filter(
+        Vehicle.status == 'approved', Vehicle.owner_approved == True, Vehicle.net_weight_after.is_(None)
+    ).order_by(Vehicle.arrival_time).limit(2).all()
+    return candidates[0] if len(candidates) == 1 else None
+
+def _attach(bridge, reading, vehicle):
+    # A vehicle gives its loaded weight first and its empty weight on the next visit; every plateau of one visit is the same weight
+    stage = bridge.visit_stage or ('before' if vehicle.net_weight_before is None else 'after')
+    bridge.vehicle_id = vehicle.id
+    bridge.visit_stage = stage
+    reading.vehicle_id = vehicle.id
+    reading.stage = stage
+    setattr(vehicle, f'net_weight_{stage}', reading.weight)
+
+def record_stable(name, weight, std_dev):
+    """Store a settled weight and attach it to the waiting vehicle. Commits."""
+    bridge = _bridge(name)
+    reading = WeighbridgeReading(weighbridge_id=bridge.id, weight=weight, std_dev=std_dev, captured_at=datetime.utcnow())
+    vehicle = waiting_vehicle(bridge)
+    if vehicle is not None:
+        _attach(bridge, reading, vehicle)
+    db.session.add(reading)
+    db.session.flush()
+    bridge.last_reading_id = reading.id
+    bridge.live_weight = weight
+    bridge.live_stable = True
+    bridge.live_at = reading.captured_at
+    db.session.commit()
+    return reading
+
+def end_visit(name):
+    """The bridge is empty again: the vehicle that was on it is done. Commits."""
+    bridge = _bridge(name)
+    if bridge.visit_stage:
+        bridge.vehicle_id = None
+        bridge.visit_stage = None
+    bridge.live_weight = 0
+    bridge.live_stable = False
+    bridge.live_at = datetime.utcnow()
+    db.session.commit()
+
+def update_live(name, weight, stable):
+    bridge = _bridge(name)
+    bridge.live_weight = weight
+    bridge.live_stable = stable
+    bridge.live_at = datetime.utcnow()
+    db.session.commit()
+
+def call_vehicle(name, vehicle_id):
+    """Put a vehicle on the bridge; a weight already settled and not yet attached is given to it. The caller commits."""
+    bridge = _bridge(name)
+    vehicle = db.session.get(Vehicle, vehicle_id) if vehicle_id else None
+    if vehicle_id and vehicle is None:
+        raise ValueError(f'Unknown vehicle: {vehicle_id}')
+    bridge.vehicle_id = vehicle.id if vehicle else None
+    bridge.visit_stage = None
+
+    reading = db.session.get(WeighbridgeReading, bridge.last_reading_id) if bridge.last_reading_id else None
+    if vehicle and reading and reading.vehicle_id is None and bridge.live_stable and bridge.live_weight == reading.weight:
+        _attach(bridge, reading, vehicle)
+    return reading if reading is not None and reading.vehicle_id == bridge.vehicle_id else None
+
+def run(name, frames, detector=None, live_seconds=LIVE_SECONDS):
+    """Ingest indicator frames until the source ends; database errors are logged and the next frame is read"""
+    detector = detector or StabilityDetector()
+    last_live = 0.0
+    for frame in frames:
+        weight = parse_frame(frame)
+        if weight is None:
+            continue
+        try:
+            event = detector.feed(weight)
+            if event is not None and event.kind == 'stable':
+                reading = record_stable(name, event.weight, event.std_dev)
+                current_app.logger.info(f"Weighbridge {name}: {reading.weight:.0f} kg settled"
+                                        + (f" ({reading.stage} of vehicle {reading.vehicle_id})" if reading.vehicle_id else ''))
+            elif event is not None:
+                end_visit(name)
+            elif time.monotonic() - last_live >= live_seconds:
+                update_live(name, weight, detector.settled)
+            else:
+                continue
+            last_live = time.monotonic()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Weighbridge {name}: could not record weight: {e}")
+
+def reading_payload(row):
+    return {
+        'id': row.id, 'weight': row.weight, 'stage': row.stage, 'std_dev': row.std_dev,
+        'vehicle_id': row.vehicle_id, 'vehicle_number': row.vehicle_number, 'captured_at': iso(row.captured_at)
+    }
+
+def _reading_rows(executor, *conditions):
+    return executor.execute(
+        select(WeighbridgeReading.id, WeighbridgeReading.weight, WeighbridgeReading.stage, WeighbridgeReading.std_dev,
+               WeighbridgeReading.vehicle_id, WeighbridgeReading.captured_at, Vehicle.vehicle_number)
+        .outerjoin(Vehicle, Vehicle.id == WeighbridgeReading.vehicle_id)
+        .where(*conditions)
+        .order_by(WeighbridgeReading.id)
+    ).all()
+
+def live_state(name, after=None):
+    """Live weight, the vehicle on the bridge, the last settled reading and those settled after reading id `after`.
+
+    Read straight from the primary on a short-lived connection, so the form
+    never waits on replica lag; None for an unknown bridge.
+    """
+    with db.engine.connect() as connection:
+        bridge = connection.execute(select(Weighbridge).where(Weighbridge.name == name)).first()
+        if bridge is None:
+            return None
+        last = _reading_rows(connection, WeighbridgeReading.id == bridge.last_reading_id) if bridge.last_reading_id else []
+        readings = []
+        if after is not None:
+            readings = _reading_rows(connection, WeighbridgeReading.weighbridge_id == bridge.id,
+                                     WeighbridgeReading.id > after)[-MAX_POLL_READINGS:]
+    return {
+        'weight': bridge.live_weight,
+        'stable': bool(bridge.live_stable),
+        'updated_at': iso(bridge.live_at),
+        'vehicle_id': bridge.vehicle_id,
+        'reading': reading_payload(last[0]) if last else None,
+        'readings': [reading_payload(row) for row in readings]
+    }